@@ -5,14 +5,33 @@
 测试所有API接口，包括认证、用户管理、商品管理、订单管理、支付管理、后台管理等模块。
 自动识别问题接口并生成测试报告。
 
+压测模式（load）用 asyncio + httpx 模拟 N 个虚拟用户按场景混合访问，
+支持分阶段爬升、按接口的延迟直方图、错误率统计与 HTML/JSON 报告：
+
+    python api_test.py                                   # 功能测试
+    python api_test.py load --scenario browse --users 50 --duration 120 --ramp-up 30
+    python api_test.py load --scenario flash_sale --stages 10:20,60:200,10:0
+    python api_test.py load --scenario callback_storm --alipay-private-key staging_alipay.pem
+
+压测流量来自同一地址，被测服务需以 RATE_LIMIT_ENABLED=false 启动，否则会被请求限流拒绝（429）。
+
 作者: AI Assistant
 日期: 2025年11月30日
 """
 
+import argparse
+import asyncio
+import html
 import json
+import random
+import re
+import sys
 import time
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass
+import uuid
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Dict, List, Any, Optional, Tuple
+from dataclasses import dataclass, replace
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
@@ -30,6 +49,7 @@ class TestResult:
     response_time: float = 0.0
     request_data: Optional[Dict] = None
     response_data: Optional[Any] = None
+    started_at: float = 0.0  # 压测模式：相对压测开始的发起时间（秒）
 
 
 class APITester:
@@ -598,13 +618,704 @@ class APITester:
         return report
 
 
+# ==================== 压测模式 ====================
+
+# 延迟直方图桶上界（毫秒），最后一个桶为超出上界的部分
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+SEARCH_TERMS = ['Python', 'Vue', '管理系统', '小程序', '商城', '博客', '不存在的关键词']
+
+# 场景混合：动作名 -> 权重（动作对应 LoadTester._act_<动作名>）
+SCENARIO_MIXES = {
+    'browse': {
+        'list_products': 40, 'product_detail': 30, 'search': 15, 'categories': 10, 'buy': 5,
+    },
+    'flash_sale': {
+        'flash_detail': 30, 'flash_buy': 70,
+    },
+    'callback_storm': {
+        'callback': 90, 'list_orders': 10,
+    },
+}
+
+SCENARIO_DESCRIPTIONS = {
+    'browse': '浏览为主：商品列表/详情/搜索/分类，少量下单并余额支付',
+    'flash_sale': '秒杀：所有虚拟用户抢购同一件限量商品，校验不超卖',
+    'callback_storm': '回调风暴：对待支付订单重复推送支付宝回调（模拟网关重试），校验到账',
+}
+
+
+def endpoint_key(method: str, endpoint: str) -> str:
+    """聚合用的接口标识（去掉查询串，路径中的数字 ID 替换为 {id}）"""
+    path = endpoint.split('?', 1)[0]
+    return f"{method.upper()} {_ID_SEGMENT.sub('/{id}', path)}"
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """最近秩百分位"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def parse_stages(text: str) -> List[Tuple[float, int]]:
+    """解析爬升阶段 "30:10,60:50,30:0"（阶段时长秒:阶段结束时的虚拟用户数，阶段内线性变化）"""
+    stages = []
+    for part in text.split(','):
+        duration, _, users = part.strip().partition(':')
+        try:
+            stages.append((float(duration), int(users)))
+        except ValueError:
+            raise ValueError(f"无效的阶段定义: {part}（格式为 时长秒:用户数）")
+        if stages[-1][0] < 0 or stages[-1][1] < 0:
+            raise ValueError(f"阶段时长与用户数不能为负: {part}")
+    if not stages:
+        raise ValueError("至少需要一个阶段")
+    return stages
+
+
+def users_at(stages: List[Tuple[float, int]], elapsed: float) -> int:
+    """elapsed 秒时的目标虚拟用户数"""
+    previous, start = 0, 0.0
+    for duration, target in stages:
+        if elapsed < start + duration:
+            return round(previous + (target - previous) * (elapsed - start) / duration)
+        previous, start = target, start + duration
+    return previous
+
+
+def sign_alipay_callback(private_key, data: Dict[str, str]) -> Dict[str, str]:
+    """按支付宝规则签名回调（去掉 sign/sign_type 和空值后按键排序，k=v& 拼接，RSA2）"""
+    import base64
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+
+    content = '&'.join(
+        f"{k}={v}" for k, v in sorted(data.items())
+        if k not in ('sign', 'sign_type') and v not in (None, '')
+    )
+    signature = private_key.sign(content.encode(), padding.PKCS1v15(), hashes.SHA256())
+    return {**data, 'sign': base64.b64encode(signature).decode(), 'sign_type': 'RSA2'}
+
+
+class LatencyHistogram:
+    """固定桶延迟直方图（毫秒）"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, ms: float):
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+
+    @staticmethod
+    def labels() -> List[str]:
+        return [f"≤{b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+
+
+class LoadTester:
+    """并发压测器：N 个虚拟用户按场景混合访问，结果沿用 TestResult 记录"""
+
+    def __init__(
+        self,
+        base_url: str,
+        scenario: str,
+        stages: List[Tuple[float, int]],
+        accounts: int = 20,
+        think_time: Tuple[float, float] = (0.5, 2.0),
+        timeout: float = 30.0,
+        admin_username: str = 'admin',
+        admin_password: str = 'admin123',
+        flash_stock: int = 100,
+        callback_trades: int = 200,
+        alipay_private_key: Optional[str] = None,
+        seed: int = 42,
+    ):
+        if scenario not in SCENARIO_MIXES:
+            raise ValueError(f"未知场景: {scenario}（可选: {', '.join(SCENARIO_MIXES)}）")
+        self.base_url = base_url.rstrip('/')
+        self.scenario = scenario
+        self.stages = stages
+        self.account_count = max(1, accounts)
+        self.think_time = think_time
+        self.timeout = timeout
+        self.admin_username = admin_username
+        self.admin_password = admin_password
+        self.flash_stock = flash_stock
+        self.callback_trades = callback_trades
+        self.alipay_private_key = alipay_private_key
+        self.seed = seed
+        self.run_id = uuid.uuid4().hex[:8]
+
+        self.admin_token: Optional[str] = None
+        self.tokens: List[str] = []
+        self.product_ids: List[int] = []
+        self.buy_product_id: Optional[int] = None
+        self.flash_product_id: Optional[int] = None
+        self.trades: List[Dict[str, Any]] = []
+        self.callbacks_signed = False
+        self.acknowledged: set = set()
+
+        self.results: List[TestResult] = []
+        self.active_users: Dict[int, int] = {}
+        self.checks: Dict[str, Any] = {}
+        self.target_users = 0
+        self.elapsed = 0.0
+        self._started: Optional[float] = None
+        self._wall_started = ''
+
+    # ---------- 请求与记录 ----------
+
+    async def request(self, client, method: str, endpoint: str, token: Optional[str] = None,
+                      expected: Tuple[int, ...] = (), **kwargs) -> TestResult:
+        """发送请求；压测阶段的结果记入 self.results（不保留响应体）
+
+        expected 中的状态码视为正常业务结果（如秒杀售罄返回的 400）。
+        """
+        import httpx
+
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        started = time.perf_counter()
+        try:
+            response = await client.request(method.upper(), endpoint, headers=headers, **kwargs)
+            response_time = time.perf_counter() - started
+            try:
+                response_data = response.json()
+            except ValueError:
+                response_data = response.text
+            success = response.status_code < 400 or response.status_code in expected
+            result = TestResult(
+                api_name=endpoint_key(method, endpoint),
+                endpoint=endpoint,
+                method=method.upper(),
+                status_code=response.status_code,
+                success=success,
+                error_message=None if success else str(response_data)[:200],
+                response_time=round(response_time, 4),
+                response_data=response_data,
+            )
+        except httpx.HTTPError as e:
+            result = TestResult(
+                api_name=endpoint_key(method, endpoint),
+                endpoint=endpoint,
+                method=method.upper(),
+                status_code=0,
+                success=False,
+                error_message=f"{type(e).__name__}: {e}",
+                response_time=round(time.perf_counter() - started, 4),
+            )
+
+        if self._started is not None:
+            result.started_at = round(started - self._started, 4)
+            self.results.append(replace(result, response_data=None))
+        return result
+
+    async def _require(self, client, method: str, endpoint: str, token: Optional[str] = None, **kwargs) -> Any:
+        """准备阶段的请求，失败直接终止"""
+        result = await self.request(client, method, endpoint, token=token, **kwargs)
+        if not result.success:
+            raise RuntimeError(f"准备数据失败: {method} {endpoint} -> {result.status_code} "
+                               f"{result.error_message}")
+        return result.response_data
+
+    async def _login(self, client, username: str, password: str) -> Optional[str]:
+        result = await self.request(client, 'POST', '/api/v1/auth/login',
+                                    data={'username': username, 'password': password})
+        if result.success and isinstance(result.response_data, dict):
+            return result.response_data.get('access_token')
+        return None
+
+    # ---------- 准备数据 ----------
+
+    async def setup(self, client):
+        """登录管理员，准备压测账号、商品以及场景所需的数据"""
+        self.admin_token = await self._login(client, self.admin_username, self.admin_password)
+        if not self.admin_token:
+            raise RuntimeError(f"管理员 {self.admin_username} 登录失败")
+
+        # 压测账号：已存在则直接登录，否则注册；并发受限，避免准备阶段本身压垮服务
+        semaphore = asyncio.Semaphore(5)
+
+        async def prepare_account(i: int) -> str:
+            username, password = f'loadtest_{i:04d}', 'loadtest123'
+            async with semaphore:
+                token = await self._login(client, username, password)
+                if not token:
+                    await self.request(client, 'POST', '/api/v1/auth/register', json={
+                        'username': username,
+                        'email': f'{username}@example.com',
+                        'password': password,
+                        'full_name': f'Load Test {i}',
+                    })
+                    token = await self._login(client, username, password)
+                if not token:
+                    raise RuntimeError(f"压测账号 {username} 无法登录")
+                if self.scenario in ('browse', 'flash_sale'):
+                    await self._require(client, 'POST', '/api/v1/users/recharge?amount=100000', token=token)
+                return token
+
+        self.tokens = list(await asyncio.gather(*(prepare_account(i) for i in range(self.account_count))))
+
+        # 下单与回调订单使用专用的大库存商品，避免受现有商品库存影响
+        product = await self._require(client, 'POST', '/api/v1/products/', token=self.admin_token, json={
+            'name': f'压测商品-{self.run_id}',
+            'description': 'api_test.py 压测模式创建',
+            'price': 9.9,
+            'stock': 1000000,
+        })
+        self.buy_product_id = product['id']
+
+        listing = await self._require(client, 'GET', '/api/v1/products/?limit=100')
+        self.product_ids = [item['id'] for item in listing.get('items', [])] or [self.buy_product_id]
+
+        if self.scenario == 'flash_sale':
+            product = await self._require(client, 'POST', '/api/v1/products/', token=self.admin_token, json={
+                'name': f'秒杀商品-{self.run_id}',
+                'description': 'api_test.py 压测模式创建',
+                'price': 1.0,
+                'stock': self.flash_stock,
+            })
+            self.flash_product_id = product['id']
+        elif self.scenario == 'callback_storm':
+            await self._setup_trades(client)
+
+    async def _setup_trades(self, client):
+        """创建待支付的支付宝订单与支付记录，并生成对应的回调报文"""
+        private_key = None
+        if self.alipay_private_key:
+            from cryptography.hazmat.primitives.serialization import load_pem_private_key
+            with open(self.alipay_private_key, 'rb') as f:
+                private_key = load_pem_private_key(f.read(), password=None)
+        self.callbacks_signed = private_key is not None
+
+        semaphore = asyncio.Semaphore(10)
+
+        async def prepare_trade(i: int) -> Dict[str, Any]:
+            async with semaphore:
+                order = await self._require(client, 'POST', '/api/v1/orders/', token=self.tokens[i % len(self.tokens)],
+                                            json={'product_id': self.buy_product_id, 'quantity': 1,
+                                                  'payment_method': 'alipay'})
+                payment = await self._require(client, 'POST', '/api/v1/payments/', token=self.admin_token, json={
+                    'user_id': order['user_id'],
+                    'order_id': order['id'],
+                    'payment_method': 'alipay',
+                    'amount': order['total_amount'],
+                })
+                trade_no = f'LOAD{self.run_id}{i:08d}'
+                await self._require(client, 'PUT', f"/api/v1/payments/{payment['id']}", token=self.admin_token,
+                                    json={'transaction_id': trade_no})
+
+            callback = {
+                'out_trade_no': order['order_number'],
+                'trade_no': trade_no,
+                'total_amount': f"{order['total_amount']:.2f}",
+                'trade_status': 'TRADE_SUCCESS',
+            }
+            if private_key is not None:
+                callback = sign_alipay_callback(private_key, callback)
+            return {'payment_id': payment['id'], 'callback': callback}
+
+        self.trades = list(await asyncio.gather(*(prepare_trade(i) for i in range(self.callback_trades))))
+
+    # ---------- 场景动作 ----------
+
+    async def _act_list_products(self, client, token, rng):
+        await self.request(client, 'GET', f"/api/v1/products/?skip={rng.randrange(5) * 20}&limit=20")
+
+    async def _act_product_detail(self, client, token, rng):
+        await self.request(client, 'GET', f"/api/v1/products/{rng.choice(self.product_ids)}")
+
+    async def _act_search(self, client, token, rng):
+        await self.request(client, 'GET', '/api/v1/products/', params={'search': rng.choice(SEARCH_TERMS)})
+
+    async def _act_categories(self, client, token, rng):
+        await self.request(client, 'GET', '/api/v1/products/categories')
+
+    async def _act_buy(self, client, token, rng):
+        result = await self.request(client, 'POST', '/api/v1/orders/', token=token, json={
+            'product_id': self.buy_product_id, 'quantity': 1, 'payment_method': 'balance',
+        })
+        if result.success and isinstance(result.response_data, dict):
+            await self.request(client, 'POST', f"/api/v1/orders/{result.response_data['id']}/pay", token=token)
+
+    async def _act_flash_detail(self, client, token, rng):
+        await self.request(client, 'GET', f"/api/v1/products/{self.flash_product_id}")
+
+    async def _act_flash_buy(self, client, token, rng):
+        # 库存在支付发货时扣减，售罄后下单或支付返回 400（库存不足）属于正常结果
+        result = await self.request(client, 'POST', '/api/v1/orders/', token=token, expected=(400,), json={
+            'product_id': self.flash_product_id, 'quantity': 1, 'payment_method': 'balance',
+        })
+        if result.status_code == 200 and isinstance(result.response_data, dict):
+            await self.request(client, 'POST', f"/api/v1/orders/{result.response_data['id']}/pay",
+                               token=token, expected=(400,))
+
+    async def _act_callback(self, client, token, rng):
+        # 随机挑选交易，同一交易会被多次推送（模拟网关重试）；未签名的回调应被拒绝
+        trade = rng.choice(self.trades)
+        expected = () if self.callbacks_signed else (400,)
+        result = await self.request(client, 'POST', '/api/v1/payments/alipay/callback',
+                                    json=trade['callback'], expected=expected)
+        if result.status_code == 200:
+            self.acknowledged.add(trade['payment_id'])
+
+    async def _act_list_orders(self, client, token, rng):
+        await self.request(client, 'GET', '/api/v1/orders/?limit=20', token=token)
+
+    # ---------- 执行 ----------
+
+    async def _virtual_user(self, index: int, client, stop: asyncio.Event):
+        """虚拟用户：按权重随机选择动作，动作之间停顿思考时间；超出目标用户数时退出"""
+        rng = random.Random(self.seed * 100003 + index)
+        token = self.tokens[index % len(self.tokens)]
+        mix = SCENARIO_MIXES[self.scenario]
+        actions = [getattr(self, f'_act_{name}') for name in mix]
+        weights = list(mix.values())
+
+        while not stop.is_set() and index < self.target_users:
+            action = rng.choices(actions, weights)[0]
+            await action(client, token, rng)
+            try:
+                await asyncio.wait_for(stop.wait(), rng.uniform(*self.think_time))
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self):
+        """准备数据并按阶段执行压测"""
+        import httpx
+
+        peak = max(users for _, users in self.stages)
+        limits = httpx.Limits(max_connections=max(peak, self.account_count) + 10)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits,
+                                     headers={'User-Agent': 'API-Load-Test/1.0'}) as client:
+            print(f"🧰 准备数据（场景 {self.scenario}，{self.account_count} 个压测账号）...")
+            await self.setup(client)
+
+            duration = sum(d for d, _ in self.stages)
+            print(f"🚀 开始压测: {SCENARIO_DESCRIPTIONS[self.scenario]}")
+            print(f"   阶段: {', '.join(f'{d:g}s→{u}' for d, u in self.stages)}，共 {duration:g}s")
+
+            stop = asyncio.Event()
+            tasks: Dict[int, asyncio.Task] = {}
+            self._wall_started = time.strftime('%Y-%m-%d %H:%M:%S')
+            self._started = time.perf_counter()
+
+            while (elapsed := time.perf_counter() - self._started) < duration:
+                self.target_users = users_at(self.stages, elapsed)
+                for index in range(self.target_users):
+                    if index not in tasks or tasks[index].done():
+                        tasks[index] = asyncio.create_task(self._virtual_user(index, client, stop))
+                active = sum(not task.done() for task in tasks.values())
+                self.active_users[int(elapsed)] = max(self.active_users.get(int(elapsed), 0), active)
+                await asyncio.sleep(0.2)
+
+            stop.set()
+            pending = [task for task in tasks.values() if not task.done()]
+            if pending:
+                _, still_running = await asyncio.wait(pending, timeout=self.timeout)
+                for task in still_running:
+                    task.cancel()
+            self.elapsed = time.perf_counter() - self._started
+            self._started = None
+
+            await self._verify(client)
+
+    async def _verify(self, client):
+        """压测后的一致性检查"""
+        if self.scenario == 'flash_sale':
+            sold = sum(1 for r in self.results
+                       if r.api_name == 'POST /api/v1/orders/{id}/pay' and r.status_code == 200)
+            product = await self.request(client, 'GET', f"/api/v1/products/{self.flash_product_id}")
+            stock_left = product.response_data.get('stock') if isinstance(product.response_data, dict) else None
+            self.checks = {
+                'flash_stock': self.flash_stock,
+                'orders_paid': sold,
+                'stock_left': stock_left,
+                'oversold': sold > self.flash_stock or (stock_left is not None and stock_left < 0),
+                'stock_consistent': stock_left is not None and stock_left == self.flash_stock - sold,
+            }
+        elif self.scenario == 'callback_storm':
+            if not self.callbacks_signed:
+                self.checks = {'signed': False, 'note': '未提供支付宝私钥，回调应全部因验签失败被拒绝'}
+                return
+            # 回调异步处理，给后台 worker 留出消费时间
+            unpaid = set(self.acknowledged)
+            deadline = time.perf_counter() + 30
+            while unpaid and time.perf_counter() < deadline:
+                statuses = await asyncio.gather(*(
+                    self.request(client, 'GET', f'/api/v1/payments/{payment_id}', token=self.admin_token)
+                    for payment_id in unpaid
+                ))
+                unpaid = {
+                    payment_id for payment_id, result in zip(unpaid, statuses)
+                    if not (isinstance(result.response_data, dict) and result.response_data.get('status') == 'success')
+                }
+                if unpaid:
+                    await asyncio.sleep(1)
+            self.checks = {
+                'signed': True,
+                'trades': len(self.trades),
+                'acknowledged': len(self.acknowledged),
+                'unpaid_after_storm': len(unpaid),
+            }
+
+    # ---------- 报告 ----------
+
+    def build_report(self) -> Dict[str, Any]:
+        """汇总压测结果：总体、按接口（含延迟直方图与状态码分布）、按秒时间线、错误排行"""
+        def summarize(results: List[TestResult], elapsed: float) -> Dict[str, Any]:
+            latencies = [r.response_time * 1000 for r in results]
+            errors = sum(not r.success for r in results)
+            summary = {
+                'requests': len(results),
+                'errors': errors,
+                'error_rate': round(errors / len(results), 4) if results else 0.0,
+                'rps': round(len(results) / elapsed, 2) if elapsed else 0.0,
+                'max_ms': round(max(latencies), 2) if latencies else None,
+            }
+            for p in (50, 90, 95, 99):
+                value = percentile(latencies, p)
+                summary[f'p{p}_ms'] = round(value, 2) if value is not None else None
+            return summary
+
+        by_endpoint: Dict[str, List[TestResult]] = defaultdict(list)
+        by_second: Dict[int, List[TestResult]] = defaultdict(list)
+        for result in self.results:
+            by_endpoint[result.api_name].append(result)
+            by_second[int(result.started_at)].append(result)
+
+        endpoints = []
+        for name, results in sorted(by_endpoint.items(), key=lambda item: -len(item[1])):
+            histogram = LatencyHistogram()
+            for result in results:
+                histogram.add(result.response_time * 1000)
+            endpoints.append({
+                'endpoint': name,
+                **summarize(results, self.elapsed),
+                'status_codes': dict(sorted(Counter(str(r.status_code) for r in results).items())),
+                'histogram': histogram.counts,
+            })
+
+        timeline = []
+        for second in range(int(self.elapsed) + 1):
+            results = by_second.get(second, [])
+            p95 = percentile([r.response_time * 1000 for r in results], 95)
+            timeline.append({
+                'second': second,
+                'users': self.active_users.get(second, 0),
+                'requests': len(results),
+                'errors': sum(not r.success for r in results),
+                'p95_ms': round(p95, 2) if p95 is not None else None,
+            })
+
+        error_messages = Counter(
+            f"{r.api_name} -> {r.status_code}: {r.error_message}" for r in self.results if not r.success
+        )
+
+        return {
+            'scenario': self.scenario,
+            'description': SCENARIO_DESCRIPTIONS[self.scenario],
+            'base_url': self.base_url,
+            'started_at': self._wall_started,
+            'duration': round(self.elapsed, 2),
+            'stages': [{'duration': d, 'users': u} for d, u in self.stages],
+            'peak_users': max(self.active_users.values(), default=0),
+            'histogram_buckets': LatencyHistogram.labels(),
+            'summary': summarize(self.results, self.elapsed),
+            'endpoints': endpoints,
+            'timeline': timeline,
+            'top_errors': [{'error': error, 'count': count} for error, count in error_messages.most_common(10)],
+            'checks': self.checks,
+        }
+
+
+def render_load_html(report: Dict[str, Any]) -> str:
+    """生成自包含的 HTML 报告（无外部依赖）"""
+    esc = html.escape
+
+    def fmt(value, suffix=''):
+        return '-' if value is None else f"{value}{suffix}"
+
+    def bars(values: List[float], labels: List[str], color: str) -> str:
+        peak = max(values, default=0) or 1
+        cells = ''.join(
+            f'<div class="bar" title="{esc(label)}: {value}">'
+            f'<span style="height:{value * 100 / peak:.1f}%;background:{color}"></span></div>'
+            for value, label in zip(values, labels)
+        )
+        return f'<div class="bars">{cells}</div>'
+
+    summary = report['summary']
+    rows = ''.join(
+        f"<tr><td>{esc(e['endpoint'])}</td><td>{e['requests']}</td><td>{e['errors']}</td>"
+        f"<td>{e['error_rate'] * 100:.2f}%</td><td>{e['rps']}</td><td>{fmt(e['p50_ms'])}</td>"
+        f"<td>{fmt(e['p95_ms'])}</td><td>{fmt(e['p99_ms'])}</td><td>{fmt(e['max_ms'])}</td>"
+        f"<td>{esc(', '.join(f'{k}×{v}' for k, v in e['status_codes'].items()))}</td>"
+        f"<td>{bars(e['histogram'], report['histogram_buckets'], '#4e79a7')}</td></tr>"
+        for e in report['endpoints']
+    )
+    timeline = report['timeline']
+    seconds = [f"{t['second']}s" for t in timeline]
+    errors = ''.join(
+        f"<li><code>{esc(item['error'])}</code> × {item['count']}</li>" for item in report['top_errors']
+    ) or '<li>无</li>'
+    checks = ''.join(
+        f"<li>{esc(str(key))}: <b>{esc(str(value))}</b></li>" for key, value in report['checks'].items()
+    ) or '<li>无</li>'
+
+    return f"""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="utf-8">
+<title>压测报告 - {esc(report['scenario'])}</title>
+<style>
+body {{ font-family: -apple-system, "Segoe UI", "PingFang SC", sans-serif; margin: 24px; color: #222; }}
+table {{ border-collapse: collapse; width: 100%; font-size: 13px; }}
+th, td {{ border: 1px solid #ddd; padding: 4px 8px; text-align: right; vertical-align: middle; }}
+th:first-child, td:first-child {{ text-align: left; }}
+.cards {{ display: flex; gap: 12px; flex-wrap: wrap; }}
+.card {{ border: 1px solid #ddd; border-radius: 6px; padding: 8px 16px; min-width: 110px; }}
+.card b {{ display: block; font-size: 20px; }}
+.bars {{ display: flex; align-items: flex-end; gap: 1px; height: 40px; min-width: 120px; }}
+.bar {{ flex: 1; height: 100%; display: flex; align-items: flex-end; background: #f3f3f3; }}
+.bar span {{ display: block; width: 100%; }}
+.timeline .bars {{ height: 80px; }}
+</style>
+</head>
+<body>
+<h1>压测报告：{esc(report['scenario'])}</h1>
+<p>{esc(report['description'])}<br>
+目标: {esc(report['base_url'])}，开始于 {esc(report['started_at'])}，持续 {report['duration']}s，
+阶段: {esc(', '.join(f"{s['duration']:g}s→{s['users']}" for s in report['stages']))}</p>
+<div class="cards">
+<div class="card">请求数<b>{summary['requests']}</b></div>
+<div class="card">吞吐<b>{summary['rps']}/s</b></div>
+<div class="card">错误率<b>{summary['error_rate'] * 100:.2f}%</b></div>
+<div class="card">p50<b>{fmt(summary['p50_ms'], 'ms')}</b></div>
+<div class="card">p95<b>{fmt(summary['p95_ms'], 'ms')}</b></div>
+<div class="card">p99<b>{fmt(summary['p99_ms'], 'ms')}</b></div>
+<div class="card">峰值用户<b>{report['peak_users']}</b></div>
+</div>
+<h2>时间线</h2>
+<div class="timeline">
+<p>虚拟用户数</p>{bars([t['users'] for t in timeline], seconds, '#59a14f')}
+<p>每秒请求数</p>{bars([t['requests'] for t in timeline], seconds, '#4e79a7')}
+<p>每秒错误数</p>{bars([t['errors'] for t in timeline], seconds, '#e15759')}
+<p>p95 延迟（ms）</p>{bars([t['p95_ms'] or 0 for t in timeline], seconds, '#f28e2b')}
+</div>
+<h2>接口明细</h2>
+<p>直方图桶: {esc(' / '.join(report['histogram_buckets']))}</p>
+<table>
+<tr><th>接口</th><th>请求数</th><th>错误</th><th>错误率</th><th>吞吐(/s)</th><th>p50(ms)</th>
+<th>p95(ms)</th><th>p99(ms)</th><th>最大(ms)</th><th>状态码</th><th>延迟分布</th></tr>
+{rows}
+</table>
+<h2>一致性检查</h2>
+<ul>{checks}</ul>
+<h2>错误排行</h2>
+<ul>{errors}</ul>
+</body>
+</html>
+"""
+
+
+def run_load_test(args) -> int:
+    """执行压测并输出报告，错误率超标或一致性检查失败时返回非零"""
+    try:
+        stages = parse_stages(args.stages) if args.stages else [
+            (args.ramp_up, args.users), (max(args.duration - args.ramp_up, 0), args.users),
+        ]
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+    tester = LoadTester(
+        base_url=args.base_url,
+        scenario=args.scenario,
+        stages=stages,
+        accounts=min(args.accounts, max(users for _, users in stages)) or 1,
+        think_time=(args.think_min, args.think_max),
+        timeout=args.timeout,
+        admin_username=args.admin_username,
+        admin_password=args.admin_password,
+        flash_stock=args.flash_stock,
+        callback_trades=args.callback_trades,
+        alipay_private_key=args.alipay_private_key,
+        seed=args.seed,
+    )
+    try:
+        asyncio.run(tester.run())
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 2
+
+    report = tester.build_report()
+    summary = report['summary']
+    print("=" * 50)
+    print(f"✅ 压测完成: {summary['requests']} 个请求，{report['duration']}s，吞吐 {summary['rps']}/s")
+    print(f"错误率: {summary['error_rate'] * 100:.2f}%  "
+          f"p50/p95/p99: {summary['p50_ms']}/{summary['p95_ms']}/{summary['p99_ms']} ms")
+    print(f"\n{'接口':<40}{'请求':>8}{'错误':>6}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for e in report['endpoints']:
+        print(f"{e['endpoint']:<40}{e['requests']:>8}{e['errors']:>6}"
+              f"{e['p50_ms']:>9}{e['p95_ms']:>9}{e['p99_ms']:>9}")
+    if report['checks']:
+        print(f"\n一致性检查: {json.dumps(report['checks'], ensure_ascii=False)}")
+
+    with open(f'{args.report}.json', 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    with open(f'{args.report}.html', 'w', encoding='utf-8') as f:
+        f.write(render_load_html(report))
+    print(f"\n📄 报告已保存到: {args.report}.json, {args.report}.html")
+
+    failed = summary['error_rate'] > args.max_error_rate
+    if failed:
+        print(f"❌ 错误率 {summary['error_rate'] * 100:.2f}% 超过阈值 {args.max_error_rate * 100:.2f}%")
+    checks = report['checks']
+    if checks.get('oversold') or checks.get('stock_consistent') is False or checks.get('unpaid_after_storm'):
+        print("❌ 一致性检查未通过")
+        failed = True
+    return 1 if failed else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='独角发卡 FastAPI - API测试工具')
+    parser.add_argument('--base-url', default='http://localhost:8000', help='被测服务地址')
+    subparsers = parser.add_subparsers(dest='mode')
+
+    load = subparsers.add_parser('load', help='并发压测模式')
+    load.add_argument('--scenario', choices=list(SCENARIO_MIXES), default='browse', help='场景混合')
+    load.add_argument('--users', type=int, default=20, help='虚拟用户数（未指定 --stages 时使用）')
+    load.add_argument('--duration', type=float, default=60, help='总时长（秒，含爬升）')
+    load.add_argument('--ramp-up', type=float, default=10, help='从 0 线性爬升到 --users 的时长（秒）')
+    load.add_argument('--stages', help='自定义阶段，如 "30:10,60:50,30:0"（时长秒:用户数）')
+    load.add_argument('--accounts', type=int, default=20, help='压测账号数（虚拟用户轮流复用）')
+    load.add_argument('--think-min', type=float, default=0.5, help='动作间最短思考时间（秒）')
+    load.add_argument('--think-max', type=float, default=2.0, help='动作间最长思考时间（秒）')
+    load.add_argument('--timeout', type=float, default=30, help='单请求超时（秒）')
+    load.add_argument('--admin-username', default='admin')
+    load.add_argument('--admin-password', default='admin123')
+    load.add_argument('--flash-stock', type=int, default=100, help='flash_sale 秒杀商品库存')
+    load.add_argument('--callback-trades', type=int, default=200, help='callback_storm 待回调交易数')
+    load.add_argument('--alipay-private-key', help='与被测服务 ALIPAY_PUBLIC_KEY 配对的私钥 PEM（用于签名回调）')
+    load.add_argument('--seed', type=int, default=42, help='随机种子（相同种子产生相同的动作序列）')
+    load.add_argument('--max-error-rate', type=float, default=0.01, help='错误率阈值，超过则以非零状态退出')
+    load.add_argument('--report', default='load_test_report', help='报告文件名前缀（生成 .json 与 .html）')
+    return parser.parse_args(argv)
+
+
 def main():
     """主函数"""
+    args = parse_args()
+    if args.mode == 'load':
+        sys.exit(run_load_test(args))
+
     print("独角发卡 FastAPI - API测试工具")
     print("=" * 40)
 
     # 创建测试器
-    tester = APITester()
+    tester = APITester(args.base_url)
 
     # 运行所有测试
     report = tester.run_all_tests()
@@ -0,0 +1,30 @@
+"""card status expires index
+
+Revision ID: 3f1a9c2d7b10
+Revises: 
+Create Date: 2026-10-19 08:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1a9c2d7b10'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 卡密过期清理按 (status, expires_at) 范围扫描
+    op.create_index(
+        'ix_cards_status_expires_at', 'cards', ['status', 'expires_at'],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_cards_status_expires_at', table_name='cards', if_exists=True)
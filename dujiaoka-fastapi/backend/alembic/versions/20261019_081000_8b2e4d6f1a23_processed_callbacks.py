@@ -0,0 +1,38 @@
+"""processed callbacks
+
+Revision ID: 8b2e4d6f1a23
+Revises: 3f1a9c2d7b10
+Create Date: 2026-10-19 08:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4d6f1a23'
+down_revision: Union[str, None] = '3f1a9c2d7b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table('processed_callbacks'):
+        return
+    op.create_table(
+        'processed_callbacks',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('gateway', sa.String(length=20), nullable=False),
+        sa.Column('transaction_id', sa.String(length=100), nullable=False),
+        sa.Column('payment_id', sa.Integer(), sa.ForeignKey('payments.id'), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.UniqueConstraint('gateway', 'transaction_id', name='uq_processed_callbacks_gateway_txn'),
+    )
+    op.create_index('ix_processed_callbacks_id', 'processed_callbacks', ['id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_processed_callbacks_id', table_name='processed_callbacks')
+    op.drop_table('processed_callbacks')
@@ -0,0 +1,52 @@
+"""payment callback jobs
+
+Revision ID: c47d1e9a5b36
+Revises: 8b2e4d6f1a23
+Create Date: 2026-10-19 08:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47d1e9a5b36'
+down_revision: Union[str, None] = '8b2e4d6f1a23'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table('payment_callback_jobs'):
+        return
+    op.create_table(
+        'payment_callback_jobs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('gateway', sa.String(length=20), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column(
+            'status',
+            sa.Enum('PENDING', 'PROCESSING', 'DONE', 'FAILED', name='callbackjobstatus'),
+            nullable=False,
+        ),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_payment_callback_jobs_id', 'payment_callback_jobs', ['id'])
+    op.create_index(
+        'ix_payment_callback_jobs_status_next', 'payment_callback_jobs',
+        ['status', 'next_attempt_at'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_payment_callback_jobs_status_next', table_name='payment_callback_jobs')
+    op.drop_index('ix_payment_callback_jobs_id', table_name='payment_callback_jobs')
+    op.drop_table('payment_callback_jobs')
+    sa.Enum(name='callbackjobstatus').drop(op.get_bind(), checkfirst=True)
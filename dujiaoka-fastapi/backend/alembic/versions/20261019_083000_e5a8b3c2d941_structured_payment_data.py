@@ -0,0 +1,154 @@
+"""structured payment data
+
+Revision ID: e5a8b3c2d941
+Revises: c47d1e9a5b36
+Create Date: 2026-10-19 08:30:00.000000
+
+将 payments.payment_data 从 str(dict) 文本转换为 JSON（PostgreSQL 为 JSONB），
+并提取 out_trade_no / gateway_amount / gateway_paid_at 三个带索引的对账字段。
+存量数据按主键分批回填。
+"""
+import ast
+import json
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a8b3c2d941'
+down_revision: Union[str, None] = 'c47d1e9a5b36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def _parse(raw):
+    """解析旧数据：JSON 文本或 Python repr，无法解析的原样保存在 raw 字段"""
+    if raw is None or isinstance(raw, dict):
+        return raw
+    for loader in (json.loads, ast.literal_eval):
+        try:
+            value = loader(raw)
+            if isinstance(value, dict):
+                return value
+        except Exception:
+            # 格式异常的旧数据可能抛出任意异常（如不可哈希的字典键引发 TypeError），不能中断迁移
+            continue
+    return {"raw": raw}
+
+
+def _extract(method, data):
+    """提取对账字段（与 PaymentService.extract_gateway_fields 规则一致）"""
+    fields = {"out_trade_no": data.get("out_trade_no"), "gateway_amount": None, "gateway_paid_at": None}
+    try:
+        if method == "alipay":
+            fields["gateway_amount"] = float(data["total_amount"])
+        elif method == "wechat":
+            fields["gateway_amount"] = int(data["total_fee"]) / 100
+    except (KeyError, TypeError, ValueError):
+        pass
+    try:
+        if method == "alipay" and data.get("gmt_payment"):
+            fields["gateway_paid_at"] = datetime.strptime(data["gmt_payment"], "%Y-%m-%d %H:%M:%S")
+        elif method == "wechat" and data.get("time_end"):
+            fields["gateway_paid_at"] = datetime.strptime(data["time_end"], "%Y%m%d%H%M%S")
+    except (TypeError, ValueError):
+        pass
+    return fields
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    columns = {c['name'] for c in sa.inspect(bind).get_columns('payments')}
+
+    with op.batch_alter_table('payments') as batch_op:
+        if 'out_trade_no' not in columns:
+            batch_op.add_column(sa.Column('out_trade_no', sa.String(length=64), nullable=True))
+        if 'gateway_amount' not in columns:
+            batch_op.add_column(sa.Column('gateway_amount', sa.Float(), nullable=True))
+        if 'gateway_paid_at' not in columns:
+            batch_op.add_column(sa.Column('gateway_paid_at', sa.DateTime(), nullable=True))
+
+    # 分批回填：按主键游标推进，每批一个事务内的批量 UPDATE
+    payments = sa.table(
+        'payments',
+        sa.column('id', sa.Integer),
+        sa.column('payment_method', sa.String),
+        sa.column('payment_data', sa.Text),
+        sa.column('out_trade_no', sa.String),
+        sa.column('gateway_amount', sa.Float),
+        sa.column('gateway_paid_at', sa.DateTime),
+    )
+    update_stmt = (
+        payments.update()
+        .where(payments.c.id == sa.bindparam('_id'))
+        .values(
+            payment_data=sa.bindparam('_data'),
+            out_trade_no=sa.bindparam('_out_trade_no'),
+            gateway_amount=sa.bindparam('_amount'),
+            gateway_paid_at=sa.bindparam('_paid_at'),
+        )
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(payments.c.id, payments.c.payment_method, payments.c.payment_data)
+            .where(payments.c.id > last_id, payments.c.payment_data.isnot(None))
+            .order_by(payments.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+
+        params = []
+        for payment_id, method, raw in rows:
+            data = _parse(raw)
+            fields = _extract(method, data)
+            params.append({
+                '_id': payment_id,
+                '_data': json.dumps(data, ensure_ascii=False),
+                '_out_trade_no': fields['out_trade_no'],
+                '_amount': fields['gateway_amount'],
+                '_paid_at': fields['gateway_paid_at'],
+            })
+        bind.execute(update_stmt, params)
+        last_id = rows[-1][0]
+
+    # 回填完成后所有值均为合法 JSON 文本，再转换列类型
+    if bind.dialect.name == 'postgresql':
+        op.alter_column(
+            'payments', 'payment_data',
+            type_=postgresql.JSONB(),
+            postgresql_using='payment_data::jsonb',
+        )
+    else:
+        with op.batch_alter_table('payments') as batch_op:
+            batch_op.alter_column('payment_data', type_=sa.JSON(), existing_nullable=True)
+
+    op.create_index('ix_payments_out_trade_no', 'payments', ['out_trade_no'], if_not_exists=True)
+    op.create_index('ix_payments_gateway_paid_at', 'payments', ['gateway_paid_at'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_payments_gateway_paid_at', table_name='payments')
+    op.drop_index('ix_payments_out_trade_no', table_name='payments')
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.alter_column(
+            'payments', 'payment_data',
+            type_=sa.Text(),
+            postgresql_using='payment_data::text',
+        )
+
+    with op.batch_alter_table('payments') as batch_op:
+        if bind.dialect.name != 'postgresql':
+            batch_op.alter_column('payment_data', type_=sa.Text(), existing_nullable=True)
+        batch_op.drop_column('gateway_paid_at')
+        batch_op.drop_column('gateway_amount')
+        batch_op.drop_column('out_trade_no')
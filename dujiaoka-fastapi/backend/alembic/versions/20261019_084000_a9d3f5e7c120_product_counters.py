@@ -0,0 +1,45 @@
+"""product counters
+
+Revision ID: a9d3f5e7c120
+Revises: e5a8b3c2d941
+Create Date: 2026-10-19 08:40:00.000000
+
+新增 products.view_count，以及记录已写入计数批次的 counter_flushes 表
+（销量与浏览数先写本地日志，批量累加到商品表，批次号用于重放去重）。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d3f5e7c120'
+down_revision: Union[str, None] = 'e5a8b3c2d941'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    columns = {column['name'] for column in inspector.get_columns('products')}
+    if 'view_count' not in columns:
+        op.add_column(
+            'products',
+            sa.Column('view_count', sa.Integer(), nullable=False, server_default='0'),
+        )
+
+    if not inspector.has_table('counter_flushes'):
+        op.create_table(
+            'counter_flushes',
+            sa.Column('batch_id', sa.String(length=64), primary_key=True),
+            sa.Column('applied_at', sa.DateTime(), nullable=False),
+        )
+        op.create_index('ix_counter_flushes_applied_at', 'counter_flushes', ['applied_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_counter_flushes_applied_at', table_name='counter_flushes')
+    op.drop_table('counter_flushes')
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('view_count')
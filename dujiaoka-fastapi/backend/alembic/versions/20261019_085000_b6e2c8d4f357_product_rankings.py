@@ -0,0 +1,110 @@
+"""product rankings
+
+Revision ID: b6e2c8d4f357
+Revises: a9d3f5e7c120
+Create Date: 2026-10-19 08:50:00.000000
+
+新增商品按小时销售汇总表 product_sales_hourly 与排行榜表 product_rankings。
+最近 30 天已发货订单按主键分批回填到小时汇总（之后的发货由计数写入任务累加）。
+"""
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e2c8d4f357'
+down_revision: Union[str, None] = 'a9d3f5e7c120'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+BACKFILL_DAYS = 30
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    created = False
+    if not inspector.has_table('product_sales_hourly'):
+        op.create_table(
+            'product_sales_hourly',
+            sa.Column('product_id', sa.Integer(), sa.ForeignKey('products.id'), primary_key=True),
+            sa.Column('hour', sa.DateTime(), primary_key=True),
+            sa.Column('quantity', sa.Integer(), nullable=False),
+            sa.Column('amount_cents', sa.BigInteger(), nullable=False),
+        )
+        op.create_index('ix_product_sales_hourly_hour', 'product_sales_hourly', ['hour'])
+        created = True
+
+    if not inspector.has_table('product_rankings'):
+        op.create_table(
+            'product_rankings',
+            sa.Column('period', sa.String(length=8), primary_key=True),
+            sa.Column('metric', sa.String(length=16), primary_key=True),
+            sa.Column('category_id', sa.Integer(), primary_key=True),
+            sa.Column('position', sa.Integer(), primary_key=True),
+            sa.Column('product_id', sa.Integer(), nullable=False),
+            sa.Column('quantity', sa.Integer(), nullable=False),
+            sa.Column('amount_cents', sa.BigInteger(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+        )
+
+    if not created:
+        return
+
+    # 回填：按主键游标扫描最近 30 天发货的订单，在内存中按 (商品, 整点) 汇总后一次写入
+    orders = sa.table(
+        'orders',
+        sa.column('id', sa.Integer),
+        sa.column('product_id', sa.Integer),
+        sa.column('quantity', sa.Integer),
+        sa.column('total_amount', sa.Float),
+        sa.column('status', sa.String),
+        sa.column('delivered_at', sa.DateTime),
+    )
+    sales_hourly = sa.table(
+        'product_sales_hourly',
+        sa.column('product_id', sa.Integer),
+        sa.column('hour', sa.DateTime),
+        sa.column('quantity', sa.Integer),
+        sa.column('amount_cents', sa.BigInteger),
+    )
+    since = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(days=BACKFILL_DAYS)
+    sales = {}
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(orders.c.id, orders.c.product_id, orders.c.quantity, orders.c.total_amount, orders.c.delivered_at)
+            .where(
+                orders.c.id > last_id,
+                orders.c.status == 'DELIVERED',
+                orders.c.delivered_at >= since,
+            )
+            .order_by(orders.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        for _, product_id, quantity, total_amount, delivered_at in rows:
+            hour = delivered_at.replace(minute=0, second=0, microsecond=0)
+            entry = sales.setdefault((product_id, hour), [0, 0])
+            entry[0] += quantity
+            entry[1] += round(total_amount * 100)
+        last_id = rows[-1][0]
+
+    params = [
+        {'product_id': product_id, 'hour': hour, 'quantity': quantity, 'amount_cents': amount}
+        for (product_id, hour), (quantity, amount) in sorted(sales.items())
+    ]
+    for start in range(0, len(params), BATCH_SIZE):
+        bind.execute(sales_hourly.insert(), params[start:start + BATCH_SIZE])
+
+
+def downgrade() -> None:
+    op.drop_table('product_rankings')
+    op.drop_index('ix_product_sales_hourly_hour', table_name='product_sales_hourly')
+    op.drop_table('product_sales_hourly')
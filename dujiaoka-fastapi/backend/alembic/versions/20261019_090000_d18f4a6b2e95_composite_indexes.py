@@ -0,0 +1,96 @@
+"""composite indexes
+
+Revision ID: d18f4a6b2e95
+Revises: b6e2c8d4f357
+Create Date: 2026-10-19 09:00:00.000000
+
+热点查询的组合索引与部分索引：
+- orders (user_id, created_at)、(status, created_at)：用户订单列表、后台按状态筛选，按创建时间倒序分页
+- payments (user_id, created_at)：用户支付记录列表
+- cards (product_id, status, created_at)：发卡取未使用卡密、卡密列表
+- products 只含上架商品的部分索引 (sort_order, created_at DESC)、(category_id, sort_order, created_at DESC)：前台商品列表
+
+被组合索引前缀覆盖的单列索引 ix_orders_user_id / ix_payments_user_id / ix_cards_product_id 随之删除。
+PostgreSQL 上使用 CREATE/DROP INDEX CONCURRENTLY（不阻塞写入，在事务外执行）。
+"""
+import contextlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd18f4a6b2e95'
+down_revision: Union[str, None] = 'b6e2c8d4f357'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (索引名, 表名, 列, 是否只包含上架商品)
+INDEXES = [
+    ('ix_orders_user_id_created_at', 'orders', ['user_id', 'created_at'], False),
+    ('ix_orders_status_created_at', 'orders', ['status', 'created_at'], False),
+    ('ix_payments_user_id_created_at', 'payments', ['user_id', 'created_at'], False),
+    ('ix_cards_product_id_status_created_at', 'cards', ['product_id', 'status', 'created_at'], False),
+    ('ix_products_active_sort', 'products', ['sort_order', sa.text('created_at DESC')], True),
+    ('ix_products_active_category_sort', 'products', ['category_id', 'sort_order', sa.text('created_at DESC')], True),
+]
+
+# 被组合索引覆盖的单列索引
+REDUNDANT_INDEXES = [
+    ('ix_orders_user_id', 'orders', ['user_id']),
+    ('ix_payments_user_id', 'payments', ['user_id']),
+    ('ix_cards_product_id', 'cards', ['product_id']),
+]
+
+
+def _outside_transaction():
+    """PostgreSQL 的并发建索引不能在事务中执行"""
+    if op.get_bind().dialect.name == 'postgresql':
+        return op.get_context().autocommit_block()
+    return contextlib.nullcontext()
+
+
+def _drop_invalid_index(name: str) -> None:
+    """并发建索引中断会留下 INVALID 状态的索引，IF NOT EXISTS 会跳过它，先删除再重建"""
+    if op.get_context().as_sql:
+        return
+    invalid = op.get_bind().execute(
+        sa.text(
+            "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ),
+        {'name': name},
+    ).first()
+    if invalid:
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+def upgrade() -> None:
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+    with _outside_transaction():
+        for name, table, columns, active_only in INDEXES:
+            if postgresql:
+                _drop_invalid_index(name)
+            where = {}
+            if active_only:
+                where = {
+                    'postgresql_where': sa.text('is_active = true'),
+                    'sqlite_where': sa.text('is_active = 1'),
+                }
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True, **where)
+
+        for name, table, _ in REDUNDANT_INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+    with _outside_transaction():
+        for name, table, columns in REDUNDANT_INDEXES:
+            if postgresql:
+                _drop_invalid_index(name)
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,103 @@
+"""money cents
+
+Revision ID: f2a7c9e4b813
+Revises: d18f4a6b2e95
+Create Date: 2026-10-19 09:10:00.000000
+
+金额列由 FLOAT（元）改为 BIGINT（分）：
+- users.balance、products.price / original_price、orders.product_price / total_amount、
+  payments.amount / gateway_amount -> 对应的 *_cents 列
+- 新列先以可空列加入，按主键区间分批回填 ROUND(元 * 100)（PostgreSQL 上每批单独提交，不长时间持有行锁），
+  回填完成后设为 NOT NULL 并删除原列
+- SQLite 上删除列需要重建表，重建后按原 DDL 恢复反射丢失了 DESC 的索引（商品列表的部分索引）
+"""
+import contextlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a7c9e4b813'
+down_revision: Union[str, None] = 'd18f4a6b2e95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+# 表名 -> [(原列, 新列, 是否可空)]
+MONEY_COLUMNS = {
+    'users': [('balance', 'balance_cents', False)],
+    'products': [('price', 'price_cents', False), ('original_price', 'original_price_cents', True)],
+    'orders': [('product_price', 'product_price_cents', False), ('total_amount', 'total_amount_cents', False)],
+    'payments': [('amount', 'amount_cents', False), ('gateway_amount', 'gateway_amount_cents', True)],
+}
+
+
+def _outside_transaction():
+    """PostgreSQL 上分批回填时每批单独提交"""
+    if op.get_bind().dialect.name == 'postgresql':
+        return op.get_context().autocommit_block()
+    return contextlib.nullcontext()
+
+
+def _backfill(table: str, values: dict) -> None:
+    """按主键区间分批执行 UPDATE table SET values"""
+    assignments = ', '.join(f'{column} = {expression}' for column, expression in values.items())
+    if op.get_context().as_sql:
+        op.execute(f'UPDATE {table} SET {assignments}')
+        return
+
+    bind = op.get_bind()
+    low, high = bind.execute(sa.text(f'SELECT MIN(id), MAX(id) FROM {table}')).one()
+    if low is None:
+        return
+    stmt = sa.text(f'UPDATE {table} SET {assignments} WHERE id >= :start AND id < :end')
+    for start in range(low, high + 1, BATCH_SIZE):
+        bind.execute(stmt, {'start': start, 'end': start + BATCH_SIZE})
+
+
+def _sqlite_indexes(table: str) -> dict:
+    """SQLite 上表的索引定义（索引名 -> DDL）"""
+    if op.get_bind().dialect.name != 'sqlite' or op.get_context().as_sql:
+        return {}
+    rows = op.get_bind().execute(
+        sa.text("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = :table AND sql IS NOT NULL"),
+        {'table': table},
+    )
+    return dict(rows.all())
+
+
+def _convert(target_type, expression: str, reverse: bool) -> None:
+    """加入目标列、分批回填、删除原列（reverse 为降级方向：分 -> 元）"""
+    offline = op.get_context().as_sql
+    for table, columns in MONEY_COLUMNS.items():
+        pairs = [(cents, yuan, nullable) if reverse else (yuan, cents, nullable) for yuan, cents, nullable in columns]
+        existing = set() if offline else {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+        for _, target, _ in pairs:
+            if target not in existing:
+                op.add_column(table, sa.Column(target, target_type, nullable=True))
+
+        with _outside_transaction():
+            _backfill(table, {target: expression.format(source) for source, target, _ in pairs})
+
+        indexes = _sqlite_indexes(table)
+        with op.batch_alter_table(table) as batch_op:
+            for source, target, nullable in pairs:
+                if not nullable:
+                    batch_op.alter_column(target, existing_type=target_type, nullable=False)
+                batch_op.drop_column(source)
+        rebuilt = _sqlite_indexes(table)
+        for name, ddl in indexes.items():
+            if rebuilt.get(name) != ddl:
+                op.execute(f'DROP INDEX IF EXISTS {name}')
+                op.execute(ddl)
+
+
+def upgrade() -> None:
+    _convert(sa.BigInteger(), 'CAST(ROUND({} * 100) AS BIGINT)', reverse=False)
+
+
+def downgrade() -> None:
+    _convert(sa.Float(), '{} / 100.0', reverse=True)
@@ -0,0 +1,188 @@
+"""order archive
+
+Revision ID: c3e8a1f5d724
+Revises: f2a7c9e4b813
+Create Date: 2026-10-19 09:20:00.000000
+
+新增订单、支付记录归档表 orders_archive / payments_archive（列与热表一致，主键 (created_at, id)，无外键）：
+- PostgreSQL 上为按 created_at 范围分区的分区表，按月分区由归档任务按需创建
+- 订单、支付记录移入归档表后 cards.order_id、processed_callbacks.payment_id 可能指向归档记录，
+  删除这两列上的外键约束（SQLite 上需重建表，重建后按原 DDL 恢复索引）
+- 降级时把归档记录移回热表后再恢复外键
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e8a1f5d724'
+down_revision: Union[str, None] = 'f2a7c9e4b813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 不再设外键的引用列：(表, 列, 被引用表)
+SOFT_REFERENCES = [
+    ('cards', 'order_id', 'orders'),
+    ('processed_callbacks', 'payment_id', 'payments'),
+]
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def _enum(name: str, *values: str):
+    """复用热表已有的枚举类型（PostgreSQL 上不重复创建）"""
+    return sa.Enum(*values, name=name).with_variant(
+        postgresql.ENUM(*values, name=name, create_type=False), 'postgresql'
+    )
+
+
+def _order_columns():
+    return [
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_number', sa.String(length=50), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('product_name', sa.String(length=200), nullable=False),
+        sa.Column('product_price_cents', sa.BigInteger(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('total_amount_cents', sa.BigInteger(), nullable=False),
+        sa.Column('payment_method', _enum('paymentmethod', 'BALANCE', 'ALIPAY', 'WECHAT'), nullable=False),
+        sa.Column(
+            'status',
+            _enum('orderstatus', 'PENDING', 'PAID', 'DELIVERED', 'CANCELLED', 'REFUNDED'),
+            nullable=False,
+        ),
+        sa.Column('delivery_content', sa.Text(), nullable=True),
+        sa.Column('delivered_at', sa.DateTime(), nullable=True),
+        sa.Column('user_note', sa.Text(), nullable=True),
+        sa.Column('admin_note', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('paid_at', sa.DateTime(), nullable=True),
+    ]
+
+
+def _payment_columns():
+    return [
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('payment_method', sa.String(length=20), nullable=False),
+        sa.Column('amount_cents', sa.BigInteger(), nullable=False),
+        sa.Column(
+            'status',
+            _enum('paymentstatus', 'PENDING', 'SUCCESS', 'FAILED', 'CANCELLED', 'REFUNDED'),
+            nullable=False,
+        ),
+        sa.Column('transaction_id', sa.String(length=100), nullable=True),
+        sa.Column('payment_data', sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'), nullable=True),
+        sa.Column('out_trade_no', sa.String(length=64), nullable=True),
+        sa.Column('gateway_amount_cents', sa.BigInteger(), nullable=True),
+        sa.Column('gateway_paid_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('paid_at', sa.DateTime(), nullable=True),
+    ]
+
+
+# 归档表 -> (热表, 列定义, 索引)
+ARCHIVES = {
+    'orders_archive': ('orders', _order_columns, [
+        ('ix_orders_archive_id', ['id']),
+        ('ix_orders_archive_user_id_created_at', ['user_id', 'created_at']),
+        ('ix_orders_archive_status_created_at', ['status', 'created_at']),
+        ('ix_orders_archive_order_number', ['order_number']),
+    ]),
+    'payments_archive': ('payments', _payment_columns, [
+        ('ix_payments_archive_id', ['id']),
+        ('ix_payments_archive_user_id_created_at', ['user_id', 'created_at']),
+        ('ix_payments_archive_order_id', ['order_id']),
+    ]),
+}
+
+
+def _sqlite_indexes(table: str) -> dict:
+    """SQLite 上表的索引定义（索引名 -> DDL）"""
+    if op.get_bind().dialect.name != 'sqlite' or op.get_context().as_sql:
+        return {}
+    rows = op.get_bind().execute(
+        sa.text("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = :table AND sql IS NOT NULL"),
+        {'table': table},
+    )
+    return dict(rows.all())
+
+
+def _convention_name(table: str, column: str, referred: str) -> str:
+    return NAMING_CONVENTION['fk'] % {'table_name': table, 'column_0_name': column, 'referred_table_name': referred}
+
+
+def _foreign_keys(table: str, column: str, referred: str) -> list:
+    """列上指向 referred 的外键约束名（SQLite 上未命名的约束按 NAMING_CONVENTION 命名）"""
+    default = _convention_name(table, column, referred)
+    return [
+        fk['name'] or default
+        for fk in sa.inspect(op.get_bind()).get_foreign_keys(table)
+        if fk['referred_table'] == referred and fk['constrained_columns'] == [column]
+    ]
+
+
+def _alter_references(drop: bool) -> None:
+    """删除 / 恢复 SOFT_REFERENCES 上的外键"""
+    postgresql_default = op.get_bind().dialect.name == 'postgresql'
+    for table, column, referred in SOFT_REFERENCES:
+        if op.get_context().as_sql:
+            names = [f'{table}_{column}_fkey'] if drop else []  # PostgreSQL 默认约束名
+        else:
+            names = _foreign_keys(table, column, referred)
+        if drop == (not names):
+            continue
+        indexes = _sqlite_indexes(table)
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+            if drop:
+                for name in names:
+                    batch_op.drop_constraint(name, type_='foreignkey')
+            else:
+                if postgresql_default:
+                    name = f'{table}_{column}_fkey'
+                else:
+                    name = _convention_name(table, column, referred)
+                batch_op.create_foreign_key(name, referred, [column], ['id'])
+        rebuilt = _sqlite_indexes(table)
+        for name, ddl in indexes.items():
+            if rebuilt.get(name) != ddl:
+                op.execute(f'DROP INDEX IF EXISTS {name}')
+                op.execute(ddl)
+
+
+def upgrade() -> None:
+    offline = op.get_context().as_sql
+    inspector = None if offline else sa.inspect(op.get_bind())
+    for archive, (_, columns, indexes) in ARCHIVES.items():
+        if inspector is not None and inspector.has_table(archive):
+            continue
+        op.create_table(
+            archive,
+            *columns(),
+            sa.PrimaryKeyConstraint('created_at', 'id', name=f'{archive}_pkey'),
+            postgresql_partition_by='RANGE (created_at)',
+        )
+        for name, index_columns in indexes:
+            op.create_index(name, archive, index_columns)
+
+    _alter_references(drop=True)
+
+
+def downgrade() -> None:
+    # 先把归档记录移回热表（订单在前，支付记录引用订单）
+    for archive, (table, columns, _) in ARCHIVES.items():
+        names = ', '.join(column.name for column in columns())
+        op.execute(f'INSERT INTO {table} ({names}) SELECT {names} FROM {archive}')
+
+    _alter_references(drop=False)
+
+    for archive, (_, _, indexes) in reversed(list(ARCHIVES.items())):
+        for name, _ in indexes:
+            op.drop_index(name, table_name=archive)
+        op.drop_table(archive)
@@ -25,7 +25,7 @@ API设计原则：
 安全特性：
 - 密码bcrypt加密
 - JWT令牌认证
-- 请求频率限制（可扩展）
+- 请求频率限制（按 IP / 用户 / 路由，见 app/core/rate_limit.py）
 - CORS跨域支持
 - 输入数据验证
 - SQL注入防护
@@ -1,19 +1,28 @@
 """
 后台管理API
 """
-from datetime import datetime, timedelta
-from typing import Dict, Any
+import os
+from datetime import datetime
+from typing import Literal
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, func
 
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.dependencies import get_current_active_superuser
+from app.core.profiler import profile
+from app.core.slow_query import slow_query_log
+from app.core.startup import startup_profile
 from app.models.user import User
-from app.models.order import Order, OrderStatus
+from app.models.order import Order
 from app.models.product import Product
-from app.models.payment import Payment, PaymentStatus
+from app.models.payment import Payment
+from app.models.archive import OrderArchive, PaymentArchive
+from app.services.stats import stats_service
+from app.tasks.profiler_channel import profiler_channel
 
 router = APIRouter()
 
@@ -24,83 +33,7 @@ async def get_dashboard_stats(
     db: AsyncSession = Depends(get_db)
 ):
     """获取仪表盘统计数据"""
-    # 计算时间范围
-    today = datetime.utcnow().date()
-    yesterday = today - timedelta(days=1)
-    week_ago = today - timedelta(days=7)
-    month_ago = today - timedelta(days=30)
-
-    stats = {}
-
-    # 用户统计
-    user_result = await db.execute(select(func.count(User.id)))
-    stats["total_users"] = user_result.scalar()
-
-    # 新用户统计
-    new_users_today = await db.execute(
-        select(func.count(User.id)).where(
-            func.date(User.created_at) == today
-        )
-    )
-    stats["new_users_today"] = new_users_today.scalar()
-
-    new_users_week = await db.execute(
-        select(func.count(User.id)).where(
-            func.date(User.created_at) >= week_ago
-        )
-    )
-    stats["new_users_week"] = new_users_week.scalar()
-
-    # 订单统计
-    order_result = await db.execute(select(func.count(Order.id)))
-    stats["total_orders"] = order_result.scalar()
-
-    # 今日订单
-    orders_today = await db.execute(
-        select(func.count(Order.id)).where(
-            func.date(Order.created_at) == today
-        )
-    )
-    stats["orders_today"] = orders_today.scalar()
-
-    # 订单金额统计
-    revenue_result = await db.execute(
-        select(func.sum(Order.total_amount))
-    )
-    stats["total_revenue"] = float(revenue_result.scalar() or 0)
-
-    revenue_today = await db.execute(
-        select(func.sum(Order.total_amount)).where(
-            func.date(Order.created_at) == today
-        )
-    )
-    stats["revenue_today"] = float(revenue_today.scalar() or 0)
-
-    # 订单状态统计
-    order_status_stats = await db.execute(
-        select(Order.status, func.count(Order.id)).group_by(Order.status)
-    )
-    stats["order_status"] = {status.value: count for status, count in order_status_stats}
-
-    # 商品统计
-    product_result = await db.execute(select(func.count(Product.id)))
-    stats["total_products"] = product_result.scalar()
-
-    active_products = await db.execute(
-        select(func.count(Product.id)).where(Product.is_active == True)
-    )
-    stats["active_products"] = active_products.scalar()
-
-    # 支付统计
-    payment_result = await db.execute(select(func.count(Payment.id)))
-    stats["total_payments"] = payment_result.scalar()
-
-    successful_payments = await db.execute(
-        select(func.count(Payment.id)).where(Payment.status == PaymentStatus.SUCCESS)
-    )
-    stats["successful_payments"] = successful_payments.scalar()
-
-    return stats
+    return await stats_service.get_dashboard_stats(db)
 
 
 @router.get("/dashboard/charts")
@@ -110,79 +43,7 @@ async def get_dashboard_charts(
     db: AsyncSession = Depends(get_db)
 ):
     """获取仪表盘图表数据"""
-    end_date = datetime.utcnow().date()
-    start_date = end_date - timedelta(days=days)
-
-    # 每日订单数量
-    daily_orders = await db.execute(
-        select(
-            func.date(Order.created_at).label('date'),
-            func.count(Order.id).label('count')
-        )
-        .where(func.date(Order.created_at) >= start_date)
-        .group_by(func.date(Order.created_at))
-        .order_by(func.date(Order.created_at))
-    )
-
-    order_chart = [
-        {"date": str(date), "orders": count}
-        for date, count in daily_orders
-    ]
-
-    # 每日收入
-    daily_revenue = await db.execute(
-        select(
-            func.date(Order.created_at).label('date'),
-            func.sum(Order.total_amount).label('revenue')
-        )
-        .where(
-            and_(
-                func.date(Order.created_at) >= start_date,
-                Order.status.in_([OrderStatus.PAID, OrderStatus.DELIVERED])
-            )
-        )
-        .group_by(func.date(Order.created_at))
-        .order_by(func.date(Order.created_at))
-    )
-
-    revenue_chart = [
-        {"date": str(date), "revenue": float(revenue or 0)}
-        for date, revenue in daily_revenue
-    ]
-
-    # 商品销量排行
-    product_sales = await db.execute(
-        select(
-            Product.name,
-            func.sum(Order.quantity).label('sold_quantity'),
-            func.sum(Order.total_amount).label('total_revenue')
-        )
-        .join(Order, Product.id == Order.product_id)
-        .where(
-            and_(
-                func.date(Order.created_at) >= start_date,
-                Order.status.in_([OrderStatus.PAID, OrderStatus.DELIVERED])
-            )
-        )
-        .group_by(Product.id, Product.name)
-        .order_by(func.sum(Order.total_amount).desc())
-        .limit(10)
-    )
-
-    sales_chart = [
-        {
-            "product": name,
-            "quantity": int(quantity),
-            "revenue": float(revenue or 0)
-        }
-        for name, quantity, revenue in product_sales
-    ]
-
-    return {
-        "order_chart": order_chart,
-        "revenue_chart": revenue_chart,
-        "sales_chart": sales_chart
-    }
+    return await stats_service.get_dashboard_charts(db, days)
 
 
 @router.get("/system/info")
@@ -210,8 +71,100 @@ async def get_system_info(
     payment_count = await db.execute(select(func.count(Payment.id)))
     tables_info["payments"] = payment_count.scalar()
 
+    # 归档表
+    for model in (OrderArchive, PaymentArchive):
+        archive_count = await db.execute(select(func.count()).select_from(model))
+        tables_info[model.__tablename__] = archive_count.scalar()
+
     return {
         "database_tables": tables_info,
         "server_time": datetime.utcnow().isoformat(),
         "version": "1.0.0"
     }
+
+
+@router.get("/system/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(20, ge=1, le=200, description="返回条数"),
+    order_by: str = Query("total", description="排序字段: total/max/count"),
+    current_user: User = Depends(get_current_active_superuser)
+):
+    """获取慢查询统计（当前 worker 进程）"""
+    try:
+        items = slow_query_log.top(limit=limit, order_by=order_by)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    return {
+        "threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+        "items": items,
+    }
+
+
+@router.delete("/system/slow-queries")
+async def reset_slow_queries(
+    current_user: User = Depends(get_current_active_superuser)
+):
+    """清空慢查询统计（当前 worker 进程）"""
+    slow_query_log.reset()
+    return {"message": "慢查询统计已清空"}
+
+
+@router.get("/system/startup")
+async def get_startup_profile(
+    current_user: User = Depends(get_current_active_superuser)
+):
+    """获取启动各阶段耗时（当前 worker 进程）"""
+    return startup_profile.report()
+
+
+@router.get("/system/profile")
+async def get_system_profile(
+    seconds: float = Query(5, gt=0, description="采样时长（秒）"),
+    interval_ms: float = Query(10, ge=1, le=1000, description="采样间隔（毫秒）"),
+    workers: Literal["current", "all"] = Query("current", description="采样范围: current 当前 worker / all 全部 worker"),
+    format: Literal["json", "collapsed"] = Query("json", description="返回格式: json 摘要 / collapsed 折叠栈文件"),
+    current_user: User = Depends(get_current_active_superuser)
+):
+    """采样分析 worker 进程，返回火焰图折叠栈与函数排行"""
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="采样分析未启用"
+        )
+    if seconds > settings.PROFILER_MAX_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"采样时长不能超过 {settings.PROFILER_MAX_SECONDS} 秒"
+        )
+
+    try:
+        if workers == "all":
+            result, pids = await profiler_channel.profile_all(seconds, interval_ms)
+        else:
+            result = await profile(seconds, interval_ms)
+            pids = [os.getpid()]
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+
+    if format == "collapsed":
+        filename = f"profile-{datetime.utcnow():%Y%m%d%H%M%S}.collapsed"
+        return PlainTextResponse(
+            result.collapsed(),
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+
+    return {
+        "workers": pids,
+        "seconds": round(result.duration, 3),
+        "samples": result.samples,
+        "top_functions": result.top_functions(),
+        "top_await_points": result.top_await_points(),
+        "collapsed": result.collapsed(),
+    }
@@ -308,7 +308,8 @@ async def change_password(
     Raises:
         HTTPException: 当旧密码错误时抛出400错误
     """
-    # 验证旧密码正确性
+    # 验证旧密码正确性（鉴权用户来自缓存，不含密码哈希）
+    await db.refresh(current_user, ["hashed_password"])
     if not verify_password(old_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
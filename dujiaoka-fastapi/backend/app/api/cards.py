@@ -31,6 +31,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
+from app.core.serialization import page_response
 from app.core.dependencies import get_current_active_superuser
 from app.models.user import User
 from app.schemas.card import (
@@ -40,7 +41,7 @@ from app.schemas.card import (
     CardList,
     CardBatchCreate
 )
-from app.services.card import card_service
+from app.services.card import card_service, card_list_serializer
 
 # 创建卡密管理路由器
 router = APIRouter(
@@ -101,7 +102,7 @@ async def read_cards(
                 detail="无效的卡密状态"
             )
 
-    cards = await card_service.get_cards(
+    rows = await card_service.get_card_rows(
         db,
         product_id=product_id,
         status=card_status,
@@ -110,14 +111,14 @@ async def read_cards(
     )
 
     # 获取总数（简化版）
-    total = len(cards) if len(cards) < limit else skip + limit + 1
+    total = len(rows) if len(rows) < limit else skip + limit + 1
 
-    return CardList(
-        items=cards,
+    return page_response(card_list_serializer.dumps_page(
+        rows,
         total=total,
         page=skip // limit + 1,
         size=limit
-    )
+    ))
 
 
 @router.get("/{card_id}", response_model=CardSchema)
@@ -29,7 +29,9 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
+from app.core.serialization import page_response
 from app.core.dependencies import get_current_user, get_current_active_superuser
+from app.core.money import to_yuan
 from app.models.user import User
 from app.models.order import OrderStatus
 from app.schemas.order import (
@@ -40,7 +42,7 @@ from app.schemas.order import (
     CartItem,
     OrderSummary
 )
-from app.services.order import order_service
+from app.services.order import order_service, order_list_serializer
 
 # 创建订单管理路由器
 router = APIRouter(
@@ -69,7 +71,7 @@ router = APIRouter(
     - 普通用户：只能查看自己的订单
     - 管理员：可以查看所有订单
 
-    **排序：** 按创建时间倒序
+    **排序：** 按创建时间倒序（包含已归档的历史订单）
     """,
     responses={
         200: {"description": "获取成功"},
@@ -116,7 +118,7 @@ async def read_orders(
     # 权限控制：普通用户只能查看自己的订单，管理员可以查看所有
     user_id = None if current_user.is_superuser else current_user.id
 
-    orders = await order_service.get_orders(
+    rows = await order_service.get_order_rows(
         db,
         user_id=user_id,
         status=order_status,
@@ -125,14 +127,15 @@ async def read_orders(
     )
 
     # 获取总数（简化版）
-    total = len(orders) if len(orders) < limit else skip + limit + 1
+    total = len(rows) if len(rows) < limit else skip + limit + 1
 
-    return OrderList(
-        items=orders,
+    # 由行元组直接序列化，结构与 OrderList 一致
+    return page_response(order_list_serializer.dumps_page(
+        rows,
         total=total,
         page=skip // limit + 1,
         size=limit
-    )
+    ))
 
 
 @router.get(
@@ -155,6 +158,8 @@ async def read_orders(
     - 用户信息（用户名、邮箱）
     - 时间信息（创建、支付、发货时间）
     - 备注信息（用户备注、管理员备注）
+
+    已归档的历史订单同样可以查看，但不能再修改。
     """,
     responses={
         200: {"description": "获取成功"},
@@ -184,7 +189,8 @@ async def read_order(
     Raises:
         HTTPException: 当订单不存在或无权限查看时抛出相应错误
     """
-    order = await order_service.get_order_by_id(db, order_id)
+    # 已归档的订单同样可以查看（只读）
+    order = await order_service.get_order_by_id(db, order_id, include_archived=True)
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -294,13 +300,16 @@ async def create_cart_order(
             detail="购物车为空"
         )
 
-    total_amount = 0.0
+    total_amount_cents = 0
     order_items = []
 
+    # 一次查询取出购物车中的全部商品
+    from app.services.product import product_service
+    products = await product_service.get_products_by_ids(db, (item.product_id for item in items))
+
     for item in items:
         # 验证商品
-        from app.services.product import product_service
-        product = await product_service.get_product_by_id(db, item.product_id)
+        product = products.get(item.product_id)
         if not product or not product.is_active:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -313,18 +322,18 @@ async def create_cart_order(
                 detail=f"商品 {product.name} 库存不足"
             )
 
-        item_total = float(product.price * item.quantity)
-        total_amount += item_total
+        item_total_cents = product.price_cents * item.quantity
+        total_amount_cents += item_total_cents
 
         order_items.append({
             "product": product,
             "quantity": item.quantity,
-            "item_total": item_total
+            "item_total": to_yuan(item_total_cents)
         })
 
     return OrderSummary(
         items=items,
-        total_amount=total_amount
+        total_amount=to_yuan(total_amount_cents)
     )
 
 
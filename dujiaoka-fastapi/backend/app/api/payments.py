@@ -36,6 +36,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
+from app.core.serialization import page_response
 from app.core.dependencies import get_current_user, get_current_active_superuser
 from app.models.user import User
 from app.schemas.payment import (
@@ -44,7 +45,8 @@ from app.schemas.payment import (
     PaymentUpdate,
     PaymentList
 )
-from app.services.payment import payment_service
+from app.services.payment import payment_service, payment_list_serializer
+from app.tasks.callback_queue import callback_queue
 
 # 创建支付管理路由器
 router = APIRouter(
@@ -104,7 +106,7 @@ async def read_payments(
     # 普通用户只能查看自己的支付记录，管理员可以查看所有
     user_id = None if current_user.is_superuser else current_user.id
 
-    payments = await payment_service.get_payments(
+    rows = await payment_service.get_payment_rows(
         db,
         user_id=user_id,
         skip=skip,
@@ -112,14 +114,14 @@ async def read_payments(
     )
 
     # 获取总数（简化版）
-    total = len(payments) if len(payments) < limit else skip + limit + 1
+    total = len(rows) if len(rows) < limit else skip + limit + 1
 
-    return PaymentList(
-        items=payments,
+    return page_response(payment_list_serializer.dumps_page(
+        rows,
         total=total,
         page=skip // limit + 1,
         size=limit
-    )
+    ))
 
 
 @router.get("/{payment_id}", response_model=PaymentSchema)
@@ -128,8 +130,8 @@ async def read_payment(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """获取支付记录详情"""
-    payment = await payment_service.get_payment_by_id(db, payment_id)
+    """获取支付记录详情（包含已归档的支付记录）"""
+    payment = await payment_service.get_payment_by_id(db, payment_id, include_archived=True)
     if not payment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -151,9 +153,10 @@ async def alipay_callback(
     callback_data: dict,
     db: AsyncSession = Depends(get_db)
 ):
-    """支付宝支付回调"""
+    """支付宝支付回调（落库后立即应答，异步处理）"""
     try:
-        result = await payment_service.handle_alipay_callback(db, callback_data)
+        result = await payment_service.enqueue_callback(db, "alipay", callback_data)
+        callback_queue.notify()
         return result
     except ValueError as e:
         raise HTTPException(
@@ -167,9 +170,10 @@ async def wechat_callback(
     callback_data: dict,
     db: AsyncSession = Depends(get_db)
 ):
-    """微信支付回调"""
+    """微信支付回调（落库后立即应答，异步处理）"""
     try:
-        result = await payment_service.handle_wechat_callback(db, callback_data)
+        result = await payment_service.enqueue_callback(db, "wechat", callback_data)
+        callback_queue.notify()
         return result
     except ValueError as e:
         raise HTTPException(
@@ -5,6 +5,7 @@
 - 商品分类管理（增删改查）
 - 商品信息管理（增删改查）
 - 商品搜索和筛选
+- 商品排行榜
 - 库存管理
 - 商品上下架控制
 
@@ -32,11 +33,13 @@ from app.schemas.product import (
     ProductCreate,
     ProductUpdate,
     ProductList,
+    ProductRankingItem,
     Category as CategorySchema,
     CategoryCreate,
     CategoryUpdate
 )
 from app.services.product import product_service
+from app.services.ranking import ranking_service
 
 # 创建商品管理路由器
 router = APIRouter(
@@ -84,8 +87,7 @@ async def read_categories(
     Returns:
         List[CategorySchema]: 分类列表
     """
-    categories = await product_service.get_categories(db, skip=skip, limit=limit)
-    return categories
+    return await product_service.get_category_list(db, skip=skip, limit=limit)
 
 
 @router.post(
@@ -233,12 +235,11 @@ async def read_products(
     Returns:
         ProductList: 分页的商品列表
     """
-    products = await product_service.get_products(
+    products = await product_service.get_product_page(
         db,
         skip=skip,
         limit=limit,
         category_id=category_id,
-        is_active=True,  # 只显示上架商品
         search=search
     )
 
@@ -254,6 +255,57 @@ async def read_products(
     )
 
 
+@router.get(
+    "/rankings",
+    response_model=List[ProductRankingItem],
+    summary="获取商品排行榜",
+    description="""
+    获取最近一段时间内销量或销售额最高的商品。
+
+    **查询参数：**
+    - `period`: 时间窗口，24h / 7d / 30d（默认24h）
+    - `metric`: 排序依据，quantity（销量）/ amount（销售额），默认quantity
+    - `category_id`: 分类ID（不传表示全部分类）
+    - `limit`: 返回条数（1-100）
+
+    **注意：** 排行榜由后台任务定期生成，最多滞后 RANKING_REFRESH_INTERVAL 秒
+    """,
+    responses={
+        200: {"description": "获取成功"},
+        400: {"description": "参数无效"}
+    }
+)
+async def read_product_rankings(
+    period: str = Query("24h", description="时间窗口：24h/7d/30d"),
+    metric: str = Query("quantity", description="排序依据：quantity/amount"),
+    category_id: Optional[int] = Query(None, description="分类ID"),
+    limit: int = Query(10, ge=1, le=100, description="返回条数"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取商品排行榜
+
+    读取预先生成的榜单（不聚合订单表），用于首页和分类页的热销商品展示。
+
+    Args:
+        period: 时间窗口
+        metric: 排序依据
+        category_id: 分类ID（可选）
+        limit: 返回条数
+        db: 数据库会话
+
+    Returns:
+        List[ProductRankingItem]: 按名次排列的商品
+    """
+    try:
+        return await ranking_service.get_ranking(db, period, metric, category_id, limit)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
 @router.get(
     "/{product_id}",
     response_model=ProductSchema,
@@ -293,12 +345,13 @@ async def read_product(
     Raises:
         HTTPException: 当商品不存在或未上架时抛出404错误
     """
-    product = await product_service.get_product_by_id(db, product_id)
-    if not product or not product.is_active:
+    product = await product_service.get_product_detail(db, product_id)
+    if product is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="商品不存在或已下架"
         )
+    product_service.record_view(product_id)
     return product
 
 
@@ -24,6 +24,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
 from app.core.dependencies import get_current_user, get_current_active_superuser
+from app.core.money import to_cents
 from app.models.user import User
 from app.schemas.user import User as UserSchema, UserUpdate
 from app.services.user import user_service
@@ -137,13 +138,14 @@ async def recharge_balance(
     db: AsyncSession = Depends(get_db)
 ):
     """充值余额"""
-    if amount <= 0:
+    amount_cents = to_cents(amount)
+    if amount_cents <= 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="充值金额必须大于0"
         )
 
-    user = await user_service.update_balance(db, current_user, amount)
+    user = await user_service.update_balance(db, current_user, amount_cents)
     return {"message": "充值成功", "balance": user.balance}
 
 
@@ -156,6 +158,8 @@ async def change_password(
 ):
     """修改密码"""
     from app.core.security import verify_password
+    # 鉴权用户来自缓存，不含密码哈希
+    await db.refresh(current_user, ["hashed_password"])
     if not verify_password(old_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
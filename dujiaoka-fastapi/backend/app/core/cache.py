@@ -0,0 +1,789 @@
+"""
+缓存
+
+两级缓存：进程内 L1（LRU，短 TTL）+ 共享的 L2（Redis，settings.REDIS_URL）。
+
+- 键按命名空间隔离：<前缀><命名空间>:<键>，如 dujiaoka:product:detail:42
+- 值用 msgpack 序列化（datetime / date / Decimal 以扩展类型保存），L1 同样保存序列化后的字节，
+  命中时反序列化出新对象，调用方修改返回值不会污染缓存
+- 写入时可附带标签，按标签失效所有关联的键；标签是全局的（不区分命名空间），如 user:5、products
+- 失效时先清除本进程 L1，再清除 L2 并通过 Redis 发布/订阅通知其他 worker 清除各自的 L1；
+  通知丢失（如订阅连接断开）时其他 worker 的 L1 最多在 CACHE_L1_TTL 秒后过期
+- Redis 不可用时在 retry_interval 秒内跳过 L2（读按未命中处理，回源数据库），
+  期间的失效操作暂存，恢复后先补发再读写
+- 模型变更在事务提交后自动失效对应标签（见 register_model_tags）；
+  Core 语句更新的行用 invalidate_on_commit 登记，同样在提交后失效
+- get_or_set 回源期间标签被失效时不写入（回源读到的可能是失效前的旧值）：本进程的失效直接记录，
+  其他 worker 的失效通过 L2 的失效代数判断（每次按标签失效代数加一，并记在标签的代数键上）
+
+CACHE_BACKEND=memory 使用进程内的 MemoryBackend（测试与单进程部署），none 关闭缓存。
+"""
+import asyncio
+import itertools
+import os
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import msgpack
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import CACHE_BACKEND_ERRORS_TOTAL, CACHE_REQUESTS_TOTAL
+
+# msgpack 扩展类型编号
+_EXT_DATETIME = 1
+_EXT_DATE = 2
+_EXT_DECIMAL = 3
+
+# 标签代数键的保留时间（秒），须长于回源耗时
+_MARKER_TTL = 600
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return msgpack.ExtType(_EXT_DATETIME, value.isoformat().encode())
+    if isinstance(value, date):
+        return msgpack.ExtType(_EXT_DATE, value.isoformat().encode())
+    if isinstance(value, Decimal):
+        return msgpack.ExtType(_EXT_DECIMAL, str(value).encode())
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"无法序列化的缓存值类型: {type(value).__name__}")
+
+
+def _ext_hook(code: int, data: bytes) -> Any:
+    if code == _EXT_DATETIME:
+        return datetime.fromisoformat(data.decode())
+    if code == _EXT_DATE:
+        return date.fromisoformat(data.decode())
+    if code == _EXT_DECIMAL:
+        return Decimal(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+def packb(value: Any) -> bytes:
+    """序列化缓存值"""
+    return msgpack.packb(value, default=_default, use_bin_type=True, datetime=False)
+
+
+def unpackb(data: bytes) -> Any:
+    """反序列化缓存值"""
+    return msgpack.unpackb(data, ext_hook=_ext_hook, raw=False, strict_map_key=False)
+
+
+class MemoryBackend:
+    """
+    进程内 L2 实现（测试用假 Redis，也用于 CACHE_BACKEND=memory）
+
+    行为与 RedisBackend 一致：键带过期时间，标签为键集合，发布的消息投递给所有订阅者。
+    多个 Cache 实例共享同一个 MemoryBackend 即可模拟多个 worker。
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[float, bytes]] = {}
+        self._tags: Dict[str, Tuple[float, Set[str]]] = {}
+        self._markers: Dict[str, Tuple[float, int]] = {}
+        self._generations: Dict[str, int] = {}
+        self._subscribers: List[asyncio.Queue] = []
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        now = time.monotonic()
+        values = []
+        for key in keys:
+            item = self._data.get(key)
+            if item is not None and item[0] <= now:
+                del self._data[key]
+                item = None
+            values.append(item[1] if item else None)
+        return values
+
+    async def generation(self, counter: str) -> int:
+        return self._generations.get(counter, 0)
+
+    async def set_many(
+        self,
+        items: Dict[str, bytes],
+        ttl: float,
+        tags: Sequence[str],
+        markers: Sequence[str] = (),
+        generation: Optional[int] = None,
+    ) -> bool:
+        now = time.monotonic()
+        if generation is not None:
+            for marker in markers:
+                item = self._markers.get(marker)
+                if item is not None and item[0] > now and item[1] > generation:
+                    return False
+        expires = now + ttl
+        for key, data in items.items():
+            self._data[key] = (expires, data)
+        for tag in tags:
+            tag_expires, members = self._tags.get(tag, (0.0, set()))
+            members.update(items)
+            self._tags[tag] = (max(tag_expires, expires), members)
+        return True
+
+    async def delete_many(self, keys: Sequence[str]) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def invalidate_tags(self, tags: Sequence[str], markers: Sequence[str], counter: str) -> None:
+        generation = self._generations[counter] = self._generations.get(counter, 0) + 1
+        expires = time.monotonic() + _MARKER_TTL
+        for tag, marker in zip(tags, markers):
+            _, members = self._tags.pop(tag, (0.0, set()))
+            await self.delete_many(list(members))
+            self._markers[marker] = (expires, generation)
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        for queue in self._subscribers:
+            queue.put_nowait(message)
+
+    async def listen(self, channel: str):
+        """订阅失效通知（异步迭代器）"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers.remove(queue)
+
+    async def close(self) -> None:
+        pass
+
+
+# KEYS: 数据键..., 标签键..., 标签代数键...；ARGV: TTL 毫秒, 数据键数量, 回源前的失效代数（-1 不检查）, 值...
+# 任一标签在回源后被失效（代数键大于回源前的代数）时不写入，返回 0
+# 标签集合的过期时间不短于其成员，成员过期后残留在集合中的键名在失效时 DEL 一次即可
+_SET_SCRIPT = """
+local ttl = tonumber(ARGV[1])
+local count = tonumber(ARGV[2])
+local generation = tonumber(ARGV[3])
+local tags = (#KEYS - count) / 2
+if generation >= 0 then
+    for i = count + tags + 1, #KEYS do
+        if tonumber(redis.call('GET', KEYS[i]) or '0') > generation then
+            return 0
+        end
+    end
+end
+for i = 1, count do
+    redis.call('SET', KEYS[i], ARGV[i + 3], 'PX', ttl)
+end
+for i = count + 1, count + tags do
+    for j = 1, count do
+        redis.call('SADD', KEYS[i], KEYS[j])
+    end
+    if redis.call('PTTL', KEYS[i]) < ttl then
+        redis.call('PEXPIRE', KEYS[i], ttl)
+    end
+end
+return count
+"""
+
+# KEYS: 失效代数键, 标签键..., 标签代数键...；ARGV: 标签代数键 TTL 毫秒
+# 删除标签集合中的所有键与标签本身，失效代数加一并记在各标签的代数键上
+_INVALIDATE_SCRIPT = """
+local tags = (#KEYS - 1) / 2
+local generation = redis.call('INCR', KEYS[1])
+local deleted = 0
+for i = 2, tags + 1 do
+    local members = redis.call('SMEMBERS', KEYS[i])
+    for j = 1, #members, 1000 do
+        deleted = deleted + redis.call('DEL', unpack(members, j, math.min(j + 999, #members)))
+    end
+    redis.call('DEL', KEYS[i])
+    redis.call('SET', KEYS[i + tags], generation, 'PX', tonumber(ARGV[1]))
+end
+return deleted
+"""
+
+
+class RedisBackend:
+    """Redis L2（标签写入与失效用 Lua 脚本原子执行；出错时抛出异常，由 Cache 降级处理）"""
+
+    def __init__(self, url: Optional[str] = None, client=None):
+        self.url = url
+        self._client = client
+        self._scripts: Dict[str, Any] = {}
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis.asyncio as redis
+
+            self._client = redis.from_url(self.url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._client
+
+    def _script(self, name: str, source: str):
+        script = self._scripts.get(name)
+        if script is None:
+            script = self._scripts[name] = self.client.register_script(source)
+        return script
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        return await self.client.mget(keys)
+
+    async def generation(self, counter: str) -> int:
+        return int(await self.client.get(counter) or 0)
+
+    async def set_many(
+        self,
+        items: Dict[str, bytes],
+        ttl: float,
+        tags: Sequence[str],
+        markers: Sequence[str] = (),
+        generation: Optional[int] = None,
+    ) -> bool:
+        if not tags:
+            ttl_ms = max(1, int(ttl * 1000))
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key, data in items.items():
+                    pipe.set(key, data, px=ttl_ms)
+                await pipe.execute()
+            return True
+        written = await self._script("set", _SET_SCRIPT)(
+            keys=[*items, *tags, *markers],
+            args=[max(1, int(ttl * 1000)), len(items), -1 if generation is None else generation, *items.values()],
+        )
+        return bool(written)
+
+    async def delete_many(self, keys: Sequence[str]) -> None:
+        await self.client.delete(*keys)
+
+    async def invalidate_tags(self, tags: Sequence[str], markers: Sequence[str], counter: str) -> None:
+        await self._script("invalidate", _INVALIDATE_SCRIPT)(keys=[counter, *tags, *markers], args=[_MARKER_TTL * 1000])
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        await self.client.publish(channel, message)
+
+    async def listen(self, channel: str):
+        """订阅失效通知（异步迭代器，连接断开时抛出异常）"""
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(channel)
+            while True:
+                # 带超时轮询（无超时的阻塞读会受 socket_timeout 限制而报错）
+                message = await pubsub.get_message(timeout=1.0)
+                if message is not None and message["type"] == "message":
+                    yield message["data"]
+        finally:
+            await pubsub.aclose()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+
+
+_MISSING = object()
+# 回源期间本进程 L1 被整体清空（订阅断开重连）
+_CLEARED = object()
+
+
+class CacheNamespace:
+    """命名空间视图：键自动加上 <前缀><命名空间>: 前缀"""
+
+    def __init__(self, cache: "Cache", name: str):
+        self.cache = cache
+        self.name = name
+        self._prefix = f"{cache.prefix}{name}:"
+
+    def _key(self, key: Any) -> str:
+        return f"{self._prefix}{key}"
+
+    async def get(self, key: Any, default: Any = None) -> Any:
+        full_key = self._key(key)
+        value = (await self.cache.get_many(self.name, [full_key])).get(full_key, _MISSING)
+        return default if value is _MISSING else value
+
+    async def get_many(self, keys: Iterable[Any]) -> Dict[Any, Any]:
+        """批量读取，只返回命中的键"""
+        full = {self._key(key): key for key in keys}
+        found = await self.cache.get_many(self.name, list(full))
+        return {full[key]: value for key, value in found.items()}
+
+    async def set(self, key: Any, value: Any, ttl: float, tags: Sequence[str] = ()) -> None:
+        await self.cache.set_many({self._key(key): value}, ttl, tags)
+
+    async def set_many(self, items: Dict[Any, Any], ttl: float, tags: Sequence[str] = ()) -> None:
+        await self.cache.set_many({self._key(key): value for key, value in items.items()}, ttl, tags)
+
+    async def delete_many(self, keys: Iterable[Any]) -> None:
+        await self.cache.delete_many([self._key(key) for key in keys])
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        """失效标签关联的所有键（标签是全局的，同样作用于其他命名空间）"""
+        await self.cache.invalidate_tags(tags)
+
+    async def get_or_set(
+        self,
+        key: Any,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: float,
+        tags: Union[Sequence[str], Callable[[Any], Sequence[str]]] = (),
+    ) -> Any:
+        """
+        读取缓存，未命中时调用 loader 回源并写入
+
+        tags 可以是由回源结果计算标签的函数；同一进程内同一个键的并发未命中只回源一次
+        （其余请求等待首个结果）；loader 返回 None 时不写入缓存。
+        回源期间该键或其标签被失效时只返回结果、不写入缓存。
+        """
+        full_key = self._key(key)
+        value = (await self.cache.get_many(self.name, [full_key])).get(full_key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        inflight = self.cache._inflight.get(full_key)
+        if inflight is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # 首个请求被取消，自行回源
+                return await loader()
+
+        future = asyncio.get_running_loop().create_future()
+        self.cache._inflight[full_key] = future
+        watched = self.cache._watch()
+        try:
+            # 先取失效代数再回源：之后发生的失效都会使写入被跳过
+            generation = await self.cache._generation()
+            value = await loader()
+            if value is not None:
+                await self.cache.set_many(
+                    {full_key: value}, ttl, tags(value) if callable(tags) else tags, since=(watched, generation)
+                )
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            self.cache._inflight.pop(full_key, None)
+            self.cache._unwatch(watched)
+
+
+class Cache:
+    """两级缓存"""
+
+    def __init__(
+        self,
+        backend=None,
+        prefix: str = "dujiaoka:",
+        l1_ttl: float = 5.0,
+        l1_max_items: int = 10000,
+        enabled: bool = True,
+        retry_interval: float = 30,
+        max_pending: int = 10000,
+    ):
+        self.backend = backend
+        self.prefix = prefix
+        self.l1_ttl = l1_ttl
+        self.l1_max_items = l1_max_items
+        self.enabled = enabled
+        self.retry_interval = retry_interval
+        self.max_pending = max_pending
+        self.channel = f"{prefix}invalidate"
+        self.generation_key = f"{prefix}generation"
+
+        # L1：键 -> (过期时间, 序列化值, 标签)；标签 -> 键集合
+        self._l1: "OrderedDict[str, Tuple[float, bytes, Tuple[str, ...]]]" = OrderedDict()
+        self._l1_tags: Dict[str, Set[str]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # 进行中的回源各自收集期间被失效的键与标签
+        self._watches: List[Set[Any]] = []
+
+        # L2 降级状态与暂存的失效操作
+        self._down_until = 0.0
+        self._pending_keys: Set[str] = set()
+        self._pending_tags: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._listener: Optional[asyncio.Task] = None
+        self._counters: Dict[Tuple[str, str], Any] = {}
+
+    @property
+    def origin(self) -> str:
+        """本实例标识，用于忽略自己发布的失效通知（preload 后 fork 的 worker 进程号不同）"""
+        return f"{os.getpid()}-{id(self):x}"
+
+    def namespace(self, name: str) -> CacheNamespace:
+        """命名空间视图"""
+        return CacheNamespace(self, name)
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+
+    def _marker_key(self, tag: str) -> str:
+        return f"{self.prefix}gen:{tag}"
+
+    def _count(self, namespace: str, result: str, amount: int) -> None:
+        if not amount:
+            return
+        counter = self._counters.get((namespace, result))
+        if counter is None:
+            counter = self._counters[(namespace, result)] = CACHE_REQUESTS_TOTAL.labels(namespace, result)
+        counter.inc(amount)
+
+    # ------------------------------------------------------------------ L1
+
+    def _l1_get(self, key: str, now: float) -> Optional[Tuple[float, bytes, Tuple[str, ...]]]:
+        entry = self._l1.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            self._l1_discard(key)
+            return None
+        self._l1.move_to_end(key)
+        return entry
+
+    def _l1_put(self, key: str, data: bytes, tags: Tuple[str, ...], ttl: float) -> None:
+        self._l1_discard(key)
+        self._l1[key] = (time.monotonic() + min(ttl, self.l1_ttl), data, tags)
+        for tag in tags:
+            self._l1_tags.setdefault(tag, set()).add(key)
+        while len(self._l1) > self.l1_max_items:
+            self._l1_discard(next(iter(self._l1)))
+
+    def _l1_discard(self, key: str) -> None:
+        entry = self._l1.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            members = self._l1_tags.get(tag)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del self._l1_tags[tag]
+
+    def invalidate_local(self, keys: Iterable[str] = (), tags: Iterable[str] = ()) -> None:
+        """只清除本进程 L1（收到其他 worker 的失效通知时调用）"""
+        keys, tags = tuple(keys), tuple(tags)
+        for key in keys:
+            self._l1_discard(key)
+        for tag in tags:
+            for key in list(self._l1_tags.get(tag, ())):
+                self._l1_discard(key)
+        for watched in self._watches:
+            watched.update(keys)
+            watched.update(tags)
+
+    def clear_local(self) -> None:
+        """清空本进程 L1"""
+        self._l1.clear()
+        self._l1_tags.clear()
+        for watched in self._watches:
+            watched.add(_CLEARED)
+
+    def _watch(self) -> Set[Any]:
+        watched: Set[Any] = set()
+        self._watches.append(watched)
+        return watched
+
+    def _unwatch(self, watched: Set[Any]) -> None:
+        self._watches.remove(watched)
+
+    # ------------------------------------------------------------------ L2
+
+    async def _backend_ready(self) -> bool:
+        """L2 是否可用；从故障中恢复后先补发暂存的失效操作"""
+        if self.backend is None or time.monotonic() < self._down_until:
+            return False
+        if self._pending_keys or self._pending_tags:
+            keys, tags = list(self._pending_keys), list(self._pending_tags)
+            try:
+                if keys:
+                    await self.backend.delete_many(keys)
+                if tags:
+                    await self._invalidate_l2_tags(tags)
+                await self._publish(keys, tags)
+            except Exception as e:
+                self._backend_failed("补发失效", e)
+                return False
+            self._pending_keys.difference_update(keys)
+            self._pending_tags.difference_update(tags)
+            logger.info(f"缓存 Redis 已恢复，补发 {len(keys)} 个键、{len(tags)} 个标签的失效")
+        return True
+
+    def _backend_failed(self, operation: str, error: Exception) -> None:
+        # 在 retry_interval 秒内跳过 L2，避免每次读写都等待连接超时
+        CACHE_BACKEND_ERRORS_TOTAL.labels(operation).inc()
+        if time.monotonic() >= self._down_until:
+            logger.warning(f"缓存 Redis 不可用（{operation}），{self.retry_interval:.0f} 秒内只使用进程内缓存: {error}")
+        self._down_until = time.monotonic() + self.retry_interval
+
+    def _defer(self, keys: Iterable[str], tags: Iterable[str]) -> None:
+        self._pending_keys.update(keys)
+        self._pending_tags.update(tags)
+        if len(self._pending_keys) + len(self._pending_tags) > self.max_pending:
+            # 积压过多时放弃逐键补发，L2 中残留的旧值在各自 TTL 后过期
+            logger.error(f"缓存失效积压超过 {self.max_pending} 项，已丢弃的键在 TTL 到期前可能返回旧值")
+            self._pending_keys.clear()
+
+    async def _invalidate_l2_tags(self, tags: Sequence[str]) -> None:
+        await self.backend.invalidate_tags(
+            [self._tag_key(tag) for tag in tags], [self._marker_key(tag) for tag in tags], self.generation_key
+        )
+
+    async def _generation(self) -> Optional[int]:
+        """L2 当前的失效代数（L2 不可用时为 None）"""
+        if self.backend is None or not self.enabled or not await self._backend_ready():
+            return None
+        try:
+            return await self.backend.generation(self.generation_key)
+        except Exception as e:
+            self._backend_failed("读取", e)
+            return None
+
+    async def _publish(self, keys: Sequence[str], tags: Sequence[str]) -> None:
+        await self.backend.publish(self.channel, packb({"origin": self.origin, "keys": keys, "tags": tags}))
+
+    # ------------------------------------------------------------------ 读写
+
+    async def get_many(self, namespace: str, keys: Sequence[str]) -> Dict[str, Any]:
+        """按完整键批量读取（先 L1 后 L2），只返回命中的键"""
+        if not self.enabled or not keys:
+            return {}
+        now = time.monotonic()
+        found: Dict[str, Any] = {}
+        missing: List[str] = []
+        for key in keys:
+            entry = self._l1_get(key, now)
+            if entry is None:
+                missing.append(key)
+            else:
+                found[key] = unpackb(entry[1])[1]
+        self._count(namespace, "l1_hit", len(found))
+
+        l2_hits = 0
+        if missing and await self._backend_ready():
+            try:
+                values = await self.backend.get_many(missing)
+            except Exception as e:
+                self._backend_failed("读取", e)
+            else:
+                for key, data in zip(missing, values):
+                    if data is None:
+                        continue
+                    tags, value = unpackb(data)
+                    found[key] = value
+                    l2_hits += 1
+                    self._l1_put(key, data, tuple(tags), self.l1_ttl)
+        self._count(namespace, "l2_hit", l2_hits)
+        self._count(namespace, "miss", len(keys) - len(found))
+        return found
+
+    async def set_many(
+        self,
+        items: Dict[str, Any],
+        ttl: float,
+        tags: Sequence[str] = (),
+        since: Optional[Tuple[Set[Any], Optional[int]]] = None,
+    ) -> None:
+        """
+        按完整键批量写入 L1 与 L2
+
+        since 为回源前登记的 (本进程失效收集, L2 失效代数)：期间键或标签被失效时不写入；
+        回源前 L2 不可用（代数为 None）时只写 L1。
+        """
+        if not self.enabled or not items:
+            return
+        tags = tuple(tags)
+        generation = None
+        if since is not None:
+            watched, generation = since
+            if _CLEARED in watched or not watched.isdisjoint(items) or not watched.isdisjoint(tags):
+                return
+        packed = {key: packb((tags, value)) for key, value in items.items()}
+        for key, data in packed.items():
+            self._l1_put(key, data, tags, ttl)
+        if since is not None and generation is None:
+            return
+        if await self._backend_ready():
+            try:
+                written = await self.backend.set_many(
+                    packed,
+                    ttl,
+                    [self._tag_key(tag) for tag in tags],
+                    [self._marker_key(tag) for tag in tags],
+                    generation,
+                )
+            except Exception as e:
+                self._backend_failed("写入", e)
+            else:
+                if not written:
+                    # 其他 worker 在回源期间失效了标签，本进程的通知可能尚未送达
+                    for key in packed:
+                        self._l1_discard(key)
+
+    async def delete_many(self, keys: Sequence[str]) -> None:
+        """按完整键批量删除（L1、L2 与其他 worker 的 L1）"""
+        await self._invalidate(keys, ())
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        """失效标签关联的所有键"""
+        await self._invalidate((), tuple(tags))
+
+    async def _invalidate(self, keys: Sequence[str], tags: Sequence[str]) -> None:
+        if not self.enabled or not (keys or tags):
+            return
+        keys, tags = list(keys), list(tags)
+        self.invalidate_local(keys, tags)
+        if self.backend is None:
+            return
+        if not await self._backend_ready():
+            self._defer(keys, tags)
+            return
+        try:
+            if keys:
+                await self.backend.delete_many(keys)
+            if tags:
+                await self._invalidate_l2_tags(tags)
+            await self._publish(keys, tags)
+        except Exception as e:
+            self._backend_failed("失效", e)
+            self._defer(keys, tags)
+
+    # ------------------------------------------------------------------ 提交后失效
+
+    def invalidate_after_commit(self, tags: Iterable[str]) -> Optional[asyncio.Task]:
+        """事务提交后调用：立即清除本进程 L1，并在后台清除 L2（返回该任务）"""
+        tags = tuple(tags)
+        if not self.enabled or not tags:
+            return None
+        self.invalidate_local(tags=tags)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        task = loop.create_task(self.invalidate_tags(tags))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    # ------------------------------------------------------------------ 失效通知订阅
+
+    async def _run(self) -> None:
+        """后台循环：接收其他 worker 的失效通知并清除本进程 L1"""
+        while True:
+            try:
+                async for message in self.backend.listen(self.channel):
+                    payload = unpackb(message)
+                    if payload["origin"] != self.origin:
+                        self.invalidate_local(payload["keys"], payload["tags"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._backend_failed("订阅", e)
+            # 断开期间可能错过通知，重连前清空 L1
+            self.clear_local()
+            await asyncio.sleep(min(self.retry_interval, 5))
+
+    def start(self) -> None:
+        """启动失效通知订阅"""
+        if self._listener is not None or self.backend is None or not self.enabled:
+            return
+        self._listener = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止订阅，等待进行中的失效任务并关闭连接"""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.backend is not None:
+            await self.backend.close()
+
+
+def create_backend(kind: str, url: Optional[str] = None):
+    """按配置创建 L2"""
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "redis":
+        if not url:
+            raise ValueError("CACHE_BACKEND=redis 需要设置 REDIS_URL")
+        return RedisBackend(url)
+    if kind == "none":
+        return None
+    raise ValueError(f"不支持的缓存后端: {kind}")
+
+
+# 创建缓存实例
+cache = Cache(
+    backend=create_backend(settings.CACHE_BACKEND, settings.REDIS_URL),
+    prefix=settings.CACHE_KEY_PREFIX,
+    l1_ttl=settings.CACHE_L1_TTL,
+    l1_max_items=settings.CACHE_L1_MAX_ITEMS,
+    enabled=settings.CACHE_BACKEND != "none",
+)
+
+
+# ---------------------------------------------------------------------- 模型变更自动失效
+
+# 模型类 -> 实例对应的标签
+_model_tags: Dict[type, Callable[[Any], Iterable[str]]] = {}
+
+
+def register_model_tags(model: type, tags: Callable[[Any], Iterable[str]]) -> None:
+    """登记模型实例被新增、修改或删除时需要失效的标签（事务提交后失效）"""
+    _model_tags[model] = tags
+
+
+def invalidate_on_commit(session, tags: Iterable[str]) -> None:
+    """登记在当前事务提交后失效的标签（用于 Core update 等不经过 ORM 变更跟踪的写入）"""
+    session.info.setdefault("cache_tags", set()).update(tags)
+
+
+async def flush_invalidations(session) -> None:
+    """等待本会话提交后发起的 L2 失效完成（get_db 在返回响应前调用，保证下一个请求读不到旧值）"""
+    tasks = session.info.pop("cache_tasks", None)
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_tags(session, flush_context) -> None:
+    if not _model_tags:
+        return
+    tags = None
+    for instance in itertools.chain(session.new, session.dirty, session.deleted):
+        tag_fn = _model_tags.get(type(instance))
+        if tag_fn is not None:
+            if tags is None:
+                tags = session.info.setdefault("cache_tags", set())
+            tags.update(tag_fn(instance))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session) -> None:
+    tags = session.info.pop("cache_tags", None)
+    if tags:
+        task = cache.invalidate_after_commit(tags)
+        if task is not None:
+            session.info.setdefault("cache_tasks", []).append(task)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_tags(session) -> None:
+    session.info.pop("cache_tags", None)
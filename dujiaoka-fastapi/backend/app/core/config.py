@@ -29,10 +29,30 @@ class Settings(BaseSettings):
     # 数据库设置
     # 开发环境默认使用 SQLite，生产环境推荐 PostgreSQL
     DATABASE_URL: str = "sqlite+aiosqlite:///./dujiaoka_fastapi.db"
+    # 连接池（SQLite 文件库同样使用连接池，并发写入由 busy_timeout 排队）
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    SQLITE_BUSY_TIMEOUT: int = 30
+    # 启动时未迁移到最新版本的数据库是否执行 create_all 补建缺失的表（关闭后表结构完全由 alembic 管理）
+    SCHEMA_AUTO_CREATE: bool = True
 
     # Redis 设置（可选，用于缓存和会话）
     REDIS_URL: Optional[str] = "redis://localhost:6379/0"
 
+    # 缓存（后端 redis 使用 REDIS_URL 作为 L2；memory 为进程内 L2；none 关闭缓存）
+    # L1 为进程内 LRU，TTL 即其他 worker 修改数据后本进程最长可能读到旧值的时间（失效通知丢失时）
+    CACHE_BACKEND: str = "redis"
+    CACHE_KEY_PREFIX: str = "dujiaoka:"
+    CACHE_L1_TTL: float = 5
+    CACHE_L1_MAX_ITEMS: int = 10000
+    # 各类数据的缓存时间（秒）；商品列表中的库存与销量最多滞后 CACHE_PRODUCT_LIST_TTL 秒
+    CACHE_PRODUCT_TTL: int = 300
+    CACHE_PRODUCT_LIST_TTL: int = 15
+    CACHE_CATEGORY_TTL: int = 600
+    CACHE_USER_TTL: int = 300
+    CACHE_STATS_TTL: int = 60
+    CACHE_RANKING_TTL: int = 300
+
     # CORS 设置
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = [
         "http://localhost:3000",  # Vue 开发服务器
@@ -55,6 +75,22 @@ class Settings(BaseSettings):
     WECHAT_APP_ID: Optional[str] = None
     WECHAT_MCH_ID: Optional[str] = None
     WECHAT_PRIVATE_KEY: Optional[str] = None
+    WECHAT_API_KEY: Optional[str] = None  # 商户 API 密钥（APIv2），用于回调验签
+
+    # 回调验签（进程池大小，0 表示在线程池中执行；批大小；攒批等待毫秒数）
+    PAYMENT_SIGNATURE_WORKERS: int = 2
+    PAYMENT_SIGNATURE_BATCH_SIZE: int = 64
+    PAYMENT_SIGNATURE_BATCH_WINDOW_MS: int = 2
+
+    # 支付回调去重：进程内最近已处理交易号缓存大小
+    PAYMENT_CALLBACK_DEDUP_CACHE_SIZE: int = 10000
+
+    # 支付回调异步队列（每进程 worker 数，0 表示不启动）
+    PAYMENT_CALLBACK_WORKERS: int = 4
+    PAYMENT_CALLBACK_MAX_ATTEMPTS: int = 8
+    PAYMENT_CALLBACK_RETRY_BASE_SECONDS: int = 5
+    PAYMENT_CALLBACK_POLL_INTERVAL: float = 1.0
+    PAYMENT_CALLBACK_LEASE_SECONDS: int = 60
 
     # 文件上传设置
     UPLOAD_DIR: str = "uploads"
@@ -63,6 +99,66 @@ class Settings(BaseSettings):
     # 卡密加密密钥 (32字节 base64 编码)
     CARD_ENCRYPTION_KEY: str = "your-card-encryption-key-32-chars-minimum"
 
+    # 卡密过期清理（间隔秒数，0 表示关闭）
+    CARD_EXPIRY_SWEEP_INTERVAL: int = 60
+    CARD_EXPIRY_SWEEP_BATCH_SIZE: int = 500
+
+    # 未支付订单超时取消（超时分钟数；轮询间隔秒数，0 表示关闭）
+    ORDER_PAYMENT_TIMEOUT_MINUTES: int = 60 * 24
+    ORDER_TIMEOUT_BATCH_SIZE: int = 200
+    ORDER_TIMEOUT_POLL_INTERVAL: int = 30
+
+    # 商品销量、浏览数延迟写入（写入间隔秒数，0 表示不启动写入任务；
+    # 日志目录默认位于系统临时目录（按数据库区分），需在容器重建后保留未写入的计数时应挂载持久卷）
+    COUNTER_FLUSH_INTERVAL: float = 5
+    COUNTER_JOURNAL_DIR: Optional[str] = None
+
+    # 商品排行榜（每个榜单的商品数；主节点重新生成的间隔秒数，0 表示关闭）
+    RANKING_SIZE: int = 20
+    RANKING_REFRESH_INTERVAL: int = 60
+
+    # 订单归档（已发货 / 已取消且创建超过保留天数的订单连同支付记录移入归档表；
+    # 每批移动的订单数；主节点运行间隔秒数，0 表示关闭）
+    ORDER_ARCHIVE_AFTER_DAYS: int = 90
+    ORDER_ARCHIVE_BATCH_SIZE: int = 1000
+    ORDER_ARCHIVE_INTERVAL: int = 3600
+
+    # 后台任务主节点文件锁（非 PostgreSQL 数据库时使用）
+    LEADER_LOCK_FILE: str = "dujiaoka_scheduler.lock"
+
+    # 请求限流（规则以分号分隔：方法 路径 次数/周期 维度 [算法]，详见 app/core/rate_limit.py；
+    # 存储 memory 为进程内计数（多 worker 时各进程分别计数），redis 为所有 worker 共享计数）
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_RULES: str = (
+        "POST /api/v1/auth/login 10/minute ip;"
+        "POST /api/v1/auth/register 5/minute ip;"
+        "POST /api/v1/auth/change-password 5/minute user;"
+        "POST /api/v1/payments/{gateway}/callback 100/second ip bucket;"
+        "* /api/v1/* 300/minute user bucket;"
+        "* /api/v1/* 1200/minute ip bucket"
+    )
+    RATE_LIMIT_STORAGE: str = "memory"
+    RATE_LIMIT_REDIS_URL: Optional[str] = None
+
+    # 监控指标（多 worker 部署时指定 prometheus 多进程指标目录，需在每次启动前清空）
+    METRICS_ENABLED: bool = True
+    PROMETHEUS_MULTIPROC_DIR: Optional[str] = None
+
+    # 请求级查询统计（单请求查询数预算；同一语句形态重复执行达到阈值视为疑似 N+1；0 表示不检查）
+    QUERY_COUNTER_ENABLED: bool = True
+    QUERY_BUDGET_PER_REQUEST: int = 30
+    QUERY_REPEAT_THRESHOLD: int = 5
+
+    # 慢查询日志（阈值毫秒，0 表示关闭；最多保留的语句形态数；首次出现时是否抓取执行计划）
+    SLOW_QUERY_THRESHOLD_MS: float = 200
+    SLOW_QUERY_MAX_SHAPES: int = 500
+    SLOW_QUERY_EXPLAIN: bool = True
+
+    # 采样分析（单次最长秒数；多 worker 协调用的控制目录，默认位于系统临时目录）
+    PROFILER_ENABLED: bool = True
+    PROFILER_MAX_SECONDS: int = 60
+    PROFILER_CONTROL_DIR: Optional[str] = None
+
     @field_validator("SECRET_KEY", mode="after")
     @classmethod
     def validate_secret_key(cls, v: str, info: ValidationInfo) -> str:
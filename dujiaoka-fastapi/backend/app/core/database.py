@@ -1,10 +1,19 @@
 """
 数据库配置和连接
 """
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+import ast
+import re
+from pathlib import Path
+from typing import Any, Optional, Set
+
+from loguru import logger
+from sqlalchemy import Column, MetaData, PrimaryKeyConstraint, String, Table, Update, event, inspect, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
 
+from app.core.cache import flush_invalidations
 from app.core.config import settings
 
 
@@ -13,16 +22,47 @@ class Base(DeclarativeBase):
     pass
 
 
+def _engine_options(url: str) -> dict:
+    """按数据库类型选择连接池配置"""
+    database_url = make_url(url)
+    if database_url.get_backend_name() != "sqlite":
+        return {"pool_size": settings.DB_POOL_SIZE, "max_overflow": settings.DB_MAX_OVERFLOW}
+
+    if database_url.database in (None, "", ":memory:") or "mode=memory" in url:
+        # 内存库只存在于单个连接中，只能共享同一连接
+        return {"poolclass": StaticPool}
+
+    # 文件库：每个会话使用独立连接，保证事务互相隔离（共享单连接时一个会话的提交/回滚会波及其他会话）；
+    # aiosqlite 对文件库默认不复用连接，这里显式使用连接池，避免每个会话都新建连接线程
+    return {
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "connect_args": {"timeout": settings.SQLITE_BUSY_TIMEOUT},
+    }
+
+
 # 创建异步引擎
+_database_url = settings.DATABASE_URL.replace("mysql+mysqlconnector://", "mysql+aiomysql://")
 engine = create_async_engine(
-    settings.DATABASE_URL.replace("mysql+mysqlconnector://", "mysql+aiomysql://"),
+    _database_url,
     echo=settings.DEBUG,
     pool_pre_ping=True,
     pool_recycle=300,
-    poolclass=StaticPool,
+    **_engine_options(_database_url),
 )
 
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _configure_sqlite(dbapi_connection, connection_record):
+        """SQLite 使用 WAL：读不阻塞写，并发写入按 busy_timeout 排队"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT * 1000}")
+        cursor.close()
+
+
 # 创建异步会话工厂
 async_session_maker = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
@@ -35,10 +75,113 @@ async def get_db() -> AsyncSession:
         try:
             yield session
         finally:
+            # 响应发出前等待提交触发的缓存失效完成
+            await flush_invalidations(session)
             await session.close()
 
 
+async def update_returning(db: AsyncSession, stmt: Update, column, *key) -> Optional[Any]:
+    """
+    执行条件 UPDATE，返回更新后 column 的值，未匹配到行时返回 None
+
+    MySQL 不支持 UPDATE ... RETURNING：按受影响行数判断是否匹配，再在同一事务中按 key 条件重新读取
+    （行锁持有到事务结束，读到的即本次更新后的值）。
+    """
+    if db.bind.dialect.update_returning:
+        return (await db.execute(stmt.returning(column))).scalar_one_or_none()
+
+    if (await db.execute(stmt)).rowcount != 1:
+        return None
+    return (await db.execute(select(column).where(*key))).scalar_one()
+
+
 async def create_tables():
     """创建所有数据库表"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+
+
+# Alembic 迁移脚本目录与版本表（与 alembic 自身创建的版本表结构一致）
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "alembic" / "versions"
+_alembic_version = Table(
+    "alembic_version",
+    MetaData(),
+    Column("version_num", String(32), nullable=False),
+    PrimaryKeyConstraint("version_num", name="alembic_version_pkc"),
+)
+_REVISION_LINE = re.compile(r"^(revision|down_revision)\b[^=\n]*=(.+)$", re.MULTILINE)
+
+
+def migration_heads(versions_dir: Path = MIGRATIONS_DIR) -> Set[str]:
+    """迁移脚本的最新版本（只解析 revision / down_revision 赋值行，不导入 alembic）"""
+    revisions = set()
+    parents = set()
+    for path in versions_dir.glob("*.py"):
+        for name, value in _REVISION_LINE.findall(path.read_text(encoding="utf-8")):
+            value = ast.literal_eval(value.strip())
+            if name == "revision":
+                revisions.add(value)
+            elif isinstance(value, str):
+                parents.add(value)
+            elif value:
+                parents.update(value)
+    return revisions - parents
+
+
+def _ensure_schema(connection, heads: Set[str]) -> str:
+    """按数据库的迁移版本决定是否执行 create_all（在同步连接上运行）"""
+    inspector = inspect(connection)
+    if inspector.has_table(_alembic_version.name):
+        current = set(connection.execute(select(_alembic_version.c.version_num)).scalars())
+        if current == heads:
+            return "已是最新迁移版本，跳过建表"
+        logger.warning(
+            f"数据库迁移版本 {sorted(current)} 与迁移脚本最新版本 {sorted(heads)} 不一致，"
+            "请执行 alembic upgrade head"
+        )
+        if not settings.SCHEMA_AUTO_CREATE:
+            return "迁移版本不一致，未建表"
+        Base.metadata.create_all(connection)
+        return "迁移版本不一致，已补建缺失的表"
+
+    if not settings.SCHEMA_AUTO_CREATE:
+        logger.warning("数据库尚未初始化，请执行 alembic upgrade head")
+        return "未初始化，未建表"
+
+    fresh = not inspector.get_table_names()
+    Base.metadata.create_all(connection)
+    if not fresh:
+        # 早期由 create_all 建立、未纳入迁移管理的数据库：已有的表不会补齐新增的列
+        logger.warning("数据库缺少迁移版本记录，请确认表结构后执行 alembic stamp head 或 alembic upgrade head")
+        return "无迁移版本记录，已补建缺失的表"
+
+    # 空库按当前模型建表后即与最新迁移一致，记录版本号，之后的启动直接跳过建表
+    _alembic_version.create(connection)
+    connection.execute(_alembic_version.insert(), [{"version_num": head} for head in sorted(heads)])
+    return "空库建表完成，已记录迁移版本"
+
+
+# 本进程已完成的表结构检查结果；gunicorn master 在 fork 前检查一次，worker 继承后不再重复建表
+_schema_state: Optional[str] = None
+
+
+async def ensure_schema(bind: Optional[AsyncEngine] = None) -> str:
+    """
+    启动时的表结构检查：数据库已迁移到最新版本时跳过 create_all，返回检查结果
+
+    bind 指定其他数据库的引擎时（如 seed_data.py --database-url）每次都检查，结果不缓存。
+    """
+    global _schema_state
+    if bind is not None and bind is not engine:
+        import app.models  # noqa: F401  确保所有模型已注册到 Base.metadata
+
+        async with bind.begin() as conn:
+            return await conn.run_sync(_ensure_schema, migration_heads())
+
+    if _schema_state is None:
+        import app.models  # noqa: F401  确保所有模型已注册到 Base.metadata
+
+        heads = migration_heads()
+        async with engine.begin() as conn:
+            _schema_state = await conn.run_sync(_ensure_schema, heads)
+    return _schema_state
@@ -5,7 +5,6 @@ from typing import Generator
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
@@ -33,7 +32,7 @@ async def get_current_user(
     if username is None:
         raise credentials_exception
 
-    user = await user_service.get_by_username(db, username=username)
+    user = await user_service.get_by_username_cached(db, username=username)
     if user is None:
         raise credentials_exception
 
@@ -0,0 +1,21 @@
+"""
+gunicorn worker
+
+在 uvicorn 自带的 UvicornWorker 基础上限定优雅退出的等待时间：
+收到 SIGTERM 后停止接收新连接，最多等待 graceful_timeout 减去预留时间让处理中的请求完成，
+剩余时间留给 shutdown 事件（停止后台任务、释放主节点锁），避免被 master 强制杀掉。
+"""
+from uvicorn.workers import UvicornWorker
+
+# 为 shutdown 事件预留的秒数
+SHUTDOWN_RESERVE_SECONDS = 5
+
+
+class GracefulUvicornWorker(UvicornWorker):
+    """限定请求排空时间的 UvicornWorker"""
+
+    CONFIG_KWARGS = {"loop": "auto", "http": "auto", "lifespan": "on"}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.config.timeout_graceful_shutdown = max(1, self.cfg.graceful_timeout - SHUTDOWN_RESERVE_SECONDS)
@@ -0,0 +1,125 @@
+"""
+后台任务主节点选举
+多个 worker 同时运行时，只有持有锁的进程执行定时任务：
+- PostgreSQL：会话级 advisory lock，持锁连接断开即自动释放（每次确认时检查连接，断开后放弃主节点身份）
+- SQLite 等：本地文件锁，进程退出即自动释放
+"""
+import asyncio
+import os
+from typing import IO, Optional
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.core.config import settings
+from app.core.database import engine
+
+# advisory lock 的固定键
+ADVISORY_LOCK_KEY = 725_100_026
+
+
+def _try_lock_file(fd: int) -> bool:
+    """非阻塞地获取文件锁"""
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+class LeaderLock:
+    """主节点锁"""
+
+    def __init__(self, lock_file: str):
+        self.lock_file = lock_file
+        self._conn: Optional[AsyncConnection] = None
+        self._file: Optional[IO] = None
+        # 多个后台任务共用持锁连接，检查与获取需串行
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_leader(self) -> bool:
+        return self._conn is not None or self._file is not None
+
+    async def ensure(self) -> bool:
+        """确保持有锁（未持有时尝试获取），返回当前是否为主节点"""
+        async with self._lock:
+            if self._conn is not None:
+                await self._check_connection()
+            if self.is_leader:
+                return True
+            return await self._acquire()
+
+    async def _check_connection(self) -> None:
+        """检查持锁连接，连接已断开时锁已被数据库释放，丢弃连接"""
+        try:
+            await self._conn.execute(text("SELECT 1"))
+            await self._conn.commit()
+        except Exception as e:
+            logger.warning(f"主节点锁连接已断开，进程 {os.getpid()} 不再是主节点: {e}")
+            conn, self._conn = self._conn, None
+            try:
+                await conn.invalidate()
+                await conn.close()
+            except Exception:
+                pass
+
+    async def _acquire(self) -> bool:
+        """尝试获取锁"""
+        try:
+            if engine.dialect.name == "postgresql":
+                acquired = await self._acquire_advisory_lock()
+            else:
+                acquired = self._acquire_file_lock()
+        except Exception as e:
+            logger.error(f"获取主节点锁失败: {e}")
+            return False
+
+        if acquired:
+            logger.info(f"🏁 进程 {os.getpid()} 成为后台任务主节点")
+        return acquired
+
+    async def _acquire_advisory_lock(self) -> bool:
+        conn = await engine.connect()
+        result = await conn.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}
+        )
+        if result.scalar():
+            # 会话级锁不随事务结束释放，提交以免连接长期处于事务中
+            await conn.commit()
+            self._conn = conn
+            return True
+        await conn.close()
+        return False
+
+    def _acquire_file_lock(self) -> bool:
+        f = open(self.lock_file, "a+")
+        if _try_lock_file(f.fileno()):
+            self._file = f
+            return True
+        f.close()
+        return False
+
+    async def release(self) -> None:
+        """释放锁"""
+        if self._conn is not None:
+            try:
+                await self._conn.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY}
+                )
+            finally:
+                await self._conn.close()
+                self._conn = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# 创建全局实例
+leader_lock = LeaderLock(settings.LEADER_LOCK_FILE)
@@ -0,0 +1,248 @@
+"""
+监控指标
+基于 prometheus_client 定义全局指标，并提供 Prometheus 文本格式导出
+
+多 worker 部署时设置 PROMETHEUS_MULTIPROC_DIR：各进程把指标写入该目录下的 mmap 文件，
+/metrics 由任一 worker 汇总全部进程的数据。该目录需在每次启动前清空。
+"""
+import os
+import time
+
+from app.core.config import settings
+
+# prometheus_client 在导入时决定指标的存储方式，多进程目录必须先于导入设置
+if settings.PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(settings.PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.PROMETHEUS_MULTIPROC_DIR)
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+
+# HTTP 请求
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP 请求处理耗时（秒），按路由模板统计",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "正在处理中的 HTTP 请求数",
+    multiprocess_mode="livesum",
+)
+
+# 数据库连接池（由连接池事件维护）
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "连接池已建立的数据库连接数",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "当前被借出使用的数据库连接数",
+    multiprocess_mode="livesum",
+)
+
+# 业务指标
+ORDERS_CREATED_TOTAL = Counter(
+    "orders_created_total",
+    "创建的订单总数",
+    ["payment_method"],
+)
+PAYMENTS_SUCCEEDED_TOTAL = Counter(
+    "payments_succeeded_total",
+    "支付成功总数",
+    ["payment_method"],
+)
+PAYMENTS_NEEDING_ATTENTION_TOTAL = Counter(
+    "payments_needing_attention_total",
+    "已收款但订单未按正常流程完成的支付数（paid_after_cancel: 超时取消后付款，已恢复订单并发货；"
+    "order_not_payable: 订单已取消或已支付，需人工退款；"
+    "delivery_failed: 收款已确认但发货失败（如库存不足），订单保持已支付，需人工补发或退款）",
+    ["reason"],
+)
+STOCK_EXHAUSTED_TOTAL = Counter(
+    "product_stock_exhausted_total",
+    "商品库存耗尽次数（sold_out: 扣减后库存归零；insufficient: 因库存不足拒绝下单）",
+    ["reason"],
+)
+
+
+# 卡密过期清理
+CARD_EXPIRY_SWEEP_DURATION = Histogram(
+    "card_expiry_sweep_duration_seconds",
+    "卡密过期清理单次运行耗时（秒）",
+)
+CARD_EXPIRY_SWEEP_BATCH_SIZE = Histogram(
+    "card_expiry_sweep_batch_size",
+    "卡密过期清理每批更新的行数",
+    buckets=(0, 1, 10, 50, 100, 250, 500, 1000, 5000),
+)
+CARDS_EXPIRED_TOTAL = Counter(
+    "cards_expired_total",
+    "被标记为过期的卡密总数",
+)
+
+# 订单超时取消
+ORDER_TIMEOUT_PENDING = Gauge(
+    "order_timeout_pending",
+    "超时调度器中等待到期的订单数",
+    multiprocess_mode="livemax",
+)
+ORDERS_AUTO_CANCELLED_TOTAL = Counter(
+    "orders_auto_cancelled_total",
+    "超时未支付被自动取消的订单总数",
+)
+
+# 订单归档
+ORDERS_ARCHIVED_TOTAL = Counter(
+    "orders_archived_total",
+    "移入归档表的订单总数",
+)
+
+# 支付回调队列
+PAYMENT_CALLBACK_QUEUE_DEPTH = Gauge(
+    "payment_callback_queue_depth",
+    "待处理（含处理中）的支付回调任务数",
+    multiprocess_mode="livemax",
+)
+PAYMENT_CALLBACK_OLDEST_AGE = Gauge(
+    "payment_callback_oldest_age_seconds",
+    "最早一条待处理支付回调任务的等待时长（秒）",
+    multiprocess_mode="livemax",
+)
+PAYMENT_CALLBACK_LAG = Histogram(
+    "payment_callback_lag_seconds",
+    "支付回调从接收到处理完成的延迟（秒）",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900),
+)
+PAYMENT_CALLBACK_JOBS_TOTAL = Counter(
+    "payment_callback_jobs_total",
+    "支付回调任务处理结果计数",
+    ["result"],
+)
+
+# 请求限流
+RATE_LIMIT_REJECTED_TOTAL = Counter(
+    "rate_limit_rejected_total",
+    "被限流拒绝的请求数，按触发的规则统计",
+    ["rule"],
+)
+RATE_LIMIT_BACKEND_ERRORS_TOTAL = Counter(
+    "rate_limit_backend_errors_total",
+    "限流 Redis 存储出错（临时改用进程内存储）的次数",
+)
+
+# 商品计数延迟写入
+COUNTER_FLUSHED_TOTAL = Counter(
+    "product_counter_flushed_total",
+    "批量写入数据库的商品计数增量",
+    ["field"],
+)
+COUNTER_FLUSH_ERRORS_TOTAL = Counter(
+    "product_counter_flush_errors_total",
+    "商品计数批量写入失败（保留日志稍后重试）的次数",
+)
+
+# 缓存
+CACHE_REQUESTS_TOTAL = Counter(
+    "cache_requests_total",
+    "缓存读取次数（l1_hit: 进程内命中；l2_hit: Redis 命中；miss: 未命中）",
+    ["namespace", "result"],
+)
+CACHE_BACKEND_ERRORS_TOTAL = Counter(
+    "cache_backend_errors_total",
+    "缓存 Redis 出错（临时只使用进程内缓存）的次数",
+    ["operation"],
+)
+
+
+class MetricsMiddleware:
+    """HTTP 请求耗时与并发数统计中间件（纯 ASGI 实现）"""
+
+    def __init__(self, app):
+        self.app = app
+        # (method, route, status) -> 已绑定标签的直方图，避免每个请求都调用 labels()
+        self._histograms = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+
+            # 按路由模板聚合（/orders/{order_id}），未匹配路由的请求归为一类，避免标签基数失控
+            route = scope.get("route")
+            key = (scope["method"], getattr(route, "path", "<unmatched>"), status_code)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = HTTP_REQUEST_DURATION.labels(
+                    key[0], key[1], str(key[2])
+                )
+            histogram.observe(duration)
+
+
+def _on_connect(dbapi_connection, connection_record):
+    DB_POOL_CONNECTIONS.inc()
+
+
+def _on_close(dbapi_connection, connection_record):
+    DB_POOL_CONNECTIONS.dec()
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKED_OUT.inc()
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    DB_POOL_CHECKED_OUT.dec()
+
+
+def install_pool_metrics(pool: Pool) -> None:
+    """在连接池上注册连接数统计事件（异步引擎传入 engine.sync_engine.pool）"""
+    if event.contains(pool, "connect", _on_connect):
+        return
+    event.listen(pool, "connect", _on_connect)
+    event.listen(pool, "close", _on_close)
+    event.listen(pool, "checkout", _on_checkout)
+    event.listen(pool, "checkin", _on_checkin)
+
+
+def mark_process_dead(pid: int) -> None:
+    """多进程模式下清理已退出 worker 的实时指标（供进程管理器的 worker 退出钩子调用）"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(pid)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """导出 Prometheus 文本格式的指标数据"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # 多进程模式：每次抓取时汇总所有 worker 写入的指标文件
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
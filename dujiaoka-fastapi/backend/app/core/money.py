@@ -0,0 +1,69 @@
+"""
+金额（整数分）
+
+金额在数据库中以 BIGINT 分存储，服务层直接用整数分计算、比较与汇总，结果精确且比 Decimal 快；
+只在接口边界（请求参数、响应模型、网关报文、对账单）与元互相转换：
+- to_cents()：元 -> 分。字符串按十进制逐位解析（网关报文、对账单），浮点数四舍五入到分
+- to_yuan() / format_yuan()：分 -> 元（JSON 数字 / 两位小数字符串）
+- yuan_property()：模型上以元读写的金额视图，供 Pydantic 模型 from_attributes 与按元构造模型使用
+"""
+from typing import Optional, Union
+
+Yuan = Union[str, int, float]
+
+
+def to_cents(value: Optional[Yuan]) -> Optional[int]:
+    """
+    金额（元）转换为分
+
+    两位小数以内的浮点数乘 100 后的误差远小于 0.5，四舍五入即得精确结果；
+    字符串不经浮点数，小数超过两位且不为 0 时视为无效金额。
+    """
+    if type(value) is str and value.isascii():
+        # 常见格式（"19.99"、"19.9"、"19"）直接按整数解析，其余（符号、空白、多余的 0）走通用解析
+        whole, dot, fraction = value.partition(".")
+        if whole.isdigit() and len(fraction) <= 2 and (fraction.isdigit() or not dot):
+            return int(whole) * 100 + int(fraction.ljust(2, "0"))
+    if value is None or value == "":
+        return None
+    if isinstance(value, float):
+        return round(value * 100)
+    if isinstance(value, int):
+        return value * 100
+
+    whole, _, fraction = str(value).strip().partition(".")
+    if len(fraction) > 2:
+        if fraction[2:].strip("0"):
+            raise ValueError(f"金额最多精确到分: {value}")
+        fraction = fraction[:2]
+    digits = whole.lstrip("+-") + fraction
+    if len(whole) + len(fraction) - len(digits) > 1 or not digits.isdigit() or not digits.isascii():
+        raise ValueError(f"无效的金额: {value}")
+    return int(whole + fraction.ljust(2, "0"))
+
+
+def to_yuan(cents: Optional[int]) -> Optional[float]:
+    """金额（分）转换为元"""
+    if cents is None:
+        return None
+    return cents / 100
+
+
+def format_yuan(cents: Optional[int]) -> Optional[str]:
+    """金额（分）格式化为两位小数的元，如 1999 -> "19.99\""""
+    if cents is None:
+        return None
+    sign = "-" if cents < 0 else ""
+    yuan, fen = divmod(abs(cents), 100)
+    return f"{sign}{yuan}.{fen:02d}"
+
+
+def yuan_property(cents_attr: str) -> property:
+    """以元读写的金额属性（实际存取 cents_attr 列）"""
+    def fget(self) -> Optional[float]:
+        return to_yuan(getattr(self, cents_attr))
+
+    def fset(self, value: Optional[Yuan]) -> None:
+        setattr(self, cents_attr, to_cents(value))
+
+    return property(fget, fset, doc=f"金额（元），存储于 {cents_attr}")
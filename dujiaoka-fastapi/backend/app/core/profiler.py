@@ -0,0 +1,242 @@
+"""
+采样分析器
+
+后台线程按固定间隔抓取各线程的调用栈（sys._current_frames），统计为：
+- 折叠栈（collapsed stacks，"根;...;叶 次数"），可直接交给 flamegraph.pl / speedscope 生成火焰图
+- 函数排行：自身采样数（位于栈顶）与累计采样数（出现在栈中）
+
+开启协程采样时，还会沿 cr_await 链展开事件循环中挂起的 asyncio 任务，
+以 "[await] 最外层协程" 为根记录等待点，使 await 中的时间也能归属到具体代码。
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_profile_lock = threading.Lock()
+
+# 事件循环线程的根标签
+_LOOP_THREAD_LABEL = "thread:event-loop"
+
+
+def _frame_label(code) -> str:
+    """函数标签：限定名 (短路径:定义行号)"""
+    name = getattr(code, "co_qualname", code.co_name)
+    filename = code.co_filename.replace("\\", "/")
+    short = "/".join(filename.rsplit("/", 3)[-3:])
+    return f"{name} ({short}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _thread_stack(frame: Optional[FrameType]) -> List[str]:
+    """线程调用栈（根在前）"""
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _await_stack(coro) -> List[str]:
+    """沿 cr_await / gi_yieldfrom 链展开挂起协程的等待栈（根在前）"""
+    stack = []
+    seen = 0
+    while coro is not None and seen < 128:
+        seen += 1
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            # 到达 Future 等非协程对象，记录等待对象类型作为叶子
+            stack.append(f"<{type(coro).__name__}>")
+            break
+        stack.append(_frame_label(frame.f_code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return stack
+
+
+class ProfileResult:
+    """采样结果"""
+
+    def __init__(self):
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.duration = 0.0
+
+    def add(self, stack: Iterable[str], count: int = 1) -> None:
+        self.stacks[";".join(stack)] += count
+
+    def merge(self, other: "ProfileResult", prefix: Optional[str] = None) -> None:
+        """合并另一份结果（prefix 作为新的根节点，如 worker 进程号）"""
+        for stack, count in other.stacks.items():
+            self.stacks[f"{prefix};{stack}" if prefix else stack] += count
+        self.samples += other.samples
+        self.duration = max(self.duration, other.duration)
+
+    def collapsed(self) -> str:
+        """折叠栈文本"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    @classmethod
+    def from_collapsed(cls, text: str, samples: int = 0, duration: float = 0.0) -> "ProfileResult":
+        result = cls()
+        for line in text.splitlines():
+            stack, _, count = line.rpartition(" ")
+            if stack and count.isdigit():
+                result.stacks[stack] += int(count)
+        result.samples = samples
+        result.duration = duration
+        return result
+
+    def top_functions(self, limit: int = 30) -> List[Dict]:
+        """函数排行（线程栈，按自身采样数）"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        weight = 0
+        for frames, count in self._split(awaits=False):
+            weight += count
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+
+        weight = weight or 1
+        return [
+            {
+                "function": function,
+                "self": count,
+                "total": total[function],
+                "self_percent": round(count * 100 / weight, 2),
+                "total_percent": round(total[function] * 100 / weight, 2),
+            }
+            for function, count in own.most_common(limit)
+        ]
+
+    def top_await_points(self, limit: int = 30) -> List[Dict]:
+        """挂起任务的等待点排行（最内层协程函数，按采样数）"""
+        points: Counter = Counter()
+        for frames, count in self._split(awaits=True):
+            code_frames = [frame for frame in frames if not frame.startswith("<")]
+            if code_frames:
+                points[code_frames[-1]] += count
+        return [{"function": function, "samples": count} for function, count in points.most_common(limit)]
+
+    def _split(self, awaits: bool):
+        """按根节点区分线程栈与任务等待栈（跳过 pid/thread/[await] 等标签节点）"""
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            is_await = any(frame.startswith("[await] ") for frame in frames)
+            if is_await != awaits:
+                continue
+            frames = [
+                frame.replace("[await] ", "", 1) if frame.startswith("[await] ") else frame
+                for frame in frames
+                if not frame.startswith(("pid:", "thread:"))
+            ]
+            if frames:
+                yield frames, count
+
+
+class SamplingProfiler:
+    """采样分析器（在独立线程中运行，对被采样线程无插桩开销）"""
+
+    def __init__(
+        self,
+        interval: float,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        loop_thread_id: Optional[int] = None,
+        include_tasks: bool = True,
+    ):
+        self.interval = interval
+        self.loop = loop
+        self.loop_thread_id = loop_thread_id
+        self.include_tasks = include_tasks and loop is not None
+
+    def run(self, seconds: float) -> ProfileResult:
+        """阻塞采样 seconds 秒"""
+        result = ProfileResult()
+        started = time.perf_counter()
+        deadline = started + seconds
+
+        # 缩短 GIL 切换间隔，否则采样线程只能在事件循环释放 GIL（阻塞在 select）时取得采样机会，
+        # 导致短时的 CPU 密集代码几乎采不到
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch_interval, self.interval / 4))
+        try:
+            self._sample_until(deadline, result)
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        result.duration = time.perf_counter() - started
+        return result
+
+    def _sample_until(self, deadline: float, result: ProfileResult) -> None:
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while time.perf_counter() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id == self.loop_thread_id:
+                    root = _LOOP_THREAD_LABEL
+                else:
+                    if thread_id not in names:
+                        names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    root = f"thread:{names.get(thread_id, thread_id)}"
+                result.add([root, *_thread_stack(frame)])
+
+            if self.include_tasks:
+                for stack in self._task_stacks():
+                    result.add(stack)
+
+            result.samples += 1
+            time.sleep(self.interval)
+
+    def _task_stacks(self) -> List[Tuple[str, ...]]:
+        """挂起中的 asyncio 任务的等待栈（正在运行的任务已包含在事件循环线程栈中）"""
+        try:
+            tasks = asyncio.all_tasks(self.loop)
+        except RuntimeError:
+            return []
+
+        stacks = []
+        for task in tasks:
+            coro = task.get_coro()
+            if coro is None or getattr(coro, "cr_running", False):
+                continue
+            stack = _await_stack(coro)
+            if stack:
+                stacks.append((f"[await] {stack[0]}", *stack[1:]))
+        return stacks
+
+
+async def profile(seconds: float, interval_ms: float, include_tasks: bool = True) -> ProfileResult:
+    """在当前进程中采样 seconds 秒（同一进程同时只允许一次采样）"""
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("当前进程已有采样在进行中")
+    try:
+        profiler = SamplingProfiler(
+            interval=interval_ms / 1000,
+            loop=asyncio.get_running_loop(),
+            loop_thread_id=threading.get_ident(),
+            include_tasks=include_tasks,
+        )
+        # 采样线程独立运行，事件循环在采样期间照常处理请求
+        thread_result: List[ProfileResult] = []
+        thread = threading.Thread(
+            target=lambda: thread_result.append(profiler.run(seconds)),
+            name="sampling-profiler",
+            daemon=True,
+        )
+        thread.start()
+        while thread.is_alive():
+            await asyncio.sleep(min(0.1, seconds))
+        return thread_result[0] if thread_result else ProfileResult()
+    finally:
+        _profile_lock.release()
+
+
+def worker_label() -> str:
+    """worker 根节点标签"""
+    return f"pid:{os.getpid()}"
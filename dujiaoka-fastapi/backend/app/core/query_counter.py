@@ -0,0 +1,151 @@
+"""
+请求级 SQL 查询统计与 N+1 检测
+
+通过 SQLAlchemy 的 before/after_cursor_execute 事件统计当前上下文（contextvars）中
+执行的语句数与数据库耗时：
+- QueryCounterMiddleware：为每个 HTTP 请求开启统计，写入 Server-Timing 响应头，
+  超出查询预算或同一语句形态重复执行过多（疑似 N+1）时记录警告日志
+- count_queries()：在脚本/测试中统计一段代码的查询，配合 QueryStats.assert_max 断言查询数
+"""
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+_current_stats: ContextVar[Optional["QueryStats"]] = ContextVar("query_stats", default=None)
+
+# 语句形态归一化：合并空白，IN 列表 / 批量 VALUES 中重复的占位符折叠为一个
+_WHITESPACE_RE = re.compile(r"\s+")
+_PLACEHOLDER_LIST_RE = re.compile(r"\(\s*(\?|%s|\$\d+|:\w+)(\s*,\s*(\?|%s|\$\d+|:\w+))+\s*\)")
+_VALUES_LIST_RE = re.compile(r"(VALUES\s*\([^)]*\))(\s*,\s*\([^)]*\))+", re.IGNORECASE)
+
+
+def normalize_statement(statement: str) -> str:
+    """归一化 SQL 语句，用于按形态统计重复执行"""
+    shape = _WHITESPACE_RE.sub(" ", statement).strip()
+    shape = _PLACEHOLDER_LIST_RE.sub("(?)", shape)
+    return _VALUES_LIST_RE.sub(r"\1", shape)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """查询数超出预期"""
+
+
+class QueryStats:
+    """一个统计范围内的查询数、数据库耗时与语句形态分布"""
+
+    def __init__(self, parent: Optional["QueryStats"] = None):
+        self.parent = parent
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        shape = normalize_statement(statement)
+        stats = self
+        while stats is not None:
+            stats.count += 1
+            stats.duration += duration
+            stats.shapes[shape] += 1
+            stats = stats.parent
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """执行次数达到阈值的语句形态（按次数倒序）"""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    def server_timing(self) -> str:
+        """Server-Timing 响应头取值"""
+        return f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries"'
+
+    def assert_max(self, max_queries: int) -> None:
+        """断言查询数不超过 max_queries"""
+        if self.count > max_queries:
+            top = "\n".join(f"  {n}x {shape[:200]}" for shape, n in self.shapes.most_common(5))
+            raise QueryBudgetExceeded(f"执行了 {self.count} 条查询，预期不超过 {max_queries}:\n{top}")
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryStats]:
+    """统计代码块内执行的查询（可嵌套，内层查询同时计入外层）"""
+    stats = QueryStats(parent=_current_stats.get())
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # 开始时间记在本次执行的上下文上，语句执行失败时随上下文一起丢弃，不会残留在连接上
+    if _current_stats.get() is not None and context is not None:
+        context._query_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None:
+        return
+    start = getattr(context, "_query_start_time", None)
+    duration = time.perf_counter() - start if start is not None else 0.0
+    stats.record(statement, duration)
+
+
+def install_query_counter(engine: Engine) -> None:
+    """在同步引擎上注册查询统计事件（异步引擎传入 engine.sync_engine）"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryCounterMiddleware:
+    """请求级查询统计中间件（纯 ASGI 实现）"""
+
+    def __init__(self, app, budget: Optional[int] = None, repeat_threshold: Optional[int] = None):
+        self.app = app
+        self.budget = settings.QUERY_BUDGET_PER_REQUEST if budget is None else budget
+        self.repeat_threshold = (
+            settings.QUERY_REPEAT_THRESHOLD if repeat_threshold is None else repeat_threshold
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with count_queries() as stats:
+            async def send_wrapper(message):
+                # 流式响应在响应头发出之后的查询不计入 Server-Timing，但仍参与预算检查
+                if message["type"] == "http.response.start" and stats.count:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", stats.server_timing().encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                self._check(scope, stats)
+
+    def _check(self, scope, stats: QueryStats) -> None:
+        if not stats.count:
+            return
+        route = scope.get("route")
+        path = getattr(route, "path", None) or scope.get("path", "")
+        endpoint = f"{scope.get('method', '')} {path}"
+
+        if self.budget and stats.count > self.budget:
+            logger.warning(
+                f"查询预算超限: {endpoint} 执行 {stats.count} 条查询"
+                f"（预算 {self.budget}），数据库耗时 {stats.duration * 1000:.1f}ms"
+            )
+        if self.repeat_threshold:
+            for shape, n in stats.repeated(self.repeat_threshold):
+                logger.warning(f"疑似 N+1 查询: {endpoint} 重复执行 {n} 次: {shape[:200]}")
@@ -0,0 +1,370 @@
+"""
+请求限流
+
+规则来自 settings.RATE_LIMIT_RULES，以分号分隔，每条规则格式为：
+
+    <方法|*> <路径> <次数>/<second|minute|hour|day> <维度> [window|bucket]
+
+- 路径支持 {参数} 占位符，末尾的 * 表示前缀匹配，如 /api/v1/payments/{gateway}/callback、/api/v1/*
+- 维度：ip 按客户端地址；user 按登录用户（未携带有效令牌的请求不受该规则约束）；route 按路由整体
+- 算法：window 滑动窗口计数（默认，用上一窗口计数按时间加权估算）；bucket 令牌桶（允许突发，容量为次数）
+
+一个请求匹配的所有规则依次检查，任一规则超限即返回 429。
+计数保存在进程内的分片存储中（多 worker 时各进程分别计数）；
+RATE_LIMIT_STORAGE=redis 时所有 worker 共享 Redis 计数，Redis 不可用时临时退回进程内存储。
+"""
+import math
+import re
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import orjson
+from loguru import logger
+
+from app.core.config import settings
+from app.core.metrics import RATE_LIMIT_BACKEND_ERRORS_TOTAL, RATE_LIMIT_REJECTED_TOTAL
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+KEY_TYPES = ("ip", "user", "route")
+ALGORITHMS = ("window", "bucket")
+
+
+class Decision(NamedTuple):
+    """一次限流检查的结果"""
+    allowed: bool
+    remaining: int
+    retry_after: float
+
+
+class RateLimitRule:
+    """限流规则"""
+
+    def __init__(self, method: str, path: str, limit: int, period: int, key: str, algorithm: str = "window"):
+        self.method = method.upper()
+        self.path = path
+        self.limit = limit
+        self.period = period
+        self.key = key
+        self.algorithm = algorithm
+        self.name = f"{self.method} {path} {key}"
+        self.pattern = None
+        if "{" in path or path.endswith("*"):
+            regex = re.sub(r"\\{[^/]+?\\}", "[^/]+", re.escape(path.rstrip("*")))
+            self.pattern = re.compile(regex + (".*" if path.endswith("*") else "") + "$")
+
+    @classmethod
+    def parse(cls, text: str) -> "RateLimitRule":
+        """解析一条规则"""
+        parts = text.split()
+        if len(parts) not in (4, 5):
+            raise ValueError(f"限流规则格式错误: {text!r}（应为: 方法 路径 次数/周期 维度 [算法]）")
+        method, path, rate, key = parts[:4]
+        algorithm = parts[4] if len(parts) == 5 else "window"
+        count, _, unit = rate.partition("/")
+        if not count.isdigit() or int(count) <= 0 or unit not in PERIODS:
+            raise ValueError(f"限流规则次数错误: {rate!r}（如 10/minute，周期为 second/minute/hour/day）")
+        if key not in KEY_TYPES:
+            raise ValueError(f"限流规则维度错误: {key!r}（可选 {'/'.join(KEY_TYPES)}）")
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"限流规则算法错误: {algorithm!r}（可选 {'/'.join(ALGORITHMS)}）")
+        return cls(method, path, int(count), PERIODS[unit], key, algorithm)
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.method != "*" and self.method != method:
+            return False
+        if self.pattern is not None:
+            return self.pattern.match(path) is not None
+        return self.path == path
+
+    @property
+    def ttl(self) -> float:
+        """计数状态的保留时长（秒）"""
+        return self.period * 2 if self.algorithm == "window" else self.period
+
+    def apply(self, state: Optional[list], now: float) -> Tuple[list, Decision]:
+        """在计数状态上记一次请求，返回新状态与检查结果（进程内存储使用，与 Redis 脚本逻辑一致）"""
+        if self.algorithm == "bucket":
+            return self._apply_bucket(state, now)
+        return self._apply_window(state, now)
+
+    def _apply_bucket(self, state: Optional[list], now: float) -> Tuple[list, Decision]:
+        rate = self.limit / self.period
+        tokens, updated = state if state is not None else (float(self.limit), now)
+        tokens = min(float(self.limit), tokens + max(0.0, now - updated) * rate)
+        if tokens >= 1:
+            tokens -= 1
+            return [tokens, now], Decision(True, int(tokens), 0.0)
+        return [tokens, now], Decision(False, 0, (1 - tokens) / rate)
+
+    def _apply_window(self, state: Optional[list], now: float) -> Tuple[list, Decision]:
+        window = int(now // self.period)
+        current, previous = 0, 0
+        if state is not None:
+            if state[0] == window:
+                current, previous = state[1], state[2]
+            elif state[0] == window - 1:
+                previous = state[1]
+        elapsed = now - window * self.period
+        estimate = previous * (1 - elapsed / self.period) + current
+        if estimate + 1 <= self.limit:
+            current += 1
+            return [window, current, previous], Decision(True, int(self.limit - estimate - 1), 0.0)
+        if previous and current + 1 <= self.limit:
+            # 等上一窗口的权重衰减到足以容纳本次请求
+            retry_after = (1 - (self.limit - current - 1) / previous) * self.period - elapsed
+        else:
+            retry_after = self.period - elapsed
+        return [window, current, previous], Decision(False, 0, max(retry_after, 0.0))
+
+
+def parse_rules(text: str) -> List[RateLimitRule]:
+    """解析分号分隔的规则列表"""
+    return [RateLimitRule.parse(item) for item in text.split(";") if item.strip()]
+
+
+class MemoryStore:
+    """进程内分片存储
+
+    键按哈希分布到多个分片，每个分片一把锁、一个按最近更新排序的 OrderedDict；
+    每次检查顺带从分片头部淘汰最多两个过期或超出容量的键，单次检查为 O(1)。
+    """
+
+    def __init__(self, shards: int = 16, max_keys: int = 100_000):
+        self._shards = [OrderedDict() for _ in range(shards)]
+        self._locks = [Lock() for _ in range(shards)]
+        self._max_keys_per_shard = max(1, max_keys // shards)
+
+    async def hit(self, key: str, rule: RateLimitRule, now: Optional[float] = None) -> Decision:
+        now = time.time() if now is None else now
+        index = hash(key) % len(self._shards)
+        shard = self._shards[index]
+        with self._locks[index]:
+            entry = shard.get(key)
+            state = entry[1] if entry is not None and entry[0] > now else None
+            state, decision = rule.apply(state, now)
+            shard[key] = (now + rule.ttl, state)
+            shard.move_to_end(key)
+            for _ in range(2):
+                oldest_key, (expires_at, _) = next(iter(shard.items()))
+                if expires_at > now and len(shard) <= self._max_keys_per_shard:
+                    break
+                del shard[oldest_key]
+        return decision
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    async def close(self) -> None:
+        pass
+
+
+# Redis 脚本：逻辑与 RateLimitRule.apply 一致，使用 Redis 服务器时间，保证多个 worker 的计数一致
+_BUCKET_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local rate = limit / period
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or limit
+local updated = tonumber(state[2]) or now
+tokens = math.min(limit, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+else
+  retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(period * 1000))
+return {allowed, math.floor(tokens), tostring(retry_after)}
+"""
+
+_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local window = math.floor(now / period)
+local state = redis.call('HMGET', KEYS[1], 'window', 'current', 'previous')
+local stored = tonumber(state[1])
+local current, previous = 0, 0
+if stored == window then
+  current = tonumber(state[2])
+  previous = tonumber(state[3])
+elseif stored == window - 1 then
+  previous = tonumber(state[2])
+end
+local elapsed = now - window * period
+local estimate = previous * (1 - elapsed / period) + current
+local allowed = 0
+local remaining = 0
+local retry_after = 0
+if estimate + 1 <= limit then
+  current = current + 1
+  allowed = 1
+  remaining = math.floor(limit - estimate - 1)
+elseif previous > 0 and current + 1 <= limit then
+  retry_after = math.max(0, (1 - (limit - current - 1) / previous) * period - elapsed)
+else
+  retry_after = period - elapsed
+end
+redis.call('HSET', KEYS[1], 'window', window, 'current', current, 'previous', previous)
+redis.call('PEXPIRE', KEYS[1], period * 2000)
+return {allowed, remaining, tostring(retry_after)}
+"""
+
+
+class RedisStore:
+    """Redis 存储（Lua 脚本原子更新），Redis 出错时退回进程内存储"""
+
+    def __init__(self, url: Optional[str] = None, client=None, prefix: str = "ratelimit:", retry_interval: float = 30):
+        self.url = url
+        self.prefix = prefix
+        self.retry_interval = retry_interval
+        self.fallback = MemoryStore()
+        self._client = client
+        self._scripts: Dict[str, object] = {}
+        self._down_until = 0.0
+
+    def _get_scripts(self) -> Dict[str, object]:
+        if not self._scripts:
+            if self._client is None:
+                import redis.asyncio as redis
+
+                self._client = redis.from_url(self.url, socket_timeout=0.5, socket_connect_timeout=0.5)
+            self._scripts = {
+                "bucket": self._client.register_script(_BUCKET_SCRIPT),
+                "window": self._client.register_script(_WINDOW_SCRIPT),
+            }
+        return self._scripts
+
+    async def hit(self, key: str, rule: RateLimitRule, now: Optional[float] = None) -> Decision:
+        if time.monotonic() < self._down_until:
+            return await self.fallback.hit(key, rule, now)
+        try:
+            script = self._get_scripts()[rule.algorithm]
+            allowed, remaining, retry_after = await script(keys=[self.prefix + key], args=[rule.limit, rule.period])
+        except Exception as e:
+            # Redis 不可用时在 retry_interval 秒内改用进程内存储，避免每个请求都等待连接超时
+            RATE_LIMIT_BACKEND_ERRORS_TOTAL.inc()
+            logger.warning(f"限流 Redis 存储不可用，{self.retry_interval:.0f} 秒内改用进程内存储: {e}")
+            self._down_until = time.monotonic() + self.retry_interval
+            return await self.fallback.hit(key, rule, now)
+        return Decision(bool(allowed), int(remaining), float(retry_after))
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+
+
+@lru_cache(maxsize=4096)
+def _token_subject(token: str) -> Optional[str]:
+    """令牌对应的用户名（无效令牌返回 None）"""
+    from app.core.security import verify_token
+
+    return verify_token(token)
+
+
+def _bearer_token(scope) -> Optional[str]:
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                return token.strip()
+            return None
+    return None
+
+
+class RateLimiter:
+    """按规则检查请求"""
+
+    def __init__(self, rules: List[RateLimitRule], store):
+        self.rules = rules
+        self.store = store
+        self._exact: Dict[Tuple[str, str], List[int]] = {}
+        for index, rule in enumerate(rules):
+            if rule.pattern is None and rule.method != "*":
+                self._exact.setdefault((rule.method, rule.path), []).append(index)
+        self._rules_for = lru_cache(maxsize=4096)(self._match)
+
+    def _match(self, method: str, path: str) -> Tuple[Tuple[int, RateLimitRule], ...]:
+        """匹配的规则（按配置顺序），结果按 (方法, 路径) 缓存"""
+        indexes = set(self._exact.get((method, path), ()))
+        indexes.update(
+            index for index, rule in enumerate(self.rules)
+            if (rule.pattern is not None or rule.method == "*") and rule.matches(method, path)
+        )
+        return tuple((index, self.rules[index]) for index in sorted(indexes))
+
+    async def check(self, scope) -> Optional[Tuple[RateLimitRule, Decision]]:
+        """检查请求，超限时返回触发的规则与结果"""
+        rules = self._rules_for(scope["method"], scope["path"])
+        if not rules:
+            return None
+        for index, rule in rules:
+            if rule.key == "ip":
+                client = scope.get("client")
+                identity = client[0] if client else "unknown"
+            elif rule.key == "user":
+                token = _bearer_token(scope)
+                identity = _token_subject(token) if token else None
+                if identity is None:
+                    continue
+            else:
+                identity = ""
+            decision = await self.store.hit(f"{index}:{identity}", rule)
+            if not decision.allowed:
+                return rule, decision
+        return None
+
+
+class RateLimitMiddleware:
+    """请求限流中间件（纯 ASGI 实现）"""
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rejected = await self.limiter.check(scope)
+        if rejected is None:
+            await self.app(scope, receive, send)
+            return
+
+        rule, decision = rejected
+        RATE_LIMIT_REJECTED_TOTAL.labels(rule=rule.name).inc()
+        body = orjson.dumps({"detail": "请求过于频繁，请稍后再试"})
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(decision.retry_after))).encode()),
+                (b"x-ratelimit-limit", str(rule.limit).encode()),
+                (b"x-ratelimit-remaining", b"0"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def create_store():
+    """按配置创建存储"""
+    if settings.RATE_LIMIT_STORAGE == "redis":
+        return RedisStore(settings.RATE_LIMIT_REDIS_URL or settings.REDIS_URL)
+    if settings.RATE_LIMIT_STORAGE == "memory":
+        return MemoryStore()
+    raise ValueError(f"RATE_LIMIT_STORAGE 只能是 memory 或 redis: {settings.RATE_LIMIT_STORAGE!r}")
+
+
+rate_limiter = RateLimiter(parse_rules(settings.RATE_LIMIT_RULES), create_store())
@@ -1,17 +1,13 @@
 """
 安全相关工具函数
+
+jose（连带 cryptography 后端）在首次签发或校验令牌时才导入，不计入启动耗时。
 """
 from datetime import datetime, timedelta
 from typing import Any, Union
 
-from jose import jwt
-from passlib.context import CryptContext
-
 from app.core.config import settings
 
-# 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # JWT算法
 ALGORITHM = "HS256"
 
@@ -27,6 +23,8 @@ def create_access_token(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
 
+    from jose import jwt
+
     to_encode = {"exp": expire, "sub": str(subject)}
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
@@ -49,6 +47,8 @@ def get_password_hash(password: str) -> str:
 
 def verify_token(token: str) -> Union[str, None]:
     """验证JWT令牌"""
+    from jose import jwt
+
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -0,0 +1,192 @@
+"""
+慢查询日志
+
+通过 SQLAlchemy 的 before/after_cursor_execute 事件记录耗时超过阈值的语句：
+- 按归一化后的语句形态聚合次数、总耗时、最大耗时与来源路由
+- 每种语句形态首次变慢时抓取执行计划（SQLite 使用 EXPLAIN QUERY PLAN，其余数据库使用 EXPLAIN，不带 ANALYZE）；
+  EXPLAIN 在请求自身的事务中执行，PostgreSQL 上包在保存点中，失败时不会使请求的事务进入中止状态
+- SlowQueryMiddleware 记录当前请求，用于标注慢查询的来源路由
+
+统计数据保存在当前进程内，多 worker 部署时各进程分别统计。
+"""
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from collections import Counter
+from datetime import datetime
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.query_counter import normalize_statement
+
+_request_scope: ContextVar[Optional[dict]] = ContextVar("slow_query_request_scope", default=None)
+
+# 可以安全 EXPLAIN（不会重复执行写操作）的语句
+_EXPLAINABLE_PREFIXES = ("select", "with", "update", "delete")
+
+_EXPLAIN_SAVEPOINT = "slow_query_explain"
+
+
+@dataclass
+class SlowQueryEntry:
+    """一种语句形态的慢查询聚合"""
+    shape: str
+    count: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+    first_seen: Optional[datetime] = None
+    last_seen: Optional[datetime] = None
+    sample_statement: str = ""
+    sample_parameters: str = ""
+    routes: Counter = field(default_factory=Counter)
+    plan: Optional[List[str]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "shape": self.shape,
+            "count": self.count,
+            "total_ms": round(self.total_time * 1000, 2),
+            "avg_ms": round(self.total_time * 1000 / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max_time * 1000, 2),
+            "first_seen": self.first_seen.isoformat() if self.first_seen else None,
+            "last_seen": self.last_seen.isoformat() if self.last_seen else None,
+            "sample_statement": self.sample_statement,
+            "sample_parameters": self.sample_parameters,
+            "routes": dict(self.routes.most_common(10)),
+            "plan": self.plan,
+        }
+
+
+class SlowQueryLog:
+    """慢查询记录器"""
+
+    def __init__(self, threshold_ms: float, max_shapes: int, explain: bool = True):
+        self.threshold = threshold_ms / 1000
+        self.max_shapes = max_shapes
+        self.explain = explain
+        self._entries: Dict[str, SlowQueryEntry] = {}
+        self._lock = Lock()
+
+    def install(self, engine: Engine) -> None:
+        """在同步引擎上注册事件（异步引擎传入 engine.sync_engine）"""
+        if self.threshold <= 0 or event.contains(engine, "before_cursor_execute", self._before_cursor_execute):
+            return
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start_time", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("slow_query_start_time")
+        if not starts:
+            return
+        duration = time.perf_counter() - starts.pop()
+        if duration >= self.threshold:
+            self.record(conn, statement, parameters, duration, executemany)
+
+    def record(self, conn, statement: str, parameters: Any, duration: float, executemany: bool = False) -> None:
+        """记录一次慢查询"""
+        shape = normalize_statement(statement)
+        scope = _request_scope.get()
+        route = None
+        if scope is not None:
+            route = f"{scope.get('method', '')} {getattr(scope.get('route'), 'path', scope.get('path', ''))}"
+        now = datetime.utcnow()
+
+        with self._lock:
+            entry = self._entries.get(shape)
+            is_new = entry is None
+            if is_new:
+                if len(self._entries) >= self.max_shapes:
+                    # 淘汰累计耗时最少的语句形态
+                    del self._entries[min(self._entries.values(), key=lambda e: e.total_time).shape]
+                entry = self._entries[shape] = SlowQueryEntry(shape=shape, first_seen=now)
+            entry.count += 1
+            entry.total_time += duration
+            entry.last_seen = now
+            if duration >= entry.max_time:
+                entry.max_time = duration
+                entry.sample_statement = statement[:2000]
+                entry.sample_parameters = repr(parameters)[:500]
+            entry.routes[route or "<background>"] += 1
+
+        logger.warning(f"慢查询 {duration * 1000:.1f}ms [{route or '<background>'}]: {shape[:300]}")
+
+        if is_new and self.explain and not executemany:
+            entry.plan = self._explain(conn, statement, parameters)
+
+    @staticmethod
+    def _explain(conn, statement: str, parameters: Any) -> Optional[List[str]]:
+        """抓取执行计划（直接使用 DBAPI 游标，避免再次触发引擎事件）"""
+        if not statement.lstrip().lower().startswith(_EXPLAINABLE_PREFIXES):
+            return None
+        prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+        # PostgreSQL 上事务内任一语句失败都会使整个事务中止，EXPLAIN 放在保存点中执行
+        savepoint = conn.dialect.name == "postgresql"
+        try:
+            cursor = conn.connection.dbapi_connection.cursor()
+            try:
+                if savepoint:
+                    cursor.execute(f"SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+                try:
+                    cursor.execute(prefix + statement, parameters or ())
+                    return [" | ".join(str(value) for value in row) for row in cursor.fetchall()]
+                except Exception:
+                    if savepoint:
+                        cursor.execute(f"ROLLBACK TO SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+                    raise
+                finally:
+                    if savepoint:
+                        cursor.execute(f"RELEASE SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+            finally:
+                cursor.close()
+        except Exception as e:
+            return [f"EXPLAIN 失败: {e}"]
+
+    def top(self, limit: int = 20, order_by: str = "total") -> List[Dict[str, Any]]:
+        """按累计耗时 / 最大耗时 / 次数排序的前 N 种慢查询"""
+        keys = {
+            "total": lambda e: e.total_time,
+            "max": lambda e: e.max_time,
+            "count": lambda e: e.count,
+        }
+        if order_by not in keys:
+            raise ValueError("排序字段只能是 total、max 或 count")
+        with self._lock:
+            entries = sorted(self._entries.values(), key=keys[order_by], reverse=True)[:limit]
+            return [entry.to_dict() for entry in entries]
+
+    def reset(self) -> None:
+        """清空统计"""
+        with self._lock:
+            self._entries.clear()
+
+
+class SlowQueryMiddleware:
+    """记录当前请求，用于标注慢查询的来源路由（纯 ASGI 实现）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    max_shapes=settings.SLOW_QUERY_MAX_SHAPES,
+    explain=settings.SLOW_QUERY_EXPLAIN,
+)
@@ -0,0 +1,74 @@
+"""
+启动耗时记录
+
+记录模块导入、创建应用与启动事件中各阶段的耗时，启动完成后输出一行汇总，
+管理后台可通过 /admin/system/startup 查看当前 worker 进程的记录。
+导入耗时的细分可使用 python -m benchmarks.cold_start（基于 python -X importtime）。
+"""
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def process_age() -> Optional[float]:
+    """进程已运行的秒数（含解释器启动与 uvicorn / gunicorn 自身的导入，仅 Linux 可用）"""
+    try:
+        with open("/proc/self/stat", encoding="utf-8") as f:
+            # 进程名可能包含空格，从最后一个右括号之后开始取字段，starttime 为第 22 个字段
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", encoding="utf-8") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupProfile:
+    """启动阶段耗时"""
+
+    def __init__(self):
+        self.phases: List[Tuple[str, float]] = []
+        self.notes: Dict[str, str] = {}
+        self.process_age: Optional[float] = None
+        self.ready_at: Optional[datetime] = None
+
+    def record(self, name: str, seconds: float) -> None:
+        """记录一个阶段"""
+        self.phases.append((name, seconds))
+
+    @contextmanager
+    def phase(self, name: str):
+        """计时一个阶段"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def mark_ready(self) -> None:
+        """启动完成"""
+        self.ready_at = datetime.utcnow()
+        self.process_age = process_age()
+
+    def summary(self) -> str:
+        """单行汇总"""
+        parts = [f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases]
+        if self.process_age is not None:
+            parts.append(f"进程启动至就绪 {self.process_age * 1000:.0f}ms")
+        return " | ".join(parts)
+
+    def report(self) -> Dict[str, Any]:
+        """完整记录"""
+        return {
+            "pid": os.getpid(),
+            "ready_at": self.ready_at.isoformat() if self.ready_at else None,
+            "phases": [{"name": name, "ms": round(seconds * 1000, 1)} for name, seconds in self.phases],
+            "total_ms": round(sum(seconds for _, seconds in self.phases) * 1000, 1),
+            "process_age_ms": round(self.process_age * 1000, 1) if self.process_age is not None else None,
+            "notes": dict(self.notes),
+        }
+
+
+startup_profile = StartupProfile()
@@ -2,15 +2,19 @@
 模型包初始化文件
 """
 from .user import User
-from .product import Product, Category
+from .product import Product, Category, CounterFlush, ProductSalesHourly, ProductRanking
 from .order import Order, OrderStatus, PaymentMethod
 from .card import Card, CardStatus
-from .payment import Payment, PaymentStatus
+from .payment import Payment, PaymentStatus, ProcessedCallback, PaymentCallbackJob, CallbackJobStatus
+from .archive import OrderArchive, PaymentArchive
 
 __all__ = [
     "User",
     "Product",
     "Category",
+    "CounterFlush",
+    "ProductSalesHourly",
+    "ProductRanking",
     "Order",
     "OrderStatus",
     "PaymentMethod",
@@ -18,4 +22,9 @@ __all__ = [
     "CardStatus",
     "Payment",
     "PaymentStatus",
+    "ProcessedCallback",
+    "PaymentCallbackJob",
+    "CallbackJobStatus",
+    "OrderArchive",
+    "PaymentArchive",
 ]
@@ -0,0 +1,72 @@
+"""
+归档模型
+
+已完成（已发货 / 已取消）且超过保留期的订单连同其支付记录，由归档任务（app/tasks/order_archiver.py）
+分批从 orders / payments 移入 orders_archive / payments_archive，热表大小保持有界：
+- 归档表的列由热表列生成（两者结构始终一致），不设外键；主键为 (created_at, id)，另按 id 建索引
+- PostgreSQL 上按 created_at 范围分区，按月的分区（如 orders_archive_y2026m01）由归档任务按需创建；
+  其他数据库上为普通表
+- 归档记录只读，订单、支付与统计服务的查询透明地合并热表与归档表
+"""
+from sqlalchemy import Column, Index, PrimaryKeyConstraint, Table
+from sqlalchemy.orm import relationship
+
+from app.core.database import Base
+from app.core.money import yuan_property
+from app.models.order import Order
+from app.models.payment import Payment
+
+
+def _archive_table(source: Table, name: str, *indexes: Index) -> Table:
+    """按热表的列定义归档表（分区表的主键须包含分区键，created_at 在前便于按时间范围扫描）"""
+    columns = [
+        Column(column.name, column.type, autoincrement=False, nullable=column.nullable)
+        for column in source.columns
+    ]
+    return Table(
+        name,
+        Base.metadata,
+        *columns,
+        PrimaryKeyConstraint("created_at", "id", name=f"{name}_pkey"),
+        Index(f"ix_{name}_id", "id"),
+        *indexes,
+        postgresql_partition_by="RANGE (created_at)",
+    )
+
+
+class OrderArchive(Base):
+    """已归档订单表（只读）"""
+    __table__ = _archive_table(
+        Order.__table__,
+        "orders_archive",
+        # 与热表相同的列表查询索引；按订单号查询
+        Index("ix_orders_archive_user_id_created_at", "user_id", "created_at"),
+        Index("ix_orders_archive_status_created_at", "status", "created_at"),
+        Index("ix_orders_archive_order_number", "order_number"),
+    )
+
+    product_price = yuan_property("product_price_cents")
+    total_amount = yuan_property("total_amount_cents")
+
+    # 关联关系（无外键，只读）
+    user = relationship("User", primaryjoin="foreign(OrderArchive.user_id) == User.id", viewonly=True)
+    product = relationship("Product", primaryjoin="foreign(OrderArchive.product_id) == Product.id", viewonly=True)
+
+    def __repr__(self):
+        return f"<OrderArchive(id={self.id}, order_number={self.order_number}, status={self.status})>"
+
+
+class PaymentArchive(Base):
+    """已归档支付记录表（只读）"""
+    __table__ = _archive_table(
+        Payment.__table__,
+        "payments_archive",
+        Index("ix_payments_archive_user_id_created_at", "user_id", "created_at"),
+        Index("ix_payments_archive_order_id", "order_id"),
+    )
+
+    amount = yuan_property("amount_cents")
+    gateway_amount = yuan_property("gateway_amount_cents")
+
+    def __repr__(self):
+        return f"<PaymentArchive(id={self.id}, order_id={self.order_id}, status={self.status})>"
@@ -4,7 +4,7 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import Boolean, Column, DateTime, Integer, String, Text, ForeignKey, Enum
+from sqlalchemy import Boolean, Column, DateTime, Integer, String, Text, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 import enum
 
@@ -22,11 +22,17 @@ class CardStatus(str, enum.Enum):
 class Card(Base):
     """卡密表"""
     __tablename__ = "cards"
+    __table_args__ = (
+        # 过期清理按状态 + 有效期范围扫描
+        Index("ix_cards_status_expires_at", "status", "expires_at"),
+        # 发卡按商品取未使用的卡密；卡密列表按商品 + 状态筛选、创建时间倒序
+        Index("ix_cards_product_id_status_created_at", "product_id", "status", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
     # 关联商品
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
 
     # 卡密内容（加密存储）
     encrypted_content = Column(Text, nullable=False)  # 加密后的卡密内容
@@ -37,8 +43,8 @@ class Card(Base):
     used_by = Column(Integer, ForeignKey("users.id"))  # 使用者ID
     used_at = Column(DateTime)  # 使用时间
 
-    # 订单关联（如果是通过订单发放的）
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    # 订单关联（如果是通过订单发放的；订单可能已归档，不设外键）
+    order_id = Column(Integer)
 
     # 有效期
     expires_at = Column(DateTime)
@@ -50,7 +56,7 @@ class Card(Base):
     # 关联关系
     product = relationship("Product", back_populates="cards")
     user = relationship("User", foreign_keys=[used_by])
-    order = relationship("Order", foreign_keys=[order_id])
+    order = relationship("Order", primaryjoin="foreign(Card.order_id) == Order.id", viewonly=True)
 
     def __repr__(self):
         return f"<Card(id={self.id}, product_id={self.product_id}, status={self.status})>"
@@ -4,11 +4,12 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import Boolean, Column, DateTime, Float, Integer, String, Text, ForeignKey, Enum
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Integer, String, Text, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 import enum
 
 from app.core.database import Base
+from app.core.money import yuan_property
 
 
 class OrderStatus(str, enum.Enum):
@@ -30,21 +31,28 @@ class PaymentMethod(str, enum.Enum):
 class Order(Base):
     """订单表"""
     __tablename__ = "orders"
+    __table_args__ = (
+        # 用户订单列表按创建时间倒序；后台按状态筛选订单
+        Index("ix_orders_user_id_created_at", "user_id", "created_at"),
+        Index("ix_orders_status_created_at", "status", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     order_number = Column(String(50), unique=True, index=True, nullable=False)  # 订单号
 
     # 用户信息
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
     # 商品信息
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
     product_name = Column(String(200), nullable=False)  # 快照商品名称
-    product_price = Column(Float, nullable=False)      # 快照商品价格
+    product_price_cents = Column(BigInteger, nullable=False)  # 快照商品价格（分）
+    product_price = yuan_property("product_price_cents")
 
     # 订单信息
     quantity = Column(Integer, default=1, nullable=False)
-    total_amount = Column(Float, nullable=False)       # 总金额
+    total_amount_cents = Column(BigInteger, nullable=False)   # 总金额（分）
+    total_amount = yuan_property("total_amount_cents")
     payment_method = Column(Enum(PaymentMethod), nullable=False)
     status = Column(Enum(OrderStatus), default=OrderStatus.PENDING, nullable=False)
 
@@ -4,11 +4,13 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import Boolean, Column, DateTime, Float, Integer, String, Text, ForeignKey, Enum
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Integer, String, Text, ForeignKey, Enum, Index, JSON, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 import enum
 
 from app.core.database import Base
+from app.core.money import yuan_property
 
 
 class PaymentStatus(str, enum.Enum):
@@ -20,24 +22,43 @@ class PaymentStatus(str, enum.Enum):
     REFUNDED = "refunded"   # 已退款
 
 
+class CallbackJobStatus(str, enum.Enum):
+    """回调任务状态枚举"""
+    PENDING = "pending"         # 待处理
+    PROCESSING = "processing"   # 处理中
+    DONE = "done"               # 已完成
+    FAILED = "failed"           # 重试耗尽
+
+
 class Payment(Base):
     """支付记录表"""
     __tablename__ = "payments"
+    __table_args__ = (
+        # 用户支付记录列表按创建时间倒序
+        Index("ix_payments_user_id_created_at", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
     # 关联信息
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
 
     # 支付信息
     payment_method = Column(String(20), nullable=False)  # alipay, wechat, balance
-    amount = Column(Float, nullable=False)
+    amount_cents = Column(BigInteger, nullable=False)  # 支付金额（分）
+    amount = yuan_property("amount_cents")
     status = Column(Enum(PaymentStatus), default=PaymentStatus.PENDING, nullable=False)
 
     # 第三方支付信息
     transaction_id = Column(String(100), unique=True)  # 第三方交易号
-    payment_data = Column(Text)  # 支付相关数据（JSON格式）
+    payment_data = Column(JSON().with_variant(JSONB(), "postgresql"))  # 原始回调数据
+
+    # 从回调数据中提取的对账字段
+    out_trade_no = Column(String(64), index=True)  # 商户订单号
+    gateway_amount_cents = Column(BigInteger)      # 网关通知金额（分）
+    gateway_amount = yuan_property("gateway_amount_cents")
+    gateway_paid_at = Column(DateTime, index=True) # 网关支付时间
 
     # 时间戳
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -50,3 +71,47 @@ class Payment(Base):
 
     def __repr__(self):
         return f"<Payment(id={self.id}, order_id={self.order_id}, status={self.status})>"
+
+
+class ProcessedCallback(Base):
+    """已处理的支付回调表（按第三方交易号去重）"""
+    __tablename__ = "processed_callbacks"
+    __table_args__ = (
+        UniqueConstraint("gateway", "transaction_id", name="uq_processed_callbacks_gateway_txn"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    gateway = Column(String(20), nullable=False)          # alipay, wechat
+    transaction_id = Column(String(100), nullable=False)  # 第三方交易号
+    payment_id = Column(Integer, nullable=False)  # 支付记录可能已归档，不设外键
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<ProcessedCallback(gateway={self.gateway}, transaction_id={self.transaction_id})>"
+
+
+class PaymentCallbackJob(Base):
+    """支付回调任务表（回调先落库再异步处理）"""
+    __tablename__ = "payment_callback_jobs"
+    __table_args__ = (
+        # worker 按状态 + 下次执行时间领取任务
+        Index("ix_payment_callback_jobs_status_next", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    gateway = Column(String(20), nullable=False)  # alipay, wechat
+    payload = Column(JSON, nullable=False)        # 原始回调数据
+
+    # 处理状态
+    status = Column(Enum(CallbackJobStatus), default=CallbackJobStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    locked_until = Column(DateTime)  # 处理中任务的租约到期时间
+    last_error = Column(Text)
+
+    # 时间戳
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = Column(DateTime)
+
+    def __repr__(self):
+        return f"<PaymentCallbackJob(id={self.id}, gateway={self.gateway}, status={self.status})>"
@@ -4,10 +4,11 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import Boolean, Column, DateTime, Float, Integer, String, Text, ForeignKey
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Integer, String, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
+from app.core.money import yuan_property
 
 
 class Category(Base):
@@ -38,8 +39,10 @@ class Product(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(200), nullable=False)
     description = Column(Text)
-    price = Column(Float, nullable=False)
-    original_price = Column(Float)  # 原价
+    price_cents = Column(BigInteger, nullable=False)  # 价格（分）
+    original_price_cents = Column(BigInteger)  # 原价（分）
+    price = yuan_property("price_cents")
+    original_price = yuan_property("original_price_cents")
 
     # 分类
     category_id = Column(Integer, ForeignKey("categories.id"), index=True)
@@ -47,6 +50,7 @@ class Product(Base):
     # 项目信息
     stock = Column(Integer, default=-1, nullable=False)  # 库存(-1表示无限)
     sold_count = Column(Integer, default=0, nullable=False)  # 已售数量
+    view_count = Column(Integer, default=0, server_default="0", nullable=False)  # 浏览次数
     auto_delivery = Column(Boolean, default=True, nullable=False)  # 是否自动发货
 
     # 源码项目特有字段
@@ -74,3 +78,60 @@ class Product(Base):
 
     def __repr__(self):
         return f"<Product(id={self.id}, name={self.name}, price={self.price})>"
+
+
+# 前台商品列表只查上架商品，按 sort_order、创建时间倒序分页：部分索引只包含上架商品，
+# 排序列与查询的 ORDER BY 一致，分页无需额外排序
+Index(
+    "ix_products_active_sort",
+    Product.sort_order, Product.created_at.desc(),
+    postgresql_where=Product.is_active == True,
+    sqlite_where=Product.is_active == True,
+)
+Index(
+    "ix_products_active_category_sort",
+    Product.category_id, Product.sort_order, Product.created_at.desc(),
+    postgresql_where=Product.is_active == True,
+    sqlite_where=Product.is_active == True,
+)
+
+
+class CounterFlush(Base):
+    """已写入的计数批次（销量/浏览数延迟写入，按批次号保证日志重放不重复累加）"""
+    __tablename__ = "counter_flushes"
+
+    batch_id = Column(String(64), primary_key=True)
+    applied_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<CounterFlush(batch_id={self.batch_id})>"
+
+
+class ProductSalesHourly(Base):
+    """商品按小时销售汇总表（排行榜数据源，由计数写入任务批量累加）"""
+    __tablename__ = "product_sales_hourly"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    hour = Column(DateTime, primary_key=True, index=True)  # 整点（UTC）
+    quantity = Column(Integer, default=0, nullable=False)  # 销量
+    amount_cents = Column(BigInteger, default=0, nullable=False)  # 销售额（分）
+
+    def __repr__(self):
+        return f"<ProductSalesHourly(product_id={self.product_id}, hour={self.hour})>"
+
+
+class ProductRanking(Base):
+    """商品排行榜表（主节点定期生成的各分类、各时间窗口 Top-N）"""
+    __tablename__ = "product_rankings"
+
+    period = Column(String(8), primary_key=True)  # 时间窗口: 24h/7d/30d
+    metric = Column(String(16), primary_key=True)  # 排序依据: quantity/amount
+    category_id = Column(Integer, primary_key=True)  # 分类ID（0 表示全部分类）
+    position = Column(Integer, primary_key=True)  # 名次（从 1 开始）
+    product_id = Column(Integer, nullable=False)
+    quantity = Column(Integer, nullable=False)
+    amount_cents = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<ProductRanking(period={self.period}, category_id={self.category_id}, position={self.position})>"
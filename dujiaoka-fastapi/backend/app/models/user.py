@@ -4,10 +4,11 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import Boolean, Column, DateTime, Float, Integer, String, Text
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Integer, String, Text
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
+from app.core.money import yuan_property
 
 
 class User(Base):
@@ -23,7 +24,8 @@ class User(Base):
     avatar = Column(String(255))
 
     # 账户信息
-    balance = Column(Float, default=0.0, nullable=False)  # 账户余额
+    balance_cents = Column(BigInteger, default=0, nullable=False)  # 账户余额（分）
+    balance = yuan_property("balance_cents")
     is_active = Column(Boolean, default=True, nullable=False)
     is_superuser = Column(Boolean, default=False, nullable=False)  # 管理员权限
 
@@ -16,12 +16,12 @@ __all__ = [
     "Category", "CategoryCreate", "CategoryUpdate",
 
     # 订单相关
-    "Order", "OrderCreate", "OrderUpdate", "OrderList", "CartItem", "OrderSummary",
+    "Order", "OrderCreate", "OrderUpdate", "OrderList", "OrderListItem", "CartItem", "OrderSummary",
 
     # 卡密相关
     "Card", "CardCreate", "CardUpdate", "CardImport", "CardBatchCreate", "CardList",
 
     # 支付相关
-    "Payment", "PaymentCreate", "PaymentUpdate", "PaymentList",
+    "Payment", "PaymentCreate", "PaymentUpdate", "PaymentList", "PaymentListItem",
     "AlipayCallback", "WechatCallback",
 ]
@@ -53,9 +53,47 @@ class Order(OrderBase):
         from_attributes = True
 
 
+class OrderUserBrief(BaseModel):
+    """订单列表中的用户摘要"""
+    id: int
+    username: str
+    email: str
+
+
+class OrderProductBrief(BaseModel):
+    """订单列表中的商品摘要"""
+    id: int
+    name: str
+    image_url: Optional[str]
+
+
+class OrderListItem(BaseModel):
+    """订单列表项（用户/商品只含摘要字段）"""
+    id: int
+    order_number: str
+    user_id: int
+    product_id: int
+    product_name: str
+    product_price: float
+    quantity: int
+    total_amount: float
+    payment_method: str
+    status: str
+    user_note: Optional[str]
+    admin_note: Optional[str]
+    created_at: datetime
+    updated_at: datetime
+    paid_at: Optional[datetime]
+    delivery_content: Optional[str]
+    delivered_at: Optional[datetime]
+
+    user: Optional[OrderUserBrief]
+    product: Optional[OrderProductBrief]
+
+
 class OrderList(BaseModel):
     """订单列表响应"""
-    items: List[Order]
+    items: List[OrderListItem]
     total: int
     page: int
     size: int
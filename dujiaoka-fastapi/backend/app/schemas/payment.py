@@ -2,7 +2,7 @@
 支付相关的Pydantic模型
 """
 from datetime import datetime
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 
 from pydantic import BaseModel
 
@@ -24,7 +24,7 @@ class PaymentUpdate(BaseModel):
     """支付更新模型"""
     status: Optional[str] = None
     transaction_id: Optional[str] = None
-    payment_data: Optional[str] = None
+    payment_data: Optional[Dict[str, Any]] = None
 
 
 class Payment(PaymentBase):
@@ -32,7 +32,10 @@ class Payment(PaymentBase):
     id: int
     status: str
     transaction_id: Optional[str]
-    payment_data: Optional[str]
+    payment_data: Optional[Dict[str, Any]]
+    out_trade_no: Optional[str] = None
+    gateway_amount: Optional[float] = None
+    gateway_paid_at: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
     paid_at: Optional[datetime]
@@ -41,9 +44,22 @@ class Payment(PaymentBase):
         from_attributes = True
 
 
+class PaymentListItem(PaymentBase):
+    """支付列表项（不含网关原始回调数据）"""
+    id: int
+    status: str
+    transaction_id: Optional[str]
+    out_trade_no: Optional[str] = None
+    gateway_amount: Optional[float] = None
+    gateway_paid_at: Optional[datetime] = None
+    created_at: datetime
+    updated_at: datetime
+    paid_at: Optional[datetime]
+
+
 class PaymentList(BaseModel):
     """支付列表响应"""
-    items: List[Payment]
+    items: List[PaymentListItem]
     total: int
     page: int
     size: int
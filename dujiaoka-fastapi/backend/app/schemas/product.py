@@ -82,6 +82,7 @@ class Product(ProductBase):
     """商品模型"""
     id: int
     sold_count: int
+    view_count: int = 0
     category: Optional[Category]
     created_at: datetime
     updated_at: datetime
@@ -96,3 +97,12 @@ class ProductList(BaseModel):
     total: int
     page: int
     size: int
+
+
+class ProductRankingItem(BaseModel):
+    """商品排行榜条目"""
+    position: int
+    product_id: int
+    product_name: str
+    quantity: int
+    amount: float
@@ -6,3 +6,5 @@ from .product import product_service
 from .order import order_service
 # from .card import card_service  # 卡密功能已禁用
 from .payment import payment_service
+from .stats import stats_service
+from .ranking import ranking_service
@@ -0,0 +1,184 @@
+"""
+订单归档服务
+
+热表 orders / payments 只保留近期和未完成的订单：已发货 / 已取消且创建超过 ORDER_ARCHIVE_AFTER_DAYS 天的订单
+连同其支付记录，由主节点分批移入归档表（app/models/archive.py）。每批在一个事务内 INSERT ... SELECT 到归档表后
+删除热表行，PostgreSQL 上先按需创建涉及月份的分区。
+
+读取方通过 order_tables() / payment_tables() 得到需要查询的表，用 merge_latest() / union_tables()
+把热表与归档表合并为一个子查询；归档表只读，修改类操作只作用于热表。
+"""
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterable, Optional, Sequence, Set
+
+from loguru import logger
+from sqlalchemy import Subquery, Table, delete, desc, func, insert, select, text, union_all
+
+from app.core.config import settings
+from app.core.database import async_session_maker, engine
+from app.core.metrics import ORDERS_ARCHIVED_TOTAL
+from app.models.archive import OrderArchive, PaymentArchive
+from app.models.order import Order, OrderStatus
+from app.models.payment import Payment
+
+# 可归档的订单状态（终态）
+ARCHIVED_STATUSES = (OrderStatus.DELIVERED, OrderStatus.CANCELLED)
+
+ORDER_TABLES = (Order.__table__, OrderArchive.__table__)
+PAYMENT_TABLES = (Payment.__table__, PaymentArchive.__table__)
+
+# 各表的过滤条件：table -> 条件列表
+Conditions = Callable[[Table], Sequence]
+
+
+def order_tables(status: Optional[OrderStatus] = None) -> Sequence[Table]:
+    """订单查询需要覆盖的表（归档表只含 ARCHIVED_STATUSES 状态的订单）"""
+    if status is not None and status not in ARCHIVED_STATUSES:
+        return ORDER_TABLES[:1]
+    return ORDER_TABLES
+
+
+def payment_tables() -> Sequence[Table]:
+    """支付记录查询需要覆盖的表"""
+    return PAYMENT_TABLES
+
+
+def union_tables(tables: Sequence[Table], columns: Sequence[str], where: Optional[Conditions] = None) -> Subquery:
+    """各表满足条件的行的 columns 列 UNION ALL 为一个子查询"""
+    selects = []
+    for table in tables:
+        query = select(*(table.c[name] for name in columns))
+        if where is not None:
+            query = query.where(*where(table))
+        selects.append(query)
+    return union_all(*selects).subquery()
+
+
+def merge_latest(tables: Sequence[Table], where: Conditions, limit: int) -> Subquery:
+    """
+    按创建时间倒序合并多张表的前 limit 行
+
+    每张表各自按 created_at 倒序取前 limit 行（走各自的 (xxx, created_at) 索引），
+    外层对至多 len(tables) * limit 行排序分页，不随表的大小增长。
+    """
+    selects = [
+        select(table).where(*where(table)).order_by(desc(table.c.created_at)).limit(limit).subquery()
+        for table in tables
+    ]
+    return union_all(*(select(latest) for latest in selects)).subquery()
+
+
+def _partition_bounds(stamps: Iterable[datetime]) -> Set[date]:
+    """时间所在月份的第一天"""
+    return {stamp.date().replace(day=1) for stamp in stamps}
+
+
+class ArchiveService:
+    """订单归档"""
+
+    def __init__(self, after_days: int, batch_size: int):
+        self.after_days = after_days
+        self.batch_size = batch_size
+        # 已确认存在的分区
+        self._partitions: Set[str] = set()
+
+    def cutoff(self) -> datetime:
+        """早于该时间创建的已完成订单可以归档"""
+        return datetime.utcnow() - timedelta(days=self.after_days)
+
+    async def archive(self) -> int:
+        """归档所有满足条件的订单，返回本次移动的订单数"""
+        started = time.perf_counter()
+        total = 0
+        while True:
+            moved = await self.archive_batch()
+            total += moved
+            if moved < self.batch_size:
+                break
+
+        if total:
+            ORDERS_ARCHIVED_TOTAL.inc(total)
+            logger.info(f"订单归档完成，共移动 {total} 个订单，耗时 {time.perf_counter() - started:.1f}s")
+        return total
+
+    async def archive_batch(self) -> int:
+        """移动一批订单及其支付记录"""
+        async with async_session_maker() as db:
+            postgresql = db.bind.dialect.name == "postgresql"
+
+            # 保留热表中主键最大的订单与支付记录（连同其订单）：SQLite（以及 MySQL 重启后）按当前最大主键 + 1
+            # 分配新主键，热表被清空时新记录会与已归档记录的主键重复
+            newest = (await db.execute(select(func.max(Order.id)))).scalar()
+            if newest is None:
+                return 0
+            conditions = [Order.status.in_(ARCHIVED_STATUSES), Order.created_at < self.cutoff(), Order.id < newest]
+            newest_payment_order = (await db.execute(
+                select(Payment.order_id).order_by(Payment.id.desc()).limit(1)
+            )).scalar()
+            if newest_payment_order is not None:
+                conditions.append(Order.id != newest_payment_order)
+
+            query = select(Order.id, Order.created_at).where(*conditions).limit(self.batch_size)
+            if postgresql:
+                # 锁定本批订单，跳过正在被修改（如退款）的订单
+                query = query.with_for_update(skip_locked=True)
+            rows = (await db.execute(query)).all()
+            if not rows:
+                return 0
+            order_ids = [order_id for order_id, _ in rows]
+
+            if postgresql:
+                payment_stamps = (await db.execute(
+                    select(Payment.created_at).where(Payment.order_id.in_(order_ids))
+                )).scalars().all()
+                await self._ensure_partitions(OrderArchive.__table__.name, [stamp for _, stamp in rows])
+                await self._ensure_partitions(PaymentArchive.__table__.name, payment_stamps)
+
+            # 复制时再次校验状态：SQLite 上第一条写语句才取得写锁，此前订单可能已被修改；
+            # 之后只移动实际复制了的订单
+            await db.execute(self._copy(
+                Order.__table__, OrderArchive.__table__,
+                Order.id.in_(order_ids), Order.status.in_(ARCHIVED_STATUSES),
+            ))
+            moved = (await db.execute(
+                select(OrderArchive.id).where(OrderArchive.id.in_(order_ids))
+            )).scalars().all()
+            await db.execute(self._copy(Payment.__table__, PaymentArchive.__table__, Payment.order_id.in_(moved)))
+            await db.execute(delete(Payment).where(Payment.order_id.in_(moved)))
+            await db.execute(delete(Order).where(Order.id.in_(moved)))
+            await db.commit()
+            return len(moved)
+
+    @staticmethod
+    def _copy(source: Table, target: Table, *conditions):
+        """INSERT INTO target (...) SELECT ... FROM source WHERE conditions"""
+        names = [column.name for column in target.columns]
+        return insert(target).from_select(names, select(*(source.c[name] for name in names)).where(*conditions))
+
+    async def _ensure_partitions(self, table: str, stamps: Iterable[datetime]) -> None:
+        """PostgreSQL 上按需创建归档表的月分区（单独的事务中执行，不与数据移动互相等待）"""
+        bounds = []
+        for start in sorted(_partition_bounds(stamps)):
+            name = f"{table}_y{start.year}m{start.month:02d}"
+            if name not in self._partitions:
+                bounds.append((name, start))
+        if not bounds:
+            return
+
+        async with engine.begin() as conn:
+            for name, start in bounds:
+                end = (start + timedelta(days=32)).replace(day=1)
+                await conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{start}') TO ('{end}')"
+                ))
+        self._partitions.update(name for name, _ in bounds)
+        logger.info(f"归档分区已就绪: {', '.join(name for name, _ in bounds)}")
+
+
+# 创建服务实例
+archive_service = ArchiveService(
+    after_days=settings.ORDER_ARCHIVE_AFTER_DAYS,
+    batch_size=settings.ORDER_ARCHIVE_BATCH_SIZE,
+)
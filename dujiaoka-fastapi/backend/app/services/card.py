@@ -5,45 +5,57 @@ from typing import List, Optional
 from datetime import datetime
 import secrets
 
-from cryptography.fernet import Fernet
+from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, desc
+from sqlalchemy import Row, select, and_, desc, or_
 
 from app.core.config import settings
+from app.core.serialization import RowSerializer
 from app.models.card import Card, CardStatus
 from app.models.product import Product
 from app.schemas.card import CardCreate, CardUpdate, CardBatchCreate
 
 
+# 卡密列表投影列（不含加密内容）
+CARD_LIST_COLUMNS = (
+    Card.id.label("id"),
+    Card.product_id.label("product_id"),
+    Card.status.label("status"),
+    Card.used_by.label("used_by"),
+    Card.used_at.label("used_at"),
+    Card.order_id.label("order_id"),
+    Card.expires_at.label("expires_at"),
+    Card.created_at.label("created_at"),
+    Card.updated_at.label("updated_at"),
+)
+
+card_list_serializer = RowSerializer([column.name for column in CARD_LIST_COLUMNS])
+
+
 class CardService:
     """卡密服务"""
 
     def __init__(self):
-        # 初始化加密器
-        # Fernet需要32字节的base64编码密钥
-        key_str = settings.CARD_ENCRYPTION_KEY
-
-        # 检查密钥是否有效
-        try:
-            if len(key_str) < 32:
-                raise ValueError("Key too short")
-
-            key_bytes = key_str.encode()
-            # 尝试创建Fernet对象来验证密钥
-            Fernet(key_bytes)
-            self.cipher = Fernet(key_bytes)
-            print("[OK] Card encryption key validated successfully")
-        except Exception as e:
-            print("[INFO] Generating new encryption key...")
-            # 确保生成44字符的base64编码密钥 (32字节base64编码的结果)
-            new_key = secrets.token_urlsafe(32)
-            # 如果长度不是44，重新生成直到符合要求
-            while len(new_key) != 44:
-                new_key = secrets.token_urlsafe(32)
-            print(f"[KEY] New generated key: {new_key}")
-            print("[TIP] Please copy this key to CARD_ENCRYPTION_KEY in .env file")
-
-            self.cipher = Fernet(new_key.encode())
+        self._cipher = None
+
+    @property
+    def cipher(self):
+        """加密器（首次使用时创建，cryptography 不计入启动耗时）"""
+        if self._cipher is None:
+            from cryptography.fernet import Fernet
+
+            # Fernet 需要 32 字节的 urlsafe base64 编码密钥（44 个字符）
+            try:
+                self._cipher = Fernet(settings.CARD_ENCRYPTION_KEY.encode())
+            except (ValueError, TypeError):
+                # 临时密钥仅在本进程内有效，重启后此前加密的卡密将无法解密
+                new_key = Fernet.generate_key().decode()
+                logger.warning(
+                    f"CARD_ENCRYPTION_KEY 无效，已生成临时密钥: {new_key}，"
+                    "请将其写入 .env 的 CARD_ENCRYPTION_KEY"
+                )
+                self._cipher = Fernet(new_key.encode())
+        return self._cipher
 
     def encrypt_content(self, content: str, secret: str) -> str:
         """加密卡密内容"""
@@ -59,18 +71,16 @@ class CardService:
         except Exception:
             raise ValueError("卡密解密失败")
 
-    async def get_cards(
+    async def get_card_rows(
         self,
         db: AsyncSession,
         product_id: Optional[int] = None,
         status: Optional[CardStatus] = None,
         skip: int = 0,
         limit: int = 100
-    ) -> List[Card]:
-        """获取卡密列表"""
-        from sqlalchemy.orm import selectinload
-
-        query = select(Card).options(selectinload(Card.product), selectinload(Card.user))
+    ) -> List[Row]:
+        """获取卡密列表（列投影，配合 card_list_serializer 使用）"""
+        query = select(*CARD_LIST_COLUMNS)
 
         conditions = []
         if product_id:
@@ -84,7 +94,7 @@ class CardService:
         query = query.offset(skip).limit(limit).order_by(desc(Card.created_at))
 
         result = await db.execute(query)
-        return result.scalars().all()
+        return result.all()
 
     async def get_card_by_id(self, db: AsyncSession, card_id: int) -> Optional[Card]:
         """根据ID获取卡密"""
@@ -99,12 +109,14 @@ class CardService:
 
     async def get_available_card(self, db: AsyncSession, product_id: int) -> Optional[Card]:
         """获取可用的卡密"""
+        # 过期卡密由后台清理任务批量标记为 EXPIRED；两次清理之间已过期但仍为 UNUSED 的卡密
+        # 在此排除（条件在 (product_id, status, ...) 索引范围内过滤，不影响索引使用）
         result = await db.execute(
             select(Card).where(
                 and_(
                     Card.product_id == product_id,
                     Card.status == CardStatus.UNUSED,
-                    or_(Card.expires_at.is_(None), Card.expires_at > datetime.utcnow())
+                    or_(Card.expires_at.is_(None), Card.expires_at > datetime.utcnow()),
                 )
             ).limit(1)
         )
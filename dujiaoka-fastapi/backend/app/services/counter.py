@@ -0,0 +1,318 @@
+"""
+商品计数服务（销量、浏览数延迟写入）
+
+热门商品每次发货都在事务中 UPDATE 同一行的 sold_count，并发购买会在该行上排队。
+这里把增量先累积在进程内，并同时追加到本进程的日志文件，由后台任务周期性地用一条
+UPDATE ... SET sold_count = sold_count + CASE id ... END 批量写入。
+
+- 销量在订单事务提交后才计入（add_on_commit），回滚的事务不计数
+- 写入前轮换日志：当前日志改名为 counters-<pid>-<批次号>.flushing，写入成功后删除；
+  批次号与增量在同一事务中写入 counter_flushes 表，日志重放时已写入的批次直接丢弃，不会重复累加
+- 进程重启后，启动时接管本进程号（容器重启后进程号会复用）或已退出进程遗留的日志并重新写入
+- 数据库中的计数最多滞后 COUNTER_FLUSH_INTERVAL 秒
+- 按小时汇总的商品销售额（排行榜数据源，见 app/services/ranking.py）也经由这里批量累加到 product_sales_hourly
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import case, delete, event, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.cache import invalidate_on_commit
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.metrics import COUNTER_FLUSH_ERRORS_TOTAL, COUNTER_FLUSHED_TOTAL
+from app.models.product import CounterFlush, Product, ProductSalesHourly
+
+# 商品表上的计数字段，键为 (字段, 商品ID)
+FIELDS = ("sold_count", "view_count")
+# 按小时汇总的销量与销售额（分），键为 (字段, 商品ID, 小时序号)
+SALES_FIELDS = ("sales_quantity", "sales_amount")
+
+_EPOCH = datetime(1970, 1, 1)
+
+# 已写入批次记录的保留时间与清理间隔
+_FLUSH_RECORD_RETENTION = timedelta(days=7)
+_FLUSH_RECORD_CLEANUP_INTERVAL = 3600
+# 单条 UPDATE 涉及的商品数上限
+_UPDATE_CHUNK_SIZE = 500
+
+
+def hour_index(at: datetime) -> int:
+    """时间所在的小时序号（自 1970-01-01 起的小时数，UTC）"""
+    return int((at - _EPOCH).total_seconds() // 3600)
+
+
+def hour_start(index: int) -> datetime:
+    """小时序号对应的整点时间"""
+    return _EPOCH + timedelta(hours=index)
+
+
+def _counter_key(field: str, product_id: int, hour: Optional[int] = None) -> tuple:
+    if field in FIELDS:
+        return (field, product_id)
+    if field in SALES_FIELDS:
+        if hour is None:
+            raise ValueError(f"计数字段 {field} 需要指定小时")
+        return (field, product_id, hour)
+    raise ValueError(f"不支持的计数字段: {field}")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class CounterService:
+    """商品计数缓冲"""
+
+    def __init__(self, journal_dir: str):
+        self.journal_dir = Path(journal_dir)
+        # 计数键 -> 未写入的增量
+        self._pending: Dict[tuple, int] = {}
+        self._journal = None
+        # 已轮换、等待写入数据库的批次：(批次号, 日志路径, 增量)
+        self._batches: List[Tuple[str, Path, Dict[tuple, int]]] = []
+        self._lock = asyncio.Lock()
+        self._last_cleanup = 0.0
+
+    @property
+    def _journal_path(self) -> Path:
+        return self.journal_dir / f"counters-{os.getpid()}.log"
+
+    def incr(self, field: str, product_id: int, amount: int = 1, hour: Optional[int] = None) -> None:
+        """累加计数（写入本地日志，稍后批量写入数据库）"""
+        key = _counter_key(field, product_id, hour)
+        if not amount:
+            return
+        if self._journal is None:
+            self.journal_dir.mkdir(parents=True, exist_ok=True)
+            self._journal = open(self._journal_path, "ab", buffering=0)
+        self._journal.write(f"{' '.join(map(str, key))} {amount}\n".encode())
+        self._pending[key] = self._pending.get(key, 0) + amount
+
+    def add_on_commit(self, session, field: str, product_id: int, amount: int = 1, hour: Optional[int] = None) -> None:
+        """登记在当前事务提交后累加的计数（事务回滚时丢弃）"""
+        _counter_key(field, product_id, hour)
+        session.info.setdefault("counter_increments", []).append((field, product_id, amount, hour))
+
+    def pending(self) -> Dict[tuple, int]:
+        """尚未写入数据库的增量"""
+        merged = dict(self._pending)
+        for _, _, deltas in self._batches:
+            for key, amount in deltas.items():
+                merged[key] = merged.get(key, 0) + amount
+        return merged
+
+    @staticmethod
+    def _read_journal(path: Path) -> Dict[tuple, int]:
+        """解析日志（进程崩溃时最后一行可能不完整，跳过不完整或无法解析的行）"""
+        deltas: Dict[tuple, int] = {}
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    continue
+                try:
+                    field, *numbers = line.decode().split()
+                    key = _counter_key(field, *map(int, numbers[:-1]))
+                    if len(key) != len(numbers):
+                        continue
+                    amount = int(numbers[-1])
+                except (ValueError, TypeError, IndexError):
+                    continue
+                deltas[key] = deltas.get(key, 0) + amount
+        return deltas
+
+    def recover(self) -> int:
+        """接管本进程号或已退出进程遗留的日志，返回接管的文件数"""
+        if not self.journal_dir.is_dir():
+            return 0
+        pid = os.getpid()
+        claimed = 0
+        for path in sorted(self.journal_dir.glob("counters-*")):
+            name = path.name
+            if name.endswith(".log"):
+                owner, batch_id = name[len("counters-"):-len(".log")], uuid.uuid4().hex
+            elif name.endswith(".flushing"):
+                owner, _, batch_id = name[len("counters-"):-len(".flushing")].partition("-")
+            else:
+                continue
+            try:
+                owner = int(owner)
+            except ValueError:
+                continue
+            if owner == pid:
+                # 本进程尚未打开日志时，同进程号的日志来自重启前的进程
+                if self._journal is not None or any(path == batch[1] for batch in self._batches):
+                    continue
+            elif _pid_alive(owner):
+                continue
+
+            # 改名即认领，多个进程同时接管时只有一个成功
+            target = self.journal_dir / f"counters-{pid}-{batch_id}.flushing"
+            if target != path:
+                try:
+                    os.replace(path, target)
+                except FileNotFoundError:
+                    continue
+            self._batches.append((batch_id, target, self._read_journal(target)))
+            claimed += 1
+        if claimed:
+            logger.info(f"接管 {claimed} 个未写入的计数日志")
+        return claimed
+
+    def _rotate(self) -> None:
+        """把当前日志与内存增量作为一个待写入批次"""
+        if not self._pending:
+            return
+        batch_id = uuid.uuid4().hex
+        path = self.journal_dir / f"counters-{os.getpid()}-{batch_id}.flushing"
+        self._journal.close()
+        self._journal = None
+        os.replace(self._journal_path, path)
+        self._batches.append((batch_id, path, self._pending))
+        self._pending = {}
+
+    async def flush(self) -> int:
+        """把待写入的增量批量写入数据库，返回写入的批次数"""
+        async with self._lock:
+            self._rotate()
+            flushed = 0
+            while self._batches:
+                batch_id, path, deltas = self._batches[0]
+                try:
+                    await self._apply(batch_id, deltas)
+                except Exception as e:
+                    # 保留日志与批次，下次重试
+                    COUNTER_FLUSH_ERRORS_TOTAL.inc()
+                    logger.error(f"计数写入失败（批次 {batch_id}，{len(deltas)} 项），稍后重试: {e}")
+                    break
+                path.unlink(missing_ok=True)
+                self._batches.pop(0)
+                flushed += 1
+            return flushed
+
+    async def _apply(self, batch_id: str, deltas: Dict[tuple, int]) -> None:
+        """在一个事务中累加一个批次（已写入过的批次跳过）"""
+        async with async_session_maker() as db:
+            if await db.get(CounterFlush, batch_id) is not None:
+                logger.info(f"计数批次 {batch_id} 已写入，跳过")
+                return
+
+            # 按商品ID排序分块，每块一条 UPDATE（固定的加锁顺序避免并发写入死锁）
+            counts = {key: amount for key, amount in deltas.items() if key[0] in FIELDS and amount}
+            product_ids = sorted({product_id for _, product_id in counts})
+            for start in range(0, len(product_ids), _UPDATE_CHUNK_SIZE):
+                chunk = set(product_ids[start:start + _UPDATE_CHUNK_SIZE])
+                values = {}
+                for field in FIELDS:
+                    increments = {
+                        product_id: amount for (name, product_id), amount in counts.items()
+                        if name == field and product_id in chunk
+                    }
+                    if increments:
+                        values[field] = getattr(Product, field) + case(increments, value=Product.id, else_=0)
+                await db.execute(
+                    update(Product)
+                    .where(Product.id.in_(chunk))
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+            await self._apply_sales(db, deltas)
+            db.add(CounterFlush(batch_id=batch_id))
+
+            if time.monotonic() - self._last_cleanup > _FLUSH_RECORD_CLEANUP_INTERVAL:
+                await db.execute(
+                    delete(CounterFlush).where(CounterFlush.applied_at < datetime.utcnow() - _FLUSH_RECORD_RETENTION)
+                )
+                self._last_cleanup = time.monotonic()
+
+            # 销量变化需要刷新商品缓存；浏览数只用于排行，不因此失效缓存
+            invalidate_on_commit(db, {
+                f"product:{product_id}" for (field, product_id), amount in counts.items() if field == "sold_count"
+            })
+            await db.commit()
+
+        # 退款冲减的销售汇总为负数，按绝对值计入写入量
+        for key, amount in deltas.items():
+            COUNTER_FLUSHED_TOTAL.labels(key[0]).inc(abs(amount))
+
+    @staticmethod
+    async def _apply_sales(db, deltas: Dict[tuple, int]) -> None:
+        """按 (商品ID, 小时) 累加销售汇总（不存在则插入）"""
+        sales: Dict[Tuple[int, int], List[int]] = {}
+        for key, amount in deltas.items():
+            if key[0] in SALES_FIELDS and amount:
+                field, product_id, hour = key
+                sales.setdefault((product_id, hour), [0, 0])[SALES_FIELDS.index(field)] += amount
+        if not sales:
+            return
+
+        stmt = _sales_upsert(db.bind.dialect.name)
+        rows = [
+            {"product_id": product_id, "hour": hour_start(hour), "quantity": quantity, "amount_cents": amount}
+            for (product_id, hour), (quantity, amount) in sorted(sales.items())
+        ]
+        for start in range(0, len(rows), _UPDATE_CHUNK_SIZE):
+            await db.execute(stmt, rows[start:start + _UPDATE_CHUNK_SIZE])
+
+    def close(self) -> None:
+        """关闭日志文件（未写入的增量保留在日志中，由下次启动的进程接管）"""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+
+def _sales_upsert(dialect: str):
+    """销售汇总的累加写入语句（MySQL 用 ON DUPLICATE KEY UPDATE，PostgreSQL / SQLite 用 ON CONFLICT）"""
+    if dialect == "mysql":
+        stmt = mysql.insert(ProductSalesHourly)
+        return stmt.on_duplicate_key_update(
+            quantity=ProductSalesHourly.quantity + stmt.inserted.quantity,
+            amount_cents=ProductSalesHourly.amount_cents + stmt.inserted.amount_cents,
+        )
+    stmt = (postgresql.insert if dialect == "postgresql" else sqlite.insert)(ProductSalesHourly)
+    return stmt.on_conflict_do_update(
+        index_elements=[ProductSalesHourly.product_id, ProductSalesHourly.hour],
+        set_={
+            "quantity": ProductSalesHourly.quantity + stmt.excluded.quantity,
+            "amount_cents": ProductSalesHourly.amount_cents + stmt.excluded.amount_cents,
+        },
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed(session) -> None:
+    increments = session.info.pop("counter_increments", None)
+    if increments:
+        for field, product_id, amount, hour in increments:
+            counter_service.incr(field, product_id, amount, hour)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_increments(session) -> None:
+    session.info.pop("counter_increments", None)
+
+
+def _default_journal_dir() -> str:
+    """默认日志目录按数据库区分，避免连接不同数据库的进程互相接管日志"""
+    digest = hashlib.sha1(settings.DATABASE_URL.encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"dujiaoka_counters_{digest}")
+
+
+# 创建服务实例
+counter_service = CounterService(journal_dir=settings.COUNTER_JOURNAL_DIR or _default_journal_dir())
@@ -1,79 +1,152 @@
 """
 订单服务层
 """
-from typing import List, Optional
+import secrets
+from typing import List, Optional, Union
 from datetime import datetime
-from decimal import Decimal
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, desc
+from sqlalchemy import Row, select, update, and_, desc
 from sqlalchemy.orm import selectinload
 
+from app.core.metrics import ORDERS_CREATED_TOTAL, PAYMENTS_SUCCEEDED_TOTAL, STOCK_EXHAUSTED_TOTAL
+from app.core.money import to_yuan
+from app.core.serialization import RowSerializer
+from app.models.archive import OrderArchive
 from app.models.order import Order, OrderStatus, PaymentMethod
 from app.models.product import Product
 from app.models.user import User
 from app.schemas.order import OrderCreate, OrderUpdate, CartItem
+from app.services.archive import merge_latest, order_tables
 from app.services.product import product_service
+from app.services.ranking import ranking_service
 # from app.services.card import card_service  # 卡密功能已禁用
 from app.services.user import user_service
 
 
+def _order_list_columns(orders) -> tuple:
+    """订单列表投影列（orders 为订单表或合并了归档表的子查询；标签即输出字段名，点号表示嵌套对象）"""
+    return (
+        orders.c.id.label("id"),
+        orders.c.order_number.label("order_number"),
+        orders.c.user_id.label("user_id"),
+        orders.c.product_id.label("product_id"),
+        orders.c.product_name.label("product_name"),
+        orders.c.product_price_cents.label("product_price"),
+        orders.c.quantity.label("quantity"),
+        orders.c.total_amount_cents.label("total_amount"),
+        orders.c.payment_method.label("payment_method"),
+        orders.c.status.label("status"),
+        orders.c.user_note.label("user_note"),
+        orders.c.admin_note.label("admin_note"),
+        orders.c.created_at.label("created_at"),
+        orders.c.updated_at.label("updated_at"),
+        orders.c.paid_at.label("paid_at"),
+        orders.c.delivery_content.label("delivery_content"),
+        orders.c.delivered_at.label("delivered_at"),
+        User.id.label("user.id"),
+        User.username.label("user.username"),
+        User.email.label("user.email"),
+        Product.id.label("product.id"),
+        Product.name.label("product.name"),
+        Product.image_url.label("product.image_url"),
+    )
+
+
+ORDER_LIST_COLUMNS = _order_list_columns(Order.__table__)
+
+order_list_serializer = RowSerializer(
+    [column.name for column in ORDER_LIST_COLUMNS],
+    converters={"product_price": to_yuan, "total_amount": to_yuan},
+)
+
+
 class OrderService:
     """订单服务"""
 
-    async def get_orders(
+    async def get_order_rows(
         self,
         db: AsyncSession,
         user_id: Optional[int] = None,
         status: Optional[OrderStatus] = None,
         skip: int = 0,
         limit: int = 100
-    ) -> List[Order]:
-        """获取订单列表"""
+    ) -> List[Row]:
+        """获取订单列表（列投影，配合 order_list_serializer 使用；包含已归档的订单）"""
+        def where(table) -> list:
+            conditions = []
+            if user_id:
+                conditions.append(table.c.user_id == user_id)
+            if status:
+                conditions.append(table.c.status == status)
+            return conditions
+
+        tables = order_tables(status)
+        if len(tables) > 1:
+            # 热表与归档表各取前 skip + limit 行合并后再分页
+            orders, conditions = merge_latest(tables, where, skip + limit), []
+        else:
+            orders, conditions = Order.__table__, where(Order.__table__)
+
         query = (
-            select(Order)
-            .options(
-                selectinload(Order.user),
-                selectinload(Order.product)
-            )
+            select(*_order_list_columns(orders))
+            .outerjoin(User, User.id == orders.c.user_id)
+            .outerjoin(Product, Product.id == orders.c.product_id)
         )
 
-        conditions = []
-        if user_id:
-            conditions.append(Order.user_id == user_id)
-        if status:
-            conditions.append(Order.status == status)
-
         if conditions:
             query = query.where(and_(*conditions))
 
-        query = query.offset(skip).limit(limit).order_by(desc(Order.created_at))
+        query = query.offset(skip).limit(limit).order_by(desc(orders.c.created_at))
 
         result = await db.execute(query)
-        return result.scalars().all()
+        return result.all()
 
-    async def get_order_by_id(self, db: AsyncSession, order_id: int) -> Optional[Order]:
-        """根据ID获取订单"""
+    async def get_order_by_id(
+        self, db: AsyncSession, order_id: int, include_archived: bool = False
+    ) -> Optional[Union[Order, OrderArchive]]:
+        """根据ID获取订单（include_archived 时热表中不存在则读取归档表，归档订单只读）"""
         result = await db.execute(
             select(Order)
             .options(
                 selectinload(Order.user),
-                selectinload(Order.product)
+                selectinload(Order.product).selectinload(Product.category)
             )
             .where(Order.id == order_id)
         )
-        return result.scalars().first()
+        order = result.scalars().first()
+        if order is None and include_archived:
+            order = await self._get_archived_order(db, OrderArchive.id == order_id)
+        return order
 
-    async def get_order_by_number(self, db: AsyncSession, order_number: str) -> Optional[Order]:
-        """根据订单号获取订单"""
+    async def get_order_by_number(
+        self, db: AsyncSession, order_number: str, include_archived: bool = False
+    ) -> Optional[Union[Order, OrderArchive]]:
+        """根据订单号获取订单（include_archived 时热表中不存在则读取归档表，归档订单只读）"""
         result = await db.execute(
             select(Order)
             .options(
                 selectinload(Order.user),
-                selectinload(Order.product)
+                selectinload(Order.product).selectinload(Product.category)
             )
             .where(Order.order_number == order_number)
         )
+        order = result.scalars().first()
+        if order is None and include_archived:
+            order = await self._get_archived_order(db, OrderArchive.order_number == order_number)
+        return order
+
+    @staticmethod
+    async def _get_archived_order(db: AsyncSession, condition) -> Optional[OrderArchive]:
+        """从归档表读取订单"""
+        result = await db.execute(
+            select(OrderArchive)
+            .options(
+                selectinload(OrderArchive.user),
+                selectinload(OrderArchive.product).selectinload(Product.category)
+            )
+            .where(condition)
+        )
         return result.scalars().first()
 
     async def create_order(self, db: AsyncSession, order_in: OrderCreate, user: User) -> Order:
@@ -87,10 +160,11 @@ class OrderService:
             raise ValueError("商品已下架")
 
         if product.stock < order_in.quantity:
+            STOCK_EXHAUSTED_TOTAL.labels("insufficient").inc()
             raise ValueError("商品库存不足")
 
-        # 计算总金额
-        total_amount = float(product.price * order_in.quantity)
+        # 计算总金额（分）
+        total_amount_cents = product.price_cents * order_in.quantity
 
         # 生成订单号
         order_number = self.generate_order_number()
@@ -101,16 +175,19 @@ class OrderService:
             user_id=user.id,
             product_id=order_in.product_id,
             product_name=product.name,
-            product_price=product.price,
+            product_price_cents=product.price_cents,
             quantity=order_in.quantity,
-            total_amount=total_amount,
+            total_amount_cents=total_amount_cents,
             payment_method=order_in.payment_method,
             user_note=order_in.user_note,
         )
+        # 直接关联已加载的用户/商品，响应序列化时无需再懒加载
+        order.user = user
+        order.product = product
 
         db.add(order)
         await db.commit()
-        await db.refresh(order)
+        ORDERS_CREATED_TOTAL.labels(order_in.payment_method).inc()
         return order
 
     async def update_order(self, db: AsyncSession, order: Order, order_in: OrderUpdate) -> Order:
@@ -129,11 +206,11 @@ class OrderService:
 
         if order.payment_method == PaymentMethod.BALANCE:
             # 余额支付
-            if user.balance < order.total_amount:
+            if user.balance_cents < order.total_amount_cents:
                 raise ValueError("余额不足")
 
-            # 扣除余额
-            await user_service.update_balance(db, user, -order.total_amount)
+            # 扣除余额（与扣减库存、订单状态在同一事务中提交，库存不足时一并回滚）
+            await user_service.update_balance(db, user, -order.total_amount_cents, commit=False)
 
             # 更新订单状态
             order.status = OrderStatus.PAID
@@ -150,6 +227,7 @@ class OrderService:
 
         await db.commit()
         await db.refresh(order)
+        PAYMENTS_SUCCEEDED_TOTAL.labels(order.payment_method.value).inc()
         return order
 
     async def deliver_order(self, db: AsyncSession, order: Order) -> Order:
@@ -157,6 +235,16 @@ class OrderService:
         if order.status != OrderStatus.PAID:
             raise ValueError("订单未支付")
 
+        # 比较并交换领取发货，并发的重复回调与重试只有一个能扣减库存；失败时随事务一并回滚
+        claimed = await db.execute(
+            update(Order)
+            .where(Order.id == order.id, Order.status == OrderStatus.PAID)
+            .values(status=OrderStatus.DELIVERED)
+            .execution_options(synchronize_session=False)
+        )
+        if claimed.rowcount != 1:
+            raise ValueError("订单未支付")
+
         # 获取商品
         product = await product_service.get_product_by_id(db, order.product_id)
         if not product:
@@ -166,6 +254,7 @@ class OrderService:
             # 手动发货
             order.status = OrderStatus.DELIVERED
             order.delivered_at = datetime.utcnow()
+            ranking_service.record_sale(db, order)
             await db.commit()
             return order
 
@@ -188,10 +277,11 @@ class OrderService:
         order.delivered_at = datetime.utcnow()
 
         # 减少商品库存
-        await product_service.update_stock(db, product, -order.quantity)
+        await product_service.update_stock(db, product, -order.quantity, commit=False)
 
         # 增加商品销量
         await product_service.increment_sold_count(db, product, order.quantity)
+        ranking_service.record_sale(db, order)
 
         await db.commit()
         await db.refresh(order)
@@ -206,7 +296,7 @@ class OrderService:
         if order.status == OrderStatus.PAID and order.payment_method == PaymentMethod.BALANCE:
             user = await user_service.get_by_id(db, order.user_id)
             if user:
-                await user_service.update_balance(db, user, order.total_amount)
+                await user_service.update_balance(db, user, order.total_amount_cents)
 
         order.status = OrderStatus.CANCELLED
         await db.commit()
@@ -222,9 +312,10 @@ class OrderService:
         if order.payment_method == PaymentMethod.BALANCE:
             user = await user_service.get_by_id(db, order.user_id)
             if user:
-                await user_service.update_balance(db, user, order.total_amount)
+                await user_service.update_balance(db, user, order.total_amount_cents)
 
         order.status = OrderStatus.REFUNDED
+        ranking_service.record_refund(db, order)
         await db.commit()
         await db.refresh(order)
         return order
@@ -232,9 +323,9 @@ class OrderService:
     @staticmethod
     def generate_order_number() -> str:
         """生成订单号"""
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        random_str = str(datetime.now().microsecond)[:3]
-        return f"ORD{timestamp}{random_str}"
+        now = datetime.now()
+        # 秒级时间戳 + 微秒 + 随机数，避免并发下单时重复
+        return f"ORD{now:%Y%m%d%H%M%S}{now.microsecond:06d}{secrets.randbelow(10000):04d}"
 
 
 # 创建服务实例
@@ -1,23 +1,106 @@
 """
 支付服务层
 """
-from typing import List, Optional
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple, Union
 from datetime import datetime
 
+from loguru import logger
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, desc
+from sqlalchemy import Row, select, update, desc
 from sqlalchemy.orm import selectinload
 
-from app.models.payment import Payment, PaymentStatus
-from app.models.order import Order
+from app.core.config import settings
+from app.core.metrics import PAYMENTS_NEEDING_ATTENTION_TOTAL, PAYMENTS_SUCCEEDED_TOTAL
+from app.core.money import to_cents, to_yuan
+from app.core.serialization import RowSerializer
+from app.models.archive import PaymentArchive
+from app.models.payment import Payment, PaymentStatus, ProcessedCallback, PaymentCallbackJob
+from app.models.order import Order, OrderStatus
 from app.models.user import User
 from app.schemas.payment import PaymentCreate, PaymentUpdate
+from app.services.archive import merge_latest, payment_tables
+from app.services.signature import signature_verifier
+
+
+class CallbackRejected(ValueError):
+    """回调与支付记录不符（支付记录不存在、金额不匹配），重试也不会成功"""
+
+
+def _payment_list_columns(payments) -> tuple:
+    """支付列表投影列（payments 为支付表或合并了归档表的子查询；不含 payment_data 原始回调数据）"""
+    return (
+        payments.c.id.label("id"),
+        payments.c.user_id.label("user_id"),
+        payments.c.order_id.label("order_id"),
+        payments.c.payment_method.label("payment_method"),
+        payments.c.amount_cents.label("amount"),
+        payments.c.status.label("status"),
+        payments.c.transaction_id.label("transaction_id"),
+        payments.c.out_trade_no.label("out_trade_no"),
+        payments.c.gateway_amount_cents.label("gateway_amount"),
+        payments.c.gateway_paid_at.label("gateway_paid_at"),
+        payments.c.created_at.label("created_at"),
+        payments.c.updated_at.label("updated_at"),
+        payments.c.paid_at.label("paid_at"),
+    )
+
+
+PAYMENT_LIST_COLUMNS = _payment_list_columns(Payment.__table__)
+
+payment_list_serializer = RowSerializer(
+    [column.name for column in PAYMENT_LIST_COLUMNS],
+    converters={"amount": to_yuan, "gateway_amount": to_yuan},
+)
+
+
+class RecentCallbackCache:
+    """最近已处理回调的进程内缓存（LRU），用于快速拦截网关重试"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._keys: OrderedDict = OrderedDict()
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return True
+        return False
+
+    def add(self, key: Tuple[str, str]) -> None:
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+        if len(self._keys) > self.maxsize:
+            self._keys.popitem(last=False)
 
 
 class PaymentService:
     """支付服务"""
 
-    async def get_payments(
+    def __init__(self):
+        self._recent_callbacks = RecentCallbackCache(settings.PAYMENT_CALLBACK_DEDUP_CACHE_SIZE)
+        # 同一交易号的回调在进程内串行处理：[锁, 等待数]
+        self._inflight: Dict[Tuple[str, str], list] = {}
+
+    @asynccontextmanager
+    async def _single_flight(self, key: Tuple[str, str]):
+        """同一交易号的回调在进程内串行执行"""
+        entry = self._inflight.get(key)
+        if entry is None:
+            entry = self._inflight[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._inflight[key]
+
+    async def get_payment_rows(
         self,
         db: AsyncSession,
         user_id: Optional[int] = None,
@@ -25,34 +108,34 @@ class PaymentService:
         status: Optional[PaymentStatus] = None,
         skip: int = 0,
         limit: int = 100
-    ) -> List[Payment]:
-        """获取支付记录列表"""
+    ) -> List[Row]:
+        """获取支付记录列表（列投影，配合 payment_list_serializer 使用；包含已归档的支付记录）"""
+        def where(table) -> list:
+            conditions = []
+            if user_id:
+                conditions.append(table.c.user_id == user_id)
+            if order_id:
+                conditions.append(table.c.order_id == order_id)
+            if status:
+                conditions.append(table.c.status == status)
+            return conditions
+
+        # 热表与归档表各取前 skip + limit 行合并后再分页
+        payments = merge_latest(payment_tables(), where, skip + limit)
         query = (
-            select(Payment)
-            .options(
-                selectinload(Payment.user),
-                selectinload(Payment.order)
-            )
+            select(*_payment_list_columns(payments))
+            .offset(skip)
+            .limit(limit)
+            .order_by(desc(payments.c.created_at))
         )
 
-        conditions = []
-        if user_id:
-            conditions.append(Payment.user_id == user_id)
-        if order_id:
-            conditions.append(Payment.order_id == order_id)
-        if status:
-            conditions.append(Payment.status == status)
-
-        if conditions:
-            query = query.where(and_(*conditions))
-
-        query = query.offset(skip).limit(limit).order_by(desc(Payment.created_at))
-
         result = await db.execute(query)
-        return result.scalars().all()
+        return result.all()
 
-    async def get_payment_by_id(self, db: AsyncSession, payment_id: int) -> Optional[Payment]:
-        """根据ID获取支付记录"""
+    async def get_payment_by_id(
+        self, db: AsyncSession, payment_id: int, include_archived: bool = False
+    ) -> Optional[Union[Payment, PaymentArchive]]:
+        """根据ID获取支付记录（include_archived 时热表中不存在则读取归档表，归档记录只读）"""
         result = await db.execute(
             select(Payment)
             .options(
@@ -61,7 +144,11 @@ class PaymentService:
             )
             .where(Payment.id == payment_id)
         )
-        return result.scalars().first()
+        payment = result.scalars().first()
+        if payment is None and include_archived:
+            result = await db.execute(select(PaymentArchive).where(PaymentArchive.id == payment_id))
+            payment = result.scalars().first()
+        return payment
 
     async def get_payment_by_transaction_id(
         self,
@@ -97,7 +184,7 @@ class PaymentService:
             user_id=payment_in.user_id,
             order_id=payment_in.order_id,
             payment_method=payment_in.payment_method,
-            amount=payment_in.amount,
+            amount_cents=to_cents(payment_in.amount),
             status=PaymentStatus.PENDING,
         )
 
@@ -125,100 +212,277 @@ class PaymentService:
         await db.refresh(payment)
         return payment
 
+    @staticmethod
+    def _callback_key(gateway: str, callback_data: dict) -> Tuple[str, str]:
+        """校验回调必要字段，返回去重键（网关, 第三方交易号）"""
+        if gateway == "alipay":
+            if not callback_data.get("out_trade_no") or not callback_data.get("trade_no"):
+                raise ValueError("无效的回调数据")
+            return ("alipay", callback_data["trade_no"])
+
+        if gateway == "wechat":
+            if callback_data.get("return_code") != "SUCCESS":
+                raise ValueError("回调失败")
+            return ("wechat", callback_data.get("transaction_id"))
+
+        raise ValueError("不支持的支付方式")
+
+    @staticmethod
+    def extract_gateway_fields(gateway: str, callback_data: dict) -> dict:
+        """从回调数据中提取商户订单号、网关金额（分）和网关支付时间"""
+        fields = {"out_trade_no": callback_data.get("out_trade_no"), "gateway_amount_cents": None}
+
+        try:
+            if gateway == "alipay":
+                fields["gateway_amount_cents"] = to_cents(callback_data["total_amount"])
+            elif gateway == "wechat":
+                fields["gateway_amount_cents"] = int(callback_data["total_fee"])
+        except (KeyError, TypeError, ValueError):
+            pass
+
+        # 支付宝 gmt_payment: 2026-01-01 12:00:00；微信 time_end: 20260101120000
+        paid_at = None
+        try:
+            if gateway == "alipay" and callback_data.get("gmt_payment"):
+                paid_at = datetime.strptime(callback_data["gmt_payment"], "%Y-%m-%d %H:%M:%S")
+            elif gateway == "wechat" and callback_data.get("time_end"):
+                paid_at = datetime.strptime(callback_data["time_end"], "%Y%m%d%H%M%S")
+        except (TypeError, ValueError):
+            pass
+        fields["gateway_paid_at"] = paid_at
+
+        return fields
+
+    async def enqueue_callback(self, db: AsyncSession, gateway: str, callback_data: dict) -> dict:
+        """
+        接收支付回调
+
+        只做字段校验、验签并写入回调任务表，立即应答网关；
+        实际的支付确认和发货由后台 worker 异步完成。
+        """
+        key = self._callback_key(gateway, callback_data)
+        if not await signature_verifier.verify(gateway, callback_data):
+            raise ValueError("签名验证失败")
+
+        if key in self._recent_callbacks:
+            return {"code": "success", "message": "已处理"}
+
+        db.add(PaymentCallbackJob(gateway=gateway, payload=callback_data))
+        await db.commit()
+        return {"code": "success", "message": "已接收"}
+
+    async def process_callback(self, db: AsyncSession, gateway: str, callback_data: dict) -> dict:
+        """处理回调任务"""
+        if gateway == "alipay":
+            return await self.handle_alipay_callback(db, callback_data)
+        if gateway == "wechat":
+            return await self.handle_wechat_callback(db, callback_data)
+        raise ValueError("不支持的支付方式")
+
+    async def _confirm_payment(
+        self,
+        db: AsyncSession,
+        gateway: str,
+        transaction_id: str,
+        payment: Payment,
+        callback_data: dict
+    ) -> bool:
+        """
+        确认支付成功并发货
+
+        先写入去重表（网关+交易号唯一），再把待支付的记录比较并交换为成功，
+        两步任一失败都说明该交易已被其他请求或 worker 处理。
+        收款与订单已支付状态先行提交，再单独发货，发货失败不影响已确认的支付。
+        订单超时被自动取消（支付记录随之取消）后才到达的支付成功回调，恢复订单并照常发货；
+        订单已被取消或已支付时只记录收款，记录错误日志与指标，由人工退款。
+
+        Returns:
+            bool: False 表示重复回调，未做任何修改
+        """
+        db.add(ProcessedCallback(
+            gateway=gateway,
+            transaction_id=transaction_id,
+            payment_id=payment.id,
+        ))
+        try:
+            await db.flush()
+        except IntegrityError:
+            await db.rollback()
+            return False
+
+        now = datetime.utcnow()
+        values = {
+            "status": PaymentStatus.SUCCESS,
+            "paid_at": now,
+            "transaction_id": transaction_id,
+            "payment_data": callback_data,
+            **self.extract_gateway_fields(gateway, callback_data),
+        }
+        paid_after_cancel = False
+        result = await db.execute(
+            update(Payment)
+            .where(Payment.id == payment.id, Payment.status == PaymentStatus.PENDING)
+            .values(**values)
+        )
+        if result.rowcount != 1:
+            # 网关已扣款，超时取消的支付记录同样要确认，不能当作重复回调忽略
+            result = await db.execute(
+                update(Payment)
+                .where(Payment.id == payment.id, Payment.status == PaymentStatus.CANCELLED)
+                .values(**values)
+            )
+            if result.rowcount != 1:
+                await db.rollback()
+                return False
+            paid_after_cancel = True
+
+        # 更新订单状态（只处理仍待支付的订单，避免重复发货）
+        from app.services.order import order_service
+        order = await order_service.get_order_by_id(db, payment.order_id)
+        if order and paid_after_cancel and order.status == OrderStatus.CANCELLED:
+            logger.warning(
+                f"订单 {order.order_number} 超时取消后收到支付成功回调（{gateway} {transaction_id}），恢复订单并发货"
+            )
+            PAYMENTS_NEEDING_ATTENTION_TOTAL.labels("paid_after_cancel").inc()
+            order.status = OrderStatus.PENDING
+
+        payable = order is not None and order.status == OrderStatus.PENDING
+        if payable:
+            order.status = OrderStatus.PAID
+            order.paid_at = now
+        else:
+            logger.error(
+                f"支付记录 {payment.id}（{gateway} {transaction_id}）已收款，"
+                f"但订单{'不存在' if order is None else f' {order.order_number} 状态为 {order.status.value}'}，需人工退款"
+            )
+            PAYMENTS_NEEDING_ATTENTION_TOTAL.labels("order_not_payable").inc()
+
+        # 收款与发货分开提交，发货失败不会回滚已确认的支付
+        await db.commit()
+        PAYMENTS_SUCCEEDED_TOTAL.labels(gateway).inc()
+
+        if payable:
+            await self._deliver_paid_order(db, order.id)
+        return True
+
+    async def _deliver_paid_order(self, db: AsyncSession, order_id: int) -> None:
+        """
+        为已确认收款的订单发货
+
+        订单不处于已支付状态时直接返回，重复回调可借此补发之前失败的发货。
+        发货的业务校验失败（如库存不足）只回滚发货本身：订单保持已支付，
+        记录错误日志与指标，由人工补发或退款；数据库异常照常抛出，由回调队列重试。
+        """
+        from app.services.order import order_service
+        order = await order_service.get_order_by_id(db, order_id)
+        if order is None or order.status != OrderStatus.PAID:
+            return
+
+        order_number = order.order_number
+        try:
+            await order_service.deliver_order(db, order)
+        except ValueError as e:
+            await db.rollback()
+            status = (await db.execute(select(Order.status).where(Order.id == order_id))).scalar_one_or_none()
+            if status != OrderStatus.PAID:
+                # 已被并发处理的重复回调发货
+                return
+            logger.error(f"订单 {order_number} 已支付但发货失败（{e}），需人工补发或退款")
+            PAYMENTS_NEEDING_ATTENTION_TOTAL.labels("delivery_failed").inc()
+
     async def handle_alipay_callback(self, db: AsyncSession, callback_data: dict) -> dict:
         """处理支付宝回调"""
         # 验证回调数据
-        out_trade_no = callback_data.get("out_trade_no")
+        key = self._callback_key("alipay", callback_data)
         trade_no = callback_data.get("trade_no")
         total_amount = callback_data.get("total_amount")
         trade_status = callback_data.get("trade_status")
 
-        if not out_trade_no or not trade_no:
-            raise ValueError("无效的回调数据")
-
-        # 查找支付记录
-        payment = await self.get_payment_by_transaction_id(db, trade_no)
-        if not payment:
-            raise ValueError("支付记录不存在")
-
-        if payment.status == PaymentStatus.SUCCESS:
+        if key in self._recent_callbacks:
             return {"code": "success", "message": "已处理"}
 
-        # 验证金额
-        if float(total_amount) != payment.amount:
-            raise ValueError("金额不匹配")
-
-        # 更新支付状态
-        if trade_status == "TRADE_SUCCESS":
-            payment.status = PaymentStatus.SUCCESS
-            payment.paid_at = datetime.utcnow()
-            payment.transaction_id = trade_no
-            payment.payment_data = str(callback_data)
-
-            # 更新订单状态
-            from app.services.order import order_service
-            order = await order_service.get_order_by_id(db, payment.order_id)
-            if order:
-                order.status = "paid"
-                order.paid_at = datetime.utcnow()
-
-                # 自动发货
-                await order_service.deliver_order(db, order)
-
-        elif trade_status == "TRADE_CLOSED":
-            payment.status = PaymentStatus.CANCELLED
-        else:
-            payment.status = PaymentStatus.FAILED
-
-        await db.commit()
+        async with self._single_flight(key):
+            if key in self._recent_callbacks:
+                return {"code": "success", "message": "已处理"}
+
+            # 查找支付记录
+            payment = await self.get_payment_by_transaction_id(db, trade_no)
+            if not payment:
+                raise CallbackRejected("支付记录不存在")
+
+            if payment.status == PaymentStatus.SUCCESS:
+                await self._deliver_paid_order(db, payment.order_id)
+                self._recent_callbacks.add(key)
+                return {"code": "success", "message": "已处理"}
+
+            # 验证金额（支付宝金额为元，按十进制解析为分后精确比较）
+            try:
+                amount_cents = to_cents(total_amount)
+            except (TypeError, ValueError):
+                amount_cents = None
+            if amount_cents != payment.amount_cents:
+                raise CallbackRejected("金额不匹配")
+
+            # 更新支付状态
+            if trade_status == "TRADE_SUCCESS":
+                if not await self._confirm_payment(db, "alipay", trade_no, payment, callback_data):
+                    self._recent_callbacks.add(key)
+                    return {"code": "success", "message": "已处理"}
+            elif trade_status == "TRADE_CLOSED":
+                payment.status = PaymentStatus.CANCELLED
+            else:
+                payment.status = PaymentStatus.FAILED
+
+            await db.commit()
+            if trade_status == "TRADE_SUCCESS":
+                self._recent_callbacks.add(key)
 
         return {"code": "success", "message": "处理成功"}
 
     async def handle_wechat_callback(self, db: AsyncSession, callback_data: dict) -> dict:
         """处理微信支付回调"""
         # 验证回调数据
-        return_code = callback_data.get("return_code")
+        key = self._callback_key("wechat", callback_data)
         result_code = callback_data.get("result_code")
-        out_trade_no = callback_data.get("out_trade_no")
         transaction_id = callback_data.get("transaction_id")
         total_fee = callback_data.get("total_fee")
 
-        if return_code != "SUCCESS":
-            raise ValueError("回调失败")
-
-        # 查找支付记录
-        payment = await self.get_payment_by_transaction_id(db, transaction_id)
-        if not payment:
-            raise ValueError("支付记录不存在")
-
-        if payment.status == PaymentStatus.SUCCESS:
+        if key in self._recent_callbacks:
             return {"code": "success", "message": "已处理"}
 
-        # 验证金额（微信支付金额以分为单位）
-        if int(total_fee) != int(payment.amount * 100):
-            raise ValueError("金额不匹配")
-
-        # 更新支付状态
-        if result_code == "SUCCESS":
-            payment.status = PaymentStatus.SUCCESS
-            payment.paid_at = datetime.utcnow()
-            payment.transaction_id = transaction_id
-            payment.payment_data = str(callback_data)
-
-            # 更新订单状态
-            from app.services.order import order_service
-            order = await order_service.get_order_by_id(db, payment.order_id)
-            if order:
-                order.status = "paid"
-                order.paid_at = datetime.utcnow()
-
-                # 自动发货
-                await order_service.deliver_order(db, order)
-
-        else:
-            payment.status = PaymentStatus.FAILED
-
-        await db.commit()
+        async with self._single_flight(key):
+            if key in self._recent_callbacks:
+                return {"code": "success", "message": "已处理"}
+
+            # 查找支付记录
+            payment = await self.get_payment_by_transaction_id(db, transaction_id)
+            if not payment:
+                raise CallbackRejected("支付记录不存在")
+
+            if payment.status == PaymentStatus.SUCCESS:
+                await self._deliver_paid_order(db, payment.order_id)
+                self._recent_callbacks.add(key)
+                return {"code": "success", "message": "已处理"}
+
+            # 验证金额（微信支付金额以分为单位，与库中的分直接比较）
+            try:
+                amount_cents = int(total_fee)
+            except (TypeError, ValueError):
+                amount_cents = None
+            if amount_cents != payment.amount_cents:
+                raise CallbackRejected("金额不匹配")
+
+            # 更新支付状态
+            if result_code == "SUCCESS":
+                if not await self._confirm_payment(db, "wechat", transaction_id, payment, callback_data):
+                    self._recent_callbacks.add(key)
+                    return {"code": "success", "message": "已处理"}
+            else:
+                payment.status = PaymentStatus.FAILED
+
+            await db.commit()
+            if result_code == "SUCCESS":
+                self._recent_callbacks.add(key)
 
         return {"code": "success", "message": "处理成功"}
 
@@ -1,13 +1,31 @@
 """
 商品服务层
 """
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, and_, or_, update
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
+from app.core.cache import cache, invalidate_on_commit, register_model_tags
+from app.core.config import settings
+from app.core.database import update_returning
+from app.core.metrics import STOCK_EXHAUSTED_TOTAL
 from app.models.product import Product, Category
-from app.schemas.product import ProductCreate, ProductUpdate, CategoryCreate, CategoryUpdate
+from app.services.counter import counter_service
+from app.schemas.product import (
+    Category as CategorySchema,
+    CategoryCreate,
+    CategoryUpdate,
+    Product as ProductSchema,
+    ProductCreate,
+    ProductUpdate,
+)
+
+# 商品详情带分类信息，分类变更同时失效商品缓存
+product_cache = cache.namespace("product")
+register_model_tags(Product, lambda product: (f"product:{product.id}", "products"))
+register_model_tags(Category, lambda category: ("categories",))
 
 
 class ProductService:
@@ -24,6 +42,16 @@ class ProductService:
         )
         return result.scalars().all()
 
+    async def get_category_list(self, db: AsyncSession, skip: int = 0, limit: int = 100) -> List[dict]:
+        """获取分类列表（缓存）"""
+        async def load():
+            categories = await self.get_categories(db, skip=skip, limit=limit)
+            return [CategorySchema.model_validate(category).model_dump() for category in categories]
+
+        return await product_cache.get_or_set(
+            f"categories:{skip}:{limit}", load, settings.CACHE_CATEGORY_TTL, tags=("categories",)
+        )
+
     async def get_category_by_id(self, db: AsyncSession, category_id: int) -> Optional[Category]:
         """根据ID获取分类"""
         result = await db.execute(select(Category).where(Category.id == category_id))
@@ -96,6 +124,53 @@ class ProductService:
         )
         return result.scalars().first()
 
+    async def get_product_page(
+        self,
+        db: AsyncSession,
+        skip: int = 0,
+        limit: int = 20,
+        category_id: Optional[int] = None,
+        search: Optional[str] = None
+    ) -> List[dict]:
+        """
+        获取上架商品列表（缓存）
+
+        库存与销量最多滞后 CACHE_PRODUCT_LIST_TTL 秒；搜索结果组合过多，不缓存。
+        """
+        async def load():
+            products = await self.get_products(
+                db, skip=skip, limit=limit, category_id=category_id, is_active=True, search=search
+            )
+            return [ProductSchema.model_validate(product).model_dump() for product in products]
+
+        if search:
+            return await load()
+        return await product_cache.get_or_set(
+            f"list:{skip}:{limit}:{category_id or ''}", load, settings.CACHE_PRODUCT_LIST_TTL,
+            tags=("products", "categories"),
+        )
+
+    async def get_product_detail(self, db: AsyncSession, product_id: int) -> Optional[dict]:
+        """获取上架商品详情（缓存），商品不存在或已下架时返回 None"""
+        async def load():
+            product = await self.get_product_by_id(db, product_id)
+            if not product or not product.is_active:
+                return None
+            return ProductSchema.model_validate(product).model_dump()
+
+        return await product_cache.get_or_set(
+            f"detail:{product_id}", load, settings.CACHE_PRODUCT_TTL,
+            tags=(f"product:{product_id}", "categories"),
+        )
+
+    async def get_products_by_ids(self, db: AsyncSession, product_ids: Iterable[int]) -> Dict[int, Product]:
+        """批量获取商品（一次查询），返回 {商品ID: 商品}"""
+        ids = set(product_ids)
+        if not ids:
+            return {}
+        result = await db.execute(select(Product).where(Product.id.in_(ids)))
+        return {product.id: product for product in result.scalars().all()}
+
     async def create_product(self, db: AsyncSession, product_in: ProductCreate) -> Product:
         """创建商品"""
         # 检查分类是否存在
@@ -130,22 +205,47 @@ class ProductService:
         product.is_active = False
         await db.commit()
 
-    async def update_stock(self, db: AsyncSession, product: Product, quantity: int) -> Product:
-        """更新商品库存"""
-        if product.stock + quantity < 0:
+    async def update_stock(self, db: AsyncSession, product: Product, quantity: int, commit: bool = True) -> Product:
+        """
+        更新商品库存
+
+        在数据库中原子地增减（扣减时带库存充足条件），并发扣减不会互相覆盖导致超卖。
+        commit=False 时只执行语句，由调用方统一提交。
+        """
+        stmt = (
+            update(Product)
+            .where(Product.id == product.id)
+            .values(stock=Product.stock + quantity)
+            .execution_options(synchronize_session=False)
+        )
+        if quantity < 0:
+            stmt = stmt.where(Product.stock >= -quantity)
+        stock = await update_returning(db, stmt, Product.stock, Product.id == product.id)
+        if stock is None:
+            STOCK_EXHAUSTED_TOTAL.labels("insufficient").inc()
             raise ValueError("库存不足")
 
-        product.stock += quantity
-        await db.commit()
-        await db.refresh(product)
+        set_committed_value(product, "stock", stock)
+        invalidate_on_commit(db, (f"product:{product.id}",))
+        if commit:
+            await db.commit()
+            await db.refresh(product)
+        if quantity < 0 and stock == 0:
+            STOCK_EXHAUSTED_TOTAL.labels("sold_out").inc()
         return product
 
-    async def increment_sold_count(self, db: AsyncSession, product: Product, quantity: int = 1) -> Product:
-        """增加商品销量"""
-        product.sold_count += quantity
-        await db.commit()
-        await db.refresh(product)
-        return product
+    async def increment_sold_count(self, db: AsyncSession, product: Product, quantity: int = 1) -> None:
+        """
+        增加商品销量
+
+        不在订单事务中更新商品行：事务提交后计入计数缓冲，由后台任务批量写入（见 app/services/counter.py），
+        避免热门商品的并发订单在同一行上排队。
+        """
+        counter_service.add_on_commit(db, "sold_count", product.id, quantity)
+
+    def record_view(self, product_id: int) -> None:
+        """记录一次商品浏览（批量写入 view_count）"""
+        counter_service.incr("view_count", product_id)
 
 
 # 创建服务实例
@@ -0,0 +1,313 @@
+"""
+商品排行榜服务
+
+各分类（以及全部分类）在最近 24 小时 / 7 天 / 30 天内按销量、销售额排序的 Top-N。
+
+- 数据源：订单发货时（退款时冲减）把销量与销售额登记到计数缓冲，事务提交后按小时汇总，
+  由计数写入任务批量累加到 product_sales_hourly（见 app/services/counter.py），生成排行不再聚合 orders 表
+- 生成：主节点在内存中保存最近 30 天的小时桶和各时间窗口内每个商品的累计值。每次刷新只重读最近两个小时的汇总行，
+  把差值计入窗口累计，并减去滑出窗口的小时桶，再用堆选出每个分类的 Top-N；只把有变化的榜单写入 product_rankings。
+  每小时整体重新加载一次，以纳入恢复的计数日志补写到更早小时的数据，以及商品下架、分类调整
+- 读取：各 worker 按榜单从 product_rankings 读取 N 行并缓存在内存中（标签 rankings），主节点写入后按标签失效
+"""
+import asyncio
+import heapq
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import cache, flush_invalidations, invalidate_on_commit
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.money import to_yuan
+from app.models.order import Order
+from app.models.product import Product, ProductRanking, ProductSalesHourly
+from app.services.counter import counter_service, hour_index, hour_start
+
+# 时间窗口 -> 小时数
+PERIODS = {"24h": 24, "7d": 24 * 7, "30d": 24 * 30}
+# 排序依据：销量 / 销售额
+METRICS = ("quantity", "amount")
+# 全部分类的榜单使用的分类ID
+ALL_CATEGORIES = 0
+
+# 增量刷新时重读的小时数（计数写入滞后几秒，上一小时末的销售可能在下一小时才写入）
+_LOOKBACK_HOURS = 2
+# 整体重新加载的间隔（秒）
+_FULL_RELOAD_INTERVAL = 3600
+_MAX_HOURS = max(PERIODS.values())
+_INACTIVE = -1
+
+ranking_cache = cache.namespace("ranking")
+
+# (时间窗口, 排序依据, 分类ID) -> [(商品ID, 销量, 销售额分)]
+Rankings = Dict[Tuple[str, str, int], List[Tuple[int, int, int]]]
+
+
+class RankingService:
+    """商品排行榜"""
+
+    def __init__(self, size: int):
+        self.size = size
+        # 小时序号 -> 商品ID -> (销量, 销售额分)
+        self._hours: Dict[int, Dict[int, Tuple[int, int]]] = {}
+        # 时间窗口 -> 商品ID -> [销量, 销售额分]
+        self._totals: Dict[str, Dict[int, List[int]]] = {period: {} for period in PERIODS}
+        # 商品ID -> 分类ID（已下架的商品为 _INACTIVE）
+        self._categories: Dict[int, int] = {}
+        self._current_hour: Optional[int] = None
+        # 已写入 product_rankings 的榜单（None 表示本进程尚未写入过）
+        self._published: Optional[Rankings] = None
+        self._last_full_reload = 0.0
+        self._lock = asyncio.Lock()
+
+    def record_sale(self, db: AsyncSession, order: Order) -> None:
+        """登记订单发货（事务提交后计入发货所在小时的销售汇总）"""
+        self._record(db, order, 1)
+
+    def record_refund(self, db: AsyncSession, order: Order) -> None:
+        """登记订单退款（从原发货小时的销售汇总中冲减）"""
+        if order.delivered_at is not None:
+            self._record(db, order, -1)
+
+    @staticmethod
+    def _record(db: AsyncSession, order: Order, sign: int) -> None:
+        hour = hour_index(order.delivered_at or datetime.utcnow())
+        counter_service.add_on_commit(db, "sales_quantity", order.product_id, sign * order.quantity, hour)
+        counter_service.add_on_commit(db, "sales_amount", order.product_id, sign * order.total_amount_cents, hour)
+
+    async def get_ranking(
+        self,
+        db: AsyncSession,
+        period: str = "24h",
+        metric: str = "quantity",
+        category_id: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[dict]:
+        """获取排行榜（缓存；只读取 product_rankings 中该榜单的 N 行）"""
+        if period not in PERIODS:
+            raise ValueError(f"不支持的时间窗口: {period}")
+        if metric not in METRICS:
+            raise ValueError(f"不支持的排序依据: {metric}")
+        category_id = category_id or ALL_CATEGORIES
+
+        async def load():
+            result = await db.execute(
+                select(
+                    ProductRanking.position,
+                    ProductRanking.product_id,
+                    Product.name,
+                    ProductRanking.quantity,
+                    ProductRanking.amount_cents,
+                )
+                .join(Product, Product.id == ProductRanking.product_id)
+                .where(
+                    ProductRanking.period == period,
+                    ProductRanking.metric == metric,
+                    ProductRanking.category_id == category_id,
+                    Product.is_active == True,
+                )
+                .order_by(ProductRanking.position)
+            )
+            return [
+                {
+                    "position": position,
+                    "product_id": product_id,
+                    "product_name": name,
+                    "quantity": quantity,
+                    "amount": to_yuan(amount_cents),
+                }
+                for position, product_id, name, quantity, amount_cents in result
+            ]
+
+        entries = await ranking_cache.get_or_set(
+            f"{period}:{metric}:{category_id}", load, settings.CACHE_RANKING_TTL, tags=("rankings", "products")
+        )
+        return entries[:limit] if limit else entries
+
+    @staticmethod
+    def _accumulate(totals: Dict[int, List[int]], product_id: int, quantity: int, amount: int) -> None:
+        total = totals.setdefault(product_id, [0, 0])
+        total[0] += quantity
+        total[1] += amount
+        if total[0] == 0 and total[1] == 0:
+            del totals[product_id]
+
+    def _add(self, hour: int, product_id: int, quantity: int, amount: int) -> None:
+        """把一个小时桶的增量计入包含该小时的时间窗口"""
+        for period, hours in PERIODS.items():
+            if hour > self._current_hour - hours:
+                self._accumulate(self._totals[period], product_id, quantity, amount)
+
+    def _set_hour(self, hour: int, sales: Dict[int, Tuple[int, int]]) -> None:
+        """用数据库中的汇总替换一个小时桶，差值计入窗口累计"""
+        old = self._hours.get(hour, {})
+        for product_id in old.keys() | sales.keys():
+            quantity, amount = sales.get(product_id, (0, 0))
+            old_quantity, old_amount = old.get(product_id, (0, 0))
+            if quantity != old_quantity or amount != old_amount:
+                self._add(hour, product_id, quantity - old_quantity, amount - old_amount)
+        if sales:
+            self._hours[hour] = sales
+        else:
+            self._hours.pop(hour, None)
+
+    def _advance(self, now_hour: int) -> None:
+        """时间前进到 now_hour：减去滑出各时间窗口的小时桶，丢弃超过最长窗口的小时桶"""
+        previous, self._current_hour = self._current_hour, now_hour
+        for period, hours in PERIODS.items():
+            totals = self._totals[period]
+            for hour in range(previous - hours + 1, min(now_hour, previous + hours) - hours + 1):
+                for product_id, (quantity, amount) in self._hours.get(hour, {}).items():
+                    self._accumulate(totals, product_id, -quantity, -amount)
+        for hour in [hour for hour in self._hours if hour <= now_hour - _MAX_HOURS]:
+            del self._hours[hour]
+
+    async def _load_hours(self, db: AsyncSession, since: int) -> Dict[int, Dict[int, Tuple[int, int]]]:
+        """读取 since 小时之后的销售汇总"""
+        result = await db.execute(
+            select(
+                ProductSalesHourly.hour,
+                ProductSalesHourly.product_id,
+                ProductSalesHourly.quantity,
+                ProductSalesHourly.amount_cents,
+            ).where(ProductSalesHourly.hour >= hour_start(since))
+        )
+        hours: Dict[int, Dict[int, Tuple[int, int]]] = {}
+        for hour, product_id, quantity, amount in result:
+            hours.setdefault(hour_index(hour), {})[product_id] = (quantity, amount)
+        return hours
+
+    async def _load_categories(self, db: AsyncSession, product_ids) -> None:
+        """加载商品所属分类（已下架的商品不进入排行）"""
+        product_ids = sorted(product_ids)
+        for start in range(0, len(product_ids), 500):
+            result = await db.execute(
+                select(Product.id, Product.category_id, Product.is_active)
+                .where(Product.id.in_(product_ids[start:start + 500]))
+            )
+            for product_id, category_id, is_active in result:
+                self._categories[product_id] = (category_id or ALL_CATEGORIES) if is_active else _INACTIVE
+
+    def _compute(self) -> Rankings:
+        """从各时间窗口的累计值中选出每个分类的 Top-N"""
+        rankings: Rankings = {}
+        for period, totals in self._totals.items():
+            groups: Dict[int, List[Tuple[int, int, int]]] = {}
+            for product_id, (quantity, amount) in totals.items():
+                category_id = self._categories.get(product_id, _INACTIVE)
+                if category_id == _INACTIVE or (quantity <= 0 and amount <= 0):
+                    continue
+                entry = (product_id, quantity, amount)
+                groups.setdefault(ALL_CATEGORIES, []).append(entry)
+                if category_id != ALL_CATEGORIES:
+                    groups.setdefault(category_id, []).append(entry)
+
+            for category_id, entries in groups.items():
+                rankings[(period, "quantity", category_id)] = heapq.nlargest(
+                    self.size, entries, key=lambda entry: (entry[1], entry[2], -entry[0])
+                )
+                rankings[(period, "amount", category_id)] = heapq.nlargest(
+                    self.size, entries, key=lambda entry: (entry[2], entry[1], -entry[0])
+                )
+        return rankings
+
+    async def _publish(self, db: AsyncSession, rankings: Rankings) -> int:
+        """把有变化的榜单写入 product_rankings，返回写入的榜单数"""
+        first = self._published is None
+        if first:
+            # 首次写入（含主节点切换）：清掉上一任主节点写入的全部榜单
+            await db.execute(delete(ProductRanking))
+            changed = list(rankings)
+        else:
+            changed = [key for key in rankings.keys() | self._published.keys()
+                       if rankings.get(key) != self._published.get(key)]
+            if not changed:
+                return 0
+
+        now = datetime.utcnow()
+        rows = []
+        for period, metric, category_id in changed:
+            if not first:
+                await db.execute(
+                    delete(ProductRanking).where(
+                        ProductRanking.period == period,
+                        ProductRanking.metric == metric,
+                        ProductRanking.category_id == category_id,
+                    )
+                )
+            rows.extend(
+                {
+                    "period": period,
+                    "metric": metric,
+                    "category_id": category_id,
+                    "position": position,
+                    "product_id": product_id,
+                    "quantity": quantity,
+                    "amount_cents": amount,
+                    "updated_at": now,
+                }
+                for position, (product_id, quantity, amount) in enumerate(rankings.get((period, metric, category_id), []), 1)
+            )
+        if rows:
+            await db.execute(insert(ProductRanking), rows)
+        invalidate_on_commit(db, ("rankings",))
+        await db.commit()
+        await flush_invalidations(db)
+        self._published = rankings
+        return len(changed)
+
+    async def refresh(self, full: bool = False) -> int:
+        """增量更新各时间窗口的累计值并写入有变化的榜单，返回写入的榜单数"""
+        async with self._lock:
+            now_hour = hour_index(datetime.utcnow())
+            full = (
+                full
+                or self._current_hour is None
+                or now_hour - self._current_hour >= _MAX_HOURS
+                or time.monotonic() - self._last_full_reload > _FULL_RELOAD_INTERVAL
+            )
+            async with async_session_maker() as db:
+                if full:
+                    self._hours = {}
+                    self._totals = {period: {} for period in PERIODS}
+                    self._categories = {}
+                    self._current_hour = now_hour
+                    since = now_hour - _MAX_HOURS + 1
+                else:
+                    self._advance(now_hour)
+                    since = now_hour - _LOOKBACK_HOURS + 1
+
+                loaded = await self._load_hours(db, since)
+                for hour in sorted(set(loaded) | {hour for hour in self._hours if hour >= since}):
+                    self._set_hour(hour, loaded.get(hour, {}))
+
+                unknown = {
+                    product_id for totals in self._totals.values() for product_id in totals
+                    if product_id not in self._categories
+                }
+                if unknown:
+                    await self._load_categories(db, unknown)
+                if full:
+                    self._last_full_reload = time.monotonic()
+
+                changed = await self._publish(db, self._compute())
+            if full:
+                logger.info(f"商品排行榜已重新加载：{sum(len(sales) for sales in self._hours.values())} 条小时汇总")
+            return changed
+
+    def reset(self) -> None:
+        """清空内存状态（失去主节点身份后调用，再次成为主节点时整体重新加载）"""
+        self._hours = {}
+        self._totals = {period: {} for period in PERIODS}
+        self._categories = {}
+        self._current_hour = None
+        self._published = None
+
+
+# 创建服务实例
+ranking_service = RankingService(size=settings.RANKING_SIZE)
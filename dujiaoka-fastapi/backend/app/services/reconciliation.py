@@ -0,0 +1,321 @@
+"""
+支付对账服务
+
+将 payments 表（含归档表 payments_archive）与支付宝/微信每日对账单逐笔核对，单次遍历输出差异报告：
+- 对账单通过 mmap 扫描，只在内存中保留 交易号 -> 行偏移 的哈希索引，行内容按需解析
+- 我方数据通过服务端游标流式读取，逐行在索引中查找并弹出
+- 遍历结束后索引中剩余的交易即为我方缺失的记录；剩余的退款行（原支付不在回溯范围内）按交易号补查
+
+差异类型：
+- missing_in_statement: 我方支付成功，对账单中没有
+- missing_in_ours:      对账单中有，我方没有
+- amount_diff:          金额不一致
+- status_diff:          状态不一致（支付成功/已退款）
+- bad_row:              对账单行无法解析（如金额 "1,000.00" 格式无效），需人工核对
+"""
+import csv
+import mmap
+from datetime import date, datetime, timedelta
+from typing import IO, Dict, NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.money import format_yuan, to_cents
+from app.models.payment import PaymentStatus
+from app.services.archive import PAYMENT_TABLES, union_tables
+
+# 对账单列名候选（支付宝 / 微信 / 通用）
+TXN_COLUMNS = ("支付宝交易号", "微信订单号", "transaction_id")
+OUT_TRADE_NO_COLUMNS = ("商户订单号", "out_trade_no")
+AMOUNT_COLUMNS = ("订单金额（元）", "订单金额(元)", "应结订单金额", "amount")
+STATUS_COLUMNS = ("交易状态", "业务类型", "status")
+
+# 对账单状态归一化
+STATEMENT_STATUS = {
+    "交易": "success",
+    "退款": "refund",
+    "SUCCESS": "success",
+    "REFUND": "refund",
+}
+
+# 补查剩余退款行时每批的交易号数量
+REFUND_LOOKUP_BATCH = 500
+
+REPORT_HEADER = (
+    "type", "transaction_id", "out_trade_no",
+    "our_amount", "statement_amount", "our_status", "statement_status",
+)
+
+
+class StatementRow(NamedTuple):
+    """对账单行"""
+    transaction_id: str
+    out_trade_no: Optional[str]
+    amount_cents: Optional[int]
+    status: str
+
+
+class BadStatementRow(NamedTuple):
+    """无法解析的对账单行（保留原始字段）"""
+    out_trade_no: Optional[str]
+    amount: Optional[str]
+    status: Optional[str]
+
+
+class StatementIndex:
+    """对账单哈希索引"""
+
+    def __init__(self, path: str, encoding: str = "utf-8"):
+        self.encoding = encoding
+        self._file = open(path, "rb")
+        self._mm: Optional[mmap.mmap] = None
+        self._columns: Dict[str, int] = {}
+        self._width = 0
+
+        # 交易号 -> 行偏移；退款行单独索引
+        self.trades: Dict[str, int] = {}
+        self.refunds: Dict[str, int] = {}
+        # 交易号 -> 无法解析的行
+        self.bad_rows: Dict[str, BadStatementRow] = {}
+
+    def _split(self, line: bytes) -> list:
+        """拆分一行（去掉微信账单字段前的反引号）"""
+        text = line.decode(self.encoding).strip()
+        return [field.strip().lstrip("`") for field in next(csv.reader([text]))] if text else []
+
+    def _locate_columns(self, fields: list) -> bool:
+        """识别表头，返回是否为表头行"""
+        def find(candidates):
+            for name in candidates:
+                if name in fields:
+                    return fields.index(name)
+            return None
+
+        txn = find(TXN_COLUMNS)
+        if txn is None:
+            return False
+
+        self._columns = {
+            "txn": txn,
+            "out_trade_no": find(OUT_TRADE_NO_COLUMNS),
+            "amount": find(AMOUNT_COLUMNS),
+            "status": find(STATUS_COLUMNS),
+        }
+        self._width = len(fields)
+        return True
+
+    def build(self) -> int:
+        """扫描对账单建立索引，返回交易行数"""
+        if self._file.seek(0, 2) == 0:
+            return 0
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        offset = 0
+        readline = self._mm.readline
+        while True:
+            line = readline()
+            if not line:
+                break
+            start, offset = offset, offset + len(line)
+            if line.startswith(b"#"):
+                continue
+
+            fields = self._split(line)
+            if not self._columns:
+                self._locate_columns(fields)
+                continue
+            # 字段数不一致的是汇总行等非明细行
+            if len(fields) != self._width:
+                continue
+
+            try:
+                row = self._parse(fields)
+            except ValueError:
+                # 单行金额无效不中断整个对账，单独报告
+                self.bad_rows[self._get(fields, "txn")] = BadStatementRow(
+                    out_trade_no=self._get(fields, "out_trade_no"),
+                    amount=self._get(fields, "amount"),
+                    status=self._get(fields, "status"),
+                )
+                continue
+            if row.status == "refund":
+                self.refunds[row.transaction_id] = start
+            else:
+                self.trades[row.transaction_id] = start
+
+        return len(self.trades)
+
+    def _get(self, fields: list, key: str) -> Optional[str]:
+        index = self._columns.get(key)
+        return fields[index] if index is not None else None
+
+    def _parse(self, fields: list) -> StatementRow:
+        status = self._get(fields, "status")
+        return StatementRow(
+            transaction_id=self._get(fields, "txn"),
+            out_trade_no=self._get(fields, "out_trade_no"),
+            amount_cents=to_cents(self._get(fields, "amount")),
+            status=STATEMENT_STATUS.get(status, status) if status else "success",
+        )
+
+    def read(self, offset: int) -> StatementRow:
+        """按偏移读取并解析一行"""
+        end = self._mm.find(b"\n", offset)
+        line = self._mm[offset:end if end != -1 else len(self._mm)]
+        return self._parse(self._split(line))
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+
+class ReconciliationService:
+    """对账服务"""
+
+    async def reconcile(
+        self,
+        db: AsyncSession,
+        gateway: str,
+        bill_date: date,
+        statement_path: str,
+        report: IO[str],
+        encoding: str = "utf-8",
+        lookback_days: int = 1,
+        yield_per: int = 1000,
+    ) -> Dict[str, int]:
+        """
+        核对某一天的对账单
+
+        Args:
+            gateway: 支付方式（alipay / wechat）
+            bill_date: 账单日期
+            statement_path: 对账单文件路径
+            report: 差异报告输出（CSV）
+            lookback_days: 我方记录按创建时间向前回溯的天数（覆盖跨天支付）
+            yield_per: 服务端游标每次拉取的行数
+
+        Returns:
+            Dict[str, int]: 各类结果计数
+        """
+        day_start = datetime.combine(bill_date, datetime.min.time())
+        day_end = day_start + timedelta(days=1)
+
+        writer = csv.writer(report)
+        writer.writerow(REPORT_HEADER)
+        summary = {
+            "statement_rows": 0,
+            "matched": 0,
+            "missing_in_statement": 0,
+            "missing_in_ours": 0,
+            "amount_diff": 0,
+            "status_diff": 0,
+            "bad_row": 0,
+        }
+
+        def emit(kind, txn, out_trade_no, our_amount, st_amount, our_status, st_status):
+            summary[kind] += 1
+            writer.writerow((kind, txn, out_trade_no, our_amount, st_amount, our_status, st_status))
+
+        index = StatementIndex(statement_path, encoding)
+        try:
+            summary["statement_rows"] = index.build()
+
+            # 我方记录包含已归档的支付记录（核对较早的账单时）
+            payments = union_tables(
+                PAYMENT_TABLES,
+                ("transaction_id", "out_trade_no", "amount_cents", "status", "paid_at"),
+                lambda table: [
+                    table.c.payment_method == gateway,
+                    table.c.transaction_id.isnot(None),
+                    table.c.created_at >= day_start - timedelta(days=lookback_days),
+                    table.c.created_at < day_end,
+                ],
+            )
+            query = select(payments).execution_options(yield_per=yield_per)
+            result = await db.stream(query)
+
+            async for txn, out_trade_no, our_cents, status, paid_at in result:
+                amount = format_yuan(our_cents)
+                our_status = status.value if status else None
+                trade_offset = index.trades.pop(txn, None)
+                refund_offset = index.refunds.pop(txn, None)
+                bad = index.bad_rows.pop(txn, None)
+                if bad is not None:
+                    emit("bad_row", txn, out_trade_no, amount, bad.amount, our_status, bad.status)
+                    if trade_offset is None and refund_offset is None:
+                        continue
+
+                if trade_offset is None:
+                    if refund_offset is not None:
+                        # 较早支付、当天退款：对账单中只有退款行
+                        if status == PaymentStatus.REFUNDED:
+                            summary["matched"] += 1
+                        else:
+                            emit("status_diff", txn, out_trade_no, amount, None, our_status, "refund")
+                        continue
+                    paid_today = paid_at is not None and day_start <= paid_at < day_end
+                    if status == PaymentStatus.SUCCESS and paid_today:
+                        emit("missing_in_statement", txn, out_trade_no, amount, None, our_status, None)
+                    continue
+
+                row = index.read(trade_offset)
+                st_status = "refund" if refund_offset is not None else row.status
+                expected = {
+                    PaymentStatus.SUCCESS: "success",
+                    PaymentStatus.REFUNDED: "refund",
+                }.get(status)
+
+                mismatch = False
+                if row.amount_cents is not None and row.amount_cents != our_cents:
+                    emit("amount_diff", txn, out_trade_no, amount, format_yuan(row.amount_cents), our_status, st_status)
+                    mismatch = True
+                if expected != st_status:
+                    emit("status_diff", txn, out_trade_no, amount, None, our_status, st_status)
+                    mismatch = True
+                if not mismatch:
+                    summary["matched"] += 1
+
+            # 剩余的无法解析的行在我方没有对应记录（或不在回溯范围内）
+            for txn, bad in index.bad_rows.items():
+                emit("bad_row", txn, bad.out_trade_no, None, bad.amount, None, bad.status)
+
+            # 剩余的对账单交易在我方不存在（同一交易的退款行一并输出）
+            for txn, offset in index.trades.items():
+                row = index.read(offset)
+                st_status = "refund" if index.refunds.pop(txn, None) is not None else row.status
+                emit("missing_in_ours", txn, row.out_trade_no, None, format_yuan(row.amount_cents), None, st_status)
+
+            # 剩余的退款行：原支付早于回溯范围时按交易号补查，仍找不到的在我方不存在
+            refunded = {}
+            txns = list(index.refunds)
+            for start in range(0, len(txns), REFUND_LOOKUP_BATCH):
+                batch = txns[start:start + REFUND_LOOKUP_BATCH]
+                payments = union_tables(
+                    PAYMENT_TABLES,
+                    ("transaction_id", "out_trade_no", "amount_cents", "status"),
+                    lambda table: [table.c.payment_method == gateway, table.c.transaction_id.in_(batch)],
+                )
+                for txn, out_trade_no, our_cents, status in (await db.execute(select(payments))).all():
+                    refunded[txn] = (out_trade_no, our_cents, status)
+
+            for txn, offset in index.refunds.items():
+                row = index.read(offset)
+                if txn not in refunded:
+                    emit("missing_in_ours", txn, row.out_trade_no, None, format_yuan(row.amount_cents), None, "refund")
+                    continue
+                out_trade_no, our_cents, status = refunded[txn]
+                if status == PaymentStatus.REFUNDED:
+                    summary["matched"] += 1
+                else:
+                    emit("status_diff", txn, out_trade_no, format_yuan(our_cents), None,
+                         status.value if status else None, "refund")
+        finally:
+            index.close()
+
+        return summary
+
+
+# 创建服务实例
+reconciliation_service = ReconciliationService()
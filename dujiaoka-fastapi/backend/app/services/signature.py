@@ -0,0 +1,193 @@
+"""
+支付回调签名验证服务
+
+RSA 验签是 CPU 密集操作，不能直接放在事件循环里执行：
+- 验签请求先在进程内攒成小批次（达到批大小或等待窗口到期即提交）
+- 每个批次整体交给进程池执行，减少进程间通信次数
+- 解析后的公钥按 PEM 缓存，子进程内同样复用
+
+支付宝（RSA2，SHA256withRSA）：去掉 sign、sign_type 和空值后按键名排序，以 k=v& 拼接后用支付宝公钥验签。
+微信支付（APIv2）：去掉 sign 和空值后按键名排序，以 k=v& 拼接并追加 &key=商户 API 密钥，
+按 sign_type 做 MD5 或 HMAC-SHA256 后与大写十六进制签名比较；计算量很小，直接在事件循环中执行。
+回调接口按 APIv2 的字段（return_code、total_fee 等）处理，不支持 APIv3 的加密通知。
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+# (公钥 PEM, 签名串, 签名)
+VerifyItem = Tuple[str, bytes, bytes]
+
+
+@lru_cache(maxsize=16)
+def load_public_key(pem: str):
+    """解析公钥（兼容不带 PEM 头尾的裸 base64 公钥）"""
+    from cryptography.hazmat.primitives.serialization import load_pem_public_key
+
+    pem = pem.strip()
+    if not pem.startswith("-----BEGIN"):
+        body = "\n".join(pem[i:i + 64] for i in range(0, len(pem), 64))
+        pem = f"-----BEGIN PUBLIC KEY-----\n{body}\n-----END PUBLIC KEY-----"
+    return load_pem_public_key(pem.encode())
+
+
+def verify_batch(items: List[VerifyItem]) -> List[bool]:
+    """批量验签（在进程池子进程中执行）"""
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+
+    results = []
+    for pem, message, signature in items:
+        try:
+            load_public_key(pem).verify(signature, message, padding.PKCS1v15(), hashes.SHA256())
+            results.append(True)
+        except (InvalidSignature, ValueError):
+            results.append(False)
+    return results
+
+
+def build_sign_content(data: dict) -> bytes:
+    """生成支付宝待签名字符串"""
+    items = sorted(
+        (k, v) for k, v in data.items()
+        if k not in ("sign", "sign_type") and v not in (None, "")
+    )
+    return "&".join(f"{k}={v}" for k, v in items).encode()
+
+
+def build_wechat_sign_content(data: dict, api_key: str) -> bytes:
+    """生成微信支付（APIv2）待签名字符串（sign_type 参与签名）"""
+    items = sorted((k, v) for k, v in data.items() if k != "sign" and v not in (None, ""))
+    return "&".join([*(f"{k}={v}" for k, v in items), f"key={api_key}"]).encode()
+
+
+def wechat_sign(data: dict, api_key: str) -> str:
+    """微信支付（APIv2）签名"""
+    content = build_wechat_sign_content(data, api_key)
+    if data.get("sign_type") == "HMAC-SHA256":
+        digest = hmac.new(api_key.encode(), content, hashlib.sha256).hexdigest()
+    else:
+        digest = hashlib.md5(content).hexdigest()
+    return digest.upper()
+
+
+class SignatureVerifier:
+    """回调签名验证器"""
+
+    def __init__(self, workers: int, batch_size: int, batch_window_ms: int):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_window = batch_window_ms / 1000
+
+        self._executor: Optional[Executor] = None
+        self._pending: List[Tuple[VerifyItem, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # 事件循环只保留任务的弱引用，批次任务需持有强引用直至完成
+        self._tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def public_key_for(gateway: str) -> Optional[str]:
+        """获取网关公钥（仅支付宝使用 RSA 验签）"""
+        if gateway == "alipay":
+            return settings.ALIPAY_PUBLIC_KEY
+        return None
+
+    def _get_executor(self) -> Optional[Executor]:
+        """进程池延迟创建，workers 为 0 时在线程池中执行"""
+        if self._executor is None and self.workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def verify(self, gateway: str, data: dict) -> bool:
+        """验证回调签名"""
+        if gateway == "wechat":
+            return self._verify_wechat(data)
+
+        pem = self.public_key_for(gateway)
+        if not pem:
+            # 未配置公钥时仅在调试模式下放行
+            return settings.DEBUG
+
+        sign = data.get("sign")
+        if not sign:
+            return False
+        try:
+            signature = base64.b64decode(sign)
+        except (ValueError, TypeError):
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((pem, build_sign_content(data), signature), future))
+
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+
+        return await future
+
+    @staticmethod
+    def _verify_wechat(data: dict) -> bool:
+        """验证微信支付（APIv2）回调签名"""
+        api_key = settings.WECHAT_API_KEY
+        if not api_key:
+            # 未配置 API 密钥时仅在调试模式下放行
+            return settings.DEBUG
+
+        sign = data.get("sign")
+        if not isinstance(sign, str) or not sign:
+            return False
+        return hmac.compare_digest(wechat_sign(data, api_key), sign.upper())
+
+    def _flush(self) -> None:
+        """提交当前批次"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[VerifyItem, asyncio.Future]]) -> None:
+        items = [item for item, _ in batch]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), verify_batch, items
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), ok in zip(batch, results):
+            if not future.done():
+                future.set_result(ok)
+
+    def shutdown(self) -> None:
+        """关闭进程池（等待工作进程退出，避免其写入线程被中途切断）"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def aclose(self) -> None:
+        """在线程中关闭进程池，不阻塞事件循环"""
+        await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
+
+
+# 创建服务实例
+signature_verifier = SignatureVerifier(
+    workers=settings.PAYMENT_SIGNATURE_WORKERS,
+    batch_size=settings.PAYMENT_SIGNATURE_BATCH_SIZE,
+    batch_window_ms=settings.PAYMENT_SIGNATURE_BATCH_WINDOW_MS,
+)
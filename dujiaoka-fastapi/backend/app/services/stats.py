@@ -0,0 +1,219 @@
+"""
+统计服务层
+
+后台仪表盘的聚合统计，结果按 CACHE_STATS_TTL 缓存（统计允许短暂滞后，
+键中带当天日期，跨天自动换键）。商品销量排行取自排行榜（app/services/ranking.py）。
+金额按整数分求和（结果精确），输出时转换为元。订单与支付统计合并热表与归档表，
+按时间范围统计时以 created_at 范围过滤，归档表按主键 (created_at, id) 只扫描范围内的行。
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import cache
+from app.core.config import settings
+from app.core.money import to_yuan
+from app.models.order import OrderStatus
+from app.models.payment import PaymentStatus
+from app.models.product import Product
+from app.models.user import User
+from app.services.archive import ORDER_TABLES, PAYMENT_TABLES, union_tables
+from app.services.ranking import ranking_service
+
+# 统计用到的订单列
+_ORDER_COLUMNS = ("id", "product_id", "quantity", "total_amount_cents", "status", "created_at")
+
+
+def _orders_since(start: datetime, end: Optional[datetime] = None):
+    """created_at 在 [start, end) 内的订单（热表与归档表）"""
+    def where(table) -> list:
+        conditions = [table.c.created_at >= start]
+        if end is not None:
+            conditions.append(table.c.created_at < end)
+        return conditions
+    return union_tables(ORDER_TABLES, _ORDER_COLUMNS, where)
+
+stats_cache = cache.namespace("stats")
+
+
+class StatsService:
+    """统计服务"""
+
+    async def get_dashboard_stats(self, db: AsyncSession) -> Dict[str, Any]:
+        """仪表盘统计数据（缓存）"""
+        today = datetime.utcnow().date()
+        return await stats_cache.get_or_set(
+            f"dashboard:{today}", lambda: self.compute_dashboard_stats(db), settings.CACHE_STATS_TTL, tags=("stats",)
+        )
+
+    async def get_dashboard_charts(self, db: AsyncSession, days: int = 30) -> Dict[str, Any]:
+        """仪表盘图表数据（缓存）"""
+        today = datetime.utcnow().date()
+        return await stats_cache.get_or_set(
+            f"charts:{days}:{today}", lambda: self.compute_dashboard_charts(db, days), settings.CACHE_STATS_TTL,
+            tags=("stats",),
+        )
+
+    async def compute_dashboard_stats(self, db: AsyncSession) -> Dict[str, Any]:
+        """计算仪表盘统计数据"""
+        # 计算时间范围
+        today = datetime.utcnow().date()
+        yesterday = today - timedelta(days=1)
+        week_ago = today - timedelta(days=7)
+        month_ago = today - timedelta(days=30)
+
+        stats = {}
+
+        # 用户统计
+        user_result = await db.execute(select(func.count(User.id)))
+        stats["total_users"] = user_result.scalar()
+
+        # 新用户统计
+        new_users_today = await db.execute(
+            select(func.count(User.id)).where(
+                func.date(User.created_at) == today
+            )
+        )
+        stats["new_users_today"] = new_users_today.scalar()
+
+        new_users_week = await db.execute(
+            select(func.count(User.id)).where(
+                func.date(User.created_at) >= week_ago
+            )
+        )
+        stats["new_users_week"] = new_users_week.scalar()
+
+        # 订单统计（热表与归档表）
+        orders = union_tables(ORDER_TABLES, _ORDER_COLUMNS)
+        order_result = await db.execute(select(func.count(orders.c.id)))
+        stats["total_orders"] = order_result.scalar()
+
+        # 今日订单
+        today_start = datetime.combine(today, datetime.min.time())
+        today_orders = _orders_since(today_start, today_start + timedelta(days=1))
+        orders_today = await db.execute(select(func.count(today_orders.c.id)))
+        stats["orders_today"] = orders_today.scalar()
+
+        # 订单金额统计
+        revenue_result = await db.execute(
+            select(func.sum(orders.c.total_amount_cents))
+        )
+        stats["total_revenue"] = to_yuan(int(revenue_result.scalar() or 0))
+
+        revenue_today = await db.execute(
+            select(func.sum(today_orders.c.total_amount_cents))
+        )
+        stats["revenue_today"] = to_yuan(int(revenue_today.scalar() or 0))
+
+        # 订单状态统计
+        order_status_stats = await db.execute(
+            select(orders.c.status, func.count(orders.c.id)).group_by(orders.c.status)
+        )
+        stats["order_status"] = {status.value: count for status, count in order_status_stats}
+
+        # 商品统计
+        product_result = await db.execute(select(func.count(Product.id)))
+        stats["total_products"] = product_result.scalar()
+
+        active_products = await db.execute(
+            select(func.count(Product.id)).where(Product.is_active == True)
+        )
+        stats["active_products"] = active_products.scalar()
+
+        # 支付统计（热表与归档表）
+        payments = union_tables(PAYMENT_TABLES, ("id", "status"))
+        payment_result = await db.execute(select(func.count(payments.c.id)))
+        stats["total_payments"] = payment_result.scalar()
+
+        successful_payments = await db.execute(
+            select(func.count(payments.c.id)).where(payments.c.status == PaymentStatus.SUCCESS)
+        )
+        stats["successful_payments"] = successful_payments.scalar()
+
+        return stats
+
+    async def compute_dashboard_charts(self, db: AsyncSession, days: int = 30) -> Dict[str, Any]:
+        """计算仪表盘图表数据"""
+        end_date = datetime.utcnow().date()
+        start_date = end_date - timedelta(days=days)
+        orders = _orders_since(datetime.combine(start_date, datetime.min.time()))
+
+        # 每日订单数量
+        daily_orders = await db.execute(
+            select(
+                func.date(orders.c.created_at).label('date'),
+                func.count(orders.c.id).label('count')
+            )
+            .group_by(func.date(orders.c.created_at))
+            .order_by(func.date(orders.c.created_at))
+        )
+
+        order_chart = [
+            {"date": str(date), "orders": count}
+            for date, count in daily_orders
+        ]
+
+        # 每日收入
+        daily_revenue = await db.execute(
+            select(
+                func.date(orders.c.created_at).label('date'),
+                func.sum(orders.c.total_amount_cents).label('revenue')
+            )
+            .where(orders.c.status.in_([OrderStatus.PAID, OrderStatus.DELIVERED]))
+            .group_by(func.date(orders.c.created_at))
+            .order_by(func.date(orders.c.created_at))
+        )
+
+        revenue_chart = [
+            {"date": str(date), "revenue": to_yuan(int(revenue or 0))}
+            for date, revenue in daily_revenue
+        ]
+
+        sales_chart = await self.compute_sales_chart(db, days)
+
+        return {
+            "order_chart": order_chart,
+            "revenue_chart": revenue_chart,
+            "sales_chart": sales_chart
+        }
+
+    async def compute_sales_chart(self, db: AsyncSession, days: int = 30) -> List[Dict[str, Any]]:
+        """商品销量排行（按销售额前 10）"""
+        # 1/7/30 天直接读取预先生成的排行榜（按发货时间滚动的 24h/7d/30d 窗口）
+        period = {1: "24h", 7: "7d", 30: "30d"}.get(days)
+        if period:
+            ranking = await ranking_service.get_ranking(db, period, "amount", limit=10)
+            return [
+                {"product": entry["product_name"], "quantity": entry["quantity"], "revenue": entry["amount"]}
+                for entry in ranking
+            ]
+
+        start_date = datetime.utcnow().date() - timedelta(days=days)
+        orders = _orders_since(datetime.combine(start_date, datetime.min.time()))
+        product_sales = await db.execute(
+            select(
+                Product.name,
+                func.sum(orders.c.quantity).label('sold_quantity'),
+                func.sum(orders.c.total_amount_cents).label('total_revenue')
+            )
+            .join(orders, Product.id == orders.c.product_id)
+            .where(orders.c.status.in_([OrderStatus.PAID, OrderStatus.DELIVERED]))
+            .group_by(Product.id, Product.name)
+            .order_by(func.sum(orders.c.total_amount_cents).desc())
+            .limit(10)
+        )
+
+        return [
+            {
+                "product": name,
+                "quantity": int(quantity),
+                "revenue": to_yuan(int(revenue or 0))
+            }
+            for name, quantity, revenue in product_sales
+        ]
+
+
+# 创建服务实例
+stats_service = StatsService()
@@ -5,12 +5,23 @@ from datetime import datetime
 from typing import Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 
+from app.core.cache import cache, invalidate_on_commit, register_model_tags
+from app.core.config import settings
+from app.core.database import update_returning
 from app.core.security import get_password_hash, verify_password
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
 
+user_cache = cache.namespace("user")
+register_model_tags(User, lambda user: (f"user:{user.id}",))
+
+# 缓存的用户列（不含密码哈希）
+_CACHED_COLUMNS = tuple(column.key for column in User.__table__.columns if column.key != "hashed_password")
+
 
 class UserService:
     """用户服务"""
@@ -25,6 +36,31 @@ class UserService:
         result = await db.execute(select(User).where(User.username == username))
         return result.scalars().first()
 
+    async def get_by_username_cached(self, db: AsyncSession, username: str) -> Optional[User]:
+        """
+        根据用户名获取用户（缓存，供请求鉴权使用）
+
+        缓存不含密码哈希：命中时返回的实例由缓存数据重建并关联到会话（不查询数据库），
+        hashed_password 未加载，校验密码前需 await db.refresh(user, ["hashed_password"])。
+        """
+        loaded = None
+
+        async def load():
+            nonlocal loaded
+            loaded = await self.get_by_username(db, username)
+            if loaded is None:
+                return None
+            return {key: getattr(loaded, key) for key in _CACHED_COLUMNS}
+
+        data = await user_cache.get_or_set(
+            f"username:{username}", load, settings.CACHE_USER_TTL, tags=lambda data: (f"user:{data['id']}",)
+        )
+        if loaded is not None or data is None:
+            return loaded
+        user = User(**data)
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+
     async def get_by_email(self, db: AsyncSession, email: str) -> Optional[User]:
         """根据邮箱获取用户"""
         result = await db.execute(select(User).where(User.email == email))
@@ -93,12 +129,32 @@ class UserService:
         await db.refresh(user)
         return user
 
-    async def update_balance(self, db: AsyncSession, user: User, amount: float) -> User:
-        """更新用户余额"""
-        user.balance += amount
-        user.updated_at = datetime.utcnow()
-        await db.commit()
-        await db.refresh(user)
+    async def update_balance(self, db: AsyncSession, user: User, amount_cents: int, commit: bool = True) -> User:
+        """
+        更新用户余额（金额单位为分）
+
+        在数据库中原子地增减（扣款时带余额充足条件），并发扣款不会互相覆盖。
+        commit=False 时只执行语句，由调用方统一提交。
+        """
+        now = datetime.utcnow()
+        stmt = (
+            update(User)
+            .where(User.id == user.id)
+            .values(balance_cents=User.balance_cents + amount_cents, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if amount_cents < 0:
+            stmt = stmt.where(User.balance_cents >= -amount_cents)
+        balance = await update_returning(db, stmt, User.balance_cents, User.id == user.id)
+        if balance is None:
+            raise ValueError("余额不足")
+
+        set_committed_value(user, "balance_cents", balance)
+        set_committed_value(user, "updated_at", now)
+        invalidate_on_commit(db, (f"user:{user.id}",))
+        if commit:
+            await db.commit()
+            await db.refresh(user)
         return user
 
 
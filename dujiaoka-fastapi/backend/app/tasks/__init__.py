@@ -0,0 +1,15 @@
+"""
+后台任务包
+
+应用启动时由 main.py 拉起的周期性任务：
+├── card_expiry.py    # 卡密过期清理（批量标记过期卡密）
+├── order_timeout.py  # 未支付订单超时自动取消
+├── callback_queue.py # 支付回调异步队列消费者
+├── counter_flush.py  # 商品销量、浏览数与销售汇总批量写入
+├── ranking_refresh.py # 商品排行榜增量生成
+├── order_archiver.py # 已完成的历史订单、支付记录分批移入归档表
+└── profiler_channel.py # 多 worker 采样分析控制通道
+
+定时任务只在持有主节点锁（app/core/leader.py）的进程中执行；
+回调队列通过数据库原子领取任务，所有进程都会消费。
+"""
@@ -0,0 +1,259 @@
+"""
+支付回调异步队列
+
+回调接口只把原始数据写入 payment_callback_jobs 并立即应答，
+每个进程内的一组 worker 协程通过比较并交换领取任务、处理并在失败时指数退避重试；
+回调与支付记录不符（CallbackRejected：金额不匹配、支付记录不存在）重试也不会成功，直接标记为失败；
+收款确认后发货失败（如库存不足）不回滚收款，订单保持已支付并告警，由人工处理。
+任务领取基于数据库原子更新，所有 worker 进程都可以并行消费；写回结果时按领取次数校验，
+租约过期后被重新领取的任务不会被原 worker 覆盖。
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional
+
+from loguru import logger
+from sqlalchemy import and_, func, or_, select, update
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.metrics import (
+    PAYMENT_CALLBACK_JOBS_TOTAL,
+    PAYMENT_CALLBACK_LAG,
+    PAYMENT_CALLBACK_OLDEST_AGE,
+    PAYMENT_CALLBACK_QUEUE_DEPTH,
+)
+from app.models.payment import CallbackJobStatus, PaymentCallbackJob
+from app.services.payment import CallbackRejected, payment_service
+
+
+class ClaimedJob(NamedTuple):
+    """已领取的回调任务"""
+    id: int
+    gateway: str
+    payload: dict
+    attempts: int
+    created_at: datetime
+
+
+class CallbackQueue:
+    """支付回调队列消费者"""
+
+    def __init__(
+        self,
+        workers: int,
+        max_attempts: int,
+        retry_base_seconds: int,
+        poll_interval: float,
+        lease_seconds: int,
+    ):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.poll_interval = poll_interval
+        self.lease = timedelta(seconds=lease_seconds)
+
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def notify(self) -> None:
+        """有新任务入队时唤醒空闲 worker"""
+        self._wakeup.set()
+
+    @staticmethod
+    def _claimable(now: datetime):
+        """可领取条件：到期的待处理任务，或租约已过期的处理中任务"""
+        return or_(
+            and_(
+                PaymentCallbackJob.status == CallbackJobStatus.PENDING,
+                PaymentCallbackJob.next_attempt_at <= now,
+            ),
+            and_(
+                PaymentCallbackJob.status == CallbackJobStatus.PROCESSING,
+                PaymentCallbackJob.locked_until < now,
+            ),
+        )
+
+    async def claim(self) -> Optional[ClaimedJob]:
+        """领取一个任务"""
+        now = datetime.utcnow()
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(PaymentCallbackJob.id)
+                .where(self._claimable(now))
+                .order_by(PaymentCallbackJob.next_attempt_at)
+                .limit(max(self.workers, 1))
+            )
+            for job_id in result.scalars().all():
+                claimed = await db.execute(
+                    update(PaymentCallbackJob)
+                    .where(PaymentCallbackJob.id == job_id, self._claimable(now))
+                    .values(
+                        status=CallbackJobStatus.PROCESSING,
+                        locked_until=now + self.lease,
+                        attempts=PaymentCallbackJob.attempts + 1,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                if claimed.rowcount != 1:
+                    continue
+
+                row = (await db.execute(
+                    select(
+                        PaymentCallbackJob.id,
+                        PaymentCallbackJob.gateway,
+                        PaymentCallbackJob.payload,
+                        PaymentCallbackJob.attempts,
+                        PaymentCallbackJob.created_at,
+                    ).where(PaymentCallbackJob.id == job_id)
+                )).one()
+                await db.commit()
+                return ClaimedJob(*row)
+        return None
+
+    async def process(self, job: ClaimedJob) -> bool:
+        """处理任务，返回是否成功"""
+        error = None
+        retryable = True
+        async with async_session_maker() as db:
+            try:
+                await payment_service.process_callback(db, job.gateway, job.payload)
+            except Exception as e:
+                await db.rollback()
+                error = str(e) or e.__class__.__name__
+                retryable = not isinstance(e, CallbackRejected)
+
+        now = datetime.utcnow()
+        if error is None:
+            values = {
+                "status": CallbackJobStatus.DONE,
+                "processed_at": now,
+                "locked_until": None,
+                "last_error": None,
+            }
+            result = "done"
+        elif not retryable or job.attempts >= self.max_attempts:
+            values = {
+                "status": CallbackJobStatus.FAILED,
+                "locked_until": None,
+                "last_error": error,
+            }
+            result = "failed"
+        else:
+            # 指数退避：base * 2^(attempts-1)
+            delay = self.retry_base_seconds * (2 ** (job.attempts - 1))
+            values = {
+                "status": CallbackJobStatus.PENDING,
+                "next_attempt_at": now + timedelta(seconds=delay),
+                "locked_until": None,
+                "last_error": error,
+            }
+            result = "retry"
+
+        async with async_session_maker() as db:
+            # 只写回本次领取的结果：租约过期后任务可能已被其他 worker 重新领取（领取次数随之增加）
+            updated = await db.execute(
+                update(PaymentCallbackJob)
+                .where(
+                    PaymentCallbackJob.id == job.id,
+                    PaymentCallbackJob.status == CallbackJobStatus.PROCESSING,
+                    PaymentCallbackJob.attempts == job.attempts,
+                )
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        if updated.rowcount != 1:
+            logger.warning(f"支付回调任务 {job.id} 的租约已过期并被重新领取，丢弃本次处理结果")
+            return False
+
+        PAYMENT_CALLBACK_JOBS_TOTAL.labels(result=result).inc()
+        if result == "done":
+            PAYMENT_CALLBACK_LAG.observe((now - job.created_at).total_seconds())
+        elif result == "failed":
+            if retryable:
+                logger.error(f"支付回调任务 {job.id} 重试 {job.attempts} 次后仍失败: {error}")
+            else:
+                logger.error(f"支付回调任务 {job.id} 处理失败，不再重试: {error}")
+        else:
+            logger.warning(f"支付回调任务 {job.id} 处理失败，{delay} 秒后重试: {error}")
+        return error is None
+
+    async def drain(self) -> int:
+        """处理当前所有可领取的任务，返回处理数量"""
+        processed = 0
+        while True:
+            job = await self.claim()
+            if job is None:
+                return processed
+            await self.process(job)
+            processed += 1
+
+    async def update_stats(self) -> None:
+        """刷新队列深度与积压时长指标"""
+        async with async_session_maker() as db:
+            depth, oldest = (await db.execute(
+                select(func.count(PaymentCallbackJob.id), func.min(PaymentCallbackJob.created_at))
+                .where(PaymentCallbackJob.status.in_([
+                    CallbackJobStatus.PENDING,
+                    CallbackJobStatus.PROCESSING,
+                ]))
+            )).one()
+
+        PAYMENT_CALLBACK_QUEUE_DEPTH.set(depth)
+        age = (datetime.utcnow() - oldest).total_seconds() if oldest else 0
+        PAYMENT_CALLBACK_OLDEST_AGE.set(age)
+
+    async def _worker(self) -> None:
+        """worker 循环"""
+        while True:
+            try:
+                job = await self.claim()
+                if job is not None:
+                    await self.process(job)
+                    continue
+            except Exception as e:
+                logger.error(f"支付回调 worker 异常: {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _monitor(self) -> None:
+        """指标刷新循环"""
+        while True:
+            try:
+                await self.update_stats()
+            except Exception as e:
+                logger.error(f"支付回调队列指标刷新失败: {e}")
+            await asyncio.sleep(max(self.poll_interval, 5))
+
+    def start(self) -> None:
+        """启动 worker"""
+        if self.workers <= 0 or self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._monitor()))
+
+    async def stop(self) -> None:
+        """停止 worker（处理中的任务租约到期后会被重新领取）"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+
+# 创建队列实例
+callback_queue = CallbackQueue(
+    workers=settings.PAYMENT_CALLBACK_WORKERS,
+    max_attempts=settings.PAYMENT_CALLBACK_MAX_ATTEMPTS,
+    retry_base_seconds=settings.PAYMENT_CALLBACK_RETRY_BASE_SECONDS,
+    poll_interval=settings.PAYMENT_CALLBACK_POLL_INTERVAL,
+    lease_seconds=settings.PAYMENT_CALLBACK_LEASE_SECONDS,
+)
@@ -0,0 +1,111 @@
+"""
+卡密过期清理任务
+
+周期性地把已超过 expires_at 的未使用卡密批量标记为 EXPIRED，
+使发卡查询只需按状态过滤，不必在每次分配时判断有效期。
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Optional
+
+from loguru import logger
+from sqlalchemy import select, update
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.leader import leader_lock
+from app.core.metrics import (
+    CARD_EXPIRY_SWEEP_BATCH_SIZE,
+    CARD_EXPIRY_SWEEP_DURATION,
+    CARDS_EXPIRED_TOTAL,
+)
+from app.models.card import Card, CardStatus
+
+
+class CardExpirySweeper:
+    """卡密过期清理器"""
+
+    def __init__(self, interval: int, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    async def sweep(self) -> int:
+        """执行一次完整清理，返回本次标记为过期的卡密数量"""
+        started = time.perf_counter()
+        total = 0
+        try:
+            while True:
+                expired = await self._sweep_batch()
+                CARD_EXPIRY_SWEEP_BATCH_SIZE.observe(expired)
+                total += expired
+                if expired < self.batch_size:
+                    break
+        finally:
+            CARD_EXPIRY_SWEEP_DURATION.observe(time.perf_counter() - started)
+
+        if total:
+            CARDS_EXPIRED_TOTAL.inc(total)
+            logger.info(f"卡密过期清理完成，共标记 {total} 张卡密为过期")
+        return total
+
+    async def _sweep_batch(self) -> int:
+        """标记一批过期卡密（走 (status, expires_at) 索引）"""
+        now = datetime.utcnow()
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(Card.id)
+                .where(
+                    Card.status == CardStatus.UNUSED,
+                    Card.expires_at <= now,
+                )
+                .limit(self.batch_size)
+            )
+            card_ids = result.scalars().all()
+            if not card_ids:
+                return 0
+
+            # 再次校验状态，避免覆盖期间已被使用的卡密
+            result = await db.execute(
+                update(Card)
+                .where(Card.id.in_(card_ids), Card.status == CardStatus.UNUSED)
+                .values(status=CardStatus.EXPIRED, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            return result.rowcount
+
+    async def _run(self) -> None:
+        """后台循环"""
+        while True:
+            try:
+                if await leader_lock.ensure():
+                    await self.sweep()
+            except Exception as e:
+                logger.error(f"卡密过期清理失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """启动后台清理"""
+        if self.interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台清理"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+# 创建任务实例
+card_expiry_sweeper = CardExpirySweeper(
+    interval=settings.CARD_EXPIRY_SWEEP_INTERVAL,
+    batch_size=settings.CARD_EXPIRY_SWEEP_BATCH_SIZE,
+)
@@ -0,0 +1,57 @@
+"""
+商品计数写入任务
+
+每个 worker 周期性地把本进程累积的销量、浏览数增量批量写入数据库（见 app/services/counter.py）。
+启动时先接管重启前遗留的计数日志；关闭时做最后一次写入，失败的增量留在日志中由下次启动接管。
+"""
+import asyncio
+from typing import Optional
+
+from loguru import logger
+
+from app.core.config import settings
+from app.services.counter import counter_service
+
+
+class CounterFlusher:
+    """计数写入任务"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        """后台循环"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await counter_service.flush()
+            except Exception as e:
+                logger.error(f"计数写入任务异常: {e}")
+
+    def start(self) -> None:
+        """接管遗留日志并启动后台写入"""
+        if self.interval <= 0 or self._task is not None:
+            return
+        try:
+            counter_service.recover()
+        except OSError as e:
+            logger.error(f"接管计数日志失败: {e}")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台写入，并写入剩余的增量"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await counter_service.flush()
+        counter_service.close()
+
+
+# 创建任务实例
+counter_flusher = CounterFlusher(interval=settings.COUNTER_FLUSH_INTERVAL)
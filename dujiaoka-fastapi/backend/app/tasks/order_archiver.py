@@ -0,0 +1,53 @@
+"""
+订单归档任务
+
+主节点周期性地把已发货 / 已取消且超过保留期的订单连同支付记录分批移入归档表
+（见 app/services/archive.py），使 orders / payments 热表的大小保持有界。
+"""
+import asyncio
+from typing import Optional
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.leader import leader_lock
+from app.services.archive import archive_service
+
+
+class OrderArchiver:
+    """订单归档任务"""
+
+    def __init__(self, interval: int):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        """后台循环"""
+        while True:
+            try:
+                if await leader_lock.ensure():
+                    await archive_service.archive()
+            except Exception as e:
+                logger.error(f"订单归档失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """启动后台归档"""
+        if self.interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台归档"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+# 创建任务实例
+order_archiver = OrderArchiver(interval=settings.ORDER_ARCHIVE_INTERVAL)
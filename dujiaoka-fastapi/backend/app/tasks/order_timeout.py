@@ -0,0 +1,187 @@
+"""
+未支付订单超时取消任务
+
+主节点在启动时从数据库加载全部待支付订单，按截止时间放入最小堆；
+之后按创建时间水位增量加载新订单，到期后分批取消。并发下单时订单不按 ID 顺序提交，
+每次加载回看 LOAD_OVERLAP 时间窗口，已登记的订单按 ID 去重。
+取消失败（如数据库暂时不可用）时未提交批次的订单放回堆中，等待一个轮询间隔后重试。
+"""
+import asyncio
+import heapq
+from datetime import datetime, timedelta
+from typing import List, Optional, Set, Tuple
+
+from loguru import logger
+from sqlalchemy import select, update
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.leader import leader_lock
+from app.core.metrics import ORDER_TIMEOUT_PENDING, ORDERS_AUTO_CANCELLED_TOTAL
+from app.models.order import Order, OrderStatus
+from app.models.payment import Payment, PaymentStatus
+
+# 增量加载的回看窗口：覆盖下单到提交之间的延迟与各节点的时钟偏差
+LOAD_OVERLAP = timedelta(minutes=5)
+
+
+class OrderTimeoutScheduler:
+    """订单超时调度器"""
+
+    def __init__(self, timeout_minutes: int, batch_size: int, poll_interval: int):
+        self.timeout = timedelta(minutes=timeout_minutes)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+
+        # (截止时间, 订单ID)
+        self._heap: List[Tuple[datetime, int]] = []
+        # 堆中的订单ID（去重）
+        self._scheduled: Set[int] = set()
+        # 已加载订单的最大创建时间
+        self._watermark: Optional[datetime] = None
+        self._loaded = False
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self, order_id: int, created_at: datetime) -> None:
+        """登记待支付订单（已登记的忽略）"""
+        if order_id in self._scheduled:
+            return
+        self._scheduled.add(order_id)
+        heapq.heappush(self._heap, (created_at + self.timeout, order_id))
+        ORDER_TIMEOUT_PENDING.set(len(self._heap))
+
+    async def load_pending(self) -> int:
+        """从数据库加载水位（减去回看窗口）之后的待支付订单，返回新登记的数量"""
+        query = select(Order.id, Order.created_at).where(Order.status == OrderStatus.PENDING)
+        if self._watermark is not None:
+            query = query.where(Order.created_at >= self._watermark - LOAD_OVERLAP)
+        async with async_session_maker() as db:
+            rows = (await db.execute(query)).all()
+
+        before = len(self._scheduled)
+        for order_id, created_at in rows:
+            self.schedule(order_id, created_at)
+            if self._watermark is None or created_at > self._watermark:
+                self._watermark = created_at
+        return len(self._scheduled) - before
+
+    def _pop_due(self, now: datetime) -> List[Tuple[datetime, int]]:
+        """弹出已到期的 (截止时间, 订单ID)；订单在取消提交后才从去重集合中移除"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap))
+        ORDER_TIMEOUT_PENDING.set(len(self._heap))
+        return due
+
+    def _requeue(self, entries: List[Tuple[datetime, int]]) -> None:
+        """把未能取消的订单放回堆中"""
+        for entry in entries:
+            heapq.heappush(self._heap, entry)
+        ORDER_TIMEOUT_PENDING.set(len(self._heap))
+
+    async def cancel_orders(self, due: List[Tuple[datetime, int]]) -> int:
+        """
+        分批取消到期订单，每批在一个事务内同时关闭待支付的支付记录
+
+        某批失败时该批及之后的订单放回堆中并抛出异常，已提交的批次不受影响。
+        """
+        cancelled = 0
+        try:
+            for i in range(0, len(due), self.batch_size):
+                batch = [order_id for _, order_id in due[i:i + self.batch_size]]
+                try:
+                    cancelled += await self._cancel_batch(batch)
+                except Exception:
+                    self._requeue(due[i:])
+                    raise
+                self._scheduled.difference_update(batch)
+        finally:
+            if cancelled:
+                ORDERS_AUTO_CANCELLED_TOTAL.inc(cancelled)
+                logger.info(f"已自动取消 {cancelled} 个超时未支付订单")
+        return cancelled
+
+    async def _cancel_batch(self, batch: List[int]) -> int:
+        """取消一批订单（一个事务），返回实际取消的数量"""
+        now = datetime.utcnow()
+        async with async_session_maker() as db:
+            # 只取消仍处于待支付状态的订单，期间已支付的订单不受影响
+            result = await db.execute(
+                update(Order)
+                .where(Order.id.in_(batch), Order.status == OrderStatus.PENDING)
+                .values(status=OrderStatus.CANCELLED, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            await db.execute(
+                update(Payment)
+                .where(
+                    Payment.status == PaymentStatus.PENDING,
+                    Payment.order_id.in_(
+                        select(Order.id).where(
+                            Order.id.in_(batch),
+                            Order.status == OrderStatus.CANCELLED,
+                        )
+                    ),
+                )
+                .values(status=PaymentStatus.CANCELLED, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            return result.rowcount
+
+    async def run_once(self) -> int:
+        """增量加载并取消到期订单"""
+        await self.load_pending()
+        due = self._pop_due(datetime.utcnow())
+        if not due:
+            return 0
+        return await self.cancel_orders(due)
+
+    def _next_wait(self) -> float:
+        """距离下一个到期订单的秒数（不超过轮询间隔）"""
+        if not self._heap:
+            return self.poll_interval
+        wait = (self._heap[0][0] - datetime.utcnow()).total_seconds()
+        return max(0.0, min(wait, self.poll_interval))
+
+    async def _run(self) -> None:
+        """后台循环"""
+        while True:
+            try:
+                if await leader_lock.ensure():
+                    if not self._loaded:
+                        count = await self.load_pending()
+                        self._loaded = True
+                        logger.info(f"订单超时调度器已加载 {count} 个待支付订单")
+                    await self.run_once()
+            except Exception as e:
+                logger.error(f"订单超时取消失败: {e}")
+                # 放回堆中的订单已到期，按轮询间隔重试，避免数据库故障期间空转
+                await asyncio.sleep(self.poll_interval)
+                continue
+            await asyncio.sleep(self._next_wait())
+
+    def start(self) -> None:
+        """启动调度器"""
+        if self.poll_interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止调度器"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+# 创建任务实例
+order_timeout_scheduler = OrderTimeoutScheduler(
+    timeout_minutes=settings.ORDER_PAYMENT_TIMEOUT_MINUTES,
+    batch_size=settings.ORDER_TIMEOUT_BATCH_SIZE,
+    poll_interval=settings.ORDER_TIMEOUT_POLL_INTERVAL,
+)
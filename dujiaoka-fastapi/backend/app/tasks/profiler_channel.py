@@ -0,0 +1,166 @@
+"""
+采样分析控制通道
+
+多 worker 部署时，各进程通过共享的控制目录协调采样：
+- 每个 worker 周期性地刷新心跳文件 worker-<pid>，并检查目录中的 <id>.request
+- 发起采样的 worker 写入请求文件后自己也开始采样，
+  其余 worker 发现请求后采样相同时长，把折叠栈写入 <id>.<pid>.result
+- 发起方等待所有存活 worker 的结果（或超时），合并后清理请求与结果文件
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.profiler import ProfileResult, profile, worker_label
+
+
+class ProfilerChannel:
+    """采样分析控制通道"""
+
+    def __init__(self, control_dir: str, poll_interval: float = 1.0):
+        self.control_dir = Path(control_dir)
+        self.poll_interval = poll_interval
+        self._handled: Set[str] = set()
+        self._handlers: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def _heartbeat(self) -> Path:
+        return self.control_dir / f"worker-{os.getpid()}"
+
+    def live_workers(self) -> List[int]:
+        """心跳未过期的 worker 进程号"""
+        now = time.time()
+        pids = []
+        for path in self.control_dir.glob("worker-*"):
+            try:
+                if now - path.stat().st_mtime <= self.poll_interval * 3:
+                    pids.append(int(path.name.split("-", 1)[1]))
+            except (OSError, ValueError):
+                continue
+        return sorted(pids)
+
+    async def profile_all(self, seconds: float, interval_ms: float) -> Tuple[ProfileResult, List[int]]:
+        """在所有 worker 上采样，返回合并结果（根节点为 pid:<进程号>）与参与的进程号"""
+        request_id = uuid.uuid4().hex
+        request_path = self.control_dir / f"{request_id}.request"
+        expected = set(self.live_workers()) - {os.getpid()}
+        self._write(request_path, json.dumps({
+            "origin": os.getpid(),
+            "seconds": seconds,
+            "interval_ms": interval_ms,
+            "created": time.time(),
+        }))
+
+        try:
+            merged = ProfileResult()
+            merged.merge(await profile(seconds, interval_ms), prefix=worker_label())
+            pids = [os.getpid()]
+
+            # 其余 worker 最迟在一个轮询周期后开始采样
+            deadline = time.monotonic() + self.poll_interval * 2 + 5
+            pending = set(expected)
+            while pending and time.monotonic() < deadline:
+                for pid in list(pending):
+                    result_path = self.control_dir / f"{request_id}.{pid}.result"
+                    if result_path.exists():
+                        data = json.loads(result_path.read_text(encoding="utf-8"))
+                        merged.merge(
+                            ProfileResult.from_collapsed(data["collapsed"], data["samples"], data["duration"]),
+                            prefix=f"pid:{pid}",
+                        )
+                        pids.append(pid)
+                        pending.discard(pid)
+                if pending:
+                    await asyncio.sleep(0.2)
+
+            if pending:
+                logger.warning(f"采样分析: worker {sorted(pending)} 未在超时前返回结果")
+            return merged, pids
+        finally:
+            for path in self.control_dir.glob(f"{request_id}.*"):
+                path.unlink(missing_ok=True)
+
+    async def _handle(self, request_path: Path) -> None:
+        """响应其他 worker 发起的采样请求"""
+        request_id = request_path.name.split(".", 1)[0]
+        try:
+            request = json.loads(request_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if request["origin"] == os.getpid():
+            return
+        if time.time() - request["created"] > request["seconds"] + self.poll_interval * 2:
+            return
+
+        try:
+            result = await profile(request["seconds"], request["interval_ms"])
+        except RuntimeError as e:
+            logger.warning(f"采样分析请求 {request_id} 被忽略: {e}")
+            return
+        self._write(
+            self.control_dir / f"{request_id}.{os.getpid()}.result",
+            json.dumps({"collapsed": result.collapsed(), "samples": result.samples, "duration": result.duration}),
+        )
+
+    @staticmethod
+    def _write(path: Path, content: str) -> None:
+        """原子写入（先写临时文件再重命名）"""
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_text(content, encoding="utf-8")
+        os.replace(tmp, path)
+
+    async def _run(self) -> None:
+        """后台循环：刷新心跳并处理新的采样请求"""
+        while True:
+            try:
+                self._heartbeat.touch()
+                requests = {path.name: path for path in self.control_dir.glob("*.request")}
+                # 请求文件已被发起方清理的不会再出现，从已处理集合中移除
+                self._handled &= requests.keys()
+                for name, request_path in requests.items():
+                    if name not in self._handled:
+                        self._handled.add(name)
+                        task = asyncio.create_task(self._handle(request_path))
+                        self._handlers.add(task)
+                        task.add_done_callback(self._handlers.discard)
+            except Exception as e:
+                logger.error(f"采样分析控制通道异常: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self) -> None:
+        """启动控制通道"""
+        if self._task is not None:
+            return
+        self.control_dir.mkdir(parents=True, exist_ok=True)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止控制通道"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        for task in list(self._handlers):
+            task.cancel()
+        if self._handlers:
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+        self._heartbeat.unlink(missing_ok=True)
+
+
+# 创建任务实例
+profiler_channel = ProfilerChannel(
+    control_dir=settings.PROFILER_CONTROL_DIR or os.path.join(tempfile.gettempdir(), "dujiaoka_profiler"),
+)
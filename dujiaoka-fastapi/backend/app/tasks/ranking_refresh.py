@@ -0,0 +1,55 @@
+"""
+商品排行榜生成任务
+
+主节点周期性地增量更新各时间窗口的商品累计值，并把有变化的 Top-N 榜单写入 product_rankings
+（见 app/services/ranking.py）；其他 worker 只读取榜单。
+"""
+import asyncio
+from typing import Optional
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.leader import leader_lock
+from app.services.ranking import ranking_service
+
+
+class RankingRefresher:
+    """排行榜生成任务"""
+
+    def __init__(self, interval: int):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        """后台循环"""
+        while True:
+            try:
+                if await leader_lock.ensure():
+                    await ranking_service.refresh()
+                else:
+                    ranking_service.reset()
+            except Exception as e:
+                logger.error(f"商品排行榜生成失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """启动后台生成"""
+        if self.interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台生成"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+# 创建任务实例
+ranking_refresher = RankingRefresher(interval=settings.RANKING_REFRESH_INTERVAL)
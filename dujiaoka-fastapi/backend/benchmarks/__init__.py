@@ -0,0 +1,8 @@
+"""
+性能与并发测试脚本
+
+直接在进程内通过 httpx ASGITransport 驱动 main.app，使用临时 SQLite 数据库，
+无需启动服务。在 backend 目录下以模块方式运行，例如：
+
+    python -m benchmarks.callback_idempotency
+"""
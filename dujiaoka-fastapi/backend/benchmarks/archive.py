@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+订单归档验证与对比
+
+- 正确性：只移动超过保留期的已发货 / 已取消订单及其支付记录，热表与归档表合计不变；
+  订单、支付列表（各分页、状态筛选）与仪表盘统计在归档前后一致；已归档订单可查看、不可修改；
+  重复运行不再移动；热表中始终保留主键最大的订单与支付记录，新订单、新支付记录主键不与归档记录重复
+- 对比：归档前后热表行数，以及热表全表聚合、用户订单列表首页的耗时
+
+用法:
+    python -m benchmarks.archive [--orders 50000] [--days 365] [--after-days 90] [--reads 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import secrets
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 使用临时数据库，必须在导入应用之前设置
+_db_dir = tempfile.mkdtemp(prefix="dujiaoka_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_dir}/bench.db"
+os.environ["DEBUG"] = "false"
+os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(32))
+os.environ["LEADER_LOCK_FILE"] = f"{_db_dir}/scheduler.lock"
+os.environ["COUNTER_JOURNAL_DIR"] = f"{_db_dir}/counters"
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+from sqlalchemy import func, insert, select
+
+from main import app
+from app.core.database import async_session_maker, create_tables
+from app.core.security import create_access_token, get_password_hash
+from app.models import (
+    Card, Order, OrderArchive, OrderStatus, Payment, PaymentArchive, PaymentMethod, PaymentStatus, Product, User,
+)
+from app.services.archive import ARCHIVED_STATUSES, ArchiveService
+from app.services.order import order_service
+from app.services.stats import stats_service
+
+results = []
+
+ADMIN = {"Authorization": f"Bearer {create_access_token('admin')}"}
+BUYER = {"Authorization": f"Bearer {create_access_token('buyer')}"}
+
+# 对比归档前后输出的接口（含深分页与状态筛选）
+PAGES = [
+    ("/api/v1/orders/?limit=20", BUYER),
+    ("/api/v1/orders/?skip=200&limit=50", BUYER),
+    ("/api/v1/orders/?limit=100", ADMIN),
+    ("/api/v1/orders/?skip=3000&limit=100", ADMIN),
+    ("/api/v1/orders/?skip=30000&limit=100", ADMIN),
+    ("/api/v1/orders/?skip=5000&limit=50", BUYER),
+    ("/api/v1/orders/?status=delivered&skip=500&limit=100", ADMIN),
+    ("/api/v1/orders/?status=pending&limit=100", ADMIN),
+    ("/api/v1/payments/?limit=20", BUYER),
+    ("/api/v1/payments/?skip=1000&limit=100", ADMIN),
+    ("/api/v1/payments/?skip=40000&limit=100", ADMIN),
+]
+
+
+def check(name: str, passed: bool, detail: str = "") -> None:
+    results.append(passed)
+    print(f"  {'✅' if passed else '❌'} {name}{f'（{detail}）' if detail else ''}")
+
+
+async def seed(orders: int, days: int) -> None:
+    """生成过去 days 天内各状态的订单、对应的支付记录与部分已发放的卡密"""
+    await create_tables()
+    rng = random.Random(50)
+    now = datetime.utcnow()
+    async with async_session_maker() as db:
+        db.add_all([
+            User(username="admin", email="admin@example.com", hashed_password=get_password_hash("admin123"),
+                 is_superuser=True),
+            User(username="buyer", email="buyer@example.com", hashed_password=get_password_hash("buyer123"),
+                 balance=1000.0),
+            *[User(username=f"user{i}", email=f"user{i}@example.com", hashed_password="x") for i in range(50)],
+            *[Product(name=f"商品{i}", price=round(rng.uniform(5, 200), 2), stock=1000) for i in range(20)],
+        ])
+        await db.flush()
+
+        statuses = [OrderStatus.DELIVERED] * 6 + [OrderStatus.CANCELLED] * 2 + [
+            OrderStatus.PAID, OrderStatus.REFUNDED, OrderStatus.PENDING]
+        rows, stamps = [], sorted((now - timedelta(seconds=rng.uniform(0, days * 86400)) for _ in range(orders)))
+        for i, created_at in enumerate(stamps):
+            quantity = rng.randint(1, 3)
+            price = rng.randrange(500, 20000)
+            rows.append({
+                "order_number": f"ARCH{i:08d}", "user_id": 2 if i % 5 == 0 else rng.randrange(3, 53),
+                "product_id": rng.randrange(1, 21), "product_name": "商品", "product_price_cents": price,
+                "quantity": quantity, "total_amount_cents": price * quantity, "payment_method": PaymentMethod.ALIPAY,
+                "status": rng.choice(statuses), "created_at": created_at, "updated_at": created_at,
+            })
+        await db.execute(insert(Order), rows)
+        await db.execute(insert(Payment), [
+            {"user_id": row["user_id"], "order_id": i + 1, "payment_method": "alipay",
+             "amount_cents": row["total_amount_cents"], "transaction_id": f"TXN{i:08d}",
+             "status": PaymentStatus.SUCCESS if row["status"] != OrderStatus.PENDING else PaymentStatus.PENDING,
+             "created_at": row["created_at"] + timedelta(seconds=30), "updated_at": row["created_at"]}
+            for i, row in enumerate(rows)
+        ])
+        await db.execute(insert(Card), [
+            {"product_id": 1, "encrypted_content": "x", "card_secret": "x", "order_id": i + 1,
+             "created_at": now, "updated_at": now}
+            for i in range(0, orders, 100)
+        ])
+        await db.commit()
+
+
+async def snapshot(client: httpx.AsyncClient) -> list:
+    """各列表接口与仪表盘统计的输出"""
+    outputs = [(await client.get(url, headers=headers)).json() for url, headers in PAGES]
+    async with async_session_maker() as db:
+        outputs.append(await stats_service.compute_dashboard_stats(db))
+        outputs.append(await stats_service.compute_dashboard_charts(db, 365))
+    return outputs
+
+
+async def count(model, *conditions) -> int:
+    async with async_session_maker() as db:
+        return (await db.execute(select(func.count()).select_from(model).where(*conditions))).scalar()
+
+
+async def timed(reads: int) -> tuple:
+    """热表全表聚合与用户订单列表首页的平均耗时（秒）"""
+    async with async_session_maker() as db:
+        started = time.perf_counter()
+        for _ in range(reads):
+            await db.execute(select(func.sum(Order.total_amount_cents), func.count(Order.id)))
+        scan = (time.perf_counter() - started) / reads
+
+        started = time.perf_counter()
+        for _ in range(reads):
+            await order_service.get_order_rows(db, user_id=2, limit=20)
+        listing = (time.perf_counter() - started) / reads
+    return scan, listing
+
+
+async def verify(args) -> None:
+    archiver = ArchiveService(after_days=args.after_days, batch_size=1000)
+    cutoff = archiver.cutoff()
+    hot_orders, hot_payments = await count(Order), await count(Payment)
+    expected = await count(Order, Order.status.in_(ARCHIVED_STATUSES), Order.created_at < cutoff)
+    scan_before, list_before = await timed(args.reads)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://localhost") as client:
+        before = await snapshot(client)
+
+        print("归档")
+        started = time.perf_counter()
+        moved = await archiver.archive()
+        elapsed = time.perf_counter() - started
+        check("移动超过保留期的已完成订单", moved == expected, f"{moved}/{expected}，{elapsed:.2f}s")
+        check("热表只保留近期或未完成的订单",
+              await count(Order, Order.status.in_(ARCHIVED_STATUSES), Order.created_at < cutoff) == 0)
+        check("归档表只含已完成且超过保留期的订单",
+              await count(OrderArchive) == moved
+              and await count(OrderArchive, OrderArchive.status.notin_(ARCHIVED_STATUSES)) == 0
+              and await count(OrderArchive, OrderArchive.created_at >= cutoff) == 0)
+        check("订单、支付记录合计不变",
+              await count(Order) + await count(OrderArchive) == hot_orders
+              and await count(Payment) + await count(PaymentArchive) == hot_payments)
+        check("支付记录随订单一起移动",
+              await count(Payment, Payment.order_id.notin_(select(Order.id))) == 0
+              and await count(PaymentArchive, PaymentArchive.order_id.notin_(select(OrderArchive.id))) == 0)
+        check("重复运行不再移动", await archiver.archive() == 0)
+
+        print("透明读取")
+        after = await snapshot(client)
+        same = [a == b for a, b in zip(before, after)]
+        check("订单、支付列表各分页与归档前一致", all(same[:len(PAGES)]),
+              f"{same[:len(PAGES)].count(True)}/{len(PAGES)}")
+        check("仪表盘统计与归档前一致", all(same[len(PAGES):]))
+
+        async with async_session_maker() as db:
+            archived = (await db.execute(
+                select(OrderArchive.id, OrderArchive.user_id).where(OrderArchive.status == OrderStatus.DELIVERED)
+                .limit(1)
+            )).one()
+            archived_payment = (await db.execute(select(PaymentArchive.id).limit(1))).scalar()
+            card = (await db.execute(select(Card).where(Card.order_id == archived.id))).scalars().first()
+        response = await client.get(f"/api/v1/orders/{archived.id}", headers=ADMIN)
+        check("已归档订单可查看", response.status_code == 200 and response.json()["id"] == archived.id
+              and response.json()["user"] is not None, str(response.status_code))
+        response = await client.get(f"/api/v1/payments/{archived_payment}", headers=ADMIN)
+        check("已归档支付记录可查看", response.status_code == 200, str(response.status_code))
+        response = await client.post(f"/api/v1/orders/{archived.id}/refund", headers=ADMIN)
+        check("已归档订单不可修改", response.status_code == 404, str(response.status_code))
+        check("卡密保留对已归档订单的引用", card is None or card.order_id == archived.id)
+
+        print("主键")
+        async with async_session_maker() as db:
+            # 主键最大的支付记录属于较早的订单（如补单），而不是主键最大的订单
+            oldest = (await db.execute(
+                select(Order).where(Order.status.in_(ARCHIVED_STATUSES)).order_by(Order.id).limit(1)
+            )).scalars().one()
+            db.add(Payment(user_id=oldest.user_id, order_id=oldest.id, payment_method="alipay",
+                           amount_cents=oldest.total_amount_cents, status=PaymentStatus.SUCCESS))
+            await db.commit()
+        everything = ArchiveService(after_days=-1, batch_size=1000)
+        await everything.archive()
+        async with async_session_maker() as db:
+            newest_archived = (await db.execute(select(func.max(OrderArchive.id)))).scalar()
+            newest_hot = (await db.execute(select(func.max(Order.id)))).scalar()
+            newest_archived_payment = (await db.execute(select(func.max(PaymentArchive.id)))).scalar()
+            newest_hot_payment = (await db.execute(select(func.max(Payment.id)))).scalar()
+        order = (await client.post("/api/v1/orders/", json={"product_id": 1, "quantity": 1,
+                                                             "payment_method": "balance"}, headers=BUYER)).json()
+        check("热表保留主键最大的订单", newest_hot is not None and newest_hot > newest_archived,
+              f"{newest_hot} > {newest_archived}")
+        check("新订单主键不与归档订单重复", order.get("id", 0) > newest_archived, str(order.get("id")))
+        check("热表保留主键最大的支付记录",
+              newest_hot_payment is not None and newest_hot_payment > newest_archived_payment,
+              f"{newest_hot_payment} > {newest_archived_payment}")
+        async with async_session_maker() as db:
+            payment = Payment(user_id=2, order_id=order["id"], payment_method="balance",
+                              amount_cents=100, status=PaymentStatus.PENDING)
+            db.add(payment)
+            await db.flush()
+            payment_id = payment.id
+            await db.commit()
+        check("新支付记录主键不与归档记录重复", payment_id > newest_archived_payment, str(payment_id))
+
+    print("对比")
+    scan_after, list_after = await timed(args.reads)
+    print(f"  热表行数：            订单 {hot_orders} -> {await count(Order)}，支付 {hot_payments} -> {await count(Payment)}")
+    print(f"  热表全表聚合：        {scan_before * 1e3:8.3f} ms -> {scan_after * 1e3:8.3f} ms"
+          f"（{scan_before / scan_after:.0f}x）")
+    print(f"  用户订单列表首页：    {list_before * 1e3:8.3f} ms -> {list_after * 1e3:8.3f} ms")
+    check("热表全表聚合随行数减少而变快", scan_after < scan_before)
+
+
+async def run(args) -> int:
+    await seed(args.orders, args.days)
+    await verify(args)
+
+    print(f"\n{results.count(True)}/{len(results)} 项检查通过")
+    return 0 if all(results) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="订单归档验证与对比")
+    parser.add_argument("--orders", type=int, default=50000, help="订单数（每个订单一条支付记录）")
+    parser.add_argument("--days", type=int, default=365, help="订单创建时间分布的天数")
+    parser.add_argument("--after-days", type=int, default=90, help="保留期天数")
+    parser.add_argument("--reads", type=int, default=200, help="对比测试的查询次数")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
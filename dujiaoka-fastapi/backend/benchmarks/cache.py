@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+缓存验证与开销测量
+
+- 序列化：datetime / date / Decimal / 枚举经 msgpack 往返后保持类型
+- 两级缓存：两个 Cache 实例共享同一个 L2 模拟两个 worker，检查 L2 命中回填 L1、按标签失效、
+  失效通知清除另一个 worker 的 L1、TTL 过期、并发未命中只回源一次、回源期间被失效时不写入旧值
+- 提交后失效：通过接口修改商品、下单扣库存、充值、改密码后立即读取，不返回旧值；回滚不失效
+- 降级：Redis 不可用时读按未命中处理且不再等待连接超时，期间的失效在恢复后补发
+- 开销：L1 / L2 命中耗时，商品详情接口开启与关闭缓存的耗时对比
+
+用法:
+    python -m benchmarks.cache [--requests 2000]
+    python -m benchmarks.cache --redis-url redis://localhost:6379/15
+    python -m benchmarks.cache --redis-url fake    # 使用 fakeredis（需另行安装 fakeredis[lua]）
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+
+# 使用临时数据库与进程内缓存，必须在导入应用之前设置
+_db_dir = tempfile.mkdtemp(prefix="dujiaoka_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_dir}/bench.db"
+os.environ["DEBUG"] = "false"
+os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(32))
+os.environ["LEADER_LOCK_FILE"] = f"{_db_dir}/scheduler.lock"
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from main import app
+from app.core.cache import Cache, MemoryBackend, RedisBackend, cache, invalidate_on_commit, packb, unpackb
+from app.core.database import async_session_maker, create_tables
+from app.core.security import create_access_token, get_password_hash
+from app.models import Category, OrderStatus, Product, User
+
+results = []
+
+
+def check(name: str, passed: bool, detail: str = "") -> None:
+    results.append(passed)
+    print(f"  {'✅' if passed else '❌'} {name}{f'（{detail}）' if detail else ''}")
+
+
+class FlakyBackend(MemoryBackend):
+    """可切换为故障状态的 L2"""
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+        self.calls = 0
+
+    def _check(self):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("模拟 Redis 故障")
+
+    async def get_many(self, keys):
+        self._check()
+        return await super().get_many(keys)
+
+    async def set_many(self, items, ttl, tags, *args):
+        self._check()
+        return await super().set_many(items, ttl, tags, *args)
+
+    async def delete_many(self, keys):
+        self._check()
+        await super().delete_many(keys)
+
+    async def invalidate_tags(self, tags, markers, counter):
+        self._check()
+        await super().invalidate_tags(tags, markers, counter)
+
+
+def verify_serialization() -> None:
+    print("序列化")
+    value = {
+        "at": datetime(2026, 1, 2, 3, 4, 5, 678901),
+        "day": date(2026, 1, 2),
+        "amount": Decimal("12.30"),
+        "status": OrderStatus.PAID,
+        "items": [1, 2.5, None, "文本", b"\x00"],
+        "nested": {1: {"ok": True}},
+    }
+    restored = unpackb(packb(value))
+    expected = dict(value, status=OrderStatus.PAID.value)
+    check("往返后类型与值不变", restored == expected and type(restored["at"]) is datetime
+          and type(restored["amount"]) is Decimal)
+
+
+async def verify_tiers(backend, label: str) -> None:
+    print(f"两级缓存（{label}）")
+    prefix = f"bench-{secrets.token_hex(4)}:"
+    worker_a = Cache(backend, prefix=prefix, l1_ttl=60)
+    worker_b = Cache(backend, prefix=prefix, l1_ttl=60)
+    worker_a.start()
+    worker_b.start()
+    await asyncio.sleep(0.1)  # 等待订阅建立
+    a, b = worker_a.namespace("product"), worker_b.namespace("product")
+
+    await a.set(1, {"price": 10}, ttl=60, tags=("products", "product:1"))
+    await a.set(2, {"price": 20}, ttl=60, tags=("products", "product:2"))
+    check("本进程 L1 命中", await a.get(1) == {"price": 10} and len(worker_a._l1) == 2)
+    check("其他 worker 从 L2 读取并回填 L1", await b.get_many([1, 2, 3]) == {1: {"price": 10}, 2: {"price": 20}}
+          and len(worker_b._l1) == 2)
+
+    value = await a.get(1)
+    value["price"] = 999
+    check("修改返回值不影响缓存", await a.get(1) == {"price": 10})
+
+    await a.invalidate_tags(["product:1"])
+    await asyncio.sleep(0.1)  # 等待失效通知送达
+    check("按标签失效：本进程与 L2", await a.get(1) is None and await a.get(2) == {"price": 20})
+    check("失效通知清除其他 worker 的 L1", f"{prefix}product:1" not in worker_b._l1 and await b.get(1) is None)
+
+    await b.delete_many([2])
+    await asyncio.sleep(0.1)
+    check("按键删除同步到其他 worker", await a.get(2) is None)
+
+    await a.set("short", "v", ttl=0.2)
+    await asyncio.sleep(0.3)
+    check("TTL 过期", await a.get("short") is None and await b.get("short") is None)
+
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"loaded": True}
+
+    values = await asyncio.gather(*(a.get_or_set("flight", loader, ttl=60) for _ in range(50)))
+    check("并发未命中只回源一次", calls == 1 and all(v == {"loaded": True} for v in values), f"回源 {calls} 次")
+
+    def stale_loader(invalidator: Cache):
+        async def loader():
+            value = {"price": 10}  # 回源读到旧值后，修改提交并失效标签
+            await invalidator.invalidate_tags(["product:9"])
+            return value
+        return loader
+
+    value = await a.get_or_set(9, stale_loader(worker_a), ttl=60, tags=("product:9",))
+    check("回源期间本进程失效标签时不写入旧值", value == {"price": 10} and await a.get(9) is None
+          and await b.get(9) is None)
+
+    # 未订阅失效通知的 worker，只能依靠 L2 的失效代数发现其他 worker 的失效
+    worker_c = Cache(backend, prefix=prefix, l1_ttl=60)
+    c = worker_c.namespace("product")
+    await c.get_or_set(9, stale_loader(worker_b), ttl=60, tags=lambda v: ("product:9",))
+    check("回源期间其他 worker 失效标签时不写入旧值", await c.get(9) is None and await b.get(9) is None)
+
+    async def fresh_loader():
+        return {"price": 12}
+
+    await c.get_or_set(9, fresh_loader, ttl=60, tags=("product:9",))
+    check("失效之后的回源正常写入", await b.get(9) == {"price": 12})
+    await asyncio.sleep(0.1)  # 等待失效通知送达后再停止订阅
+
+    # worker_c 未启动订阅，共用的 L2 连接由 worker_a、worker_b 关闭
+    await worker_a.stop()
+    await worker_b.stop()
+
+
+async def verify_degradation() -> None:
+    print("降级")
+    unreachable = Cache(RedisBackend("redis://127.0.0.1:1/0"), retry_interval=60)
+    ns = unreachable.namespace("x")
+    await ns.set("k", 1, ttl=60)
+    check("Redis 不可用时写入不报错，L1 仍可用", await ns.get("k") == 1)
+    unreachable.clear_local()
+    started = time.perf_counter()
+    for _ in range(100):
+        await ns.get("k")
+    elapsed = (time.perf_counter() - started) / 100
+    check("故障期间读取按未命中处理，不等待连接超时", await ns.get("k") is None and elapsed < 0.001,
+          f"{elapsed * 1e6:.0f} µs/次")
+    await unreachable.stop()
+
+    backend = FlakyBackend()
+    worker = Cache(backend, retry_interval=0.2)
+    ns = worker.namespace("product")
+    await ns.set(1, "旧值", ttl=60, tags=("product:1",))
+    backend.down = True
+    await worker.invalidate_tags(["product:1"])
+    check("故障期间的失效暂存", worker._pending_tags == {"product:1"})
+    calls = backend.calls
+    await ns.get(1)
+    check("故障期间不再访问 Redis", backend.calls == calls)
+    backend.down = False
+    await asyncio.sleep(0.25)
+    worker.clear_local()
+    check("恢复后先补发失效，不读到旧值", await ns.get(1) is None and not worker._pending_tags)
+    await worker.stop()
+
+
+async def seed():
+    await create_tables()
+    async with async_session_maker() as db:
+        admin = User(username="admin", email="admin@example.com", hashed_password=get_password_hash("admin123"),
+                     is_superuser=True)
+        buyer = User(username="buyer", email="buyer@example.com", hashed_password=get_password_hash("buyer123"),
+                     balance=1000.0)
+        category = Category(name="默认分类")
+        db.add_all([admin, buyer, category])
+        await db.flush()
+        product = Product(name="商品", price=10.0, stock=100, category_id=category.id)
+        db.add(product)
+        await db.commit()
+        return product.id, buyer.id
+
+
+async def verify_commit_invalidation() -> None:
+    print("提交后失效")
+    product_id, buyer_id = await seed()
+    admin = {"Authorization": f"Bearer {create_access_token('admin')}"}
+    buyer = {"Authorization": f"Bearer {create_access_token('buyer')}"}
+    detail = f"/api/v1/products/{product_id}"
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://localhost") as client:
+        await client.get(detail)
+        await client.get("/api/v1/products/categories")
+        response = await client.put(detail, json={"price": 12.5}, headers=admin)
+        check("修改商品后详情立即更新", response.status_code == 200
+              and (await client.get(detail)).json()["price"] == 12.5)
+
+        await client.put("/api/v1/products/categories/1", json={"name": "新分类"}, headers=admin)
+        check("修改分类后分类列表与商品详情更新",
+              (await client.get("/api/v1/products/categories")).json()[0]["name"] == "新分类"
+              and (await client.get(detail)).json()["category"]["name"] == "新分类")
+
+        order = (await client.post("/api/v1/orders/", json={"product_id": product_id, "quantity": 2,
+                                                            "payment_method": "balance"}, headers=buyer)).json()
+        response = await client.post(f"/api/v1/orders/{order['id']}/pay", headers=buyer)
+        check("支付扣库存（Core 语句）后详情库存更新", response.status_code == 200
+              and (await client.get(detail)).json()["stock"] == 98, str(response.status_code))
+        check("扣款后余额更新", (await client.get("/api/v1/users/balance", headers=buyer)).json()["balance"] == 975.0)
+
+        await client.post("/api/v1/users/recharge?amount=100", headers=buyer)
+        check("充值后余额更新", (await client.get("/api/v1/users/balance", headers=buyer)).json()["balance"] == 1075.0)
+
+        response = await client.post("/api/v1/auth/change-password?old_password=buyer123&new_password=buyer456",
+                                     headers=buyer)
+        check("缓存的鉴权用户可修改密码", response.status_code == 200, str(response.status_code))
+        response = await client.post("/api/v1/auth/login", data={"username": "buyer", "password": "buyer456"})
+        check("新密码可登录", response.status_code == 200, str(response.status_code))
+
+        await client.delete(f"/api/v1/users/{buyer_id}", headers=admin)
+        response = await client.get("/api/v1/users/balance", headers=buyer)
+        check("禁用用户后鉴权立即失效", response.status_code == 400, str(response.status_code))
+
+    async with async_session_maker() as db:
+        product = await db.get(Product, product_id)
+        product.price = 99.0
+        invalidate_on_commit(db, (f"product:{product_id}",))
+        await db.flush()
+        await db.rollback()
+    check("回滚不触发失效", await cache.namespace("product").get(f"detail:{product_id}") is not None)
+
+
+async def measure(requests: int) -> None:
+    print("开销")
+    ns = Cache(MemoryBackend()).namespace("bench")
+    await ns.set(1, {"id": 1, "name": "商品", "price": 10.0, "created_at": datetime.utcnow()}, ttl=60)
+    started = time.perf_counter()
+    for _ in range(requests * 10):
+        await ns.get(1)
+    print(f"  L1 命中            {(time.perf_counter() - started) / (requests * 10) * 1e6:8.2f} µs/次")
+
+    ns.cache.l1_ttl = 0
+    started = time.perf_counter()
+    for _ in range(requests * 10):
+        await ns.get(1)
+    print(f"  L2 命中（memory）  {(time.perf_counter() - started) / (requests * 10) * 1e6:8.2f} µs/次")
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://localhost") as client:
+        timings = {}
+        for enabled in (False, True):
+            cache.enabled = enabled
+            await client.get("/api/v1/products/1")
+            best = float("inf")
+            for _ in range(3):
+                started = time.perf_counter()
+                for _ in range(requests):
+                    await client.get("/api/v1/products/1")
+                best = min(best, (time.perf_counter() - started) / requests)
+            timings[enabled] = best
+            print(f"  商品详情接口（缓存{'开启' if enabled else '关闭'}） {best * 1000:8.3f} ms/次")
+        cache.enabled = True
+        check("缓存开启后商品详情接口更快", timings[True] < timings[False],
+              f"{timings[False] / timings[True]:.1f}x")
+
+
+async def run(args) -> int:
+    verify_serialization()
+    await verify_tiers(MemoryBackend(), "memory")
+    if args.redis_url:
+        if args.redis_url == "fake":
+            from fakeredis import FakeAsyncRedis
+            client = FakeAsyncRedis()
+        else:
+            import redis.asyncio as redis
+            client = redis.from_url(args.redis_url)
+        await verify_tiers(RedisBackend(client=client), "redis")
+    await verify_degradation()
+    await verify_commit_invalidation()
+    await measure(args.requests)
+
+    print(f"\n{results.count(True)}/{len(results)} 项检查通过")
+    return 0 if all(results) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="缓存验证与开销测量")
+    parser.add_argument("--requests", type=int, default=2000, help="开销测量的请求次数")
+    parser.add_argument("--redis-url", help="同时验证 Redis 后端（fake 表示使用 fakeredis）")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
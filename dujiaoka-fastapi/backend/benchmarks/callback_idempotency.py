@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+支付回调幂等性压测
+
+对同一笔支付并发发送 N 次相同的支付宝/微信回调，回调入队后由多个 worker
+并发消费，验证只发货一次：库存只扣减一次、销量只增加一次、去重表只有一条记录。
+另验证队列的失败处理：业务校验失败的回调不重试；租约过期后原 worker 不会覆盖新领取者的状态；
+以及订单取消后才到达的支付成功回调：超时取消的订单恢复并发货，用户取消的订单记录收款待退款；
+收款后发货时库存不足：收款照常确认，订单保持已支付待人工处理，任务不标记失败。
+
+用法:
+    python -m benchmarks.callback_idempotency [--requests 100]
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 使用临时数据库，必须在导入应用之前设置
+_db_dir = tempfile.mkdtemp(prefix="dujiaoka_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_dir}/bench.db"
+os.environ["DEBUG"] = "false"
+os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(32))
+os.environ["LEADER_LOCK_FILE"] = f"{_db_dir}/scheduler.lock"
+os.environ.setdefault("CACHE_BACKEND", "memory")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+from sqlalchemy import func, select, update
+
+from main import app
+from app.core.config import settings
+from app.core.database import async_session_maker, create_tables
+from app.core.metrics import PAYMENTS_NEEDING_ATTENTION_TOTAL
+from app.services.counter import counter_service
+from app.services.signature import signature_verifier, wechat_sign
+from app.tasks.callback_queue import callback_queue
+from app.tasks.order_timeout import order_timeout_scheduler
+from benchmarks.signature_throughput import make_key_pair, sign_callback
+from app.models import (
+    CallbackJobStatus, Order, OrderStatus, Payment, PaymentCallbackJob, PaymentMethod, PaymentStatus,
+    ProcessedCallback, Product, User,
+)
+
+INITIAL_STOCK = 1000
+QUANTITY = 2
+
+
+async def seed(gateway: str) -> dict:
+    """创建用户、商品、待支付订单和支付记录"""
+    await create_tables()
+    async with async_session_maker() as db:
+        user = User(username="bench", email="bench@example.com", hashed_password="x")
+        product = Product(name="压测商品", price=25.0, stock=INITIAL_STOCK)
+        db.add_all([user, product])
+        await db.commit()
+    return await add_order(gateway, user.id, product.id, 1)
+
+
+async def add_order(gateway: str, user_id: int, product_id: int, number: int) -> dict:
+    """创建待支付订单和支付记录"""
+    async with async_session_maker() as db:
+        user = await db.get(User, user_id)
+        product = await db.get(Product, product_id)
+        order = Order(
+            order_number=f"BENCH{number:04d}",
+            user_id=user.id,
+            product_id=product.id,
+            product_name=product.name,
+            product_price=product.price,
+            quantity=QUANTITY,
+            total_amount=product.price * QUANTITY,
+            payment_method=PaymentMethod(gateway),
+        )
+        db.add(order)
+        await db.flush()
+
+        payment = Payment(
+            user_id=user.id,
+            order_id=order.id,
+            payment_method=gateway,
+            amount=order.total_amount,
+            transaction_id=f"{gateway.upper()}-TXN-{number:04d}",
+        )
+        db.add(payment)
+        await db.commit()
+        return {"product_id": product.id, "order": order, "payment": payment}
+
+
+def build_callback(gateway: str, seeded: dict, private_key) -> tuple[str, dict]:
+    """构造已签名的回调请求"""
+    order, payment = seeded["order"], seeded["payment"]
+    if gateway == "alipay":
+        return "/api/v1/payments/alipay/callback", sign_callback(private_key, {
+            "out_trade_no": order.order_number,
+            "trade_no": payment.transaction_id,
+            "total_amount": str(payment.amount),
+            "trade_status": "TRADE_SUCCESS",
+        })
+    data = {
+        "return_code": "SUCCESS",
+        "result_code": "SUCCESS",
+        "out_trade_no": order.order_number,
+        "transaction_id": payment.transaction_id,
+        "total_fee": str(round(payment.amount * 100)),
+        "sign_type": "HMAC-SHA256",
+    }
+    return "/api/v1/payments/wechat/callback", {**data, "sign": wechat_sign(data, settings.WECHAT_API_KEY)}
+
+
+async def add_job(payload: dict) -> int:
+    """直接写入一个回调任务"""
+    async with async_session_maker() as db:
+        job = PaymentCallbackJob(gateway="alipay", payload=payload)
+        db.add(job)
+        await db.commit()
+        return job.id
+
+
+async def get_job(job_id: int) -> PaymentCallbackJob:
+    async with async_session_maker() as db:
+        return await db.get(PaymentCallbackJob, job_id)
+
+
+async def verify_failures() -> dict:
+    """业务校验失败不重试；租约过期后重新领取，原 worker 的结果被丢弃"""
+    unknown = {"out_trade_no": "NO-SUCH-ORDER", "trade_no": "NO-SUCH-TXN", "total_amount": "1.00",
+               "trade_status": "TRADE_SUCCESS"}
+    job_id = await add_job(unknown)
+    await callback_queue.drain()
+    failed = await get_job(job_id)
+
+    job_id = await add_job({**unknown, "trade_no": "NO-SUCH-TXN-2"})
+    stale = await callback_queue.claim()
+    async with async_session_maker() as db:
+        await db.execute(update(PaymentCallbackJob).where(PaymentCallbackJob.id == job_id)
+                         .values(locked_until=datetime.utcnow() - timedelta(minutes=1)))
+        await db.commit()
+    fresh = await callback_queue.claim()
+    stale_result = await callback_queue.process(stale)
+    reclaimed = await get_job(job_id)
+    await callback_queue.process(fresh)
+    finished = await get_job(job_id)
+
+    return {
+        "业务校验失败直接标记失败、不重试": failed.status == CallbackJobStatus.FAILED and failed.attempts == 1,
+        "租约过期后原 worker 不覆盖新领取者": (
+            stale.id == fresh.id == job_id and not stale_result
+            and reclaimed.status == CallbackJobStatus.PROCESSING and reclaimed.attempts == 2
+            and finished.status == CallbackJobStatus.FAILED
+        ),
+    }
+
+
+async def verify_paid_after_cancel(gateway: str, seeded: dict, private_key, client: httpx.AsyncClient) -> dict:
+    """订单取消后才到达的支付成功回调：不当作重复回调忽略"""
+    user_id, product_id = seeded["order"].user_id, seeded["product_id"]
+    timed_out = await add_order(gateway, user_id, product_id, 2)
+    await order_timeout_scheduler.cancel_orders([(datetime.utcnow(), timed_out["order"].id)])
+    cancelled_by_user = await add_order(gateway, user_id, product_id, 3)
+    async with async_session_maker() as db:
+        await db.execute(update(Order).where(Order.id == cancelled_by_user["order"].id)
+                         .values(status=OrderStatus.CANCELLED))
+        await db.commit()
+
+    for seeded_order in (timed_out, cancelled_by_user):
+        url, body = build_callback(gateway, seeded_order, private_key)
+        await client.post(url, json=body)
+    await callback_queue.drain()
+
+    async with async_session_maker() as db:
+        revived = await db.get(Order, timed_out["order"].id)
+        revived_payment = await db.get(Payment, timed_out["payment"].id)
+        kept = await db.get(Order, cancelled_by_user["order"].id)
+        kept_payment = await db.get(Payment, cancelled_by_user["payment"].id)
+        failed_jobs = (await db.execute(
+            select(func.count(PaymentCallbackJob.id)).where(PaymentCallbackJob.status != CallbackJobStatus.DONE)
+        )).scalar()
+    return {
+        "超时取消后付款：订单恢复并发货": (
+            revived.status == OrderStatus.DELIVERED and revived_payment.status == PaymentStatus.SUCCESS
+        ),
+        "用户取消后付款：记录收款，订单保持取消": (
+            kept.status == OrderStatus.CANCELLED and kept_payment.status == PaymentStatus.SUCCESS
+            and failed_jobs == 0
+        ),
+    }
+
+
+async def verify_out_of_stock(gateway: str, seeded: dict, private_key, client: httpx.AsyncClient) -> dict:
+    """收款后发货时库存不足：不回滚收款，订单保持已支付并计入告警指标"""
+    async with async_session_maker() as db:
+        product = Product(name="售罄商品", price=25.0, stock=0)
+        db.add(product)
+        await db.commit()
+    sold_out = await add_order(gateway, seeded["order"].user_id, product.id, 4)
+    alerts = PAYMENTS_NEEDING_ATTENTION_TOTAL.labels("delivery_failed")._value.get()
+
+    url, body = build_callback(gateway, sold_out, private_key)
+    await client.post(url, json=body)
+    await callback_queue.drain()
+
+    async with async_session_maker() as db:
+        order = await db.get(Order, sold_out["order"].id)
+        payment = await db.get(Payment, sold_out["payment"].id)
+        product = await db.get(Product, product.id)
+        unfinished_jobs = (await db.execute(
+            select(func.count(PaymentCallbackJob.id)).where(PaymentCallbackJob.status != CallbackJobStatus.DONE)
+        )).scalar()
+    return {
+        "发货库存不足：收款确认、订单保持已支付待人工处理": (
+            payment.status == PaymentStatus.SUCCESS and order.status == OrderStatus.PAID and product.stock == 0
+            and PAYMENTS_NEEDING_ATTENTION_TOTAL.labels("delivery_failed")._value.get() == alerts + 1
+        ),
+        "发货库存不足：回调任务完成、不重试": unfinished_jobs == 0,
+    }
+
+
+async def run(gateway: str, requests: int) -> bool:
+    private_key, public_pem = make_key_pair()
+    settings.ALIPAY_PUBLIC_KEY = public_pem
+    settings.WECHAT_API_KEY = secrets.token_hex(16)
+
+    seeded = await seed(gateway)
+    url, body = build_callback(gateway, seeded, private_key)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.post(url, json=body) for _ in range(requests)))
+        ack_elapsed = time.perf_counter() - started
+
+        # 多个 worker 并发消费回调队列
+        await asyncio.gather(*(callback_queue.drain() for _ in range(max(callback_queue.workers, 1))))
+        elapsed = time.perf_counter() - started
+        # 销量延迟写入，检查前先写入数据库
+        await counter_service.flush()
+
+        async with async_session_maker() as db:
+            product = await db.get(Product, seeded["product_id"])
+            order = await db.get(Order, seeded["order"].id)
+            payment = await db.get(Payment, seeded["payment"].id)
+            processed = (await db.execute(select(func.count(ProcessedCallback.id)))).scalar()
+
+        late = await verify_paid_after_cancel(gateway, seeded, private_key, client)
+        out_of_stock = await verify_out_of_stock(gateway, seeded, private_key, client)
+
+    status_codes = {r.status_code for r in responses}
+    checks = {
+        "所有回调返回 200": status_codes == {200},
+        "库存只扣减一次": product.stock == INITIAL_STOCK - QUANTITY,
+        "销量只增加一次": product.sold_count == QUANTITY,
+        "订单已发货": order.status == OrderStatus.DELIVERED,
+        "支付成功": payment.status == PaymentStatus.SUCCESS,
+        "去重表只有一条记录": processed == 1,
+    }
+    checks.update(late)
+    checks.update(out_of_stock)
+    checks.update(await verify_failures())
+
+    print(
+        f"[{gateway}] {requests} 个并发重复回调，应答耗时 {ack_elapsed:.3f}s，"
+        f"处理完成耗时 {elapsed:.3f}s，状态码 {sorted(status_codes)}"
+    )
+    for name, ok in checks.items():
+        print(f"  {'✅' if ok else '❌'} {name}")
+    return all(checks.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="支付回调幂等性压测")
+    parser.add_argument("--requests", type=int, default=100, help="并发重复回调数量")
+    parser.add_argument("--gateway", choices=["alipay", "wechat"], default="alipay")
+    args = parser.parse_args()
+
+    try:
+        ok = asyncio.run(run(args.gateway, args.requests))
+    finally:
+        signature_verifier.shutdown()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
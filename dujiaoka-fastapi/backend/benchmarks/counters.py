@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+商品计数延迟写入验证与对比
+
+- 正确性：并发累加后批量写入，总数准确；回滚的订单事务不计销量；浏览商品详情累加 view_count
+- 重启恢复：未写入即退出的进程留下的日志由下次启动接管；写入成功但未删除日志（提交后崩溃）时重放不重复累加；
+  已退出进程的日志可被其他进程接管；日志末尾不完整的行被跳过
+- 对比：同一热门商品 N 次销量累加，逐次 UPDATE 提交 与 缓冲后一次批量写入 的耗时
+
+用法:
+    python -m benchmarks.counters [--increments 2000] [--concurrency 20]
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 使用临时数据库与计数日志目录，必须在导入应用之前设置
+_db_dir = tempfile.mkdtemp(prefix="dujiaoka_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_dir}/bench.db"
+os.environ["DEBUG"] = "false"
+os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(32))
+os.environ["LEADER_LOCK_FILE"] = f"{_db_dir}/scheduler.lock"
+os.environ["COUNTER_JOURNAL_DIR"] = f"{_db_dir}/counters"
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+from sqlalchemy import update
+
+from main import app
+from app.core.database import async_session_maker, create_tables
+from app.models import Category, CounterFlush, Product
+from app.services.counter import CounterService, counter_service
+
+results = []
+
+
+def check(name: str, passed: bool, detail: str = "") -> None:
+    results.append(passed)
+    print(f"  {'✅' if passed else '❌'} {name}{f'（{detail}）' if detail else ''}")
+
+
+async def seed() -> list:
+    await create_tables()
+    async with async_session_maker() as db:
+        category = Category(name="默认分类")
+        db.add(category)
+        await db.flush()
+        products = [Product(name=f"商品{i}", price=10.0, stock=-1, category_id=category.id) for i in range(3)]
+        db.add_all(products)
+        await db.commit()
+        return [product.id for product in products]
+
+
+async def counts(product_id: int) -> tuple:
+    async with async_session_maker() as db:
+        product = await db.get(Product, product_id)
+        return product.sold_count, product.view_count
+
+
+async def reset(product_ids) -> None:
+    async with async_session_maker() as db:
+        await db.execute(update(Product).where(Product.id.in_(product_ids)).values(sold_count=0, view_count=0))
+        await db.commit()
+
+
+async def verify_correctness(product_ids, concurrency: int) -> None:
+    print("正确性")
+    hot, other, _ = product_ids
+
+    async def buyer(n: int):
+        for _ in range(n):
+            async with async_session_maker() as db:
+                counter_service.add_on_commit(db, "sold_count", hot, 2)
+                await db.commit()
+            await asyncio.sleep(0)
+
+    async def flusher():
+        for _ in range(5):
+            await counter_service.flush()
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(buyer(10) for _ in range(concurrency)), flusher())
+    await counter_service.flush()
+    check("并发累加与写入交错后总数准确", (await counts(hot))[0] == concurrency * 10 * 2, str((await counts(hot))[0]))
+
+    async with async_session_maker() as db:
+        counter_service.add_on_commit(db, "sold_count", other, 5)
+        await db.rollback()
+    await counter_service.flush()
+    check("回滚的事务不计销量", (await counts(other))[0] == 0)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://localhost") as client:
+        for _ in range(7):
+            await client.get(f"/api/v1/products/{other}")
+    await counter_service.flush()
+    check("浏览商品详情累加 view_count", (await counts(other))[1] == 7, str((await counts(other))[1]))
+
+
+async def verify_recovery(product_ids) -> None:
+    print("重启恢复")
+    product_id = product_ids[2]
+    journal_dir = Path(os.environ["COUNTER_JOURNAL_DIR"]) / "recovery"
+
+    # 进程退出前未写入：日志由同进程号的新实例（容器重启后进程号复用）接管
+    crashed = CounterService(str(journal_dir))
+    for _ in range(10):
+        crashed.incr("sold_count", product_id)
+    crashed.close()
+    restarted = CounterService(str(journal_dir))
+    claimed = restarted.recover()
+    await restarted.flush()
+    check("未写入的日志在重启后写入", claimed == 1 and (await counts(product_id))[0] == 10)
+
+    # 写入已提交但日志未删除：重放时按批次号跳过
+    crashed = CounterService(str(journal_dir))
+    crashed.incr("sold_count", product_id, 3)
+    crashed._rotate()
+    batch_id, path, deltas = crashed._batches[0]
+    await crashed._apply(batch_id, deltas)
+    restarted = CounterService(str(journal_dir))
+    restarted.recover()
+    await restarted.flush()
+    check("提交后崩溃的批次重放不重复累加", (await counts(product_id))[0] == 13 and not path.exists())
+
+    # 已退出进程的日志被其他进程接管；不完整的最后一行被跳过
+    dead_pid = 4194304 + 1  # 超过 pid_max，不可能存活
+    (journal_dir / f"counters-{dead_pid}.log").write_bytes(b"view_count %d 4\nview_count %d 1\nsold_co" % (
+        product_id, product_id))
+    other = CounterService(str(journal_dir))
+    claimed = other.recover()
+    await other.flush()
+    check("接管已退出进程的日志，跳过不完整的行", claimed == 1 and (await counts(product_id))[1] == 5)
+
+    async with async_session_maker() as db:
+        recorded = len((await db.execute(CounterFlush.__table__.select())).all())
+    check("批次号已记录", recorded >= 3, f"{recorded} 个批次")
+
+
+async def compare(product_ids, increments: int, concurrency: int) -> None:
+    print("对比")
+    hot = product_ids[0]
+    await reset(product_ids)
+
+    async def direct(n: int):
+        for _ in range(n):
+            async with async_session_maker() as db:
+                await db.execute(
+                    update(Product).where(Product.id == hot).values(sold_count=Product.sold_count + 1)
+                )
+                await db.commit()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(direct(increments // concurrency) for _ in range(concurrency)))
+    direct_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(increments // concurrency * concurrency):
+        counter_service.incr("sold_count", hot)
+    await counter_service.flush()
+    buffered_elapsed = time.perf_counter() - started
+
+    total = increments // concurrency * concurrency
+    check("两种方式结果一致", (await counts(hot))[0] == total * 2)
+    print(f"  逐次 UPDATE 提交：{total} 次 {direct_elapsed:.3f}s（{total / direct_elapsed:,.0f} 次/秒，{total} 次行更新）")
+    print(f"  缓冲后批量写入：  {total} 次 {buffered_elapsed:.3f}s（{total / buffered_elapsed:,.0f} 次/秒，1 次行更新）")
+
+
+async def run(args) -> int:
+    product_ids = await seed()
+    await verify_correctness(product_ids, args.concurrency)
+    await verify_recovery(product_ids)
+    await compare(product_ids, args.increments, args.concurrency)
+
+    print(f"\n{results.count(True)}/{len(results)} 项检查通过")
+    return 0 if all(results) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="商品计数延迟写入验证与对比")
+    parser.add_argument("--increments", type=int, default=2000, help="对比测试的累加次数")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发数")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
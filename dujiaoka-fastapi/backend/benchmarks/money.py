@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+金额整数分验证与对比
+
+- 正确性：元/分转换往返精确；19.99 这类金额的微信（分）/支付宝（元）回调金额校验通过，不一致时拒绝；
+  多次小额充值后余额精确；仪表盘营业额按分求和精确；列表接口输出的金额为元
+- 对比：N 笔金额的解析（只发生在接口边界）、求和与比较，浮点数 / Decimal / 整数分 的耗时
+
+用法:
+    python -m benchmarks.money [--orders 10000] [--amounts 1000000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import secrets
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+# 使用临时数据库，必须在导入应用之前设置
+_db_dir = tempfile.mkdtemp(prefix="dujiaoka_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_dir}/bench.db"
+os.environ["DEBUG"] = "false"
+os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(32))
+os.environ["LEADER_LOCK_FILE"] = f"{_db_dir}/scheduler.lock"
+os.environ["COUNTER_JOURNAL_DIR"] = f"{_db_dir}/counters"
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+from sqlalchemy import insert
+
+from main import app
+from app.core.database import async_session_maker, create_tables
+from app.core.money import format_yuan, to_cents
+from app.core.security import create_access_token, get_password_hash
+from app.models import Order, OrderStatus, Payment, PaymentMethod, PaymentStatus, Product, User
+from app.services.payment import payment_service
+from app.services.stats import stats_service
+
+results = []
+
+
+def check(name: str, passed: bool, detail: str = "") -> None:
+    results.append(passed)
+    print(f"  {'✅' if passed else '❌'} {name}{f'（{detail}）' if detail else ''}")
+
+
+async def seed() -> None:
+    await create_tables()
+    async with async_session_maker() as db:
+        db.add_all([
+            User(username="admin", email="admin@example.com", hashed_password=get_password_hash("admin123"),
+                 is_superuser=True),
+            User(username="buyer", email="buyer@example.com", hashed_password=get_password_hash("buyer123")),
+            Product(name="商品", price=19.99, stock=100),
+        ])
+        await db.commit()
+
+
+def verify_conversion() -> None:
+    print("转换")
+    check("两位小数的浮点数转换为分精确", all(to_cents(cents / 100) == cents for cents in range(10 ** 6)))
+    check("元字符串往返精确", all(to_cents(format_yuan(cents)) == cents for cents in range(-10 ** 5, 10 ** 5)))
+    # 前导空格使解析走通用路径
+    texts = [text for cents in range(10 ** 4) for text in (format_yuan(cents), format_yuan(cents)[:-1], str(cents))]
+    check("快速路径与通用解析结果一致", all(to_cents(text) == to_cents(f" {text}") for text in texts))
+    check("19.99 元 = 1999 分（旧写法 int(19.99 * 100) 为 1998）",
+          to_cents("19.99") == to_cents(19.99) == 1999 and int(19.99 * 100) == 1998)
+    try:
+        to_cents("19.999")
+        rejected = False
+    except ValueError:
+        rejected = True
+    check("超过两位小数的金额字符串被拒绝", rejected)
+
+
+async def verify_callbacks() -> None:
+    print("回调金额校验")
+    async with async_session_maker() as db:
+        payments = []
+        for i, gateway in enumerate(("wechat", "alipay", "wechat", "alipay")):
+            order = Order(order_number=f"MONEY{i}", user_id=2, product_id=1, product_name="商品", product_price=19.99,
+                          quantity=1, total_amount=19.99, payment_method=PaymentMethod(gateway))
+            db.add(order)
+            await db.flush()
+            payment = Payment(user_id=2, order_id=order.id, payment_method=gateway, amount=19.99,
+                              transaction_id=f"TXN{i}")
+            db.add(payment)
+            payments.append(payment)
+        await db.commit()
+        ids = [payment.id for payment in payments]
+
+    callbacks = [
+        ("wechat", {"return_code": "SUCCESS", "result_code": "SUCCESS", "out_trade_no": "MONEY0",
+                    "transaction_id": "TXN0", "total_fee": "1999"}),
+        ("alipay", {"out_trade_no": "MONEY1", "trade_no": "TXN1", "total_amount": "19.99",
+                    "trade_status": "TRADE_SUCCESS"}),
+        ("wechat", {"return_code": "SUCCESS", "result_code": "SUCCESS", "out_trade_no": "MONEY2",
+                    "transaction_id": "TXN2", "total_fee": "1998"}),
+        ("alipay", {"out_trade_no": "MONEY3", "trade_no": "TXN3", "total_amount": "19.98",
+                    "trade_status": "TRADE_SUCCESS"}),
+    ]
+    outcomes = []
+    for gateway, data in callbacks:
+        async with async_session_maker() as db:
+            try:
+                await payment_service.process_callback(db, gateway, data)
+                outcomes.append("ok")
+            except ValueError as e:
+                outcomes.append(str(e))
+
+    async with async_session_maker() as db:
+        statuses = [(await db.get(Payment, payment_id)).status for payment_id in ids]
+        gateway_amounts = [(await db.get(Payment, payment_id)).gateway_amount_cents for payment_id in ids[:2]]
+    check("微信 total_fee=1999 与 19.99 元匹配", outcomes[0] == "ok" and statuses[0] == PaymentStatus.SUCCESS)
+    check("支付宝 total_amount=19.99 匹配", outcomes[1] == "ok" and statuses[1] == PaymentStatus.SUCCESS)
+    check("金额不一致时拒绝", outcomes[2:] == ["金额不匹配"] * 2 and PaymentStatus.SUCCESS not in statuses[2:],
+          str(outcomes[2:]))
+    check("网关金额以分记录", gateway_amounts == [1999, 1999], str(gateway_amounts))
+
+
+async def verify_api(orders: int) -> None:
+    print("接口")
+    admin = {"Authorization": f"Bearer {create_access_token('admin')}"}
+    buyer = {"Authorization": f"Bearer {create_access_token('buyer')}"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://localhost") as client:
+        for _ in range(10):
+            await client.post("/api/v1/users/recharge?amount=0.1", headers=buyer)
+        balance = (await client.get("/api/v1/users/balance", headers=buyer)).json()["balance"]
+        check("充值 10 次 0.1 元后余额为 1.0", balance == 1.0, f"{balance}；浮点累加为 {sum([0.1] * 10)}")
+
+        response = await client.post("/api/v1/users/recharge?amount=0.001", headers=buyer)
+        check("不足 1 分的充值被拒绝", response.status_code == 400, str(response.status_code))
+
+        order = (await client.post("/api/v1/orders/", json={"product_id": 1, "quantity": 3, "payment_method": "balance"},
+                                   headers=buyer)).json()
+        check("下单金额为 3 × 19.99 = 59.97", order.get("total_amount") == 59.97, str(order.get("total_amount")))
+        response = await client.post(f"/api/v1/orders/{order['id']}/pay", headers=buyer)
+        check("余额不足时拒绝支付", response.status_code == 400, str(response.status_code))
+
+        listing = (await client.get("/api/v1/orders/?size=1", headers=buyer)).json()
+        check("订单列表输出元", listing["items"][0]["total_amount"] == 59.97 and listing["items"][0]["product_price"] == 19.99)
+        payments = (await client.get("/api/v1/payments/", headers=admin)).json()
+        check("支付列表输出元", {item["amount"] for item in payments["items"]} == {19.99},
+              str({item["amount"] for item in payments["items"]}))
+
+        # 大量 0.1 元订单：浮点 SUM 有累积误差，整数分求和精确
+        async with async_session_maker() as db:
+            await db.execute(insert(Order), [
+                {"order_number": f"SUM{i:08d}", "user_id": 2, "product_id": 1, "product_name": "商品",
+                 "product_price_cents": 10, "quantity": 1, "total_amount_cents": 10,
+                 "payment_method": PaymentMethod.BALANCE, "status": OrderStatus.DELIVERED}
+                for i in range(orders)
+            ])
+            await db.commit()
+            stats = await stats_service.compute_dashboard_stats(db)
+        expected = round((orders * 10 + 5997 + 4 * 1999) / 100, 2)
+        check("营业额按分求和精确", stats["total_revenue"] == expected,
+              f"{stats['total_revenue']}；浮点累加为 {sum([0.1] * orders)}")
+
+
+def measure(count: int) -> None:
+    print("对比")
+    rng = random.Random(49)
+    cents = [rng.randrange(1, 100000) for _ in range(count)]
+    texts = [format_yuan(value) for value in cents]
+
+    def timed(fn):
+        started = time.perf_counter()
+        value = fn()
+        return time.perf_counter() - started, value
+
+    rows = []
+    for name, parse, zero in (
+        ("浮点数", float, 0.0),
+        ("Decimal", Decimal, Decimal(0)),
+        ("整数分", to_cents, 0),
+    ):
+        parse_elapsed, values = timed(lambda: [parse(text) for text in texts])
+        sum_elapsed, total = timed(lambda: sum(values, zero))
+        compare_elapsed, _ = timed(lambda: [a == b for a, b in zip(values, values[1:])])
+        rows.append((name, parse_elapsed, sum_elapsed, compare_elapsed, total))
+
+    exact = sum(cents)
+    expected = {"浮点数": exact / 100, "Decimal": Decimal(exact) / 100, "整数分": exact}
+    for name, parse_elapsed, sum_elapsed, compare_elapsed, total in rows:
+        correct = total == expected[name]
+        print(f"  {name:8s} 解析 {parse_elapsed * 1e3:7.1f} ms  求和 {sum_elapsed * 1e3:6.1f} ms  "
+              f"比较 {compare_elapsed * 1e3:6.1f} ms  合计 {total}（{'精确' if correct else '有误差'}）")
+    check("整数分求和与比较快于 Decimal", rows[2][2] + rows[2][3] < rows[1][2] + rows[1][3])
+
+
+async def run(args) -> int:
+    await seed()
+    verify_conversion()
+    await verify_callbacks()
+    await verify_api(args.orders)
+    measure(args.amounts)
+
+    print(f"\n{results.count(True)}/{len(results)} 项检查通过")
+    return 0 if all(results) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="金额整数分验证与对比")
+    parser.add_argument("--orders", type=int, default=10000, help="营业额求和的订单数")
+    parser.add_argument("--amounts", type=int, default=1000000, help="对比测试的金额数")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
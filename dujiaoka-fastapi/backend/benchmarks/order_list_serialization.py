@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+订单列表序列化基准
+
+对比 GET /orders 的两条路径（单进程顺序请求，即每核吞吐）：
+- 旧路径：加载完整 ORM 实体 + selectinload 用户/商品，经嵌套 Pydantic 模型校验后用 JSONResponse 输出
+- 新路径：列投影查询，行元组经 RowSerializer 直接生成 JSON 字节
+
+用法:
+    python -m benchmarks.order_list_serialization [--orders 2000] [--limit 100] [--requests 300]
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+_db_dir = tempfile.mkdtemp(prefix="dujiaoka_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_dir}/bench.db"
+os.environ["DEBUG"] = "false"
+os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(32))
+os.environ["LEADER_LOCK_FILE"] = f"{_db_dir}/scheduler.lock"
+os.environ.setdefault("CACHE_BACKEND", "memory")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+from fastapi import Depends, Query
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import desc, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from main import app
+from app.core.database import async_session_maker, create_tables, get_db
+from app.core.security import create_access_token
+from app.models import Order, OrderStatus, PaymentMethod, Product, User
+from app.schemas.order import Order as OrderSchema
+
+
+class LegacyOrderList(BaseModel):
+    """旧版订单列表响应（嵌套完整用户/商品模型）"""
+    items: List[OrderSchema]
+    total: int
+    page: int
+    size: int
+
+
+@app.get("/bench/legacy-orders", response_model=LegacyOrderList, response_class=JSONResponse)
+async def legacy_orders(limit: int = Query(100), db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        select(Order)
+        .options(selectinload(Order.user), selectinload(Order.product))
+        .limit(limit)
+        .order_by(desc(Order.created_at))
+    )
+    orders = result.scalars().all()
+    return LegacyOrderList(items=orders, total=len(orders), page=1, size=limit)
+
+
+async def seed(order_count: int) -> str:
+    """生成测试数据，返回管理员令牌"""
+    await create_tables()
+    async with async_session_maker() as db:
+        users = [
+            User(username=f"user{i}", email=f"user{i}@example.com", hashed_password="x", is_superuser=(i == 0))
+            for i in range(50)
+        ]
+        products = [
+            Product(name=f"商品{i}", description="描述" * 200, price=10.0 + i, stock=-1)
+            for i in range(20)
+        ]
+        db.add_all(users + products)
+        await db.flush()
+
+        for i in range(order_count):
+            product = products[i % len(products)]
+            db.add(Order(
+                order_number=f"BENCH{i:08d}",
+                user_id=users[i % len(users)].id,
+                product_id=product.id,
+                product_name=product.name,
+                product_price=product.price,
+                quantity=1,
+                total_amount=product.price,
+                payment_method=PaymentMethod.BALANCE,
+                status=OrderStatus.DELIVERED,
+                delivery_content="感谢购买！",
+            ))
+        await db.commit()
+        return create_access_token(users[0].username)
+
+
+async def measure(client: httpx.AsyncClient, url: str, headers: dict, requests: int) -> float:
+    """顺序请求，返回每秒请求数"""
+    response = await client.get(url, headers=headers)
+    assert response.status_code == 200, response.text
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        await client.get(url, headers=headers)
+    return requests / (time.perf_counter() - started)
+
+
+async def run(order_count: int, limit: int, requests: int) -> None:
+    token = await seed(order_count)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+        before = await measure(client, f"/bench/legacy-orders?limit={limit}", headers, requests)
+        after = await measure(client, f"/api/v1/orders/?limit={limit}", headers, requests)
+
+    print(f"GET /orders（每页 {limit} 条，单进程 {requests} 次顺序请求）")
+    print(f"  旧路径（ORM + 嵌套 Pydantic）: {before:,.1f} 请求/秒/核")
+    print(f"  新路径（列投影 + orjson）:     {after:,.1f} 请求/秒/核")
+    print(f"  提升: {after / before:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="订单列表序列化基准")
+    parser.add_argument("--orders", type=int, default=2000, help="订单数量")
+    parser.add_argument("--limit", type=int, default=100, help="每页条数")
+    parser.add_argument("--requests", type=int, default=300, help="请求次数")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.orders, args.limit, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+接口查询预算检查
+
+逐个调用主要接口，用 count_queries 统计每个请求执行的 SQL 条数，
+超出预算（或出现疑似 N+1 的重复语句形态）时以非零状态退出，可作为回归检查使用。
+
+用法:
+    python -m benchmarks.query_budget [--verbose]
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+_db_dir = tempfile.mkdtemp(prefix="dujiaoka_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_dir}/bench.db"
+os.environ["DEBUG"] = "false"
+os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(32))
+os.environ["LEADER_LOCK_FILE"] = f"{_db_dir}/scheduler.lock"
+os.environ.setdefault("CACHE_BACKEND", "memory")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from main import app
+from app.core.config import settings
+from app.core.database import async_session_maker, create_tables
+from app.core.query_counter import count_queries
+from app.core.security import create_access_token
+from app.models import Category, Order, OrderStatus, PaymentMethod, Product, User
+
+CART_SIZE = 10
+
+
+class Endpoint(NamedTuple):
+    name: str
+    method: str
+    url: str
+    max_queries: int
+    json: Optional[Any] = None
+    admin: bool = False
+
+
+ENDPOINTS = (
+    Endpoint("商品列表", "GET", "/api/v1/products/", 2),
+    Endpoint("商品详情", "GET", "/api/v1/products/1", 2),
+    Endpoint("分类列表", "GET", "/api/v1/products/categories", 1),
+    Endpoint("订单列表", "GET", "/api/v1/orders/?limit=100", 2),
+    Endpoint("支付记录列表", "GET", "/api/v1/payments/?limit=100", 2),
+    Endpoint("创建订单（余额支付）", "POST", "/api/v1/orders/",
+             4, json={"product_id": 1, "quantity": 1, "payment_method": "balance"}),
+    Endpoint(f"购物车结算（{CART_SIZE} 件商品）", "POST", "/api/v1/orders/cart",
+             2, json=[{"product_id": i + 1, "quantity": 1} for i in range(CART_SIZE)]),
+    Endpoint("仪表盘统计", "GET", "/api/v1/admin/dashboard/stats", 13, admin=True),
+)
+
+
+async def seed() -> tuple:
+    """生成测试数据，返回 (普通用户令牌, 管理员令牌)"""
+    await create_tables()
+    async with async_session_maker() as db:
+        admin = User(username="admin", email="admin@example.com", hashed_password="x", is_superuser=True)
+        buyer = User(username="buyer", email="buyer@example.com", hashed_password="x", balance=10000.0)
+        category = Category(name="默认分类")
+        db.add_all([admin, buyer, category])
+        await db.flush()
+
+        products = [
+            Product(name=f"商品{i}", price=10.0 + i, stock=100000, category_id=category.id)
+            for i in range(CART_SIZE)
+        ]
+        db.add_all(products)
+        await db.flush()
+
+        for i in range(200):
+            product = products[i % len(products)]
+            db.add(Order(
+                order_number=f"BENCH{i:08d}",
+                user_id=buyer.id,
+                product_id=product.id,
+                product_name=product.name,
+                product_price=product.price,
+                quantity=1,
+                total_amount=product.price,
+                payment_method=PaymentMethod.BALANCE,
+                status=OrderStatus.DELIVERED,
+            ))
+        await db.commit()
+    return create_access_token(buyer.username), create_access_token(admin.username)
+
+
+async def run(verbose: bool) -> int:
+    user_token, admin_token = await seed()
+    failures = 0
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+        for endpoint in ENDPOINTS:
+            token = admin_token if endpoint.admin else user_token
+            with count_queries() as stats:
+                response = await client.request(
+                    endpoint.method,
+                    endpoint.url,
+                    json=endpoint.json,
+                    headers={"Authorization": f"Bearer {token}"},
+                )
+
+            problems = []
+            if response.status_code >= 400:
+                problems.append(f"HTTP {response.status_code}")
+            if stats.count > endpoint.max_queries:
+                problems.append(f"超出预算 {endpoint.max_queries}")
+            repeated = stats.repeated(settings.QUERY_REPEAT_THRESHOLD)
+            if repeated:
+                problems.append(f"{len(repeated)} 种语句重复执行 ≥{settings.QUERY_REPEAT_THRESHOLD} 次")
+
+            mark = "FAIL" if problems else "ok"
+            print(f"[{mark:>4}] {endpoint.name:<24} {stats.count:>3} 条查询 "
+                  f"{stats.duration * 1000:>7.2f}ms  {'; '.join(problems)}")
+            if problems or verbose:
+                for shape, n in stats.shapes.most_common(5 if verbose else 3):
+                    print(f"         {n:>3}x {shape[:120]}")
+            failures += bool(problems)
+
+    print(f"\n{len(ENDPOINTS) - failures}/{len(ENDPOINTS)} 个接口在查询预算内")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="接口查询预算检查")
+    parser.add_argument("--verbose", action="store_true", help="输出每个接口的主要语句形态")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run(args.verbose)))
+
+
+if __name__ == "__main__":
+    main()
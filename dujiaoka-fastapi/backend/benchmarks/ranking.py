@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+商品排行榜验证与对比
+
+- 正确性：由小时汇总生成的各分类、各时间窗口 Top-N 与直接按订单逐条统计的结果一致；
+  窗口滑动后的增量结果与整体重新加载一致；未变化时不重复写入
+- 端到端：下单支付发货后销量计入 24h 榜单，退款后冲减，接口与仪表盘读取到最新榜单
+- 对比：仪表盘销量排行 按订单表聚合 与 读取排行榜（进程内缓存命中 / 未命中读 N 行）的耗时
+
+用法:
+    python -m benchmarks.ranking [--orders 20000] [--products 200] [--reads 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import secrets
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 使用临时数据库与计数日志目录，必须在导入应用之前设置
+_db_dir = tempfile.mkdtemp(prefix="dujiaoka_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_dir}/bench.db"
+os.environ["DEBUG"] = "false"
+os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(32))
+os.environ["LEADER_LOCK_FILE"] = f"{_db_dir}/scheduler.lock"
+os.environ["COUNTER_JOURNAL_DIR"] = f"{_db_dir}/counters"
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+from sqlalchemy import insert
+
+from main import app
+from app.core.cache import cache
+from app.core.database import async_session_maker, create_tables
+from app.core.security import create_access_token, get_password_hash
+from app.models import Category, Order, OrderStatus, PaymentMethod, Product, User
+from app.services.counter import counter_service, hour_index
+from app.services.ranking import ALL_CATEGORIES, PERIODS, RankingService, ranking_service
+from app.services.stats import stats_service
+
+results = []
+
+
+def check(name: str, passed: bool, detail: str = "") -> None:
+    results.append(passed)
+    print(f"  {'✅' if passed else '❌'} {name}{f'（{detail}）' if detail else ''}")
+
+
+async def seed(orders: int, products: int) -> list:
+    """生成分类、商品与最近 35 天的已发货订单，并把销售计入小时汇总，返回逐条销售记录"""
+    await create_tables()
+    rng = random.Random(47)
+    async with async_session_maker() as db:
+        admin = User(username="admin", email="admin@example.com", hashed_password=get_password_hash("admin123"),
+                     is_superuser=True)
+        buyer = User(username="buyer", email="buyer@example.com", hashed_password=get_password_hash("buyer123"),
+                     balance=1000000.0)
+        categories = [Category(name=f"分类{i}") for i in range(4)]
+        db.add_all([admin, buyer, *categories])
+        await db.flush()
+        items = [
+            Product(name=f"商品{i}", price=round(rng.uniform(5, 200), 2), stock=-1,
+                    category_id=categories[i % 4].id if i % 10 else None)
+            for i in range(products)
+        ]
+        db.add_all(items)
+        await db.flush()
+
+        now = datetime.utcnow()
+        sales, rows = [], []
+        for i in range(orders):
+            # 少数商品占大部分销量
+            product = items[min(int(rng.paretovariate(1.2)) - 1, products - 1) if i % 3 else rng.randrange(products)]
+            quantity = rng.randint(1, 3)
+            delivered_at = now - timedelta(seconds=rng.uniform(0, 35 * 86400))
+            total_amount = product.price_cents * quantity
+            rows.append({
+                "order_number": f"BENCH{i:08d}", "user_id": buyer.id, "product_id": product.id,
+                "product_name": product.name, "product_price_cents": product.price_cents, "quantity": quantity,
+                "total_amount_cents": total_amount, "payment_method": PaymentMethod.BALANCE,
+                "status": OrderStatus.DELIVERED, "created_at": delivered_at, "updated_at": delivered_at,
+                "paid_at": delivered_at, "delivered_at": delivered_at,
+            })
+            hour = hour_index(delivered_at)
+            sales.append((product.id, product.category_id, quantity, total_amount, hour))
+            counter_service.incr("sales_quantity", product.id, quantity, hour)
+            counter_service.incr("sales_amount", product.id, total_amount, hour)
+        await db.execute(insert(Order), rows)
+        await db.commit()
+    await counter_service.flush()
+    return sales
+
+
+def expected(sales: list, now_hour: int, size: int) -> dict:
+    """直接按逐条销售记录统计各榜单"""
+    totals = {}
+    for product_id, category_id, quantity, amount, hour in sales:
+        for period, hours in PERIODS.items():
+            if hour > now_hour - hours:
+                for category in {ALL_CATEGORIES, category_id or ALL_CATEGORIES}:
+                    total = totals.setdefault((period, category), {}).setdefault(product_id, [0, 0])
+                    total[0] += quantity
+                    total[1] += amount
+    rankings = {}
+    for (period, category), products in totals.items():
+        entries = [(product_id, quantity, amount) for product_id, (quantity, amount) in products.items()]
+        rankings[(period, "quantity", category)] = sorted(
+            entries, key=lambda entry: (-entry[1], -entry[2], entry[0]))[:size]
+        rankings[(period, "amount", category)] = sorted(
+            entries, key=lambda entry: (-entry[2], -entry[1], entry[0]))[:size]
+    return rankings
+
+
+async def verify_correctness(sales: list) -> None:
+    print("正确性")
+    changed = await ranking_service.refresh(full=True)
+    now_hour = ranking_service._current_hour
+    want = expected(sales, now_hour, ranking_service.size)
+    got = ranking_service._compute()
+    check("各分类、各时间窗口的 Top-N 与逐条统计一致", got == want, f"{len(got)} 个榜单")
+    check("首次生成写入全部榜单", changed == len(want), str(changed))
+    check("未变化时不重复写入", await ranking_service.refresh() == 0)
+
+    async with async_session_maker() as db:
+        top = await ranking_service.get_ranking(db, "7d", "amount", limit=5)
+    check("读取的榜单与生成结果一致",
+          [entry["product_id"] for entry in top] == [entry[0] for entry in want[("7d", "amount", ALL_CATEGORIES)][:5]])
+
+    # 时间前进 3 天：24h 榜单清空，7d/30d 榜单只保留仍在窗口内的小时
+    later = RankingService(size=ranking_service.size)
+    await later.refresh(full=True)
+    later._advance(now_hour + 72)
+    want = expected(sales, now_hour + 72, later.size)
+    got = later._compute()
+    check("窗口滑动后的增量结果与逐条统计一致", got == want and not any(key[0] == "24h" for key in got))
+
+
+async def verify_end_to_end() -> None:
+    print("端到端")
+    admin = {"Authorization": f"Bearer {create_access_token('admin')}"}
+    buyer = {"Authorization": f"Bearer {create_access_token('buyer')}"}
+    async with async_session_maker() as db:
+        product = Product(name="新品", price=20000.0, stock=100, category_id=1)
+        db.add(product)
+        await db.commit()
+        product_id = product.id
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://localhost") as client:
+        rankings = "/api/v1/products/rankings?period=24h&metric=amount&limit=1"
+        await client.get(rankings)
+
+        order = (await client.post("/api/v1/orders/", json={"product_id": product_id, "quantity": 5,
+                                                            "payment_method": "balance"}, headers=buyer)).json()
+        await client.post(f"/api/v1/orders/{order['id']}/pay", headers=buyer)
+        await counter_service.flush()
+        await ranking_service.refresh()
+        top = (await client.get(rankings)).json()
+        check("发货后计入 24h 销售额榜首", top and top[0]["product_id"] == product_id and top[0]["amount"] == 100000.0,
+              str(top[:1]))
+        top = (await client.get("/api/v1/products/rankings?period=24h&category_id=1&limit=100")).json()
+        check("计入所属分类的榜单", any(entry["product_id"] == product_id for entry in top))
+        charts = (await client.get("/api/v1/admin/dashboard/charts?days=1", headers=admin)).json()
+        check("仪表盘销量排行读取排行榜", charts["sales_chart"][0]["product"] == "新品")
+
+        await client.post(f"/api/v1/orders/{order['id']}/refund", headers=admin)
+        await counter_service.flush()
+        await ranking_service.refresh()
+        top = (await client.get(rankings)).json()
+        check("退款后冲减", not top or top[0]["product_id"] != product_id)
+        response = await client.get("/api/v1/products/rankings?period=1y")
+        check("不支持的时间窗口返回 400", response.status_code == 400, str(response.status_code))
+
+    fresh = RankingService(size=ranking_service.size)
+    await fresh.refresh(full=True)
+    check("增量更新结果与整体重新加载一致", fresh._compute() == ranking_service._compute())
+
+
+async def measure(reads: int) -> None:
+    print("对比")
+    async with async_session_maker() as db:
+        started = time.perf_counter()
+        for _ in range(reads):
+            await stats_service.compute_sales_chart(db, 31)
+        aggregate = (time.perf_counter() - started) / reads
+
+        started = time.perf_counter()
+        for _ in range(reads):
+            await cache.invalidate_tags(("rankings",))
+            await stats_service.compute_sales_chart(db, 30)
+        uncached = (time.perf_counter() - started) / reads
+
+        await stats_service.compute_sales_chart(db, 30)
+        started = time.perf_counter()
+        for _ in range(reads * 10):
+            await stats_service.compute_sales_chart(db, 30)
+        cached = (time.perf_counter() - started) / (reads * 10)
+
+    print(f"  按订单表聚合：        {aggregate * 1e3:8.3f} ms/次")
+    print(f"  读取排行榜（未命中）：{uncached * 1e3:8.3f} ms/次（{aggregate / uncached:.0f}x）")
+    print(f"  读取排行榜（命中）：  {cached * 1e3:8.3f} ms/次（{aggregate / cached:.0f}x）")
+
+
+async def run(args) -> int:
+    sales = await seed(args.orders, args.products)
+    await verify_correctness(sales)
+    await verify_end_to_end()
+    await measure(args.reads)
+
+    print(f"\n{results.count(True)}/{len(results)} 项检查通过")
+    return 0 if all(results) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="商品排行榜验证与对比")
+    parser.add_argument("--orders", type=int, default=20000, help="已发货订单数")
+    parser.add_argument("--products", type=int, default=200, help="商品数")
+    parser.add_argument("--reads", type=int, default=200, help="对比测试的读取次数")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+请求限流验证与开销测量
+
+- 算法：滑动窗口与令牌桶在给定时间序列下的放行/拒绝是否符合预期
+- 登录洪泛：同一地址连续登录失败，超出规则后返回 429（不再进入密码校验），其他地址不受影响
+- Redis 不可用时退回进程内存储
+- 开销：默认规则下单次检查的耗时（进程内存储；指定 --redis-url 时同时测量 Redis 存储）
+
+用法:
+    python -m benchmarks.rate_limit [--checks 100000]
+    python -m benchmarks.rate_limit --redis-url redis://localhost:6379/15
+    python -m benchmarks.rate_limit --redis-url fake    # 使用 fakeredis（需另行安装 fakeredis[lua]）
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 使用临时数据库，必须在导入应用之前设置
+_db_dir = tempfile.mkdtemp(prefix="dujiaoka_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_dir}/bench.db"
+os.environ["DEBUG"] = "false"
+os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(32))
+os.environ["LEADER_LOCK_FILE"] = f"{_db_dir}/scheduler.lock"
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ["RATE_LIMIT_ENABLED"] = "true"
+os.environ["RATE_LIMIT_STORAGE"] = "memory"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from main import app
+from app.core.config import settings
+from app.core.database import create_tables
+from app.core.rate_limit import MemoryStore, RateLimiter, RateLimitRule, RedisStore, parse_rules, rate_limiter
+
+results = []
+
+
+def check(name: str, passed: bool, detail: str = "") -> None:
+    results.append(passed)
+    print(f"  {'✅' if passed else '❌'} {name}{f'（{detail}）' if detail else ''}")
+
+
+async def verify_algorithms() -> None:
+    print("算法")
+    store = MemoryStore()
+    start = 1_000_020.0  # 某个窗口起点之后 0 秒
+
+    window = RateLimitRule.parse("POST /login 10/minute ip window")
+    allowed = [(await store.hit("w", window, start + i * 0.1)).allowed for i in range(11)]
+    check("滑动窗口：窗口内前 10 次放行、第 11 次拒绝", allowed == [True] * 10 + [False])
+    decision = await store.hit("w", window, start + 60)
+    check("滑动窗口：下一窗口开始时上一窗口计数仍全额计入", not decision.allowed)
+    allowed = [(await store.hit("w", window, start + 90)).allowed for _ in range(6)]
+    check("滑动窗口：下一窗口过半时放行约一半", allowed == [True] * 5 + [False], f"{allowed.count(True)} 次放行")
+
+    bucket = RateLimitRule.parse("POST /callback 10/minute ip bucket")
+    allowed = [(await store.hit("b", bucket, start)).allowed for _ in range(11)]
+    check("令牌桶：突发 10 次放行、第 11 次拒绝", allowed == [True] * 10 + [False])
+    decision = await store.hit("b", bucket, start + 1)
+    check("令牌桶：拒绝时给出补充一个令牌所需的等待时间", not decision.allowed and abs(decision.retry_after - 5) < 0.01,
+          f"{decision.retry_after:.1f} 秒")
+    check("令牌桶：6 秒后补充一个令牌", (await store.hit("b", bucket, start + 7)).allowed)
+
+    rule = RateLimitRule.parse("POST /api/v1/payments/{gateway}/callback 1/second ip")
+    check("路径占位符匹配", rule.matches("POST", "/api/v1/payments/alipay/callback")
+          and not rule.matches("POST", "/api/v1/payments/alipay/callback/x"))
+
+
+async def verify_login_flood() -> None:
+    print("登录洪泛")
+    await create_tables()
+    limit = next(rule.limit for rule in rate_limiter.rules if rule.path.endswith("/auth/login"))
+    attacker = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=("203.0.113.7", 40000)), base_url="http://localhost")
+    other = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=("198.51.100.9", 40000)), base_url="http://localhost")
+    login = f"{settings.API_V1_STR}/auth/login"
+    async with attacker, other:
+        statuses = []
+        for _ in range(limit + 20):
+            response = await attacker.post(login, data={"username": "nobody", "password": "wrong"})
+            statuses.append(response.status_code)
+        rejected = statuses.count(429)
+        check(f"前 {limit} 次正常处理", all(status != 429 for status in statuses[:limit]))
+        check("超出后全部返回 429", rejected == 20, f"{rejected} 次")
+        check("429 带 Retry-After", int(response.headers.get("retry-after", "0")) >= 1)
+        response = await other.post(login, data={"username": "nobody", "password": "wrong"})
+        check("其他地址不受影响", response.status_code != 429, str(response.status_code))
+
+
+async def verify_fallback() -> None:
+    print("Redis 不可用")
+    store = RedisStore("redis://127.0.0.1:1/0", retry_interval=60)
+    rule = RateLimitRule.parse("GET /x 3/minute ip")
+    allowed = [(await store.hit("k", rule)).allowed for _ in range(4)]
+    check("退回进程内存储继续限流", allowed == [True, True, True, False])
+    await store.close()
+
+
+async def measure(store, label: str, checks: int) -> None:
+    limiter = RateLimiter(parse_rules(settings.RATE_LIMIT_RULES), store)
+    scopes = [
+        {"type": "http", "method": "GET", "path": "/api/v1/products/", "headers": [], "client": (f"10.0.{i // 256}.{i % 256}", 1)}
+        for i in range(10_000)
+    ]
+    started = time.perf_counter()
+    for i in range(checks):
+        await limiter.check(scopes[i % len(scopes)])
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<10} {elapsed / checks * 1e6:8.2f} µs/次  （{checks} 次检查，{len(scopes)} 个地址）")
+
+
+async def run(args) -> int:
+    await verify_algorithms()
+    await verify_login_flood()
+    await verify_fallback()
+
+    print("开销")
+    await measure(MemoryStore(), "memory", args.checks)
+    if args.redis_url:
+        if args.redis_url == "fake":
+            from fakeredis import FakeAsyncRedis
+            client = FakeAsyncRedis()
+        else:
+            import redis.asyncio as redis
+            client = redis.from_url(args.redis_url)
+        store = RedisStore(client=client, prefix=f"ratelimit-bench-{secrets.token_hex(4)}:")
+        rule = RateLimitRule.parse("GET /x 5/minute ip")
+        allowed = [(await store.hit("k", rule)).allowed for _ in range(6)]
+        check("Redis 滑动窗口：5 次放行、第 6 次拒绝", allowed == [True] * 5 + [False])
+        rule = RateLimitRule.parse("GET /y 5/minute ip bucket")
+        allowed = [(await store.hit("k", rule)).allowed for _ in range(6)]
+        check("Redis 令牌桶：5 次放行、第 6 次拒绝", allowed == [True] * 5 + [False])
+        await measure(store, "redis", min(args.checks, 10_000))
+        await store.close()
+
+    print(f"\n{results.count(True)}/{len(results)} 项检查通过")
+    return 0 if all(results) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="请求限流验证与开销测量")
+    parser.add_argument("--checks", type=int, default=100_000, help="开销测量的检查次数")
+    parser.add_argument("--redis-url", help="同时验证 Redis 存储（fake 表示使用 fakeredis）")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
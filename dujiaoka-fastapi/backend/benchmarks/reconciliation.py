@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+支付对账验证
+
+构造我方支付记录与一份支付宝对账单（含 N 笔正常交易与各类差异），验证：
+- 各类差异（金额不一致、状态不一致、双方缺失）被正确识别
+- 金额格式无效的行（如 "1,000.00"）单独报告为 bad_row，不中断整个对账，其余交易照常核对
+
+用法:
+    python -m benchmarks.reconciliation [--rows 10000]
+"""
+import argparse
+import asyncio
+import csv
+import io
+import os
+import secrets
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+# 使用临时数据库，必须在导入应用之前设置
+_db_dir = tempfile.mkdtemp(prefix="dujiaoka_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_dir}/bench.db"
+os.environ["DEBUG"] = "false"
+os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(32))
+os.environ["LEADER_LOCK_FILE"] = f"{_db_dir}/scheduler.lock"
+os.environ.setdefault("CACHE_BACKEND", "memory")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import insert
+
+from app.core.database import async_session_maker, create_tables
+from app.models import Order, Payment, PaymentMethod, PaymentStatus, Product, User
+from app.services.reconciliation import reconciliation_service
+
+BILL_DATE = date(2026, 1, 1)
+PAID_AT = datetime(2026, 1, 1, 12, 0, 0)
+
+results = []
+
+
+def check(name: str, passed: bool, detail: str = "") -> None:
+    results.append(passed)
+    print(f"  {'✅' if passed else '❌'} {name}{f'（{detail}）' if detail else ''}")
+
+
+async def seed(rows: int) -> None:
+    """我方记录：N 笔正常交易，另有金额不一致、状态不一致、对账单缺失、对账单行无效各一笔"""
+    await create_tables()
+    async with async_session_maker() as db:
+        user = User(username="bench", email="bench@example.com", hashed_password="x")
+        product = Product(name="对账商品", price=10.0, stock=0)
+        db.add_all([user, product])
+        await db.flush()
+        order = Order(
+            order_number="BENCH0001", user_id=user.id, product_id=product.id, product_name=product.name,
+            product_price=10.0, quantity=1, total_amount=10.0, payment_method=PaymentMethod.ALIPAY,
+        )
+        db.add(order)
+        await db.flush()
+
+        def payment(txn: str, amount_cents: int, status=PaymentStatus.SUCCESS) -> dict:
+            return {
+                "user_id": user.id, "order_id": order.id, "payment_method": "alipay",
+                "amount_cents": amount_cents, "status": status, "transaction_id": txn,
+                "out_trade_no": f"OUT-{txn}", "created_at": PAID_AT, "updated_at": PAID_AT, "paid_at": PAID_AT,
+            }
+
+        records = [payment(f"TXN{i:06d}", 1000) for i in range(rows)]
+        records += [
+            payment("AMOUNT-DIFF", 1000),
+            payment("STATUS-DIFF", 1000, PaymentStatus.REFUNDED),
+            payment("NOT-IN-STATEMENT", 1000),
+            payment("BAD-AMOUNT", 100000),
+        ]
+        await db.execute(insert(Payment), records)
+        await db.commit()
+
+
+def write_statement(path: str, rows: int) -> None:
+    """支付宝对账单：表头注释、明细行与汇总行"""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        f.write("#支付宝业务明细查询\n")
+        writer = csv.writer(f)
+        writer.writerow(("支付宝交易号", "商户订单号", "业务类型", "订单金额（元）"))
+        for i in range(rows):
+            writer.writerow((f"TXN{i:06d}", f"OUT-TXN{i:06d}", "交易", "10.00"))
+        writer.writerow(("AMOUNT-DIFF", "OUT-AMOUNT-DIFF", "交易", "9.99"))
+        writer.writerow(("STATUS-DIFF", "OUT-STATUS-DIFF", "交易", "10.00"))
+        writer.writerow(("BAD-AMOUNT", "OUT-BAD-AMOUNT", "交易", "1,000.00"))
+        writer.writerow(("UNPARSABLE-ONLY", "OUT-UNPARSABLE-ONLY", "交易", "ten"))
+        writer.writerow(("NOT-IN-OURS", "OUT-NOT-IN-OURS", "交易", "5.00"))
+        f.write("#交易合计\n")
+
+
+async def run(args) -> int:
+    await seed(args.rows)
+    statement_path = os.path.join(_db_dir, "statement.csv")
+    write_statement(statement_path, args.rows)
+
+    report = io.StringIO()
+    started = time.perf_counter()
+    async with async_session_maker() as db:
+        summary = await reconciliation_service.reconcile(
+            db, gateway="alipay", bill_date=BILL_DATE, statement_path=statement_path, report=report,
+        )
+    elapsed = time.perf_counter() - started
+    print(f"对账 {args.rows + 5} 行对账单耗时 {elapsed:.3f}s: {summary}")
+
+    diffs = {row["transaction_id"]: row for row in csv.DictReader(io.StringIO(report.getvalue()))}
+
+    def kind(txn: str):
+        return diffs.get(txn, {}).get("type")
+
+    check("正常交易全部核对一致", summary["matched"] == args.rows, f"{summary['matched']}/{args.rows}")
+    check("金额不一致", kind("AMOUNT-DIFF") == "amount_diff")
+    check("状态不一致", kind("STATUS-DIFF") == "status_diff")
+    check("对账单缺失", kind("NOT-IN-STATEMENT") == "missing_in_statement")
+    check("我方缺失", kind("NOT-IN-OURS") == "missing_in_ours")
+    check(
+        "金额格式无效的行报告为 bad_row（附我方金额）",
+        kind("BAD-AMOUNT") == "bad_row" and diffs["BAD-AMOUNT"]["statement_amount"] == "1,000.00"
+        and diffs["BAD-AMOUNT"]["our_amount"] == "1000.00",
+    )
+    check("我方没有记录的无效行同样报告为 bad_row", kind("UNPARSABLE-ONLY") == "bad_row")
+    check(
+        "差异计数与报告行数一致",
+        summary["bad_row"] == 2 and sum(v for k, v in summary.items() if k not in ("statement_rows", "matched"))
+        == len(diffs),
+    )
+
+    print(f"\n{results.count(True)}/{len(results)} 项检查通过")
+    return 0 if all(results) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="支付对账验证")
+    parser.add_argument("--rows", type=int, default=10000, help="对账单中正常交易的行数")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+回调验签吞吐基准
+
+生成一对 RSA-2048 密钥和一批已签名的回调数据，分别测量：
+- 单进程直接验签（每核基线）
+- 通过 SignatureVerifier 并发验签（攒批 + 进程池）
+
+用法:
+    python -m benchmarks.signature_throughput [--count 5000] [--workers 2]
+"""
+import argparse
+import asyncio
+import base64
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+from app.services.signature import SignatureVerifier, build_sign_content, verify_batch
+
+
+def make_key_pair() -> tuple:
+    """生成测试密钥对"""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    ).decode()
+    return private_key, public_pem
+
+
+def sign_callback(private_key, data: dict) -> dict:
+    """按网关规则对回调数据签名"""
+    signature = private_key.sign(build_sign_content(data), padding.PKCS1v15(), hashes.SHA256())
+    return {**data, "sign": base64.b64encode(signature).decode(), "sign_type": "RSA2"}
+
+
+def make_callbacks(private_key, count: int) -> list:
+    return [
+        sign_callback(private_key, {
+            "out_trade_no": f"ORD{i:010d}",
+            "trade_no": f"2026{i:016d}",
+            "total_amount": "25.00",
+            "trade_status": "TRADE_SUCCESS",
+        })
+        for i in range(count)
+    ]
+
+
+def bench_inline(public_pem: str, callbacks: list) -> float:
+    """单进程直接验签，返回每秒验签次数"""
+    items = [
+        (public_pem, build_sign_content(cb), base64.b64decode(cb["sign"]))
+        for cb in callbacks
+    ]
+    started = time.perf_counter()
+    results = verify_batch(items)
+    elapsed = time.perf_counter() - started
+    assert all(results)
+    return len(items) / elapsed
+
+
+async def bench_verifier(verifier: SignatureVerifier, callbacks: list) -> float:
+    """并发提交到验签服务，返回每秒验签次数"""
+    # 预热进程池（子进程启动与公钥解析）
+    await verifier.verify("alipay", callbacks[0])
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(verifier.verify("alipay", cb) for cb in callbacks))
+    elapsed = time.perf_counter() - started
+    assert all(results)
+    return len(callbacks) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回调验签吞吐基准")
+    parser.add_argument("--count", type=int, default=5000, help="验签次数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="进程池大小")
+    parser.add_argument("--batch-size", type=int, default=64, help="批大小")
+    parser.add_argument("--window-ms", type=int, default=2, help="攒批等待毫秒数")
+    args = parser.parse_args()
+
+    private_key, public_pem = make_key_pair()
+    callbacks = make_callbacks(private_key, args.count)
+
+    from app.core.config import settings
+    settings.ALIPAY_PUBLIC_KEY = public_pem
+
+    inline_rate = bench_inline(public_pem, callbacks)
+    print(f"单进程直接验签: {inline_rate:,.0f} 次/秒（每核）")
+
+    verifier = SignatureVerifier(args.workers, args.batch_size, args.window_ms)
+    try:
+        pool_rate = asyncio.run(bench_verifier(verifier, callbacks))
+    finally:
+        verifier.shutdown()
+    print(
+        f"验签服务（{args.workers} 进程，批大小 {args.batch_size}）: "
+        f"{pool_rate:,.0f} 次/秒，约 {pool_rate / max(args.workers, 1):,.0f} 次/秒/核"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+gunicorn 生产环境配置
+
+用法:
+    gunicorn -c gunicorn.conf.py main:app
+
+- worker 数默认按容器的 CPU 配额（cgroup v2 / v1）计算，每个 CPU 一个异步 worker；
+  可用 WEB_CONCURRENCY 指定
+- preload：master 导入应用后再 fork，worker 共享只读内存页，启动更快
+- worker 处理 GUNICORN_MAX_REQUESTS 个请求后轮换（带随机抖动，避免所有 worker 同时重启）
+- SIGTERM 时 worker 停止接收新连接，在 GUNICORN_GRACEFUL_TIMEOUT 秒内排空处理中的请求
+- 多进程 Prometheus 指标目录在 master 启动时清空，worker 退出后标记其指标失效
+- 表结构检查（空库建表）在 master fork worker 之前执行一次，避免多个 worker 同时建表互相冲突
+
+以上参数均从环境变量读取（docker-compose 会把 .env 注入环境变量）。
+"""
+import math
+import os
+import shutil
+import tempfile
+
+
+def _cgroup_cpu_quota():
+    """容器的 CPU 配额（核数），未限制时返回 None"""
+    try:
+        # cgroup v2: "<quota> <period>" 或 "max <period>"
+        with open("/sys/fs/cgroup/cpu.max", encoding="utf-8") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1: quota 为 -1 表示不限制
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", encoding="utf-8") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", encoding="utf-8") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def default_workers() -> int:
+    """按 CPU 配额与可用核数计算 worker 数"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+# 监听与 worker
+bind = f"0.0.0.0:{os.getenv('BACKEND_PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY") or default_workers())
+worker_class = "app.core.gunicorn_worker.GracefulUvicornWorker"
+preload_app = True
+
+# worker 轮换
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", str(max_requests // 10)))
+
+# 超时（timeout 为 worker 心跳超时；graceful_timeout 为收到 SIGTERM 后排空请求的时限）
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# 日志（访问日志默认关闭，与 main.py 一致）
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+# 只信任反向代理转发的客户端地址（X-Forwarded-For 可由客户端伪造，不能信任任意来源；
+# docker-compose 中为前端 nginx 的固定地址）
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# 多进程 Prometheus 指标：目录必须在 preload 导入应用之前设置，并在每次启动前清空
+prometheus_multiproc_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    os.path.join(tempfile.gettempdir(), "dujiaoka_metrics"),
+)
+shutil.rmtree(prometheus_multiproc_dir, ignore_errors=True)
+os.makedirs(prometheus_multiproc_dir, exist_ok=True)
+
+
+def on_starting(server):
+    """
+    fork worker 之前在 master 中完成表结构检查
+
+    多个 worker 同时对空库建表会因表已存在而启动失败，进而导致 master 退出；
+    preload 时 worker 继承检查结果，不再重复检查。
+    """
+    import asyncio
+
+    from app.core.database import engine, ensure_schema
+
+    async def check() -> str:
+        try:
+            return await ensure_schema()
+        finally:
+            # 关闭 master 中建立的连接，worker 各自建立
+            await engine.dispose()
+
+    server.log.info(f"数据库表结构: {asyncio.run(check())}")
+
+
+def when_ready(server):
+    server.log.info(
+        f"workers={workers} max_requests={max_requests}±{max_requests_jitter} "
+        f"graceful_timeout={graceful_timeout}s metrics_dir={prometheus_multiproc_dir}"
+    )
+
+
+def post_fork(server, worker):
+    """fork 后丢弃从 master 继承的连接池，worker 各自建立数据库连接"""
+    from app.core.database import engine
+
+    engine.sync_engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    """worker 退出后标记其 Prometheus 指标失效（livesum 类 Gauge 不再计入）"""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid, prometheus_multiproc_dir)
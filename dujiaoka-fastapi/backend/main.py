@@ -2,6 +2,10 @@
 小申交流站 - 分享学习，共同成长
 """
 import os
+import time
+
+_import_started = time.perf_counter()
+
 import uvicorn
 
 # 设置默认的卡密加密密钥（如果环境变量未设置）
@@ -11,18 +15,37 @@ if 'CARD_ENCRYPTION_KEY' not in os.environ or len(os.environ.get('CARD_ENCRYPTIO
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from loguru import logger
 
 from app.api.api_v1.api import api_router
+from app.core.cache import cache
 from app.core.config import settings
-from app.core.database import create_tables
+from app.core.database import engine, ensure_schema
+from app.core.leader import leader_lock
+from app.core.metrics import MetricsMiddleware, install_pool_metrics, render_metrics
+from app.core.query_counter import QueryCounterMiddleware, install_query_counter
+from app.core.rate_limit import RateLimitMiddleware, rate_limiter
+from app.core.slow_query import SlowQueryMiddleware, slow_query_log
+from app.core.startup import startup_profile
+from app.services.signature import signature_verifier
+from app.tasks.callback_queue import callback_queue
+from app.tasks.card_expiry import card_expiry_sweeper
+from app.tasks.counter_flush import counter_flusher
+from app.tasks.order_archiver import order_archiver
+from app.tasks.order_timeout import order_timeout_scheduler
+from app.tasks.profiler_channel import profiler_channel
+from app.tasks.ranking_refresh import ranking_refresher
+
+startup_profile.record("模块导入", time.perf_counter() - _import_started)
+_app_started = time.perf_counter()
 
 # 创建 FastAPI 应用
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="小申交流站 - 分享学习资源，技术交流，共同成长",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     openapi_url=f"{settings.API_V1_STR}/openapi.json" if settings.DEBUG else None,
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
@@ -45,6 +68,25 @@ if not settings.DEBUG:
         allowed_hosts=settings.ALLOWED_HOSTS,
     )
 
+# 请求级查询统计（Server-Timing / 查询预算 / N+1 检测）
+if settings.QUERY_COUNTER_ENABLED:
+    install_query_counter(engine.sync_engine)
+    app.add_middleware(QueryCounterMiddleware)
+
+# 慢查询日志（按语句形态聚合，标注来源路由）
+if settings.SLOW_QUERY_THRESHOLD_MS > 0:
+    slow_query_log.install(engine.sync_engine)
+    app.add_middleware(SlowQueryMiddleware)
+
+# 请求限流（位于指标中间件之内，被拒绝的请求同样计入请求指标）
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
+# 请求耗时 / 并发数 / 连接池指标（最外层，覆盖其余中间件的耗时）
+if settings.METRICS_ENABLED:
+    install_pool_metrics(engine.sync_engine.pool)
+    app.add_middleware(MetricsMiddleware)
+
 # 全局异常处理
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -64,6 +106,7 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 # 包含 API 路由
 app.include_router(api_router, prefix=settings.API_V1_STR)
+startup_profile.record("创建应用", time.perf_counter() - _app_started)
 
 
 @app.on_event("startup")
@@ -75,9 +118,23 @@ async def startup_event():
     logger.info(f"🔧 调试模式: {settings.DEBUG}")
     logger.info("=" * 50)
     
-    # 创建数据库表
-    await create_tables()
-    logger.info("✅ 数据库表初始化完成")
+    # 表结构检查（已迁移到最新版本时跳过建表）
+    with startup_profile.phase("表结构检查"):
+        schema_state = await ensure_schema()
+    startup_profile.notes["schema"] = schema_state
+    logger.info(f"✅ 数据库表结构: {schema_state}")
+
+    # 启动后台任务
+    with startup_profile.phase("启动后台任务"):
+        card_expiry_sweeper.start()
+        order_timeout_scheduler.start()
+        callback_queue.start()
+        counter_flusher.start()
+        ranking_refresher.start()
+        order_archiver.start()
+        cache.start()
+        if settings.PROFILER_ENABLED:
+            profiler_channel.start()
     
     # 生产环境安全检查
     if not settings.DEBUG:
@@ -86,11 +143,25 @@ async def startup_event():
             logger.warning("⚠️ 生产环境建议使用 PostgreSQL！")
         logger.info("✅ 安全检查完成")
 
+    startup_profile.mark_ready()
+    logger.info(f"⏱️ 启动耗时: {startup_profile.summary()}")
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """应用关闭时的清理"""
     logger.info("👋 应用关闭中...")
+    await card_expiry_sweeper.stop()
+    await order_timeout_scheduler.stop()
+    await callback_queue.stop()
+    await counter_flusher.stop()
+    await ranking_refresher.stop()
+    await order_archiver.stop()
+    await profiler_channel.stop()
+    await signature_verifier.aclose()
+    await rate_limiter.store.close()
+    await cache.stop()
+    await leader_lock.release()
 
 
 @app.get("/")
@@ -110,6 +181,14 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 指标"""
+    data, content_type = render_metrics()
+    return Response(content=data, media_type=content_type)
+
+
+# 开发环境直接运行本文件（单进程）；生产环境使用 gunicorn -c gunicorn.conf.py main:app
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
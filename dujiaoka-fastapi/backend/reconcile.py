@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+支付对账脚本
+将 payments 表与支付宝/微信的每日对账单核对，输出差异报告（CSV）
+
+用法:
+    python reconcile.py --gateway alipay --date 2026-01-01 \
+        --statement alipay_20260101.csv --output report_20260101.csv --encoding gbk
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.core.database import async_session_maker
+from app.services.reconciliation import reconciliation_service
+
+
+async def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="支付对账")
+    parser.add_argument("--gateway", choices=["alipay", "wechat"], required=True, help="支付方式")
+    parser.add_argument("--date", required=True, help="账单日期 YYYY-MM-DD")
+    parser.add_argument("--statement", required=True, help="对账单文件路径")
+    parser.add_argument("--output", required=True, help="差异报告输出路径")
+    parser.add_argument("--encoding", default="utf-8", help="对账单编码（支付宝账单一般为 gbk）")
+    parser.add_argument("--lookback-days", type=int, default=1, help="我方记录回溯天数")
+    args = parser.parse_args()
+
+    bill_date = datetime.strptime(args.date, "%Y-%m-%d").date()
+
+    print(f"🧾 开始对账: {args.gateway} {bill_date}")
+    async with async_session_maker() as db:
+        with open(args.output, "w", newline="", encoding="utf-8") as report:
+            summary = await reconciliation_service.reconcile(
+                db,
+                gateway=args.gateway,
+                bill_date=bill_date,
+                statement_path=args.statement,
+                report=report,
+                encoding=args.encoding,
+                lookback_days=args.lookback_days,
+            )
+
+    for key, value in summary.items():
+        print(f"  - {key}: {value}")
+    print(f"✅ 对账完成，差异报告: {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())